@@ -0,0 +1,18 @@
+import argparse
+import os
+from pymergen.core.aggregator import Aggregator
+from pymergen.core.manifest import Manifest
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-r", "--run-path", action="store", type=str, required=True, help="Run directory (or any entity directory in it)")
+args = parser.parse_args()
+
+aggregator = Aggregator()
+paths = aggregator.aggregate(args.run_path, recursive=True)
+
+# Summaries are registered when the manifest of a whole run directory is available.
+if os.path.exists(os.path.join(args.run_path, Manifest.FILE_NAME)):
+    manifest = Manifest(args.run_path)
+    for path in paths:
+        manifest.register(path)
+    manifest.close()
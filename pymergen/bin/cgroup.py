@@ -0,0 +1,33 @@
+import argparse
+from pymergen.controller.group import ControllerGroup
+from pymergen.controller.factory import ControllerFactory
+
+# Privileged helper of the native cgroup v2 backend, run with the become_cmd of the cgroup
+parser = argparse.ArgumentParser()
+parser.add_argument("action", action="store", type=str, choices=["create", "destroy"], help="Action")
+parser.add_argument("-n", "--name", action="store", type=str, required=True, help="Cgroup name")
+parser.add_argument("-c", "--controllers", action="store", type=str, default="", help="Comma separated controller names")
+parser.add_argument("-l", "--limit", action="append", type=str, default=list(), help="Limit as <controller>.<key>=<value>")
+parser.add_argument("--nested", action="store_true", default=False, help="Place commands into leaves of the cgroup")
+parser.add_argument("-o", "--owner", action="store", type=str, required=False, help="Delegate the cgroup to <uid>:<gid>")
+args = parser.parse_args()
+
+cgroup = ControllerGroup(args.name)
+cgroup.backend = ControllerGroup.BACKEND_NATIVE
+cgroup.nested = args.nested
+cgroup.owner = args.owner
+controllers = dict()
+for name in filter(None, args.controllers.split(",")):
+    controllers[name] = ControllerFactory.instance(name)
+    cgroup.add_controller(controllers[name])
+for limit in args.limit:
+    key, value = limit.split("=", 1)
+    name, key = key.split(".", 1)
+    if name not in controllers:
+        raise Exception("Controller {name} of limit {limit} is not enabled".format(name=name, limit=limit))
+    controllers[name].add_limit(key, value)
+
+if args.action == "create":
+    cgroup.create()
+else:
+    cgroup.destroy()
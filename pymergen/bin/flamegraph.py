@@ -0,0 +1,35 @@
+import os
+import argparse
+from pymergen.core.flamegraph import FlamegraphPool
+from pymergen.core.manifest import Manifest
+from pymergen.collector.perf import CollectorPerfProfile
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-r", "--run-path", action="store", type=str, required=True, help="Run directory (or any entity directory in it)")
+parser.add_argument("-j", "--workers", action="store", type=int, default=FlamegraphPool.DEFAULT_WORKERS, help="Number of worker processes")
+parser.add_argument("--cache-path", action="store", type=str, required=False, help="Directory of converted profiles by data file hash")
+parser.add_argument("--become-cmd", action="store", type=str, required=False, help="Prefix of perf script, e.g. sudo")
+args = parser.parse_args()
+
+cache_path = args.cache_path
+if cache_path is None:
+    cache_path = os.path.join(os.path.dirname(os.path.abspath(args.run_path)), CollectorPerfProfile.DIR_FLAMEGRAPH_CACHE)
+
+pool = FlamegraphPool(cache_path, args.workers, args.become_cmd)
+futures = list()
+for dir_path, _, file_names in os.walk(args.run_path):
+    if CollectorPerfProfile.FILE_DATA in file_names:
+        futures.append(pool.submit(os.path.join(dir_path, CollectorPerfProfile.FILE_DATA)))
+paths = list()
+for future in futures:
+    if future.exception() is None:
+        paths.extend(future.result())
+for error in pool.close():
+    print("Failed to generate flame graph due to {e}".format(e=error))
+
+# Flame graphs are registered when the manifest of a whole run directory is available.
+if os.path.exists(os.path.join(args.run_path, Manifest.FILE_NAME)):
+    manifest = Manifest(args.run_path)
+    for path in paths:
+        manifest.register(path)
+    manifest.close()
@@ -0,0 +1,58 @@
+import os
+import argparse
+from pymergen.core.flamegraph import Flamegraph, FlamegraphDiff, FlamegraphFolder
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-r", "--run-path", action="store", type=str, required=True, help="Run directory (or any entity directory in it)")
+parser.add_argument("-b", "--baseline-path", action="store", type=str, required=False, help="Directory to compare with, iterations of the run are compared with each other otherwise")
+parser.add_argument("-i", "--baseline-iteration", action="store", type=str, required=False, help="Iteration to compare with, the first one by default")
+parser.add_argument("-o", "--output-path", action="store", type=str, required=True, help="Directory of merged profiles, differential flame graphs and tables")
+parser.add_argument("-n", "--top", action="store", type=int, default=10, help="Number of regressed symbols printed per comparison")
+args = parser.parse_args()
+
+
+def output(key: str) -> str:
+    path = os.path.join(args.output_path, *[part for part in key.split("/") if part != ""])
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def compare(key: str, label: str, diff: FlamegraphDiff) -> None:
+    path = output(key)
+    diff.write_table(os.path.join(path, "collector.perf_profile.diff.tsv"))
+    diff.render(os.path.join(path, "collector.perf_profile.diff.svg"), "{key} against {label}".format(key=key, label=label))
+    print("{key} against {label}".format(key=key, label=label))
+    for row in diff.table()[:args.top]:
+        if row[3] <= 0:
+            break
+        print("  {delta:+8.2f}% {symbol}".format(delta=row[3], symbol=row[0]))
+
+
+# Profiles of the replications of a node are merged as they are compared, one node at a time.
+profiles = FlamegraphDiff.find(args.run_path)
+if args.baseline_path is not None:
+    baseline_profiles = FlamegraphDiff.find(args.baseline_path)
+    for key in sorted(profiles):
+        if key not in baseline_profiles:
+            continue
+        stacks = FlamegraphDiff.merge(profiles[key])
+        FlamegraphFolder.write(stacks, os.path.join(output(key), Flamegraph.FILE_FOLDED))
+        compare(key, args.baseline_path, FlamegraphDiff(FlamegraphDiff.merge(baseline_profiles[key]), stacks))
+else:
+    nodes = dict()
+    for key in sorted(profiles):
+        node, iteration = FlamegraphDiff.iterations(key)
+        if iteration is not None:
+            nodes.setdefault(node, dict())[iteration] = key
+    for node, iterations in sorted(nodes.items()):
+        baseline_iteration = args.baseline_iteration if args.baseline_iteration is not None else sorted(iterations)[0]
+        if baseline_iteration not in iterations:
+            continue
+        baseline = FlamegraphDiff.merge(profiles[iterations[baseline_iteration]])
+        FlamegraphFolder.write(baseline, os.path.join(output(iterations[baseline_iteration]), Flamegraph.FILE_FOLDED))
+        for iteration, key in sorted(iterations.items()):
+            if iteration == baseline_iteration:
+                continue
+            stacks = FlamegraphDiff.merge(profiles[key])
+            FlamegraphFolder.write(stacks, os.path.join(output(key), Flamegraph.FILE_FOLDED))
+            compare(key, baseline_iteration, FlamegraphDiff(baseline, stacks))
@@ -12,6 +12,9 @@ parser.add_argument("--filter-suite", action="store", type=str, required=False,
 parser.add_argument("--filter-case", action="store", type=str, required=False, metavar="REGEX", help="Filter cases by name")
 parser.add_argument("-l", "--log-level", action="store", type=str.upper, choices=["DEBUG", "INFO", "WARN", "ERROR"], default="INFO")
 parser.add_argument("--report-files", action="store_true", default=False)
+parser.add_argument("--compress", action="store", type=str, choices=["gzip", "xz", "zstd"], required=False, help="Compress the runner log")
+parser.add_argument("--store", action="store_true", default=False, help="Record results in the SQLite store of the run")
+parser.add_argument("--no-files", action="store_true", default=False, help="Do not write statistics, parsed metrics, and collector samples to files")
 args = parser.parse_args()
 
 context = Context(args)
@@ -20,9 +23,13 @@ context.validate()
 parser = Parser(context)
 parser.load()
 plans = parser.parse()
+context.validate_plans(plans)
 
 runner = Runner(context)
-runner.run(plans)
+try:
+    runner.run(plans)
+finally:
+    context.close()
 runner.report({
     runner.REPORT_FILES: args.report_files
 })
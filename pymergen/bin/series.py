@@ -0,0 +1,10 @@
+import sys
+import argparse
+from pymergen.core.series import SeriesReader
+
+parser = argparse.ArgumentParser()
+parser.add_argument("path", action="store", type=str, help="Series file written by a collector")
+args = parser.parse_args()
+
+# Text export in the layout of the collector text logs
+SeriesReader(args.path).export(sys.stdout)
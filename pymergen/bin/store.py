@@ -0,0 +1,13 @@
+import os
+import json
+import argparse
+from pymergen.core.store import Store
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-r", "--run-path", action="store", type=str, required=True, help="Run directory containing the store")
+parser.add_argument("query", action="store", type=str, help="SQL query, e.g. \"SELECT * FROM stats WHERE metric = 'timer.duration_ns'\"")
+parser.add_argument("params", action="store", type=str, nargs="*", help="Query parameters")
+args = parser.parse_args()
+
+for row in Store.query(os.path.join(args.run_path, Store.FILE_NAME), args.query, tuple(args.params)):
+    print(json.dumps(row))
@@ -1,10 +1,14 @@
 import os
 import time
+import json
 from io import TextIOBase
-from typing import Self, List
-from datetime import datetime
-from pymergen.collector.thread import CollectorThread
+from typing import Any, Self, List, Dict, Tuple, Union
+from pymergen.core.writer import Writer
+from pymergen.core.series import SeriesWriter
+from pymergen.collector.thread import CollectorPeriodic
+from pymergen.collector.engine import CollectorSchedule
 from pymergen.core.executor import CollectingExecutorContext
+from pymergen.controller.group import ControllerGroup
 
 
 class CollectorControllerGroupFile:
@@ -26,41 +30,89 @@ class CollectorControllerGroupFile:
             self._fh = open(self._path, self._mode)
         return self._fh
 
+    def close(self) -> None:
+        if self._fh is not None and not self._fh.closed:
+            self._fh.close()
+        self._instances.pop(self._path, None)
 
-class CollectorControllerGroupStatParser(CollectorControllerGroupFile):
 
-    @staticmethod
-    def instance(path: str, mode: str) -> Self:
-        if path not in CollectorControllerGroupStatParser._instances:
-            CollectorControllerGroupStatParser._instances[path] = CollectorControllerGroupStatParser(path, mode)
-        return CollectorControllerGroupStatParser._instances[path]
+class CollectorControllerGroupSampler:
+
+    BUFFER_SIZE = 4096
+
+    def __init__(self, path: str):
+        self._path = path
+        self._fd = None
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._headers = None
+        self._layout = None
+        self._size = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def headers(self) -> List[str]:
+        return self._headers
+
+    def sample(self) -> Tuple[int, List[Union[int, float, str]]]:
+        timestamp_ns = time.monotonic_ns()
+        data = self._read()
+        tokens = data.split()
+        if self._layout is None or len(tokens) != self._size:
+            self._compile(data)
+        try:
+            values = [convert(tokens[i][offset:]) for i, offset, convert in self._layout]
+        except ValueError:
+            # A field changed its type (e.g. from a number to "max"), which requires a new layout.
+            self._compile(data)
+            values = [convert(tokens[i][offset:]) for i, offset, convert in self._layout]
+        return timestamp_ns, values
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
 
-    def parse_headers(self) -> List:
+    def _read(self) -> bytes:
+        # The file is opened once and re-read from offset zero, which makes the kernel regenerate its content.
+        if self._fd is None:
+            self._fd = os.open(self._path, os.O_RDONLY)
+        while True:
+            size = os.preadv(self._fd, [self._buffer], 0)
+            if size < len(self._buffer):
+                return bytes(memoryview(self._buffer)[:size])
+            self._buffer = bytearray(len(self._buffer) * 2)
+
+    def _compile(self, data: bytes) -> None:
+        # The layout maps each field to its token index, the offset of the value within the token, and the numeric
+        # conversion, so that subsequent samples are parsed without re-deriving the structure from the text. Layouts
+        # are recompiled when the number of tokens changes (e.g. devices appearing in io.stat).
         headers = list()
-        headers.append("timestamp")
-        self.fh.seek(0)
-        for i, input_line in enumerate(self.fh.readlines()):
-            input_columns = input_line.split(" ")
-            input_columns_len = len(input_columns)
-            if input_columns_len < 2:
-                raise Exception("Unable to parse headers from {path} in line: {input_line}".format(
+        layout = list()
+        i = 0
+        for line in data.splitlines():
+            columns = line.split()
+            if len(columns) == 0:
+                continue
+            if len(columns) < 2:
+                raise Exception("Unable to parse headers from {path} in line: {line}".format(
                     path=self._path,
-                    input_line=input_line)
+                    line=line.decode(errors="replace"))
                 )
-            # First input column is the field prefix, and the rest of the columns contain a part of the field
-            # name to on the left side of the equal sign.
+            # Nested key format where the first column is the field prefix, and the rest of the columns contain a
+            # part of the field name to on the left side of the equal sign.
             #
             # For example:
             #
             # some avg10=0.00 avg60=0.00 avg300=0.00 total=219731
             # full avg10=0.00 avg60=0.00 avg300=0.00 total=146364
-            if "=" in input_columns[1]:
-                for j in range(1, input_columns_len):
-                    column_parts = input_columns[j].split("=")
-                    headers.append("{name}_{subname}".format(
-                        name=input_columns[0].strip(),
-                        subname=column_parts[0].strip())
-                    )
+            if b"=" in columns[1]:
+                for j in range(1, len(columns)):
+                    key, value = columns[j].split(b"=", 1)
+                    headers.append("{name}_{subname}".format(name=columns[0].decode(), subname=key.decode()))
+                    layout.append((i + j, len(key) + 1, self._converter(value)))
             # Two column format where first column is the field name and the right column is the field value.
             #
             # For example:
@@ -69,36 +121,41 @@ class CollectorControllerGroupStatParser(CollectorControllerGroupFile):
             # user_usec 45340836
             # system_usec 30788112
             else:
-                headers.append(input_columns[0].strip())
-        return headers
+                headers.append(columns[0].decode())
+                layout.append((i + 1, 0, self._converter(columns[1])))
+            i += len(columns)
+        self._headers = headers
+        self._layout = layout
+        self._size = i
 
-    def parse_values(self) -> List:
-        values = list()
-        values.append(datetime.now().isoformat())
-        self.fh.seek(0)
-        for i, input_line in enumerate(self.fh.readlines()):
-            input_columns = input_line.split(" ")
-            input_columns_len = len(input_columns)
-            if input_columns_len < 2:
-                raise Exception("Unable to parse headers from {path} in line: {input_line}".format(
-                    path=self._path,
-                    input_line=input_line)
-                )
-            if "=" in input_columns[1]:
-                for j in range(1, input_columns_len):
-                    column_parts = input_columns[j].split("=")
-                    values.append(column_parts[1].strip())
-            else:
-                values.append(input_columns[1].strip())
-        return values
+    @staticmethod
+    def _converter(value: bytes) -> Any:
+        for convert in (int, float):
+            try:
+                convert(value)
+                return convert
+            except ValueError:
+                continue
+        return CollectorControllerGroupSampler._decode
+
+    @staticmethod
+    def _decode(value: bytes) -> str:
+        return value.decode()
 
 
 class CollectorControllerGroupStatLogger(CollectorControllerGroupFile):
 
-    def __init__(self, path: str, mode: str):
+    def __init__(self, path: str, mode: str, compress: str = None):
         super().__init__(path, mode)
+        self._compress = compress
         self._is_first_call = True
 
+    @property
+    def fh(self) -> TextIOBase:
+        if self._fh is None:
+            self._fh = Writer.open(self._path, self._compress, self._mode)
+        return self._fh
+
     @property
     def is_first_call(self) -> bool:
         result = self._is_first_call
@@ -106,9 +163,9 @@ class CollectorControllerGroupStatLogger(CollectorControllerGroupFile):
         return result
 
     @staticmethod
-    def instance(path: str, mode: str) -> Self:
+    def instance(path: str, mode: str, compress: str = None) -> Self:
         if path not in CollectorControllerGroupStatLogger._instances:
-            CollectorControllerGroupStatLogger._instances[path] = CollectorControllerGroupStatLogger(path, mode)
+            CollectorControllerGroupStatLogger._instances[path] = CollectorControllerGroupStatLogger(path, mode, compress)
         return CollectorControllerGroupStatLogger._instances[path]
 
     def log_line(self, line: str) -> None:
@@ -116,25 +173,308 @@ class CollectorControllerGroupStatLogger(CollectorControllerGroupFile):
         self.fh.flush()
 
 
-class CollectorControllerGroup(CollectorThread):
-
-    def run(self, parent_context: CollectingExecutorContext) -> None:
-        time.sleep(self.ramp)
-        while self._join is False:
-            for cgroup in parent_context.cgroups:
-                for controller in cgroup.controllers:
-                    for stat_file in controller.stat_files:
-                        log_file_path = os.path.join(
-                            self._executor.run_path(parent_context),
-                            "collector.cgroup_{cgname}_{stat_file}.log".format(
-                                cgname=cgroup.name,
-                                stat_file=stat_file.replace(".", "_")
-                            )
-                        )
-                        stat_logger = CollectorControllerGroupStatLogger.instance(log_file_path, 'a')
-                        stat_file_path = os.path.join(cgroup.DIR_BASE, cgroup.name, stat_file)
-                        stat_parser = CollectorControllerGroupStatParser.instance(stat_file_path, 'r')
-                        if stat_logger.is_first_call:
-                            stat_logger.log_line(" ".join(stat_parser.parse_headers()))
-                        stat_logger.log_line(" ".join(stat_parser.parse_values()))
-            time.sleep(self.interval)
+class CollectorControllerGroupRates:
+
+    # Cumulative counters and the rates derived from them: (field, derived field, scale of the per-second rate)
+    RATES = {
+        "cpu.stat": [
+            # Microseconds of CPU time per second of wall time, i.e. utilization in cores
+            ("usage_usec", "usage_cores", 1e-6),
+            ("user_usec", "user_cores", 1e-6),
+            ("system_usec", "system_cores", 1e-6),
+            ("throttled_usec", "throttled_cores", 1e-6),
+        ],
+        "io.stat": [
+            ("rbytes", "rbytes_per_sec", 1),
+            ("wbytes", "wbytes_per_sec", 1),
+            ("dbytes", "dbytes_per_sec", 1),
+            ("rios", "riops", 1),
+            ("wios", "wiops", 1),
+            ("dios", "diops", 1),
+        ],
+        "memory.stat": [
+            ("pgfault", "pgfault_per_sec", 1),
+            ("pgmajfault", "pgmajfault_per_sec", 1),
+        ],
+    }
+    # Ratios of counter deltas: (numerator field, denominator field, derived field)
+    RATIOS = {
+        "cpu.stat": [
+            ("nr_throttled", "nr_periods", "throttled_ratio"),
+        ],
+    }
+
+    def __init__(self, stat_file: str):
+        self._stat_file = stat_file
+        self._rates = self.RATES.get(stat_file, list())
+        self._ratios = self.RATIOS.get(stat_file, list())
+        self._first = None
+        self._last = None
+        self._headers = list()
+
+    @property
+    def stat_file(self) -> str:
+        return self._stat_file
+
+    @classmethod
+    def supports(cls, stat_file: str) -> bool:
+        return stat_file in cls.RATES or stat_file in cls.RATIOS
+
+    def derive(self, timestamp_ns: int, headers: List[str], values: List) -> Tuple[List[str], List[float]]:
+        # Samples are keyed by field name, so rates remain correct across layout changes (e.g. a new io.stat device).
+        sample = (timestamp_ns, dict(zip(headers, values)))
+        if self._first is None:
+            self._first = sample
+        previous = self._last
+        self._last = sample
+        if previous is None:
+            return None
+        derived_headers, derived_values = self._derive(previous, sample)
+        # The same header list is returned as long as the derived fields do not change, which marks an unchanged layout.
+        if derived_headers != self._headers:
+            self._headers = derived_headers
+        return self._headers, derived_values
+
+    def summary(self) -> Dict:
+        if self._first is None:
+            return None
+        first_ns, first = self._first
+        last_ns, last = self._last
+        delta = dict()
+        for field, value in last.items():
+            if self._is_number(value) and self._is_number(first.get(field)):
+                delta[field] = value - first[field]
+        derived_headers, derived_values = self._derive(self._first, self._last)
+        return {
+            "duration_ns": last_ns - first_ns,
+            "delta": delta,
+            "rate": dict(zip(derived_headers, derived_values)),
+        }
+
+    def _derive(self, previous: Tuple[int, Dict], current: Tuple[int, Dict]) -> Tuple[List[str], List[float]]:
+        headers = list()
+        values = list()
+        elapsed_ns = current[0] - previous[0]
+        if elapsed_ns <= 0:
+            return headers, values
+        for header, value in current[1].items():
+            for field, derived, scale in self._rates:
+                if header == field or header.endswith("_{field}".format(field=field)):
+                    delta = self._delta(previous[1].get(header), value)
+                    if delta is not None:
+                        headers.append(header[:len(header) - len(field)] + derived)
+                        values.append(delta * scale * 1e9 / elapsed_ns)
+        for numerator, denominator, derived in self._ratios:
+            delta_numerator = self._delta(previous[1].get(numerator), current[1].get(numerator))
+            delta_denominator = self._delta(previous[1].get(denominator), current[1].get(denominator))
+            if delta_numerator is not None and delta_denominator is not None:
+                headers.append(derived)
+                values.append(delta_numerator / delta_denominator if delta_denominator > 0 else 0.0)
+        return headers, values
+
+    @staticmethod
+    def _delta(previous: Any, current: Any) -> float:
+        if not CollectorControllerGroupRates._is_number(previous) or not CollectorControllerGroupRates._is_number(current):
+            return None
+        # Counters that went backwards were reset, e.g. by a cgroup that was recreated.
+        if current < previous:
+            return None
+        return current - previous
+
+    @staticmethod
+    def _is_number(value: Any) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class CollectorControllerGroup(CollectorPeriodic):
+
+    HEADER_TIMESTAMP = "timestamp_ns"
+    # Delay of the sample against its scheduled deadline, and the number of ticks skipped so far due to overruns
+    HEADERS_SCHEDULE = ["jitter_ns", "skipped"]
+
+    FORMAT_TEXT = "text"
+    FORMAT_BINARY = "binary"
+
+    # Rates derived from the sampled files
+    RATES_TYPE = CollectorControllerGroupRates
+
+    # System-wide pressure stall information
+    DIR_PRESSURE = "/proc/pressure"
+    PRESSURE_RESOURCES = ["cpu", "memory", "io"]
+
+    def __init__(self):
+        super().__init__()
+        self._compress = None
+        self._format = self.FORMAT_TEXT
+        self._series_writers = dict()
+        self._stat_loggers = list()
+        self._stat_headers = dict()
+        self._samplers = dict()
+        self._clock_offset_ns = None
+        self._rates = False
+        self._rate_states = dict()
+        self._system_pressure = False
+        self._parent_context = None
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._compress = config.get("compress", None)
+        self._format = config.get("format", self.FORMAT_TEXT)
+        self._rates = config.get("rates", False)
+        self._system_pressure = config.get("system_pressure", False)
+
+    @property
+    def compress(self) -> str:
+        return self._compress
+
+    @compress.setter
+    def compress(self, value: str) -> None:
+        self._compress = value
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    @format.setter
+    def format(self, value: str) -> None:
+        self._format = value
+
+    @property
+    def rates(self) -> bool:
+        return self._rates
+
+    @rates.setter
+    def rates(self, value: bool) -> None:
+        self._rates = value
+
+    @property
+    def system_pressure(self) -> bool:
+        return self._system_pressure
+
+    @system_pressure.setter
+    def system_pressure(self, value: bool) -> None:
+        self._system_pressure = value
+
+    def stop(self) -> None:
+        super().stop()
+        for name, rates in self._rate_states.items():
+            self._summarize(self._parent_context, name, rates)
+        self._rate_states = dict()
+        self._parent_context = None
+        # Close log files for the finished node. Compressed logs are only complete once their writer is closed.
+        for stat_logger in self._stat_loggers:
+            stat_logger.close()
+        self._stat_loggers = list()
+        for series_writer in self._series_writers.values():
+            series_writer.close()
+        self._series_writers = dict()
+        self._stat_headers = dict()
+        for sampler in self._samplers.values():
+            sampler.close()
+        self._samplers = dict()
+
+    def start(self, parent_context: CollectingExecutorContext) -> None:
+        # Samples are timestamped with the monotonic clock, the offset converts them to wall clock time for the store.
+        self._clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        self._parent_context = parent_context
+        super().start(parent_context)
+
+    def sample(self, parent_context: CollectingExecutorContext, schedule: CollectorSchedule) -> None:
+        for cgroup in parent_context.cgroups:
+            # Leaves of nested cgroups are created as commands start, so they are looked up at every tick.
+            self._sample_group(parent_context, schedule, cgroup)
+            for leaf in cgroup.leaves():
+                self._sample_group(parent_context, schedule, leaf)
+        if self._system_pressure:
+            for resource in self.PRESSURE_RESOURCES:
+                name = "collector.cgroup_system_{resource}_pressure".format(resource=resource)
+                self._sample_file(parent_context, schedule, name, os.path.join(self.DIR_PRESSURE, resource), "{resource}.pressure".format(resource=resource))
+
+    def _sample_group(self, parent_context: CollectingExecutorContext, schedule: CollectorSchedule, cgroup: ControllerGroup) -> None:
+        for controller in cgroup.controllers:
+            for stat_file in controller.stat_files:
+                name = "collector.cgroup_{cgname}_{stat_file}".format(
+                    cgname=cgroup.name.replace("/", "_"),
+                    stat_file=stat_file.replace(".", "_")
+                )
+                self._sample_file(parent_context, schedule, name, os.path.join(cgroup.DIR_BASE, cgroup.name, stat_file), stat_file)
+
+    def _sample_file(self, parent_context: CollectingExecutorContext, schedule: CollectorSchedule, name: str, path: str, stat_file: str) -> None:
+        sampler = self._sampler(path)
+        try:
+            timestamp_ns, values = sampler.sample()
+        except OSError:
+            # Files of controllers that are not enabled, and pressure files while PSI is disabled, are skipped.
+            return
+        headers = self.HEADERS_SCHEDULE + sampler.headers
+        values = [schedule.jitter_ns(timestamp_ns), schedule.skipped] + values
+        if self.context.files:
+            self._log(parent_context, name, headers, sampler.headers, timestamp_ns, values)
+        if self.context.store is not None:
+            self._sample(self._executor.node_path(parent_context), name, headers, timestamp_ns, values)
+        if self._rates and self.RATES_TYPE.supports(stat_file):
+            self._derive(parent_context, name, stat_file, sampler.headers, timestamp_ns, values[len(self.HEADERS_SCHEDULE):])
+
+    def _derive(self, parent_context: CollectingExecutorContext, name: str, stat_file: str, headers: List[str], timestamp_ns: int, values: List) -> None:
+        if name not in self._rate_states:
+            self._rate_states[name] = self.RATES_TYPE(stat_file)
+        derived = self._rate_states[name].derive(timestamp_ns, headers, values)
+        if derived is None:
+            return
+        derived_name = "{name}_rates".format(name=name)
+        if self.context.files:
+            self._log(parent_context, derived_name, derived[0], derived[0], timestamp_ns, derived[1])
+        if self.context.store is not None:
+            self._sample(self._executor.node_path(parent_context), derived_name, derived[0], timestamp_ns, derived[1])
+
+    def _summarize(self, parent_context: CollectingExecutorContext, name: str, rates: CollectorControllerGroupRates) -> None:
+        # Start and end deltas of the node, written when the collector stops
+        summary = rates.summary()
+        if summary is None:
+            return
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(parent_context), "stat.{name}.json".format(name=name))
+            with open(log_file_path, "w") as fh:
+                fh.write("{data}\n".format(data=json.dumps(summary)))
+                fh.flush()
+            self.context.manifest.register(log_file_path)
+        if self.context.store is not None:
+            self.context.store.stat(self._executor.node_path(parent_context), "collector", {name: summary})
+
+    def _sampler(self, path: str) -> CollectorControllerGroupSampler:
+        if path not in self._samplers:
+            self._samplers[path] = CollectorControllerGroupSampler(path)
+        return self._samplers[path]
+
+    def _log(self, parent_context: CollectingExecutorContext, name: str, headers: List[str], layout: List[str], timestamp_ns: int, values: List) -> None:
+        if self._format == self.FORMAT_BINARY:
+            self._log_series(parent_context, name, headers, layout, timestamp_ns, values)
+            return
+        log_file_path = os.path.join(self._executor.run_path(parent_context), "{name}.log".format(name=name))
+        stat_logger = CollectorControllerGroupStatLogger.instance(log_file_path, 'a', self.compress)
+        if stat_logger.is_first_call:
+            self._stat_loggers.append(stat_logger)
+            self.context.manifest.register(Writer.path_for(log_file_path, self.compress))
+        # A header line is repeated whenever the layout of the stat file changes.
+        if self._stat_headers.get(log_file_path) is not layout:
+            self._stat_headers[log_file_path] = layout
+            stat_logger.log_line(" ".join([self.HEADER_TIMESTAMP] + headers))
+        stat_logger.log_line(" ".join([str(timestamp_ns)] + [str(value) for value in values]))
+
+    def _log_series(self, parent_context: CollectingExecutorContext, name: str, headers: List[str], layout: List[str], timestamp_ns: int, values: List) -> None:
+        series_file_path = os.path.join(self._executor.run_path(parent_context), "{name}.series".format(name=name))
+        if series_file_path not in self._series_writers:
+            self._series_writers[series_file_path] = SeriesWriter(series_file_path, self.compress)
+            self.context.manifest.register(self._series_writers[series_file_path].path)
+        series_writer = self._series_writers[series_file_path]
+        # A schema block is written whenever the layout of the stat file changes.
+        if self._stat_headers.get(series_file_path) is not layout:
+            self._stat_headers[series_file_path] = layout
+            series_writer.schema(headers, SeriesWriter.types_for(values))
+        series_writer.append(timestamp_ns, values)
+
+    def _sample(self, node: str, source: str, headers: List[str], timestamp_ns: int, values: List) -> None:
+        timestamp = (timestamp_ns + self._clock_offset_ns) / 1e9
+        for header, value in zip(headers, values):
+            if isinstance(value, (int, float)):
+                self.context.store.sample(node, source, header, timestamp, value)
@@ -35,3 +35,7 @@ class Collector:
 
     def stop(self) -> None:
         raise NotImplementedError()
+
+    def close(self) -> None:
+        # Called once the plan finished, for collectors that keep state across the nodes of the plan.
+        pass
@@ -0,0 +1,207 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from typing import Callable, Self
+
+
+class CollectorSchedule:
+
+    def __init__(self, interval: float):
+        self._interval_ns = int(interval * 1e9)
+        self._started_ns = None
+        self._tick = 0
+        self._skipped = 0
+        self._final = False
+
+    @property
+    def interval_ns(self) -> int:
+        return self._interval_ns
+
+    @property
+    def deadline_ns(self) -> int:
+        return self._started_ns + self._tick * self._interval_ns
+
+    @property
+    def skipped(self) -> int:
+        return self._skipped
+
+    @property
+    def started(self) -> bool:
+        return self._started_ns is not None and time.monotonic_ns() >= self._started_ns
+
+    @property
+    def final(self) -> bool:
+        return self._final
+
+    @final.setter
+    def final(self, value: bool) -> None:
+        self._final = value
+
+    def start(self, delay: float = 0) -> None:
+        self._started_ns = time.monotonic_ns() + int(delay * 1e9)
+        self._tick = 0
+        self._skipped = 0
+        self._final = False
+
+    def jitter_ns(self, now_ns: int) -> int:
+        # Delay of a sample against the deadline of its tick. The final sample is taken when the node stops, which
+        # is not a tick of the schedule.
+        if self._final:
+            return 0
+        return now_ns - self.deadline_ns
+
+    def next(self) -> int:
+        # Deadlines are multiples of the interval from the start, so the sampling cost never accumulates as drift.
+        # Ticks whose deadline has already passed when sampling overruns are skipped rather than run back to back.
+        now_ns = time.monotonic_ns()
+        self._tick += 1
+        if now_ns > self.deadline_ns:
+            missed = (now_ns - self.deadline_ns - 1) // self._interval_ns + 1
+            self._tick += missed
+            self._skipped += missed
+        return self.deadline_ns - now_ns
+
+    def sleep(self) -> None:
+        time.sleep(self.next() / 1e9)
+
+
+class CollectorEngineTask:
+
+    def __init__(self, name: str, callback: Callable[[CollectorSchedule], None], interval: float, ramp: float = 0):
+        self._name = name
+        self._callback = callback
+        self._schedule = CollectorSchedule(interval)
+        self._ramp = ramp
+        self._active = False
+        self._error = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def callback(self) -> Callable[[CollectorSchedule], None]:
+        return self._callback
+
+    @property
+    def schedule(self) -> CollectorSchedule:
+        return self._schedule
+
+    @property
+    def ramp(self) -> float:
+        return self._ramp
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @active.setter
+    def active(self, value: bool) -> None:
+        self._active = value
+
+    @property
+    def error(self) -> Exception:
+        return self._error
+
+    @error.setter
+    def error(self, value: Exception) -> None:
+        self._error = value
+
+    def finish(self) -> None:
+        # A last sample at the stop boundary, taken by the stopping thread once the task is unregistered, so that the
+        # tail of the node since the last tick is not lost. Tasks that failed or are still ramping up are not sampled.
+        if self._error is not None or not self._schedule.started:
+            return
+        self._schedule.final = True
+        try:
+            self._callback(self._schedule)
+        except Exception as e:
+            self._error = e
+
+
+class CollectorEngine:
+
+    _instances = dict()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, cpu: int = None):
+        self._cpu = cpu
+        self._tasks = list()
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = None
+
+    @property
+    def cpu(self) -> int:
+        return self._cpu
+
+    @property
+    def thread(self) -> threading.Thread:
+        return self._thread
+
+    @staticmethod
+    def instance(cpu: int = None) -> Self:
+        # One engine per housekeeping CPU, or a single unpinned engine
+        with CollectorEngine._instances_lock:
+            if cpu not in CollectorEngine._instances:
+                CollectorEngine._instances[cpu] = CollectorEngine(cpu)
+            return CollectorEngine._instances[cpu]
+
+    def register(self, task: CollectorEngineTask) -> None:
+        with self._condition:
+            task.active = True
+            task.error = None
+            task.schedule.start(task.ramp)
+            self._push(task)
+            # The engine thread only exists while tasks are registered.
+            if self._thread is None:
+                name = "collector_engine" if self._cpu is None else "collector_engine_{cpu}".format(cpu=self._cpu)
+                self._thread = threading.Thread(name=name, target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def unregister(self, task: CollectorEngineTask) -> None:
+        with self._condition:
+            task.active = False
+            # A running callback is allowed to finish, so that collectors can safely release their resources afterwards.
+            while self._running is task:
+                self._condition.wait()
+            self._tasks = [entry for entry in self._tasks if entry[2] is not task]
+            heapq.heapify(self._tasks)
+            self._condition.notify_all()
+
+    def _push(self, task: CollectorEngineTask) -> None:
+        heapq.heappush(self._tasks, (task.schedule.deadline_ns, next(self._sequence), task))
+
+    def _run(self) -> None:
+        if self._cpu is not None:
+            # Only the engine thread is pinned, the PyMergen process and the workload keep their affinity.
+            os.sched_setaffinity(0, {self._cpu})
+        while True:
+            with self._condition:
+                while True:
+                    if len(self._tasks) == 0:
+                        self._thread = None
+                        return
+                    deadline_ns, _, task = self._tasks[0]
+                    remaining_ns = deadline_ns - time.monotonic_ns()
+                    if remaining_ns <= 0:
+                        break
+                    # Registrations wake the engine up in case they are due earlier.
+                    self._condition.wait(remaining_ns / 1e9)
+                heapq.heappop(self._tasks)
+                self._running = task
+            try:
+                task.callback(task.schedule)
+            except Exception as e:
+                task.error = e
+            finally:
+                with self._condition:
+                    self._running = None
+                    if task.active and task.error is None:
+                        task.schedule.next()
+                        self._push(task)
+                    self._condition.notify_all()
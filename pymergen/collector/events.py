@@ -0,0 +1,168 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, List, Tuple
+from pymergen.collector.thread import CollectorThread
+from pymergen.collector.cgroup import CollectorControllerGroupSampler, CollectorControllerGroupStatLogger
+from pymergen.core.executor import CollectingExecutorContext
+
+
+class CollectorInotify:
+
+    IN_MODIFY = 0x00000002
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+
+    EVENT = struct.Struct("iIII")
+    BUFFER_SIZE = 4096
+
+    _libc = None
+
+    def __init__(self):
+        libc = self.libc()
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._watches = dict()
+
+    @property
+    def fd(self) -> int:
+        return self._fd
+
+    @staticmethod
+    def libc() -> ctypes.CDLL:
+        if CollectorInotify._libc is None:
+            CollectorInotify._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return CollectorInotify._libc
+
+    def watch(self, path: str, mask: int = IN_MODIFY) -> int:
+        wd = self.libc().inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), path)
+        self._watches[wd] = path
+        return wd
+
+    def read(self) -> List[Tuple[str, int]]:
+        events = list()
+        try:
+            data = os.read(self._fd, self.BUFFER_SIZE)
+        except BlockingIOError:
+            return events
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _, size = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size + size
+            if wd in self._watches:
+                events.append((self._watches[wd], mask))
+                if mask & self.IN_IGNORED:
+                    # The watched file was removed together with its cgroup.
+                    self._watches.pop(wd)
+        return events
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CollectorControllerGroupEvents(CollectorThread):
+
+    HEADER_TIMESTAMP = "timestamp_ns"
+
+    DEFAULT_FILES = ["memory.events"]
+
+    def __init__(self):
+        super().__init__()
+        self._files = list(self.DEFAULT_FILES)
+        self._wakeup = None
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._files = config.get("files", list(self.DEFAULT_FILES))
+
+    @property
+    def files(self) -> List[str]:
+        return self._files
+
+    @files.setter
+    def files(self, values: List[str]) -> None:
+        self._files = values
+
+    def run(self, parent_context: CollectingExecutorContext) -> None:
+        if self.wait(self.ramp):
+            return
+        # Event files are modified by the kernel when a counter changes, so each change is read and timestamped as it
+        # happens rather than at the next sampling tick. The pipe wakes the poll up when the collector is stopped.
+        self._wakeup = os.pipe()
+        inotify = CollectorInotify()
+        samplers = dict()
+        stat_loggers = list()
+        clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        try:
+            for cgroup in parent_context.cgroups:
+                for file_name in self._files:
+                    path = os.path.join(cgroup.DIR_BASE, cgroup.name, file_name)
+                    try:
+                        inotify.watch(path)
+                    except OSError as e:
+                        if e.errno != errno.ENOENT:
+                            raise
+                        # Controllers that are not enabled have no event files.
+                        continue
+                    name = "collector.events_{cgname}_{file_name}".format(cgname=cgroup.name, file_name=file_name.replace(".", "_"))
+                    samplers[path] = (name, CollectorControllerGroupSampler(path))
+                    # Initial values, so that the log starts from the counters at the start of the node
+                    self._record(parent_context, samplers[path], stat_loggers, clock_offset_ns)
+            poller = select.poll()
+            poller.register(self._wakeup[0], select.POLLIN)
+            poller.register(inotify.fd, select.POLLIN)
+            while not self.joined:
+                for fd, _ in poller.poll():
+                    if fd != inotify.fd:
+                        continue
+                    for path, mask in inotify.read():
+                        if mask & CollectorInotify.IN_MODIFY and path in samplers:
+                            self._record(parent_context, samplers[path], stat_loggers, clock_offset_ns)
+        finally:
+            inotify.close()
+            for _, sampler in samplers.values():
+                sampler.close()
+            for stat_logger in stat_loggers:
+                stat_logger.close()
+
+    def join(self) -> None:
+        super().join()
+        if self._wakeup is not None:
+            os.write(self._wakeup[1], b"\0")
+
+    def stop(self) -> None:
+        super().stop()
+        # The pipe is closed once the thread is joined, so that join never writes to a closed descriptor.
+        if self._wakeup is not None:
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+
+    def _record(self, parent_context: CollectingExecutorContext, entry: Tuple, stat_loggers: List, clock_offset_ns: int) -> None:
+        name, sampler = entry
+        try:
+            timestamp_ns, values = sampler.sample()
+        except OSError:
+            return
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(parent_context), "{name}.log".format(name=name))
+            stat_logger = CollectorControllerGroupStatLogger.instance(log_file_path, "a")
+            if stat_logger.is_first_call:
+                stat_loggers.append(stat_logger)
+                self.context.manifest.register(log_file_path)
+                stat_logger.log_line(" ".join([self.HEADER_TIMESTAMP] + sampler.headers))
+            stat_logger.log_line(" ".join([str(timestamp_ns)] + [str(value) for value in values]))
+        if self.context.store is not None:
+            node = self._executor.node_path(parent_context)
+            for header, value in zip(sampler.headers, values):
+                self.context.store.sample(node, name, header, (timestamp_ns + clock_offset_ns) / 1e9, value)
@@ -1,6 +1,98 @@
-from typing import List, Dict
+import os
+import re
+import json
+import time
+import shlex
+import bisect
+import shutil
+import select
+import signal
+import threading
+import subprocess
+from typing import Iterable, List, Dict, Tuple
 from collections import defaultdict
+from pymergen.core.writer import Writer
+from pymergen.core.flamegraph import FlamegraphPool
+from pymergen.core.aggregator import Aggregator
+from pymergen.entity.command import EntityCommand
+from pymergen.parser.parser import OutputParser
 from pymergen.collector.process import CollectorProcess
+from pymergen.collector.cgroup import CollectorControllerGroupStatLogger
+from pymergen.core.executor import ExecutorContext
+
+
+class CollectorPerfSession:
+
+    FILE_CONTROL = "control.fifo"
+    FILE_ACK = "ack.fifo"
+
+    COMMAND_ENABLE = "enable"
+    COMMAND_DISABLE = "disable"
+    ACK = b"ack"
+
+    TIMEOUT = 30.0
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, path: str):
+        self._path = path
+        self._control_fd = None
+        self._ack_fd = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def control_path(self) -> str:
+        return os.path.join(self._path, self.FILE_CONTROL)
+
+    @property
+    def ack_path(self) -> str:
+        return os.path.join(self._path, self.FILE_ACK)
+
+    def open(self) -> None:
+        os.makedirs(self._path, exist_ok=True)
+        for path in [self.control_path, self.ack_path]:
+            if not os.path.exists(path):
+                os.mkfifo(path)
+        # Both ends are kept open for reading and writing, so that neither side blocks while perf starts up, and
+        # commands sent before perf opened the FIFOs are buffered.
+        self._control_fd = os.open(self.control_path, os.O_RDWR | os.O_CLOEXEC)
+        self._ack_fd = os.open(self.ack_path, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+
+    def control(self, command: str) -> None:
+        os.write(self._control_fd, "{command}\n".format(command=command).encode())
+        # perf acknowledges each command once it is applied to the counters.
+        deadline = time.monotonic() + self.TIMEOUT
+        data = b""
+        while self.ACK not in data:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Exception("No acknowledgement of {command} from perf session in {path}".format(command=command, path=self._path))
+            ready, _, _ = select.select([self._ack_fd], [], [], remaining)
+            if len(ready) > 0:
+                data += os.read(self._ack_fd, 64)
+
+    def outputs(self, prefix: str) -> List[str]:
+        return sorted(name for name in os.listdir(self._path) if name.startswith("{prefix}.".format(prefix=prefix)))
+
+    def wait_output(self, prefix: str, known: List[str]) -> str:
+        # Output files are renamed into place by perf once they are complete.
+        deadline = time.monotonic() + self.TIMEOUT
+        while time.monotonic() < deadline:
+            for name in self.outputs(prefix):
+                if name not in known:
+                    return os.path.join(self._path, name)
+            time.sleep(self.POLL_INTERVAL)
+        raise Exception("No output was switched by perf session in {path}".format(path=self._path))
+
+    def close(self) -> None:
+        for fd in [self._control_fd, self._ack_fd]:
+            if fd is not None:
+                os.close(fd)
+        self._control_fd = None
+        self._ack_fd = None
+        shutil.rmtree(self._path, ignore_errors=True)
 
 
 class CollectorPerf(CollectorProcess):
@@ -9,6 +101,9 @@ class CollectorPerf(CollectorProcess):
         super().__init__()
         self._cmd_parts = list()
         self._custom = list()
+        self._persistent = False
+        self._session = None
+        self._parent_context = None
 
     @property
     def cmd(self) -> str:
@@ -21,11 +116,60 @@ class CollectorPerf(CollectorProcess):
     def parse(self, config: Dict) -> None:
         super().parse(config)
         self._custom = config.get("custom", list())
+        self._persistent = config.get("persistent", False)
+
+    @property
+    def persistent(self) -> bool:
+        return self._persistent
+
+    @persistent.setter
+    def persistent(self, value: bool) -> None:
+        self._persistent = value
+
+    @property
+    def session(self) -> CollectorPerfSession:
+        return self._session
+
+    @property
+    def session_path(self) -> str:
+        return os.path.join(self.context.run_path, "{name}.session".format(name=self.name))
+
+    def start(self, parent_context: ExecutorContext) -> None:
+        self._parent_context = parent_context
+        if self._persistent is False:
+            super().start(parent_context)
+            return
+        # A single perf process is started for the first node of the plan and counts only while a node runs.
+        if self._session is None:
+            self._session = CollectorPerfSession(self.session_path)
+            self._session.open()
+            super().start(parent_context)
+        self._session.control(CollectorPerfSession.COMMAND_ENABLE)
+
+    def stop(self) -> None:
+        if self._persistent is False:
+            super().stop()
+            return
+        self._session.control(CollectorPerfSession.COMMAND_DISABLE)
+
+    def close(self) -> None:
+        if self._session is None:
+            return
+        try:
+            super().stop()
+        finally:
+            self._session.close()
+            self._session = None
 
     def _prepare_cmd(self):
         self._prepare_cmd_parts()
 
     def _prepare_cmd_parts(self):
+        if self._persistent is True:
+            # Counters start disabled and are enabled through the control FIFO.
+            control = os.path.join(self.session_path, CollectorPerfSession.FILE_CONTROL)
+            ack = os.path.join(self.session_path, CollectorPerfSession.FILE_ACK)
+            self._cmd_parts.extend(["--control", "fifo:{control},{ack}".format(control=control, ack=ack), "--delay=-1"])
         if self._custom is not None:
             self._cmd_parts.extend(self._custom)
 
@@ -61,7 +205,7 @@ class CollectorPerfEvent(CollectorPerf):
 
     def parse(self, config: Dict) -> None:
         super().parse(config)
-        for e in config["events"]:
+        for e in config.get("events", list()):
             if "cgroup" in e:
                 self.add_cgroup_event(e["cgroup"], e["name"])
             else:
@@ -75,23 +219,641 @@ class CollectorPerfEvent(CollectorPerf):
         super()._prepare_cmd_parts()
 
 
+class CollectorPerfStatMetrics:
+
+    # Ratios of event counts: (derived metric, numerator event, denominator event)
+    RATIOS = [
+        ("ipc", "instructions", "cycles"),
+        ("cache_miss_rate", "cache-misses", "cache-references"),
+        ("branch_miss_rate", "branch-misses", "branches"),
+    ]
+    ALIASES = {
+        "cpu-cycles": "cycles",
+        "branch-instructions": "branches",
+    }
+
+    @staticmethod
+    def derive(values: Dict[str, float]) -> Tuple[List[str], List[float]]:
+        # Event modifiers (e.g. cycles:u) are ignored when looking up the events of a metric.
+        events = dict()
+        for event, value in values.items():
+            name = event.split(":")[0]
+            events.setdefault(CollectorPerfStatMetrics.ALIASES.get(name, name), value)
+        headers = list()
+        derived = list()
+        for metric, numerator, denominator in CollectorPerfStatMetrics.RATIOS:
+            if numerator in events and denominator in events:
+                headers.append(metric)
+                derived.append(events[numerator] / events[denominator] if events[denominator] > 0 else 0.0)
+        return headers, derived
+
+    # Level 1 of the top-down microarchitecture analysis, the shares of pipeline slots
+    TOPDOWN = ["frontend_bound", "bad_speculation", "retiring", "backend_bound"]
+
+    @staticmethod
+    def metric(unit: str) -> str:
+        # Metrics of metric groups are named by their unit column, e.g. "%  tma_frontend_bound".
+        return "_".join(unit.strip().lstrip("%").lower().split())
+
+    @staticmethod
+    def topdown(metrics: Dict[str, float]) -> Dict[str, float]:
+        # Fractions of the slots from the percentages of perf, named with or without the tma_ prefix
+        fractions = dict()
+        for metric, value in metrics.items():
+            name = metric[len("tma_"):] if metric.startswith("tma_") else metric
+            if name in CollectorPerfStatMetrics.TOPDOWN:
+                fractions[name] = value / 100.0
+        return fractions
+
+
+class CollectorPerfStatParser(OutputParser):
+
+    GROUP_SYSTEM = "system"
+
+    def __init__(self, collector: "CollectorPerfStat"):
+        super().__init__()
+        self._name = "perf_stat"
+        # perf stat writes its counts to stderr
+        self._stream = self.STREAM_STDERR
+        self._collector = collector
+        self._interval = None
+        self._values = dict()
+        self._intervals = 0
+        self._lines = 0
+        self._expected = None
+        self._lock = threading.Condition()
+
+    @property
+    def collector(self) -> "CollectorPerfStat":
+        return self._collector
+
+    @property
+    def intervals(self) -> int:
+        return self._intervals
+
+    def reset(self) -> None:
+        super().reset()
+        self._interval = None
+        self._values = dict()
+        self._intervals = 0
+        self._lines = 0
+        self._expected = None
+        self._lock = threading.Condition()
+        # The collector follows the copy that consumes the output of its perf process.
+        self._collector.parser = self
+
+    def parse_line(self, line: str) -> None:
+        # Interval lines in CSV mode: time,value,unit,event[,cgroup],run time,enabled percent,metric value,metric unit
+        # The cgroup field is present as soon as one event is counted per cgroup, and empty for the other events.
+        fields = line.split(CollectorPerfStat.SEPARATOR)
+        if len(fields) < 4 or line.startswith("#"):
+            return
+        try:
+            interval = float(fields[0])
+        except ValueError:
+            return
+        group = self.GROUP_SYSTEM
+        offset = 4
+        if self._collector.has_cgroups:
+            offset = 5
+            if len(fields) > 4 and fields[4] != "":
+                group = fields[4]
+        event = fields[3]
+        with self._lock:
+            if interval != self._interval:
+                if self._interval is not None:
+                    # All intervals print the same lines, so the last complete one tells when the next one is complete.
+                    self._expected = self._lines
+                self._flush()
+                self._interval = interval
+                self._intervals += 1
+                self._lines = 0
+            self._lines += 1
+            self._lock.notify_all()
+            try:
+                value = float(fields[1])
+            except ValueError:
+                # Counters that were not counted or are not supported, and lines of metrics only
+                value = None
+            if value is not None and event != "":
+                self._group(group)["events"][event] = value
+                # The share of the time the counter was enabled, its count is scaled by perf below 100 percent when
+                # counters are multiplexed.
+                if len(fields) > offset + 1 and fields[offset + 1] != "":
+                    self._group(group)["enabled"][event] = float(fields[offset + 1])
+            if self._collector.has_metrics and len(fields) > offset + 3 and fields[offset + 2] != "":
+                try:
+                    metric_value = float(fields[offset + 2])
+                except ValueError:
+                    return
+                self._group(group)["metrics"][CollectorPerfStatMetrics.metric(fields[offset + 3])] = metric_value
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def wait(self, intervals: int, timeout: float) -> bool:
+        # Waits until the interval following the given number of intervals was printed in full, which is either known
+        # from the number of lines of an interval or from the start of the interval after it.
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if self._intervals > intervals + 1:
+                    return True
+                if self._intervals > intervals and self._expected is not None and self._lines >= self._expected:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+
+    def discard(self) -> None:
+        with self._lock:
+            self._interval = None
+            self._values = dict()
+
+    def finish(self) -> None:
+        self.flush()
+        self._collector.summarize()
+
+    def _flush(self) -> None:
+        if self._interval is None:
+            return
+        # Intervals are timed by perf from its start.
+        timestamp_ns = self._collector.started_ns + int(self._interval * 1e9)
+        for group, values in self._values.items():
+            self._collector.record(group, timestamp_ns, values["events"], values["metrics"], values["enabled"])
+        self._interval = None
+        self._values = dict()
+
+    def _group(self, group: str) -> Dict:
+        return self._values.setdefault(group, {"events": dict(), "metrics": dict(), "enabled": dict()})
+
+
 class CollectorPerfStat(CollectorPerfEvent):
 
+    HEADER_TIMESTAMP = "timestamp_ns"
+    SEPARATOR = ","
+
+    # Upper bound of the wait for the interval printed by perf when the counters of a persistent session are disabled
+    FLUSH_TIMEOUT = 0.5
+
     def __init__(self):
         super().__init__()
+        self._interval = None
+        self._parser = None
+        self._started_ns = None
+        self._clock_offset_ns = None
+        self._cgroup_metrics = defaultdict(list)
+        self._system_metrics = list()
+        self._totals = dict()
+        self._metrics = dict()
+        self._enabled = dict()
+        self._stat_loggers = dict()
+        self._stat_headers = dict()
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._interval = config.get("interval", None)
+        for m in config.get("metrics", list()):
+            if "cgroup" in m:
+                self.add_cgroup_metric(m["cgroup"], m["name"])
+            else:
+                self.add_system_metric(m["name"])
+        if self._persistent is True and self._interval is None:
+            raise Exception("Persistent perf_stat collector {name} requires an interval".format(name=self.name))
+        if self.has_metrics and self._interval is None:
+            # Metric groups are only parsed from the interval output, a recorded data file holds the raw counts only.
+            raise Exception("Metrics of perf_stat collector {name} require an interval".format(name=self.name))
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @interval.setter
+    def interval(self, value: float) -> None:
+        self._interval = value
+
+    @property
+    def parser(self) -> CollectorPerfStatParser:
+        return self._parser
+
+    @parser.setter
+    def parser(self, value: CollectorPerfStatParser) -> None:
+        self._parser = value
+
+    @property
+    def cgroup_metrics(self) -> Dict:
+        return self._cgroup_metrics
+
+    @cgroup_metrics.setter
+    def cgroup_metrics(self, metrics: Dict) -> None:
+        self._cgroup_metrics = metrics
+
+    def add_cgroup_metric(self, cgroup: str, name: str) -> None:
+        self._cgroup_metrics[cgroup].append(name)
+
+    @property
+    def system_metrics(self) -> List:
+        return self._system_metrics
+
+    @system_metrics.setter
+    def system_metrics(self, metrics: List) -> None:
+        self._system_metrics = metrics
+
+    def add_system_metric(self, name: str) -> None:
+        self._system_metrics.append(name)
+
+    @property
+    def has_cgroups(self) -> bool:
+        return len(self.cgroup_events) > 0 or len(self.cgroup_metrics) > 0
+
+    @property
+    def has_metrics(self) -> bool:
+        return len(self.cgroup_metrics) > 0 or len(self.system_metrics) > 0
+
+    @property
+    def started_ns(self) -> int:
+        return self._started_ns
+
+    def command(self) -> EntityCommand:
+        command = super().command()
+        if self._interval is not None:
+            # Counts are parsed from the output of perf while it runs.
+            command.add_parser(CollectorPerfStatParser(self))
+        return command
+
+    def start(self, parent_context: ExecutorContext) -> None:
+        if self._session is None:
+            self._started_ns = time.monotonic_ns()
+            self._clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        if self._session is not None and self._parser is not None:
+            # Counts of a persistent session printed between nodes
+            self._parser.discard()
+        super().start(parent_context)
+
+    def stop(self) -> None:
+        # Parsers are closed once perf exited, which flushes the last interval and writes the totals.
+        intervals = self._parser.intervals if self._parser is not None else 0
+        super().stop()
+        if self._persistent is True:
+            # perf prints the interval that was cut short right after it acknowledged disabling the counters.
+            if self._parser is not None:
+                if not self._parser.wait(intervals, self.FLUSH_TIMEOUT):
+                    self.context.logger.debug("Collector {n} did not receive the last interval".format(n=self.name))
+                self._parser.flush()
+            self.summarize()
+        for stat_logger in self._stat_loggers.values():
+            stat_logger.close()
+        self._stat_loggers = dict()
+        self._stat_headers = dict()
+        self._totals = dict()
+        self._metrics = dict()
+        self._enabled = dict()
+        self._parent_context = None
+
+    def record(self, group: str, timestamp_ns: int, events: Dict[str, float], metrics: Dict[str, float] = None, enabled: Dict[str, float] = None) -> None:
+        if self._parent_context is None:
+            # Counts of a persistent session while no node runs
+            return
+        metrics = metrics if metrics is not None else dict()
+        enabled = enabled if enabled is not None else dict()
+        totals = self._totals.setdefault(group, dict())
+        for event, value in events.items():
+            totals[event] = totals.get(event, 0) + value
+        # Metrics are ratios computed by perf per interval, they are averaged over the intervals of the node.
+        for key, entries in [(self._metrics, metrics), (self._enabled, enabled)]:
+            sums = key.setdefault(group, dict())
+            for name, value in entries.items():
+                sums.setdefault(name, [0.0, 0])
+                sums[name][0] += value
+                sums[name][1] += 1
+        headers, derived = CollectorPerfStatMetrics.derive(events)
+        headers = list(events.keys()) + headers + list(metrics.keys())
+        values = list(events.values()) + derived + list(metrics.values())
+        if len(enabled) > 0:
+            # The lowest share of time any counter of the interval was enabled, counts are scaled estimates below 100
+            headers.append("enabled_pct")
+            values.append(min(enabled.values()))
+        name = "collector.perf_stat_{group}".format(group=group.replace("/", "_"))
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(self._parent_context), "{name}.log".format(name=name))
+            stat_logger = CollectorControllerGroupStatLogger.instance(log_file_path, "a", self.compress)
+            if stat_logger.is_first_call:
+                self._stat_loggers[log_file_path] = stat_logger
+                self.context.manifest.register(Writer.path_for(log_file_path, self.compress))
+            # A header line is repeated whenever the set of events changes.
+            if self._stat_headers.get(log_file_path) != headers:
+                self._stat_headers[log_file_path] = headers
+                stat_logger.log_line(" ".join([self.HEADER_TIMESTAMP] + headers))
+            stat_logger.log_line(" ".join([str(timestamp_ns)] + [str(value) for value in values]))
+        if self.context.store is not None:
+            node = self._executor.node_path(self._parent_context)
+            timestamp = (timestamp_ns + self._clock_offset_ns) / 1e9
+            for header, value in zip(headers, values):
+                self.context.store.sample(node, name, header, timestamp, value)
+
+    def summarize(self) -> None:
+        if self._parent_context is None:
+            return
+        # Totals of the node, summed over all intervals
+        summary = dict()
+        for group in sorted(set(self._totals) | set(self._metrics)):
+            totals = self._totals.get(group, dict())
+            headers, derived = CollectorPerfStatMetrics.derive(totals)
+            summary[group] = {"total": totals, "derived": dict(zip(headers, derived))}
+            metrics = {name: total / count for name, (total, count) in self._metrics.get(group, dict()).items()}
+            if len(metrics) > 0:
+                summary[group]["metrics"] = metrics
+                topdown = CollectorPerfStatMetrics.topdown(metrics)
+                if len(topdown) > 0:
+                    summary[group]["topdown"] = topdown
+            enabled = {name: total / count for name, (total, count) in self._enabled.get(group, dict()).items()}
+            if len(enabled) > 0:
+                summary[group]["enabled_pct"] = enabled
+                summary[group]["scaled"] = any(value < 100.0 for value in enabled.values())
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(self._parent_context), "stat.collector.perf_stat.json")
+            with open(log_file_path, "w") as fh:
+                fh.write("{data}\n".format(data=json.dumps(summary)))
+                fh.flush()
+            self.context.manifest.register(log_file_path)
+        if self.context.store is not None:
+            self.context.store.stat(self._executor.node_path(self._parent_context), "collector", {"collector.perf_stat": summary})
 
     def _prepare_cmd_parts(self):
-        self._cmd_parts.extend(["perf", "stat", "record"])
-        self._cmd_parts.extend(["-o", "{m:context:run_path}/collector.perf_stat.data"])
+        if self._interval is not None:
+            self._cmd_parts.extend(["perf", "stat", "-I", str(max(int(self._interval * 1000), 1)), "-x", self.SEPARATOR])
+        else:
+            self._cmd_parts.extend(["perf", "stat", "record"])
+            self._cmd_parts.extend(["-o", "{m:context:run_path}/collector.perf_stat.data"])
+        for cgroup, metrics in self.cgroup_metrics.items():
+            self._cmd_parts.extend(["-M", ",".join(metrics), "-G", cgroup])
+        if len(self.system_metrics) > 0:
+            self._cmd_parts.extend(["-a", "-M", ",".join(self.system_metrics)])
         super()._prepare_cmd_parts()
 
 
 class CollectorPerfProfile(CollectorPerfEvent):
 
+    FILE_DATA = "collector.perf_profile.data"
+    FILE_SESSION_DATA = "perf.data"
+    DIR_FLAMEGRAPH_CACHE = "flamegraph.cache"
+
     def __init__(self):
         super().__init__()
+        self._flamegraph = False
+        self._flamegraph_workers = FlamegraphPool.DEFAULT_WORKERS
+        self._flamegraph_pool = None
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._flamegraph = config.get("flamegraph", False)
+        self._flamegraph_workers = config.get("flamegraph_workers", FlamegraphPool.DEFAULT_WORKERS)
+
+    @property
+    def flamegraph(self) -> bool:
+        return self._flamegraph
+
+    @flamegraph.setter
+    def flamegraph(self, value: bool) -> None:
+        self._flamegraph = value
+
+    @property
+    def flamegraph_workers(self) -> int:
+        return self._flamegraph_workers
+
+    @flamegraph_workers.setter
+    def flamegraph_workers(self, value: int) -> None:
+        self._flamegraph_workers = value
+
+    def stop(self) -> None:
+        super().stop()
+        data_file_path = None
+        if self._persistent is True:
+            # The samples of the node are switched to a file of their own, which is moved into the node directory.
+            known = self._session.outputs(self.FILE_SESSION_DATA)
+            self._executor.execute_signal(signal.SIGUSR2)
+            path = self._session.wait_output(self.FILE_SESSION_DATA, known)
+            if self.context.files:
+                data_file_path = os.path.join(self._executor.run_path(self._parent_context), self.FILE_DATA)
+                os.replace(path, data_file_path)
+                self.context.manifest.register(data_file_path)
+            else:
+                os.remove(path)
+        elif self.context.files:
+            data_file_path = os.path.join(self._executor.run_path(self._parent_context), self.FILE_DATA)
+        if self._flamegraph is True and data_file_path is not None and os.path.exists(data_file_path):
+            self._submit_flamegraph(data_file_path)
+        self._parent_context = None
+
+    def close(self) -> None:
+        super().close()
+        if self._flamegraph_pool is not None:
+            # Profiles still being converted are waited for once the plan finished.
+            for error in self._flamegraph_pool.close():
+                self.context.logger.error("Failed to generate flame graph due to {e}".format(e=error))
+            self._flamegraph_pool = None
+
+    def _submit_flamegraph(self, data_file_path: str) -> None:
+        # Profiles are converted by a bounded pool of worker processes while the next nodes run.
+        if self._flamegraph_pool is None:
+            cache_path = os.path.join(self.context.work_path, self.DIR_FLAMEGRAPH_CACHE)
+            self._flamegraph_pool = FlamegraphPool(cache_path, self._flamegraph_workers, self.become_cmd)
+        self._flamegraph_pool.submit(data_file_path, self._register_flamegraph)
+
+    def _register_flamegraph(self, paths: List[str]) -> None:
+        for path in paths:
+            self.context.manifest.register(path)
 
     def _prepare_cmd_parts(self):
         self._cmd_parts.extend(["perf", "record"])
-        self._cmd_parts.extend(["-o", "{m:context:run_path}/collector.perf_profile.data"])
+        if self._persistent is True:
+            self._cmd_parts.extend(["-o", os.path.join(self.session_path, self.FILE_SESSION_DATA), "--switch-output=signal"])
+        else:
+            self._cmd_parts.extend(["-o", "{m:context:run_path}/" + self.FILE_DATA])
+        super()._prepare_cmd_parts()
+
+
+class CollectorPerfSchedSummary:
+
+    # Event lines of perf sched timehist: time, [cpu], task, wait time, scheduling delay and run time in msec
+    PATTERN_EVENT = re.compile(r"^\s*(\d+\.\d+)\s+\[(\d+)\]\s+(.+?)\s+(\d+\.\d+)\s+(\d+\.\d+)\s+(\d+\.\d+)\s*$")
+    # Migration lines (-M) name the migrated task after the current one.
+    PATTERN_MIGRATION = re.compile(r"migrated:\s+(\S+)\s+cpu\s+(\d+)\s+=>\s+(\d+)")
+
+    TASK_IDLE = "<idle>"
+
+    # Upper bounds of the run queue delay histogram in microseconds
+    HISTOGRAM_BOUNDS_US = [2 ** i for i in range(0, 21)]
+
+    def __init__(self):
+        self._tasks = dict()
+        self._histogram = [0] * (len(self.HISTOGRAM_BOUNDS_US) + 1)
+
+    @property
+    def tasks(self) -> Dict[str, Dict]:
+        return self._tasks
+
+    def parse(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            match = self.PATTERN_MIGRATION.search(line)
+            if match is not None:
+                self._task(match.group(1))["migrations"] += 1
+                continue
+            match = self.PATTERN_EVENT.match(line)
+            if match is None or match.group(3) == self.TASK_IDLE:
+                continue
+            wait_ms, delay_ms, run_ms = float(match.group(4)), float(match.group(5)), float(match.group(6))
+            task = self._task(match.group(3))
+            task["switches"] += 1
+            task["wait_ms"] += wait_ms
+            task["delay_ms"] += delay_ms
+            task["delay_max_ms"] = max(task["delay_max_ms"], delay_ms)
+            task["run_ms"] += run_ms
+            self._histogram[bisect.bisect_left(self.HISTOGRAM_BOUNDS_US, delay_ms * 1000)] += 1
+
+    def summary(self) -> Dict:
+        # The scheduling delay is the time from the wakeup of a task (or its preemption) until it runs again, i.e.
+        # the time it spent waiting on a run queue.
+        tasks = dict()
+        for name, task in sorted(self._tasks.items()):
+            switches = task["switches"]
+            tasks[name] = {
+                "switches": switches,
+                "migrations": task["migrations"],
+                "run_ms": task["run_ms"],
+                "wait_avg_ms": task["wait_ms"] / switches if switches > 0 else 0.0,
+                "delay_avg_ms": task["delay_ms"] / switches if switches > 0 else 0.0,
+                "delay_max_ms": task["delay_max_ms"],
+            }
+        histogram = dict()
+        for bound, count in zip(self.HISTOGRAM_BOUNDS_US, self._histogram):
+            histogram["le_{bound}us".format(bound=bound)] = count
+        histogram["gt_{bound}us".format(bound=self.HISTOGRAM_BOUNDS_US[-1])] = self._histogram[-1]
+        switches = sum(task["switches"] for task in self._tasks.values())
+        return {
+            "total": {
+                "switches": switches,
+                "migrations": sum(task["migrations"] for task in self._tasks.values()),
+                "delay_avg_ms": sum(task["delay_ms"] for task in self._tasks.values()) / switches if switches > 0 else 0.0,
+                "delay_max_ms": max([task["delay_max_ms"] for task in self._tasks.values()], default=0.0),
+            },
+            "delay_histogram": histogram,
+            "tasks": tasks,
+        }
+
+    def _task(self, name: str) -> Dict:
+        if name not in self._tasks:
+            self._tasks[name] = {"switches": 0, "migrations": 0, "wait_ms": 0.0, "delay_ms": 0.0, "delay_max_ms": 0.0, "run_ms": 0.0}
+        return self._tasks[name]
+
+
+class CollectorPerfSched(CollectorPerf):
+
+    FILE_DATA = "collector.perf_sched.data"
+
+    def __init__(self):
+        super().__init__()
+        self._cgroup = None
+        self._workers = FlamegraphPool.DEFAULT_WORKERS
+        self._pool = None
+        self._summarized = list()
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._cgroup = config.get("cgroup", None)
+        self._workers = config.get("workers", FlamegraphPool.DEFAULT_WORKERS)
+
+    @property
+    def cgroup(self) -> str:
+        return self._cgroup
+
+    @cgroup.setter
+    def cgroup(self, value: str) -> None:
+        self._cgroup = value
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @workers.setter
+    def workers(self, value: int) -> None:
+        self._workers = value
+
+    def stop(self) -> None:
+        super().stop()
+        if self.context.files:
+            run_path = self._executor.run_path(self._parent_context)
+            data_file_path = os.path.join(run_path, self.FILE_DATA)
+            if os.path.exists(data_file_path):
+                # Recordings are summarized by a bounded pool of worker processes while the next nodes run.
+                if self._pool is None:
+                    self._pool = FlamegraphPool(workers=self._workers)
+                node = self._executor.node_path(self._parent_context)
+                self._pool.call(CollectorPerfSched.timehist, (data_file_path, self.become_cmd), lambda summary: self.summarize(summary, run_path, node))
+        self._parent_context = None
+
+    def close(self) -> None:
+        super().close()
+        if self._pool is None:
+            return
+        # Recordings still being summarized are waited for once the plan finished.
+        for error in self._pool.close():
+            self.context.logger.error("Failed to summarize perf sched data due to {e}".format(e=error))
+        self._pool = None
+        self.aggregate()
+
+    def aggregate(self) -> None:
+        # Entities were rolled up when their replications finished, mostly before the summaries of their nodes were
+        # written. They are rolled up again, nested entities first, so that each merges the state of its children.
+        paths = set()
+        for run_path in self._summarized:
+            path = os.path.dirname(run_path)
+            while len(path) > len(self.context.run_path):
+                paths.add(path)
+                path = os.path.dirname(path)
+        aggregator = Aggregator()
+        for path in sorted(paths, key=lambda p: p.count(os.sep), reverse=True):
+            for log_file_path in aggregator.aggregate(path):
+                self.context.manifest.register(log_file_path)
+        self._summarized = list()
+
+    @staticmethod
+    def timehist(data_file_path: str, become_cmd: str = None) -> Dict:
+        # Scheduling events are summarized once perf exited, with migrations (-M) next to the switches.
+        cmd = ["perf", "sched", "timehist", "-M", "-f", "-i", data_file_path]
+        if become_cmd is not None:
+            cmd = shlex.split(become_cmd) + cmd
+        summary = CollectorPerfSchedSummary()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace")
+        try:
+            summary.parse(process.stdout)
+        finally:
+            process.stdout.close()
+            return_code = process.wait()
+        if return_code != 0:
+            raise Exception("Unable to read {path} with perf sched timehist: return code {code}".format(path=data_file_path, code=return_code))
+        return summary.summary()
+
+    def summarize(self, summary: Dict, run_path: str, node: str) -> None:
+        # Called on the thread of the pool once the worker finished, after the node itself was stopped.
+        try:
+            log_file_path = os.path.join(run_path, "stat.collector.perf_sched.json")
+            with open(log_file_path, "w") as fh:
+                fh.write("{data}\n".format(data=json.dumps(summary)))
+                fh.flush()
+            self.context.manifest.register(log_file_path)
+            if self.context.store is not None:
+                self.context.store.stat(node, "collector", {"collector.perf_sched": summary["total"]})
+            self._summarized.append(run_path)
+        except Exception as e:
+            self.context.logger.error("Failed to summarize perf sched data of {path} due to {e}".format(path=run_path, e=e))
+
+    def _prepare_cmd_parts(self):
+        self._cmd_parts.extend(["perf", "sched", "record"])
+        self._cmd_parts.extend(["-o", "{m:context:run_path}/" + self.FILE_DATA])
+        if self._cgroup is not None:
+            # A single cgroup applies to all scheduler events.
+            self._cmd_parts.extend(["-G", self._cgroup])
         super()._prepare_cmd_parts()
@@ -0,0 +1,219 @@
+import os
+import time
+import select
+from typing import Dict, List, Self
+from pymergen.collector.thread import CollectorThread
+from pymergen.core.executor import CollectingExecutorContext
+
+
+class CollectorPressureTrigger:
+
+    TYPE_SOME = "some"
+    TYPE_FULL = "full"
+
+    DEFAULT_THRESHOLD_US = 150000
+    DEFAULT_WINDOW_US = 1000000
+
+    def __init__(self, resource: str, type: str = TYPE_SOME, threshold_us: int = DEFAULT_THRESHOLD_US, window_us: int = DEFAULT_WINDOW_US):
+        self._resource = resource
+        self._type = type
+        self._threshold_us = threshold_us
+        self._window_us = window_us
+
+    @property
+    def resource(self) -> str:
+        return self._resource
+
+    @property
+    def type(self) -> str:
+        return self._type
+
+    @property
+    def threshold_us(self) -> int:
+        return self._threshold_us
+
+    @property
+    def window_us(self) -> int:
+        return self._window_us
+
+    @property
+    def line(self) -> str:
+        # Stall of threshold_us within any window_us, e.g. "some 150000 1000000"
+        return "{type} {threshold} {window}".format(type=self._type, threshold=self._threshold_us, window=self._window_us)
+
+    @staticmethod
+    def parse(config: Dict) -> Self:
+        return CollectorPressureTrigger(
+            config.get("resource"),
+            config.get("type", CollectorPressureTrigger.TYPE_SOME),
+            config.get("threshold_us", CollectorPressureTrigger.DEFAULT_THRESHOLD_US),
+            config.get("window_us", CollectorPressureTrigger.DEFAULT_WINDOW_US)
+        )
+
+
+class CollectorPressureSource:
+
+    def __init__(self, name: str, path: str, trigger: CollectorPressureTrigger):
+        self._name = name
+        self._path = path
+        self._trigger = trigger
+        self._fd = None
+        self._events = 0
+        self._fh = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def trigger(self) -> CollectorPressureTrigger:
+        return self._trigger
+
+    @property
+    def fd(self) -> int:
+        return self._fd
+
+    @property
+    def events(self) -> int:
+        return self._events
+
+    def open(self) -> int:
+        # The trigger stays registered as long as the file descriptor is open.
+        self._fd = os.open(self._path, os.O_RDWR | os.O_NONBLOCK)
+        try:
+            os.write(self._fd, "{line}\0".format(line=self._trigger.line).encode())
+        except OSError:
+            self.close()
+            raise
+        return self._fd
+
+    def event(self) -> int:
+        self._events += 1
+        return self._events
+
+    def log(self, path: str, timestamp_ns: int) -> bool:
+        is_first_call = self._fh is None
+        if is_first_call:
+            self._fh = open(path, "a")
+            self._fh.write("timestamp_ns events\n")
+        self._fh.write("{timestamp_ns} {events}\n".format(timestamp_ns=timestamp_ns, events=self._events))
+        self._fh.flush()
+        return is_first_call
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class CollectorPressure(CollectorThread):
+
+    DIR_SYSTEM = "/proc/pressure"
+    NAME_SYSTEM = "system"
+
+    def __init__(self):
+        super().__init__()
+        self._triggers = list()
+        self._system = False
+        self._wakeup = None
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._triggers = [CollectorPressureTrigger.parse(trigger) for trigger in config.get("triggers", list())]
+        self._system = config.get("system", False)
+
+    @property
+    def triggers(self) -> List[CollectorPressureTrigger]:
+        return self._triggers
+
+    @triggers.setter
+    def triggers(self, values: List[CollectorPressureTrigger]) -> None:
+        self._triggers = values
+
+    @property
+    def system(self) -> bool:
+        return self._system
+
+    @system.setter
+    def system(self, value: bool) -> None:
+        self._system = value
+
+    def sources(self, parent_context: CollectingExecutorContext) -> List[CollectorPressureSource]:
+        sources = list()
+        for trigger in self._triggers:
+            if self._system:
+                sources.append(CollectorPressureSource(
+                    self.NAME_SYSTEM,
+                    os.path.join(self.DIR_SYSTEM, trigger.resource),
+                    trigger
+                ))
+            for cgroup in parent_context.cgroups:
+                sources.append(CollectorPressureSource(
+                    cgroup.name,
+                    os.path.join(cgroup.DIR_BASE, cgroup.name, "{resource}.pressure".format(resource=trigger.resource)),
+                    trigger
+                ))
+        return sources
+
+    def run(self, parent_context: CollectingExecutorContext) -> None:
+        if self.wait(self.ramp):
+            return
+        # Stalls are reported by the kernel as POLLPRI events, so there is no polling interval to miss them. The pipe
+        # wakes the poll up when the collector is stopped.
+        self._wakeup = os.pipe()
+        poller = select.poll()
+        poller.register(self._wakeup[0], select.POLLIN)
+        sources = dict()
+        try:
+            for source in self.sources(parent_context):
+                poller.register(source.open(), select.POLLPRI)
+                sources[source.fd] = source
+            while not self.joined:
+                for fd, mask in poller.poll():
+                    if fd not in sources:
+                        continue
+                    source = sources[fd]
+                    if mask & select.POLLERR:
+                        # The monitored cgroup was removed.
+                        poller.unregister(fd)
+                        continue
+                    if mask & select.POLLPRI:
+                        self._event(parent_context, source, time.monotonic_ns())
+        finally:
+            for source in sources.values():
+                source.close()
+
+    def join(self) -> None:
+        super().join()
+        if self._wakeup is not None:
+            os.write(self._wakeup[1], b"\0")
+
+    def stop(self) -> None:
+        super().stop()
+        # The pipe is closed once the thread is joined, so that join never writes to a closed descriptor.
+        if self._wakeup is not None:
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+
+    def _event(self, parent_context: CollectingExecutorContext, source: CollectorPressureSource, timestamp_ns: int) -> None:
+        source.event()
+        name = "collector.pressure_{name}_{resource}_{type}".format(
+            name=source.name,
+            resource=source.trigger.resource,
+            type=source.trigger.type
+        )
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(parent_context), "{name}.log".format(name=name))
+            if source.log(log_file_path, timestamp_ns):
+                self.context.manifest.register(log_file_path)
+        if self.context.store is not None:
+            timestamp = (timestamp_ns + time.time_ns() - time.monotonic_ns()) / 1e9
+            self.context.store.sample(self._executor.node_path(parent_context), name, "events", timestamp, source.events)
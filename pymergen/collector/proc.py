@@ -0,0 +1,294 @@
+import os
+import time
+from typing import Dict, List, Tuple
+from pymergen.core.writer import Writer
+from pymergen.collector.thread import CollectorPeriodic
+from pymergen.collector.engine import CollectorSchedule
+from pymergen.collector.cgroup import CollectorControllerGroupStatLogger
+from pymergen.core.executor import CollectingExecutorContext
+
+
+class CollectorProcFile:
+
+    BUFFER_SIZE = 4096
+
+    def __init__(self, path: str):
+        self._path = path
+        self._fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self._size = self.BUFFER_SIZE
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def read(self) -> bytes:
+        # The file stays open across ticks and is re-read from the start. Reading a file of a process that exited
+        # fails with ESRCH or returns nothing.
+        while True:
+            data = os.pread(self._fd, self._size, 0)
+            if len(data) < self._size:
+                break
+            self._size *= 2
+        if len(data) == 0:
+            raise ProcessLookupError(self._path)
+        return data
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CollectorProcTask:
+
+    HEADERS = ["utime_ns", "stime_ns", "run_ns", "wait_ns", "timeslices"]
+
+    # Fields of the stat file after the command name, e.g. utime is the 14th field of the file
+    FIELD_UTIME = 11
+    FIELD_STIME = 12
+
+    def __init__(self, path: str, clock_ticks: int):
+        self._path = path
+        self._tick_ns = 1000000000 // clock_ticks
+        self._files = dict()
+        try:
+            for name in ["stat", "schedstat", "children"]:
+                try:
+                    self._files[name] = CollectorProcFile(os.path.join(path, name))
+                except FileNotFoundError:
+                    # Scheduler statistics and children require CONFIG_SCHEDSTATS and CONFIG_PROC_CHILDREN.
+                    if name == "stat":
+                        raise
+        except OSError:
+            self.close()
+            raise
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def sample(self) -> Tuple[str, List[int]]:
+        data = self._files["stat"].read()
+        # The command name is enclosed in parentheses and may contain spaces and parentheses itself.
+        start = data.index(b"(")
+        end = data.rindex(b")")
+        comm = "_".join(data[start + 1:end].decode(errors="replace").split()) or "-"
+        fields = data[end + 2:].split()
+        values = [int(fields[self.FIELD_UTIME]) * self._tick_ns, int(fields[self.FIELD_STIME]) * self._tick_ns]
+        if "schedstat" in self._files:
+            # Time spent on the CPU, time spent waiting on a run queue, and the number of time slices
+            values.extend(int(value) for value in self._files["schedstat"].read().split()[:3])
+        else:
+            values.extend([0, 0, 0])
+        return comm, values
+
+    def children(self) -> List[int]:
+        if "children" not in self._files:
+            return list()
+        try:
+            return [int(pid) for pid in self._files["children"].read().split()]
+        except ProcessLookupError:
+            # A thread without children reads as an empty file.
+            return list()
+
+    def close(self) -> None:
+        for fh in self._files.values():
+            fh.close()
+        self._files = dict()
+
+
+class CollectorProcProcess:
+
+    HEADERS = ["rss_bytes", "read_bytes", "write_bytes"]
+
+    DIR_BASE = "/proc"
+
+    def __init__(self, pid: int, command: str, clock_ticks: int):
+        self._pid = pid
+        self._command = command
+        self._clock_ticks = clock_ticks
+        self._path = os.path.join(self.DIR_BASE, str(pid))
+        self._status = CollectorProcFile(os.path.join(self._path, "status"))
+        try:
+            self._io = CollectorProcFile(os.path.join(self._path, "io"))
+        except PermissionError:
+            # IO accounting of processes of other users requires ptrace access.
+            self._io = None
+        self._tasks = dict()
+
+    @property
+    def pid(self) -> int:
+        return self._pid
+
+    @property
+    def command(self) -> str:
+        return self._command
+
+    @property
+    def tasks(self) -> Dict[int, CollectorProcTask]:
+        return self._tasks
+
+    def sample(self) -> List[Tuple[int, str, List[int]]]:
+        values = [self._rss()] + self._io_bytes()
+        self._refresh()
+        rows = list()
+        for tid, task in sorted(self._tasks.items()):
+            try:
+                comm, task_values = task.sample()
+            except (ProcessLookupError, FileNotFoundError):
+                # The thread exited since the task directory was listed.
+                continue
+            rows.append((tid, comm, task_values + values))
+        return rows
+
+    def children(self) -> List[int]:
+        children = list()
+        for task in self._tasks.values():
+            try:
+                children.extend(task.children())
+            except OSError:
+                continue
+        return children
+
+    def close(self) -> None:
+        self._status.close()
+        if self._io is not None:
+            self._io.close()
+        for task in self._tasks.values():
+            task.close()
+        self._tasks = dict()
+
+    def _refresh(self) -> None:
+        # Threads are started and stopped during the run, descriptors of the remaining ones are kept open.
+        tids = set(int(tid) for tid in os.listdir(os.path.join(self._path, "task")))
+        for tid in list(self._tasks):
+            if tid not in tids:
+                self._tasks.pop(tid).close()
+        for tid in tids:
+            if tid not in self._tasks:
+                try:
+                    self._tasks[tid] = CollectorProcTask(os.path.join(self._path, "task", str(tid)), self._clock_ticks)
+                except FileNotFoundError:
+                    continue
+
+    def _rss(self) -> int:
+        for line in self._status.read().splitlines():
+            if line.startswith(b"VmRSS:"):
+                return int(line.split()[1]) * 1024
+        # Zombies and kernel threads have no address space.
+        return 0
+
+    def _io_bytes(self) -> List[int]:
+        if self._io is None:
+            return [0, 0]
+        values = dict()
+        for line in self._io.read().splitlines():
+            key, value = line.split(b":")
+            values[key] = int(value)
+        return [values.get(b"read_bytes", 0), values.get(b"write_bytes", 0)]
+
+
+class CollectorProc(CollectorPeriodic):
+
+    HEADER_TIMESTAMP = "timestamp_ns"
+    HEADERS_ID = ["pid", "tid", "comm"]
+
+    def __init__(self):
+        super().__init__()
+        self._compress = None
+        self._processes = dict()
+        self._exited = set()
+        self._stat_loggers = dict()
+        self._clock_offset_ns = None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._compress = config.get("compress", None)
+
+    @property
+    def compress(self) -> str:
+        return self._compress
+
+    @compress.setter
+    def compress(self, value: str) -> None:
+        self._compress = value
+
+    @property
+    def headers(self) -> List[str]:
+        return self.HEADERS_ID + CollectorProcTask.HEADERS + CollectorProcProcess.HEADERS
+
+    def start(self, parent_context: CollectingExecutorContext) -> None:
+        self._clock_offset_ns = time.time_ns() - time.monotonic_ns()
+        super().start(parent_context)
+
+    def stop(self) -> None:
+        super().stop()
+        for process in self._processes.values():
+            process.close()
+        self._processes = dict()
+        self._exited = set()
+        for stat_logger in self._stat_loggers.values():
+            stat_logger.close()
+        self._stat_loggers = dict()
+
+    def sample(self, parent_context: CollectingExecutorContext, schedule: CollectorSchedule) -> None:
+        pids = parent_context.pids if parent_context.pids is not None else dict()
+        # The commands started so far, followed by their descendants as they are found
+        queue = [(pid, command) for pid, command in list(pids.items()) if pid not in self._exited]
+        seen = set()
+        while len(queue) > 0:
+            pid, command = queue.pop(0)
+            if pid in seen:
+                continue
+            seen.add(pid)
+            process = self._process(pid, command)
+            if process is None:
+                continue
+            timestamp_ns = time.monotonic_ns()
+            try:
+                rows = process.sample()
+            except (ProcessLookupError, FileNotFoundError):
+                self._exit(pid)
+                continue
+            self._record(parent_context, process, timestamp_ns, rows)
+            queue.extend((child, command) for child in process.children())
+        # Descendants that were not found again have exited, or were reparented after their parent exited.
+        for pid in list(self._processes):
+            if pid not in seen:
+                self._exit(pid)
+
+    def _process(self, pid: int, command: str) -> CollectorProcProcess:
+        if pid not in self._processes:
+            try:
+                self._processes[pid] = CollectorProcProcess(pid, command, self._clock_ticks)
+            except (ProcessLookupError, FileNotFoundError):
+                # Process IDs are not followed again once the process exited, as they can be reused by the system.
+                self._exited.add(pid)
+                return None
+        return self._processes[pid]
+
+    def _exit(self, pid: int) -> None:
+        self._exited.add(pid)
+        if pid in self._processes:
+            self._processes.pop(pid).close()
+
+    def _record(self, parent_context: CollectingExecutorContext, process: CollectorProcProcess, timestamp_ns: int, rows: List[Tuple[int, str, List[int]]]) -> None:
+        name = "collector.proc_{command}".format(command=process.command)
+        if self.context.files:
+            log_file_path = os.path.join(self._executor.run_path(parent_context), "{name}.log".format(name=name))
+            stat_logger = CollectorControllerGroupStatLogger.instance(log_file_path, "a", self._compress)
+            if stat_logger.is_first_call:
+                self._stat_loggers[log_file_path] = stat_logger
+                self.context.manifest.register(Writer.path_for(log_file_path, self._compress))
+                stat_logger.log_line(" ".join([self.HEADER_TIMESTAMP] + self.headers))
+            for tid, comm, values in rows:
+                stat_logger.log_line(" ".join([str(timestamp_ns), str(process.pid), str(tid), comm] + [str(value) for value in values]))
+        if self.context.store is not None:
+            node = self._executor.node_path(parent_context)
+            timestamp = (timestamp_ns + self._clock_offset_ns) / 1e9
+            headers = CollectorProcTask.HEADERS + CollectorProcProcess.HEADERS
+            for tid, comm, values in rows:
+                source = "{name}_{pid}_{tid}".format(name=name, pid=process.pid, tid=tid)
+                for header, value in zip(headers, values):
+                    self.context.store.sample(node, source, header, timestamp, value)
@@ -15,6 +15,7 @@ class CollectorProcess(Collector):
         self._shell_executable = None
         self._pipe_stdout = None
         self._pipe_stderr = None
+        self._compress = None
 
     def parse(self, config: Dict) -> None:
         super().parse(config)
@@ -24,6 +25,7 @@ class CollectorProcess(Collector):
         self._shell_executable = config.get("shell_executable", None)
         self._pipe_stdout = config.get("pipe_stdout", None)
         self._pipe_stderr = config.get("pipe_stderr", None)
+        self._compress = config.get("compress", None)
 
     @property
     def cmd(self) -> str:
@@ -73,6 +75,14 @@ class CollectorProcess(Collector):
     def pipe_stderr(self, value: str) -> None:
         self._pipe_stderr = value
 
+    @property
+    def compress(self) -> str:
+        return self._compress
+
+    @compress.setter
+    def compress(self, value: str) -> None:
+        self._compress = value
+
     def command(self) -> EntityCommand:
         command = EntityCommand()
         command.name = self.name
@@ -82,6 +92,7 @@ class CollectorProcess(Collector):
         command.shell_executable = self.shell_executable
         command.pipe_stdout = self.pipe_stdout
         command.pipe_stderr = self.pipe_stderr
+        command.compress = self.compress
         return command
 
     def start(self, parent_context: ExecutorContext) -> None:
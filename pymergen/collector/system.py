@@ -0,0 +1,280 @@
+import os
+import re
+import time
+from typing import Dict, List, Tuple, Union
+from pymergen.collector.cgroup import CollectorControllerGroup, CollectorControllerGroupSampler, CollectorControllerGroupRates
+from pymergen.collector.engine import CollectorSchedule
+from pymergen.core.executor import CollectingExecutorContext
+
+
+class CollectorSystemSampler(CollectorControllerGroupSampler):
+
+    SOURCE_STAT = "stat"
+    SOURCE_MEMINFO = "meminfo"
+    SOURCE_VMSTAT = "vmstat"
+    SOURCE_DISKSTATS = "diskstats"
+    SOURCE_NET_DEV = "net/dev"
+    SOURCE_LOADAVG = "loadavg"
+    SOURCE_INTERRUPTS = "interrupts"
+
+    # Time spent in each mode in USER_HZ, guest time is also accounted to user and nice time.
+    CPU_MODES = ["user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice"]
+    DISK_FIELDS = [
+        "reads", "reads_merged", "sectors_read", "read_ms", "writes", "writes_merged", "sectors_written", "write_ms",
+        "in_flight", "io_ms", "weighted_io_ms", "discards", "discards_merged", "sectors_discarded", "discard_ms",
+        "flushes", "flush_ms",
+    ]
+    NET_FIELDS = [
+        "rx_bytes", "rx_packets", "rx_errs", "rx_drop", "rx_fifo", "rx_frame", "rx_compressed", "rx_multicast",
+        "tx_bytes", "tx_packets", "tx_errs", "tx_drop", "tx_fifo", "tx_colls", "tx_carrier", "tx_compressed",
+    ]
+    LOADAVG_FIELDS = ["load1", "load5", "load15"]
+    # Loop and RAM disks are listed whether they are used or not.
+    DISKS_IGNORED = re.compile(r"^(loop|ram)[0-9]+$")
+
+    def __init__(self, path: str, source: str):
+        super().__init__(path)
+        self._source = source
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    def sample(self) -> Tuple[int, List[Union[int, float]]]:
+        timestamp_ns = time.monotonic_ns()
+        data = self._read()
+        tokens = data.split()
+        if self._layout is None or len(tokens) != self._size:
+            self._compile(data)
+        # A layout entry spans one or more tokens, e.g. the counts of an interrupt on every CPU.
+        return timestamp_ns, [convert(tokens[i:i + n]) for i, n, convert in self._layout]
+
+    def _compile(self, data: bytes) -> None:
+        headers = list()
+        layout = list()
+        compile_line = getattr(self, "_compile_{source}".format(source=self._source.replace("/", "_")))
+        lines = data.splitlines()
+        i = 0
+        for index, line in enumerate(lines):
+            columns = line.split()
+            compile_line(index, lines, columns, i, headers, layout)
+            i += len(columns)
+        self._headers = headers
+        self._layout = layout
+        self._size = i
+
+    def _compile_stat(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        if len(columns) < 2:
+            return
+        name = columns[0].decode()
+        if name.startswith("cpu"):
+            for j, mode in enumerate(self.CPU_MODES[:len(columns) - 1]):
+                headers.append("{cpu}_{mode}".format(cpu=name, mode=mode))
+                layout.append((i + j + 1, 1, self._int))
+        else:
+            # Only the total of intr and softirq, which are followed by the count of every interrupt
+            headers.append(name)
+            layout.append((i + 1, 1, self._int))
+
+    def _compile_meminfo(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        if len(columns) < 2:
+            return
+        headers.append("{key}_bytes".format(key=columns[0].decode().rstrip(":")) if len(columns) > 2 else columns[0].decode().rstrip(":"))
+        layout.append((i + 1, 1, self._kilobytes if len(columns) > 2 else self._int))
+
+    def _compile_vmstat(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        if len(columns) < 2:
+            return
+        headers.append(columns[0].decode())
+        layout.append((i + 1, 1, self._int))
+
+    def _compile_diskstats(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        if len(columns) < 4:
+            return
+        device = columns[2].decode()
+        if self.DISKS_IGNORED.match(device):
+            return
+        for j, field in enumerate(self.DISK_FIELDS[:len(columns) - 3]):
+            headers.append("{device}_{field}".format(device=device, field=field))
+            layout.append((i + j + 3, 1, self._int))
+
+    def _compile_net_dev(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        # The first two lines are column headers.
+        if index < 2 or len(columns) < 2:
+            return
+        interface = columns[0].decode().rstrip(":")
+        for j, field in enumerate(self.NET_FIELDS[:len(columns) - 1]):
+            headers.append("{interface}_{field}".format(interface=interface, field=field))
+            layout.append((i + j + 1, 1, self._int))
+
+    def _compile_loadavg(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        # For example: 0.11 0.18 0.35 2/72 31691
+        for j, field in enumerate(self.LOADAVG_FIELDS):
+            headers.append(field)
+            layout.append((i + j, 1, self._float))
+        headers.extend(["running", "threads"])
+        layout.append((i + 3, 1, lambda tokens: int(tokens[0].split(b"/")[0])))
+        layout.append((i + 3, 1, lambda tokens: int(tokens[0].split(b"/")[1])))
+
+    def _compile_interrupts(self, index: int, lines: List[bytes], columns: List[bytes], i: int, headers: List[str], layout: List) -> None:
+        # The first line lists the CPUs, every other line the count of an interrupt on each CPU, summed over all CPUs.
+        if index == 0 or len(columns) < 2:
+            return
+        cpus = len(lines[0].split())
+        n = 0
+        while n < cpus and n + 1 < len(columns) and columns[n + 1].isdigit():
+            n += 1
+        if n == 0:
+            return
+        headers.append("irq_{name}".format(name=columns[0].decode().rstrip(":")))
+        layout.append((i + 1, n, self._sum))
+
+    @staticmethod
+    def _int(tokens: List[bytes]) -> int:
+        return int(tokens[0])
+
+    @staticmethod
+    def _float(tokens: List[bytes]) -> float:
+        return float(tokens[0])
+
+    @staticmethod
+    def _kilobytes(tokens: List[bytes]) -> int:
+        return int(tokens[0]) * 1024
+
+    @staticmethod
+    def _sum(tokens: List[bytes]) -> int:
+        return sum(int(token) for token in tokens)
+
+
+class CollectorSystemRates(CollectorControllerGroupRates):
+
+    RATES = {
+        "stat": [
+            ("ctxt", "ctxt_per_sec", 1),
+            ("processes", "forks_per_sec", 1),
+            ("intr", "intr_per_sec", 1),
+        ],
+        "diskstats": [
+            ("reads", "riops", 1),
+            ("writes", "wiops", 1),
+            # Sectors are always 512 bytes in diskstats, regardless of the sector size of the device.
+            ("sectors_read", "read_bytes_per_sec", 512),
+            ("sectors_written", "write_bytes_per_sec", 512),
+        ],
+        "net/dev": [
+            ("rx_bytes", "rx_bytes_per_sec", 1),
+            ("tx_bytes", "tx_bytes_per_sec", 1),
+            ("rx_packets", "rx_packets_per_sec", 1),
+            ("tx_packets", "tx_packets_per_sec", 1),
+            ("rx_drop", "rx_drop_per_sec", 1),
+            ("tx_drop", "tx_drop_per_sec", 1),
+        ],
+        "vmstat": [
+            # Reclaim activity
+            ("pgscan_kswapd", "pgscan_kswapd_per_sec", 1),
+            ("pgscan_direct", "pgscan_direct_per_sec", 1),
+            ("pgsteal_kswapd", "pgsteal_kswapd_per_sec", 1),
+            ("pgsteal_direct", "pgsteal_direct_per_sec", 1),
+            ("allocstall_normal", "allocstall_normal_per_sec", 1),
+            ("allocstall_movable", "allocstall_movable_per_sec", 1),
+            ("pgmajfault", "pgmajfault_per_sec", 1),
+            ("pswpin", "pswpin_per_sec", 1),
+            ("pswpout", "pswpout_per_sec", 1),
+        ],
+    }
+    RATIOS = dict()
+
+    # Modes that make up the total time of a CPU
+    CPU_MODES = CollectorSystemSampler.CPU_MODES[:8]
+
+    def _derive(self, previous: Tuple[int, Dict], current: Tuple[int, Dict]) -> Tuple[List[str], List[float]]:
+        headers, values = super()._derive(previous, current)
+        elapsed_ns = current[0] - previous[0]
+        if elapsed_ns <= 0:
+            return headers, values
+        if self._stat_file == "stat":
+            self._derive_cpus(previous[1], current[1], headers, values)
+        elif self._stat_file == "diskstats":
+            self._derive_disks(previous[1], current[1], elapsed_ns, headers, values)
+        return headers, values
+
+    def _derive_cpus(self, previous: Dict, current: Dict, headers: List[str], values: List[float]) -> None:
+        # Utilization of every CPU (and of all CPUs as "cpu") by mode, in percent of the time of the interval
+        for header in current:
+            if not header.endswith("_user"):
+                continue
+            cpu = header[:-len("_user")]
+            deltas = [self._delta(previous.get("{cpu}_{mode}".format(cpu=cpu, mode=mode)), current.get("{cpu}_{mode}".format(cpu=cpu, mode=mode))) for mode in self.CPU_MODES]
+            deltas = [delta for delta in deltas if delta is not None]
+            if len(deltas) != len(self.CPU_MODES):
+                continue
+            # CPU time is accounted in ticks, intervals shorter than a tick may see no time at all.
+            total = sum(deltas)
+            for mode, delta in zip(self.CPU_MODES, deltas):
+                headers.append("{cpu}_{mode}_pct".format(cpu=cpu, mode=mode))
+                values.append(delta * 100 / total if total > 0 else 0.0)
+
+    def _derive_disks(self, previous: Dict, current: Dict, elapsed_ns: int, headers: List[str], values: List[float]) -> None:
+        for header in current:
+            if not header.endswith("_in_flight"):
+                continue
+            device = header[:-len("_in_flight")]
+            deltas = dict()
+            for field in ["reads", "writes", "read_ms", "write_ms", "io_ms"]:
+                key = "{device}_{field}".format(device=device, field=field)
+                deltas[field] = self._delta(previous.get(key), current.get(key))
+            if any(delta is None for delta in deltas.values()):
+                continue
+            ios = deltas["reads"] + deltas["writes"]
+            # Average time of the requests completed in the interval, including their time in the queue
+            headers.append("{device}_await_ms".format(device=device))
+            values.append((deltas["read_ms"] + deltas["write_ms"]) / ios if ios > 0 else 0.0)
+            # Share of the interval with requests in flight
+            headers.append("{device}_util_pct".format(device=device))
+            values.append(min(deltas["io_ms"] * 1e6 * 100 / elapsed_ns, 100.0))
+
+
+class CollectorSystem(CollectorControllerGroup):
+
+    DIR_PROC = "/proc"
+
+    SOURCES = [
+        CollectorSystemSampler.SOURCE_STAT,
+        CollectorSystemSampler.SOURCE_MEMINFO,
+        CollectorSystemSampler.SOURCE_VMSTAT,
+        CollectorSystemSampler.SOURCE_DISKSTATS,
+        CollectorSystemSampler.SOURCE_NET_DEV,
+        CollectorSystemSampler.SOURCE_LOADAVG,
+        CollectorSystemSampler.SOURCE_INTERRUPTS,
+    ]
+
+    RATES_TYPE = CollectorSystemRates
+
+    def __init__(self):
+        super().__init__()
+        self._sources = list(self.SOURCES)
+        self._rates = True
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._sources = config.get("sources", list(self.SOURCES))
+        self._rates = config.get("rates", True)
+
+    @property
+    def sources(self) -> List[str]:
+        return self._sources
+
+    @sources.setter
+    def sources(self, values: List[str]) -> None:
+        self._sources = values
+
+    def sample(self, parent_context: CollectingExecutorContext, schedule: CollectorSchedule) -> None:
+        # All files are sampled on the same tick, so that their samples can be lined up.
+        for source in self._sources:
+            name = "collector.system_{source}".format(source=source.replace("/", "_"))
+            self._sample_file(parent_context, schedule, name, os.path.join(self.DIR_PROC, source), source)
+
+    def _sampler(self, path: str) -> CollectorSystemSampler:
+        if path not in self._samplers:
+            self._samplers[path] = CollectorSystemSampler(path, os.path.relpath(path, self.DIR_PROC))
+        return self._samplers[path]
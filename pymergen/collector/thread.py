@@ -1,6 +1,8 @@
+import threading
 from typing import Dict
 from pymergen.collector.collector import Collector
-from pymergen.core.executor import ExecutorContext, AsyncThreadExecutor
+from pymergen.collector.engine import CollectorEngine, CollectorEngineTask, CollectorSchedule
+from pymergen.core.executor import ExecutorContext, Executor, AsyncThreadExecutor
 
 
 class CollectorThread(Collector):
@@ -11,7 +13,7 @@ class CollectorThread(Collector):
     def __init__(self):
         super().__init__()
         self._executor = None
-        self._join = False
+        self._join = threading.Event()
         self._ramp = self.DEFAULT_RAMP
         self._interval = self.DEFAULT_INTERVAL
 
@@ -36,6 +38,10 @@ class CollectorThread(Collector):
     def interval(self, value: int) -> None:
         self._interval = value
 
+    @property
+    def joined(self) -> bool:
+        return self._join.is_set()
+
     def start(self, parent_context: ExecutorContext) -> None:
         self._executor = AsyncThreadExecutor(self.context, parent_context.entity)
         self._executor.target = self
@@ -44,10 +50,54 @@ class CollectorThread(Collector):
     def stop(self) -> None:
         self._executor.execute_stop()
         # Reset value for subsequent runs
-        self._join = False
+        self._join.clear()
 
     def run(self, parent_context: ExecutorContext) -> None:
         raise NotImplementedError()
 
     def join(self) -> None:
-        self._join = True
+        self._join.set()
+
+    def wait(self, timeout: float) -> bool:
+        # Sleeps of collector threads are interrupted by join, so that stopping never waits for a ramp or an interval.
+        return self._join.wait(timeout)
+
+
+class CollectorPeriodic(CollectorThread):
+
+    def __init__(self):
+        super().__init__()
+        self._cpu = None
+        self._task = None
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._cpu = config.get("cpu", None)
+
+    @property
+    def cpu(self) -> int:
+        return self._cpu
+
+    @cpu.setter
+    def cpu(self, value: int) -> None:
+        self._cpu = value
+
+    def start(self, parent_context: ExecutorContext) -> None:
+        # Periodic collectors do not own a thread. Their samples are taken by the shared engine, and the executor is
+        # only used to resolve the paths of the node.
+        self._executor = Executor(self.context, parent_context.entity)
+        self._task = CollectorEngineTask(self.name, lambda schedule: self.sample(parent_context, schedule), self.interval, self.ramp)
+        CollectorEngine.instance(self._cpu).register(self._task)
+
+    def stop(self) -> None:
+        CollectorEngine.instance(self._cpu).unregister(self._task)
+        self._task.finish()
+        if self._task.error is not None:
+            self.context.logger.error("Collector {n} failed due to {e}".format(n=self.name, e=self._task.error))
+        self._task = None
+
+    def run(self, parent_context: ExecutorContext) -> None:
+        raise NotImplementedError()
+
+    def sample(self, parent_context: ExecutorContext, schedule: CollectorSchedule) -> None:
+        raise NotImplementedError()
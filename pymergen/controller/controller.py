@@ -55,6 +55,7 @@ class ControllerCpu(Controller):
     def __init__(self):
         super().__init__(Controller.TYPE_CPU)
         self.add_stat_file("cpu.stat")
+        self.add_stat_file("cpu.pressure")
 
 
 class ControllerIo(Controller):
@@ -62,6 +63,7 @@ class ControllerIo(Controller):
     def __init__(self):
         super().__init__(Controller.TYPE_IO)
         self.add_stat_file("io.stat")
+        self.add_stat_file("io.pressure")
 
 
 class ControllerMemory(Controller):
@@ -70,6 +72,7 @@ class ControllerMemory(Controller):
         super().__init__(Controller.TYPE_MEMORY)
         self.add_stat_file("memory.stat")
         self.add_stat_file("memory.numa_stat")
+        self.add_stat_file("memory.pressure")
 
 
 class ControllerHugeTlb(Controller):
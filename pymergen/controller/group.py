@@ -1,4 +1,9 @@
-from typing import List
+import os
+import sys
+import time
+import errno
+import shlex
+from typing import List, Self
 from pymergen.entity.command import EntityCommand
 from pymergen.controller.controller import Controller
 
@@ -7,10 +12,27 @@ class ControllerGroup:
 
     DIR_BASE = "/sys/fs/cgroup"
 
+    BACKEND_AUTO = "auto"
+    BACKEND_NATIVE = "native"
+    BACKEND_LIBCGROUP = "libcgroup"
+
+    FILE_CONTROLLERS = "cgroup.controllers"
+    FILE_SUBTREE_CONTROL = "cgroup.subtree_control"
+    FILE_PROCS = "cgroup.procs"
+    FILE_THREADS = "cgroup.threads"
+    FILE_EVENTS = "cgroup.events"
+    FILE_KILL = "cgroup.kill"
+
+    REMOVE_TIMEOUT = 2.0
+    REMOVE_INTERVAL = 0.01
+
     def __init__(self, name: str):
         self._name = name
         self._become_cmd = None
         self._controllers = list()
+        self._backend = self.BACKEND_AUTO
+        self._nested = False
+        self._owner = None
 
     @property
     def name(self) -> str:
@@ -35,7 +57,104 @@ class ControllerGroup:
     def add_controller(self, value: Controller) -> None:
         self._controllers.append(value)
 
+    @property
+    def backend(self) -> str:
+        return self._backend
+
+    @backend.setter
+    def backend(self, value: str) -> None:
+        self._backend = value
+
+    @property
+    def native(self) -> bool:
+        if self._backend == self.BACKEND_AUTO:
+            # The native backend requires the unified cgroup v2 hierarchy, libcgroup remains the fallback otherwise.
+            return os.path.exists(os.path.join(self.DIR_BASE, self.FILE_CONTROLLERS))
+        return self._backend == self.BACKEND_NATIVE
+
+    @property
+    def nested(self) -> bool:
+        return self._nested
+
+    @nested.setter
+    def nested(self, value: bool) -> None:
+        self._nested = value
+
+    @property
+    def owner(self) -> str:
+        return self._owner
+
+    @owner.setter
+    def owner(self, value: str) -> None:
+        self._owner = value
+
+    @property
+    def direct(self) -> bool:
+        # Commands are placed into native cgroups at spawn time, without cgexec. Privileged cgroups are delegated to the
+        # user running PyMergen when they are created, so that its commands can move themselves into them.
+        return self.native
+
+    @property
+    def managed(self) -> bool:
+        # Native cgroups without become_cmd are managed by PyMergen itself, privileged cgroups by a helper command run
+        # with become_cmd.
+        return self.native and self._become_cmd is None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.DIR_BASE, self._name)
+
+    @property
+    def procs_path(self) -> str:
+        return os.path.join(self.path, self.FILE_PROCS)
+
+    def create(self) -> None:
+        if not self.managed:
+            return
+        # Controllers are enabled top-down in every ancestor, so that they are available to the cgroup.
+        path = self.DIR_BASE
+        for part in self._name.strip("/").split("/"):
+            self._write(os.path.join(path, self.FILE_SUBTREE_CONTROL), " ".join("+{c}".format(c=c) for c in self._controller_names()))
+            path = os.path.join(path, part)
+            os.makedirs(path, exist_ok=True)
+        for controller in self.controllers:
+            for key, value in controller.limits.items():
+                self._write(os.path.join(path, "{controller}.{key}".format(controller=controller.name, key=key)), str(value))
+        if self._nested:
+            # Leaf cgroups have no limits of their own, they are bounded by the limits of this cgroup as a whole.
+            self._write(os.path.join(path, self.FILE_SUBTREE_CONTROL), " ".join("+{c}".format(c=c) for c in self._controller_names()))
+        if self._owner is not None:
+            self._delegate(path)
+
+    def destroy(self) -> None:
+        if not self.managed:
+            return
+        for leaf in self.leaves():
+            self._remove(leaf.path)
+        if os.path.isdir(self.path):
+            self._remove(self.path)
+
+    def leaf(self, name: str) -> str:
+        # Processes can only be placed in leaves once controllers are enabled for the children of this cgroup.
+        path = os.path.join(self.path, name.replace(os.sep, "_"))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def leaves(self) -> List[Self]:
+        leaves = list()
+        if not self._nested or not self.direct or not os.path.isdir(self.path):
+            return leaves
+        for entry in sorted(os.scandir(self.path), key=lambda e: e.name):
+            if entry.is_dir():
+                leaf = ControllerGroup("{name}/{leaf}".format(name=self._name, leaf=entry.name))
+                leaf.backend = self.BACKEND_NATIVE
+                leaf.controllers = self._controllers
+                leaves.append(leaf)
+        return leaves
+
     def builders(self) -> List[EntityCommand]:
+        if self.native:
+            return self._helpers("create")
         commands = list()
         c = EntityCommand()
         c.name = "cgcreate_{cgroup}".format(cgroup=self.name)
@@ -58,6 +177,8 @@ class ControllerGroup:
         return commands
 
     def destroyers(self) -> List[EntityCommand]:
+        if self.native:
+            return self._helpers("destroy")
         commands = list()
         c = EntityCommand()
         c.name = "cgdelete_{cgroup}".format(cgroup=self.name)
@@ -71,3 +192,70 @@ class ControllerGroup:
 
     def _controller_names(self) -> List[str]:
         return [c.name for c in self.controllers]
+
+    def _helpers(self, action: str) -> List[EntityCommand]:
+        if self.managed:
+            return list()
+        # A single privileged helper replaces the cgcreate and cgset commands of every limit.
+        parts = [sys.executable, "-m", "pymergen.bin.cgroup", action, "--name", self.name]
+        if self._nested:
+            parts.append("--nested")
+        if action == "create":
+            parts.extend(["--owner", "{uid}:{gid}".format(uid=os.getuid(), gid=os.getgid())])
+            parts.extend(["--controllers", ",".join(self._controller_names())])
+            for controller in self.controllers:
+                for key, value in controller.limits.items():
+                    parts.extend(["--limit", "{controller}.{key}={value}".format(controller=controller.name, key=key, value=value)])
+        c = EntityCommand()
+        c.name = "cgroup_{action}_{cgroup}".format(action=action, cgroup=self.name)
+        c.cmd = " ".join(shlex.quote(part) for part in parts)
+        c.become_cmd = self.become_cmd
+        return [c]
+
+    def _delegate(self, path: str) -> None:
+        # Delegation as documented for cgroup v2: the owner may create leaves and move processes between them.
+        uid, gid = [int(i) for i in self._owner.split(":")]
+        os.chown(path, uid, gid)
+        for name in [self.FILE_PROCS, self.FILE_THREADS, self.FILE_SUBTREE_CONTROL]:
+            os.chown(os.path.join(path, name), uid, gid)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.rmdir(path)
+            return
+        except OSError as e:
+            if e.errno != errno.EBUSY:
+                raise
+        # Processes of the cgroup are still exiting, or were left behind by the commands. They are killed and the
+        # directory is removed once the kernel reports the cgroup as no longer populated.
+        kill_path = os.path.join(path, self.FILE_KILL)
+        if os.path.exists(kill_path):
+            self._write(kill_path, "1")
+        deadline = time.monotonic() + self.REMOVE_TIMEOUT
+        while True:
+            if not self._populated(path):
+                try:
+                    os.rmdir(path)
+                    return
+                except OSError as e:
+                    if e.errno != errno.EBUSY or time.monotonic() >= deadline:
+                        raise
+            elif time.monotonic() >= deadline:
+                raise Exception("Unable to remove cgroup {path}, it is still populated after {timeout}s".format(path=path, timeout=self.REMOVE_TIMEOUT))
+            time.sleep(self.REMOVE_INTERVAL)
+
+    def _populated(self, path: str) -> bool:
+        try:
+            with open(os.path.join(path, self.FILE_EVENTS), "r") as fh:
+                for line in fh:
+                    key, _, value = line.partition(" ")
+                    if key == "populated":
+                        return value.strip() != "0"
+        except FileNotFoundError:
+            pass
+        return False
+
+    @staticmethod
+    def _write(path: str, value: str) -> None:
+        with open(path, "w") as fh:
+            fh.write(value)
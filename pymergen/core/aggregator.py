@@ -0,0 +1,439 @@
+import os
+import re
+import json
+import gzip
+import lzma
+import math
+import heapq
+import random
+import statistics
+import importlib
+from typing import Any, Dict, List, Self
+from pymergen.core.series import SeriesReader
+
+
+class AggregatorSample:
+
+    # Values kept for percentiles and the bootstrap. Larger samples keep a uniform random subset of this size.
+    RESERVOIR_SIZE = 1024
+    SEED = 0
+
+    def __init__(self, random_source: random.Random = None):
+        self._random = random_source if random_source is not None else random.Random(self.SEED)
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = None
+        self._max = None
+        # Bottom-k sample: the values with the smallest random priorities, kept as a max-heap of negated priorities. The
+        # bottom-k of a union is the bottom-k of the bottom-k of its parts, so samples merge without their values.
+        self._reservoir = list()
+
+    @staticmethod
+    def of(values: List[float]) -> Self:
+        sample = AggregatorSample()
+        for value in values:
+            sample.add(value)
+        return sample
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self._m2 / (self._count - 1)) if self._count > 1 else None
+
+    @property
+    def min(self) -> float:
+        return self._min
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    @property
+    def values(self) -> List[float]:
+        return sorted(value for _, value in self._reservoir)
+
+    @property
+    def complete(self) -> bool:
+        return len(self._reservoir) == self._count
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        # Welford's online mean and sum of squared deviations
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        self._min = value if self._min is None else min(self._min, value)
+        self._max = value if self._max is None else max(self._max, value)
+        self._keep(self._random.random(), value)
+
+    def merge(self, sample: Self) -> None:
+        if sample.count == 0:
+            return
+        # Pairwise combination of the means and sums of squared deviations of both samples
+        count = self._count + sample.count
+        delta = sample.mean - self._mean
+        self._m2 += sample._m2 + delta * delta * self._count * sample.count / count
+        self._mean += delta * sample.count / count
+        self._count = count
+        self._min = sample.min if self._min is None else min(self._min, sample.min)
+        self._max = sample.max if self._max is None else max(self._max, sample.max)
+        for priority, value in sample._reservoir:
+            self._keep(-priority, value)
+
+    def state(self) -> List:
+        return [self._count, self._mean, self._m2, self._min, self._max, self._reservoir]
+
+    @staticmethod
+    def load(state: List, random_source: random.Random = None) -> Self:
+        sample = AggregatorSample(random_source)
+        sample._count, sample._mean, sample._m2, sample._min, sample._max, reservoir = state
+        sample._reservoir = [tuple(entry) for entry in reservoir]
+        heapq.heapify(sample._reservoir)
+        return sample
+
+    def _keep(self, priority: float, value: float) -> None:
+        if len(self._reservoir) < self.RESERVOIR_SIZE:
+            heapq.heappush(self._reservoir, (-priority, value))
+        elif -priority > self._reservoir[0][0]:
+            heapq.heapreplace(self._reservoir, (-priority, value))
+
+
+class AggregatorStatistics:
+
+    PERCENTILES = [50, 90, 95, 99]
+    BOOTSTRAP_RESAMPLES = 1000
+    BOOTSTRAP_CONFIDENCE = 0.95
+    # Larger samples use the normal approximation of the confidence interval, which the bootstrap converges to anyway.
+    # So do samples larger than the reservoir, whose values are not all known.
+    BOOTSTRAP_LIMIT = 10000
+    BOOTSTRAP_SEED = 0
+    # Indices drawn at once by the numpy bootstrap, which bounds its memory regardless of the sample size
+    BOOTSTRAP_CHUNK = 1000000
+
+    def __init__(self):
+        try:
+            self._numpy = importlib.import_module("numpy")
+        except ModuleNotFoundError:
+            self._numpy = None
+
+    @property
+    def numpy(self) -> Any:
+        return self._numpy
+
+    @numpy.setter
+    def numpy(self, value: Any) -> None:
+        self._numpy = value
+
+    def summarize(self, values: List[float] | AggregatorSample) -> Dict:
+        sample = values if isinstance(values, AggregatorSample) else AggregatorSample.of(values)
+        if sample.count == 0:
+            return {"count": 0}
+        if self._numpy is not None:
+            return self._summarize_numpy(sample)
+        return self._summarize_python(sample)
+
+    def _summarize_numpy(self, sample: AggregatorSample) -> Dict:
+        np = self._numpy
+        array = np.asarray(sample.values, dtype=np.float64)
+        percentiles = [float(p) for p in np.percentile(array, self.PERCENTILES)]
+        if sample.count < 2:
+            ci = None
+        elif sample.count > self.BOOTSTRAP_LIMIT or not sample.complete:
+            ci = self._normal_ci(sample.mean, sample.stddev, sample.count)
+        else:
+            # Resamples are drawn in chunks of matrix reductions.
+            rng = np.random.default_rng(self.BOOTSTRAP_SEED)
+            count = array.size
+            chunk = max(1, self.BOOTSTRAP_CHUNK // count)
+            means = list()
+            for start in range(0, self.BOOTSTRAP_RESAMPLES, chunk):
+                size = min(chunk, self.BOOTSTRAP_RESAMPLES - start)
+                means.append(array[rng.integers(0, count, (size, count))].mean(axis=1))
+            alpha = (1 - self.BOOTSTRAP_CONFIDENCE) / 2 * 100
+            ci = [float(c) for c in np.percentile(np.concatenate(means), [alpha, 100 - alpha])]
+        return self._data(sample.count, sample.mean, sample.stddev, sample.min, sample.max, percentiles, ci)
+
+    def _summarize_python(self, sample: AggregatorSample) -> Dict:
+        values = sample.values
+        percentiles = [self._percentile(values, p) for p in self.PERCENTILES]
+        if sample.count < 2:
+            ci = None
+        elif sample.count > self.BOOTSTRAP_LIMIT or not sample.complete:
+            ci = self._normal_ci(sample.mean, sample.stddev, sample.count)
+        else:
+            rng = random.Random(self.BOOTSTRAP_SEED)
+            count = len(values)
+            means = sorted(statistics.fmean(rng.choices(values, k=count)) for _ in range(self.BOOTSTRAP_RESAMPLES))
+            alpha = (1 - self.BOOTSTRAP_CONFIDENCE) / 2 * 100
+            ci = [self._percentile(means, alpha), self._percentile(means, 100 - alpha)]
+        return self._data(sample.count, sample.mean, sample.stddev, sample.min, sample.max, percentiles, ci)
+
+    def _normal_ci(self, mean: float, stddev: float, count: int) -> List[float]:
+        z = statistics.NormalDist().inv_cdf(1 - (1 - self.BOOTSTRAP_CONFIDENCE) / 2)
+        margin = z * stddev / math.sqrt(count)
+        return [mean - margin, mean + margin]
+
+    @staticmethod
+    def _percentile(values: List[float], p: float) -> float:
+        # Linear interpolation between closest ranks, the default method of numpy.percentile
+        rank = (len(values) - 1) * p / 100
+        lower = math.floor(rank)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+    def _data(self, count: int, mean: float, stddev: float, min_value: float, max_value: float, percentiles: List[float], ci: List[float]) -> Dict:
+        data = {
+            "count": count,
+            "mean": mean,
+            "stddev": stddev,
+            "min": min_value,
+            "max": max_value,
+        }
+        for p, value in zip(self.PERCENTILES, percentiles):
+            data["median" if p == 50 else "p{p}".format(p=p)] = value
+        data["ci"] = ci
+        return data
+
+
+class AggregatorNode:
+
+    def __init__(self):
+        self._samples = dict()
+        self._children = dict()
+        # Shared by the samples of the node, so that the reservoirs of a run are reproducible
+        self._random = random.Random(AggregatorSample.SEED)
+
+    @property
+    def samples(self) -> Dict[str, AggregatorSample]:
+        return self._samples
+
+    @property
+    def children(self) -> Dict[str, Self]:
+        return self._children
+
+    def add(self, key: str, value: float) -> None:
+        if key not in self._samples:
+            self._samples[key] = AggregatorSample(self._random)
+        self._samples[key].add(value)
+
+    def merge(self, node: Self) -> None:
+        for key, sample in node.samples.items():
+            if key not in self._samples:
+                self._samples[key] = AggregatorSample(self._random)
+            self._samples[key].merge(sample)
+        for name, child in node.children.items():
+            if name not in self._children:
+                self._children[name] = AggregatorNode()
+            self._children[name].merge(child)
+
+    def state(self) -> Dict:
+        return {
+            "metrics": {key: sample.state() for key, sample in sorted(self._samples.items())},
+            "children": {name: child.state() for name, child in sorted(self._children.items())},
+        }
+
+    @staticmethod
+    def load(state: Dict) -> Self:
+        node = AggregatorNode()
+        for key, sample_state in state["metrics"].items():
+            node.samples[key] = AggregatorSample.load(sample_state, node._random)
+        for name, child_state in state["children"].items():
+            node.children[name] = AggregatorNode.load(child_state)
+        return node
+
+
+class Aggregator:
+
+    FILE_NAME = "stat.summary.json"
+    # Mergeable aggregates of the summary, which the summaries of enclosing entities are rolled up from
+    STATE_FILE_NAME = "stat.summary.state.json"
+
+    REPLICATION_PATTERN = re.compile(r"^r[0-9]{3}$")
+    STAT_PATTERN = re.compile(r"^stat\.(?!summary\.|timer\.).*\.json$")
+    METRIC_FILE_NAME = "metrics.jsonl"
+    COLLECTOR_PATTERN = re.compile(r"^collector\..*\.log(\.gz|\.xz|\.zst)?$")
+    SERIES_PATTERN = re.compile(r"^collector\..*\.series(\.gz|\.xz|\.zst)?$")
+
+    # Wall clock timestamps and process identifiers are not measurements
+    KEYS_IGNORED = ["started_at", "stopped_at", "timestamp", "timestamp_ns", "pid", "tid"]
+
+    def __init__(self, stats: AggregatorStatistics = None):
+        self._stats = stats if stats is not None else AggregatorStatistics()
+
+    @property
+    def stats(self) -> AggregatorStatistics:
+        return self._stats
+
+    def is_entity(self, path: str) -> bool:
+        # Entity directories (plans, suites, and cases) are recognized by their replication directories.
+        if not os.path.isdir(path):
+            return False
+        return any(self.REPLICATION_PATTERN.match(name) and os.path.isdir(os.path.join(path, name)) for name in os.listdir(path))
+
+    def aggregate(self, path: str, recursive: bool = False) -> List[str]:
+        log_file_paths = list()
+        if recursive:
+            for name in sorted(os.listdir(path)):
+                child_path = os.path.join(path, name)
+                if os.path.isdir(child_path):
+                    log_file_paths.extend(self.aggregate(child_path, recursive))
+        if self.is_entity(path):
+            node = self.collect(path)
+            log_file_paths.append(self.log(path, self.summarize(node)))
+            log_file_paths.append(self.log_state(path, node))
+        return log_file_paths
+
+    def collect(self, path: str) -> AggregatorNode:
+        node = AggregatorNode()
+        for name in sorted(os.listdir(path)):
+            replication_path = os.path.join(path, name)
+            if self.REPLICATION_PATTERN.match(name) and os.path.isdir(replication_path):
+                node.merge(self._collect_replication(replication_path))
+        return node
+
+    def summarize(self, node: AggregatorNode) -> Dict:
+        return {
+            "metrics": {key: self._stats.summarize(sample) for key, sample in sorted(node.samples.items())},
+            "children": {name: self.summarize(child) for name, child in sorted(node.children.items())},
+        }
+
+    def log(self, path: str, data: Dict) -> str:
+        log_file_path = os.path.join(path, self.FILE_NAME)
+        with open(log_file_path, "w") as fh:
+            fh.write("{data}\n".format(data=json.dumps(data)))
+            fh.flush()
+        return log_file_path
+
+    def log_state(self, path: str, node: AggregatorNode) -> str:
+        log_file_path = os.path.join(path, self.STATE_FILE_NAME)
+        with open(log_file_path, "w") as fh:
+            fh.write("{data}\n".format(data=json.dumps(node.state())))
+            fh.flush()
+        return log_file_path
+
+    def load_state(self, path: str) -> AggregatorNode:
+        try:
+            with open(os.path.join(path, self.STATE_FILE_NAME), "r") as fh:
+                return AggregatorNode.load(json.loads(fh.read()))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _collect_replication(self, path: str) -> AggregatorNode:
+        node = AggregatorNode()
+        for dir_path, dir_names, file_names in os.walk(path):
+            # Nested entities are rolled up as children rather than mixed into the samples of this entity. Their
+            # aggregates are merged from the state they were summarized with, so that every file of a run is read
+            # once, by its closest entity, rather than once per enclosing entity.
+            for dir_name in list(dir_names):
+                child_path = os.path.join(dir_path, dir_name)
+                child = self.load_state(child_path)
+                if child is None and self.is_entity(child_path):
+                    child = self.collect(child_path)
+                if child is not None:
+                    dir_names.remove(dir_name)
+                    if dir_name not in node.children:
+                        node.children[dir_name] = AggregatorNode()
+                    node.children[dir_name].merge(child)
+            dir_names.sort()
+            prefix = os.path.relpath(dir_path, path).replace(os.sep, "/")
+            prefix = "" if prefix == "." else "{prefix}/".format(prefix=prefix)
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                if self.STAT_PATTERN.match(file_name):
+                    self._collect_stat(node, file_path, prefix + file_name[:-len(".json")])
+                elif file_name == self.METRIC_FILE_NAME:
+                    self._collect_metrics(node, file_path, prefix + "metrics")
+                elif self.COLLECTOR_PATTERN.match(file_name):
+                    self._collect_collector(node, file_path, prefix + file_name.split(".log")[0])
+                elif self.SERIES_PATTERN.match(file_name):
+                    self._collect_series(node, file_path, prefix + file_name.split(".series")[0])
+        return node
+
+    def _collect_stat(self, node: AggregatorNode, path: str, key: str) -> None:
+        try:
+            with open(path, "r") as fh:
+                data = json.loads(fh.read())
+        except ValueError:
+            return
+        self._flatten(node, key, data)
+
+    def _collect_metrics(self, node: AggregatorNode, path: str, key: str) -> None:
+        with open(path, "r") as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last record may be incomplete while the command is still running.
+                    continue
+                value = record.get("value")
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    node.add("{key}.{metric}".format(key=key, metric=record.get("metric")), value)
+
+    def _collect_collector(self, node: AggregatorNode, path: str, key: str) -> None:
+        fh = self._open(path)
+        if fh is None:
+            return
+        with fh:
+            headers = None
+            for line in fh:
+                columns = line.split()
+                # Header lines are repeated when the layout of the sampled file changes.
+                if headers is None or (len(columns) > 0 and columns[0] in self.KEYS_IGNORED):
+                    headers = columns
+                    continue
+                for header, column in zip(headers, columns):
+                    if header in self.KEYS_IGNORED:
+                        continue
+                    try:
+                        node.add("{key}.{header}".format(key=key, header=header), float(column))
+                    except ValueError:
+                        continue
+
+    def _collect_series(self, node: AggregatorNode, path: str, key: str) -> None:
+        try:
+            segments = SeriesReader(path).read()
+        except ModuleNotFoundError:
+            # Compressed with zstd while zstandard is not installed, as for the text logs
+            return
+        for segment in segments:
+            for header, values in segment.items():
+                if header in self.KEYS_IGNORED:
+                    continue
+                for value in values.tolist():
+                    # Non-numeric tokens are stored as NaN
+                    if not math.isnan(value):
+                        node.add("{key}.{header}".format(key=key, header=header), value)
+
+    def _flatten(self, node: AggregatorNode, key: str, data: Any) -> None:
+        if isinstance(data, dict):
+            for name, value in data.items():
+                if name not in self.KEYS_IGNORED:
+                    self._flatten(node, "{key}.{name}".format(key=key, name=name), value)
+        elif isinstance(data, list):
+            for i, value in enumerate(data):
+                self._flatten(node, "{key}.{i}".format(key=key, i=i), value)
+        elif isinstance(data, (int, float)) and not isinstance(data, bool):
+            node.add(key, data)
+
+    @staticmethod
+    def _open(path: str) -> Any:
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt")
+        if path.endswith(".xz"):
+            return lzma.open(path, "rt")
+        if path.endswith(".zst"):
+            try:
+                zstandard = importlib.import_module("zstandard")
+            except ModuleNotFoundError:
+                return None
+            return zstandard.open(path, "rt")
+        return open(path, "r")
@@ -3,7 +3,11 @@ import shutil
 import os
 import logging
 from datetime import datetime
+from typing import List
 from pymergen.core.logger import Logger
+from pymergen.core.store import Store
+from pymergen.core.writer import Writer
+from pymergen.core.manifest import Manifest
 from pymergen.plugin.manager import PluginManager
 
 
@@ -18,9 +22,15 @@ class Context:
         self._filter_plan = args.filter_plan
         self._filter_suite = args.filter_suite
         self._filter_case = args.filter_case
+        self._compress = args.compress
+        self._files = not args.no_files
         self._prepare()
+        self._manifest = Manifest(self._run_path)
         self._init_logger()
         self._plugin_manager = None
+        self._store = None
+        if args.store:
+            self._store = Store(os.path.join(self._run_path, Store.FILE_NAME))
 
     @property
     def plan_path(self) -> str:
@@ -54,6 +64,22 @@ class Context:
     def filter_case(self) -> str:
         return self._filter_case
 
+    @property
+    def compress(self) -> str:
+        return self._compress
+
+    @property
+    def files(self) -> bool:
+        return self._files
+
+    @property
+    def store(self) -> Store:
+        return self._store
+
+    @property
+    def manifest(self) -> Manifest:
+        return self._manifest
+
     @property
     def logger(self) -> logging.Logger:
         return self._logger
@@ -68,11 +94,27 @@ class Context:
     def validate(self):
         if sys.platform != "linux":
             raise Exception("Linux support only")
-        for binary in ["cgcreate", "cgset", "cgdelete", "cgexec", "perf"]:
-            if shutil.which(binary) is None:
-                raise Exception("Command {binary} not found".format(binary=binary))
+        if shutil.which("perf") is None:
+            raise Exception("Command perf not found")
         if not os.path.exists(self._plan_path):
             raise Exception("Plan path {path} does not exist".format(path=self._plan_path))
+        if not self._files and self._store is None:
+            raise Exception("Results must be written to files or to the store")
+
+    def validate_plans(self, plans: List) -> None:
+        # libcgroup is only required by cgroups that are not managed through the native cgroup v2 backend.
+        if all(cgroup.native for plan in plans for cgroup in plan.cgroups):
+            return
+        for binary in ["cgcreate", "cgset", "cgdelete", "cgexec"]:
+            if shutil.which(binary) is None:
+                raise Exception("Command {binary} not found".format(binary=binary))
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+            self._manifest.register(self._store.path)
+        self._manifest.register(Writer.path_for(os.path.join(self._run_path, Logger.FILE_NAME), self._compress))
+        self._manifest.close()
 
     def _prepare(self) -> None:
         if not os.path.isdir(self.work_path):
@@ -2,6 +2,7 @@ import copy
 import itertools
 import os
 import re
+import signal
 import threading
 from typing import Any, List, Dict, Self
 from pymergen.entity.entity import EntityConfig, Entity
@@ -13,6 +14,7 @@ from pymergen.core.context import Context
 from pymergen.core.process import Process
 from pymergen.core.thread import Thread
 from pymergen.core.stat import Stat
+from pymergen.core.aggregator import Aggregator
 from pymergen.controller.group import ControllerGroup
 from pymergen.collector.collector import Collector
 
@@ -25,6 +27,10 @@ class ExecutorContext:
         self._current = None
         self._prefix = None
         self._exclude_from_path = False
+        # Stats of all enclosing executor levels, innermost last
+        self._stats = list(parent.stats) if parent is not None else list()
+        # Commands started under a collecting executor, shared with its collectors
+        self._pids = parent.pids if parent is not None else None
 
     @property
     def parent(self) -> Self:
@@ -50,6 +56,24 @@ class ExecutorContext:
     def exclude_from_path(self) -> bool:
         return self._exclude_from_path
 
+    @property
+    def stats(self) -> List[Stat]:
+        return self._stats
+
+    def add_stat(self, value: Stat) -> None:
+        self._stats.append(value)
+
+    def remove_stat(self, value: Stat) -> None:
+        self._stats.remove(value)
+
+    @property
+    def pids(self) -> Dict[int, str]:
+        return self._pids
+
+    @pids.setter
+    def pids(self, values: Dict[int, str]) -> None:
+        self._pids = values
+
     def id(self) -> str:
         return "{p}{c:03d}".format(p=self._prefix, c=self._current)
 
@@ -161,6 +185,15 @@ class Executor:
 
     # Do NOT cache this logic. Parallel executor requires things to stay independent if we don't want to deal with cloned objects.
     def run_path(self, parent_context: ExecutorContext) -> str:
+        run_path = os.path.join(self.context.run_path, *self._dirs(parent_context))
+        os.makedirs(run_path, exist_ok=True)
+        return run_path
+
+    def node_path(self, parent_context: ExecutorContext) -> str:
+        # Same as the run path relative to the run directory, but without creating it
+        return "/".join(self._dirs(parent_context))
+
+    def _dirs(self, parent_context: ExecutorContext) -> List[str]:
         names = dict()
         while parent_context is not None:
             if parent_context.exclude_from_path is True:
@@ -176,12 +209,68 @@ class Executor:
             dirs.append(entity)
             for name in reversed(names[entity]):
                 dirs.append(name)
-        run_path = os.path.join(self.context.run_path, *dirs)
-        os.makedirs(run_path, exist_ok=True)
-        return run_path
+        return dirs
+
+    def log_stat(self, stat: Stat, context: ExecutorContext, phase: str = Stat.PHASE_TOTAL) -> None:
+        if self.context.files:
+            for path in stat.log(self.run_path(context), phase):
+                self.context.manifest.register(path)
+        if self.context.store is not None:
+            path = self.node_path(context)
+            self.log_node(path, context)
+            self.context.store.stat(path, phase, stat.data())
+
+    def log_node(self, path: str, parent_context: ExecutorContext, command: str = None) -> None:
+        contexts = list()
+        iters = dict()
+        c = parent_context
+        while c is not None:
+            if c.exclude_from_path is False:
+                contexts.insert(0, c.id())
+            if isinstance(c, IteratingExecutorContext) and c.iters is not None:
+                for key, val in c.iters.items():
+                    iters.setdefault(key, val)
+            c = c.parent
+        params = dict()
+        e = self.entity
+        while isinstance(e, Entity):
+            for key, val in e.config.params.items():
+                params.setdefault(key, val)
+            e = e.parent
+        kind = type(self.entity).__name__.replace("Entity", "").lower()
+        self.context.store.node(path, self.entity.name, kind, contexts, command, iters, params)
 
-    def stat(self):
-        return Stat()
+    def stat(self) -> Stat:
+        metrics = None
+        counters = None
+        cgroups = list()
+        e = self.entity
+        # Plans are the root of the entity tree
+        while isinstance(e, Entity):
+            if metrics is None:
+                metrics = e.config.stats
+            if counters is None:
+                counters = e.config.counters
+            if isinstance(e, EntityPlan):
+                cgroups = e.cgroups
+                break
+            e = e.parent
+        return Stat(metrics, counters, cgroups)
+
+    def execute_stat(self, phase: str, target: Any, context: ExecutorContext) -> None:
+        stat = self.stat()
+        # Commands executed in this phase are accounted to the phase stat as well as to the stats of enclosing levels.
+        context.add_stat(stat)
+        stat.start()
+        try:
+            target(context)
+        finally:
+            stat.stop()
+            context.remove_stat(stat)
+            self.log_stat(stat, context, phase)
+
+    def execute_child(self, child: Self, context: ExecutorContext) -> None:
+        self.execute_stat(Stat.PHASE_MAIN, child.execute, context)
 
 
 class ControllingExecutor(Executor):
@@ -210,6 +299,7 @@ class ControllingExecutor(Executor):
 
     def _build(self, parent_context: ExecutorContext):
         for cgroup in self.cgroups:
+            cgroup.create()
             for command in cgroup.builders():
                 context = ControllingExecutorContext(parent_context)
                 context.entity = self.entity
@@ -223,6 +313,7 @@ class ControllingExecutor(Executor):
                 context.entity = self.entity
                 pe = ProcessExecutor(self.context, command)
                 pe.execute(context)
+            cgroup.destroy()
 
 
 class CollectingExecutor(Executor):
@@ -254,25 +345,50 @@ class CollectingExecutor(Executor):
         return self._executors
 
     def execute_main(self, parent_context: ExecutorContext) -> None:
+        # Process IDs of the commands started under this node, by command name
+        pids = dict()
         try:
-            self._start_collectors(parent_context)
+            self._start_collectors(parent_context, pids)
             for child in self.children:
                 context = CollectingExecutorContext(parent_context)
                 context.entity = self.entity
+                context.pids = pids
                 child.execute(context)
         finally:
             self._stop_collectors()
 
-    def _start_collectors(self, parent_context: ExecutorContext):
+    def _start_collectors(self, parent_context: ExecutorContext, pids: Dict[int, str] = None):
         for collector in self.collectors:
             context = CollectingExecutorContext(parent_context)
             context.entity = self.entity
             context.cgroups = self.cgroups
+            context.pids = pids
             collector.start(context)
 
     def _stop_collectors(self):
+        if len(self.collectors) < 2:
+            for collector in self.collectors:
+                collector.stop()
+            return
+        # Collectors are stopped in parallel, so that the stop latency of the node is that of the slowest collector
+        # rather than their sum. All collectors are stopped before the first failure is raised.
+        errors = list()
+        threads = list()
         for collector in self.collectors:
+            threads.append(threading.Thread(target=self._stop_collector, args=[collector, errors]))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if len(errors) > 0:
+            raise errors[0]
+
+    @staticmethod
+    def _stop_collector(collector: Collector, errors: List[Exception]) -> None:
+        try:
             collector.stop()
+        except Exception as e:
+            errors.append(e)
 
 
 class ReplicatingExecutor(Executor):
@@ -284,17 +400,28 @@ class ReplicatingExecutor(Executor):
             context.entity = self.entity
             context.current = r
             stat = self.stat()
+            context.add_stat(stat)
             stat.start()
             try:
-                self.execute_pre(context)
-                for child in self.children:
-                    child.execute(context)
+                if len(self.entity.pre) > 0:
+                    self.execute_stat(Stat.PHASE_PRE, self.execute_pre, context)
+                self.execute_stat(Stat.PHASE_MAIN, self._execute_children, context)
             finally:
                 # Try to perform post / clean up actions
-                self.execute_post(context)
+                if len(self.entity.post) > 0:
+                    self.execute_stat(Stat.PHASE_POST, self.execute_post, context)
             stat.stop()
-            stat.log(self.run_path(context))
+            self.log_stat(stat, context)
             self.context.logger.debug("{n} Finish[replication={r} duration={d}]".format(n=self.entity, r=r, d=stat.timer.duration))
+        if self.entity.config.replication > 0 and self.context.files:
+            # Summaries are rolled up online, lower levels finish (and are summarized) before their parents.
+            for path in Aggregator().aggregate(os.path.dirname(self.run_path(context))):
+                self.context.manifest.register(path)
+
+    def _execute_children(self, context: ExecutorContext) -> None:
+        for child in self.children:
+            child.execute(context)
+
 
 class ConcurrentExecutor(Executor):
 
@@ -345,7 +472,7 @@ class IteratingExecutor(Executor):
                     context.entity = self.entity
                     context.current = i
                     context.iters = iters
-                    child.execute(context)
+                    self.execute_child(child, context)
                     i += 1
         else:
             self.context.logger.debug("{n} Execute[iteration=false]".format(n=self.entity))
@@ -353,7 +480,7 @@ class IteratingExecutor(Executor):
                 context = IteratingExecutorContext(parent_context)
                 context.entity = self.entity
                 context.current = 1
-                child.execute(context)
+                self.execute_child(child, context)
 
     def _iter_vars(self) -> Dict[str, List]:
         iter_vars = dict()
@@ -381,7 +508,7 @@ class ParallelExecutor(Executor):
                     context = ParallelExecutorContext(parent_context)
                     context.entity = self.entity
                     context.current = p
-                    threads.append(threading.Thread(target=child_copy.execute, args=[context]))
+                    threads.append(threading.Thread(target=self.execute_child, args=[child_copy, context]))
                 for thread in threads:
                     thread.start()
                 for thread in threads:
@@ -392,7 +519,7 @@ class ParallelExecutor(Executor):
                 context = ParallelExecutorContext(parent_context)
                 context.entity = self.entity
                 context.current = 1
-                child.execute(context)
+                self.execute_child(child, context)
 
 
 class ProcessExecutor(Executor):
@@ -404,7 +531,36 @@ class ProcessExecutor(Executor):
     def execute_main(self, parent_context: ExecutorContext) -> None:
         self._process = Process(self.context)
         self._process.command = self._command(parent_context)
+        self._process.cgroup = self._native_cgroup(parent_context)
+        self._process.pids = parent_context.pids
+        if len(self._process.command.parsers) > 0 and self.context.files:
+            self._process.run_path = self.run_path(parent_context)
+        if self.context.store is not None:
+            self._process.node = "/".join(filter(None, [self.node_path(parent_context), self.entity.name]))
         self._process.run()
+        if self.context.files:
+            self.context.manifest.register(self._process.log(self.run_path(parent_context)))
+        self._register_outputs(parent_context)
+        if self.context.store is not None:
+            self.log_node(self._process.node, parent_context, self._process.command.cmd)
+            self.context.store.stat(self._process.node, Stat.PHASE_PROCESS, self._process.data())
+        self._account(parent_context)
+
+    def _register_outputs(self, parent_context: ExecutorContext) -> None:
+        # Output files written by the command itself can only be found in the execution directory it was given.
+        for cmd in [self.entity.cmd, self.entity.become_cmd]:
+            if cmd is not None and "{m:context:run_path}" in cmd:
+                self.context.manifest.register_dir(self.run_path(parent_context))
+                return
+
+    def _account(self, parent_context: ExecutorContext) -> None:
+        rusages = [stage.rusage for stage in self._process.stages if stage.rusage is not None]
+        parsed = self._process.metrics
+        for stat in parent_context.stats:
+            stat.count(Stat.COUNTER_COMMANDS)
+            if self._process.return_code != 0:
+                stat.count(Stat.COUNTER_FAILURES)
+            stat.account(rusages, parsed)
 
     def _command(self, parent_context: ExecutorContext) -> EntityCommand:
         command = copy.copy(self.entity)
@@ -431,7 +587,9 @@ class ProcessExecutor(Executor):
         return cmd
 
     def _sub_context(self, cmd: str, parent_context: ExecutorContext) -> str:
-        cmd = re.sub("{m:context:run_path}", self.run_path(parent_context), cmd)
+        # The run path is only created when it is actually referenced.
+        if "{m:context:run_path}" in cmd:
+            cmd = re.sub("{m:context:run_path}", self.run_path(parent_context), cmd)
         cmd = re.sub("{m:context:pid}", str(os.getpid()), cmd)
         cmd = re.sub("{m:context:ppid}", str(os.getppid()), cmd)
         cmd = re.sub("{m:context:pgid}", str(os.getpgid(os.getpid())), cmd)
@@ -470,19 +628,51 @@ class ProcessExecutor(Executor):
             c = c.parent
         return cmd
 
-    def _sub_cgroup(self, cmd: str) -> str:
+    def _cgroups(self) -> List[ControllerGroup]:
+        cgroups = list()
         cgroup_names = self.entity.cgroups
         if len(cgroup_names) > 0:
-            parts = list()
-            cgroups = self.entity.parent.parent.parent.cgroups
+            plan_cgroups = self.entity.parent.parent.parent.cgroups
             for cgroup_name in cgroup_names:
-                for cgroup in cgroups:
+                for cgroup in plan_cgroups:
                     if cgroup.name == cgroup_name:
-                        controllers = [c.name for c in cgroup.controllers]
-                        parts.append("-g {controllers}:{cgroup_name}".format(controllers=",".join(controllers), cgroup_name=cgroup_name))
+                        cgroups.append(cgroup)
                         break
-            if len(parts) == 0:
+            if len(cgroups) == 0:
                 raise Exception("No matching controller group found")
+        return cgroups
+
+    def _native_cgroup(self, parent_context: ExecutorContext) -> str:
+        # Commands are placed into native cgroups at spawn time, without a cgexec fork and exec per command.
+        cgroups = [cgroup for cgroup in self._cgroups() if cgroup.direct]
+        if len(cgroups) == 0:
+            return None
+        if len(cgroups) > 1:
+            raise Exception("Command {n} can only be placed in one native cgroup".format(n=self.entity.name))
+        if cgroups[0].nested:
+            return cgroups[0].leaf(self._leaf(parent_context))
+        return cgroups[0].path
+
+    def _leaf(self, parent_context: ExecutorContext) -> str:
+        # One leaf per case, so that concurrent cases are told apart, and one per parallel instance of the case.
+        # Pre and post commands of the case run in the leaf of the case itself.
+        parts = [self.entity.parent.name]
+        c = parent_context
+        while c is not None:
+            if isinstance(c, ParallelExecutorContext):
+                parts.append(c.id())
+                break
+            c = c.parent
+        return "_".join(parts)
+
+    def _sub_cgroup(self, cmd: str) -> str:
+        parts = list()
+        for cgroup in self._cgroups():
+            if cgroup.direct:
+                continue
+            controllers = [c.name for c in cgroup.controllers]
+            parts.append("-g {controllers}:{cgroup_name}".format(controllers=",".join(controllers), cgroup_name=cgroup.name))
+        if len(parts) > 0:
             cmd = "cgexec {parts} {cmd}".format(parts=" ".join(parts), cmd=cmd)
         return cmd
 
@@ -497,15 +687,27 @@ class AsyncProcessExecutor(ProcessExecutor):
 
     def __init__(self, context: Context, entity: EntityCommand):
         super().__init__(context, entity)
+        self._parent_context = None
 
     def execute_main(self, parent_context: ExecutorContext) -> None:
+        self._parent_context = parent_context
         self._process = Process(self.context)
         self._process.command = self._command(parent_context)
+        self._process.cgroup = self._native_cgroup(parent_context)
+        self._process.pids = parent_context.pids
+        if len(self._process.command.parsers) > 0 and self.context.files:
+            self._process.run_path = self.run_path(parent_context)
+        if self.context.store is not None:
+            self._process.node = "/".join(filter(None, [self.node_path(parent_context), self.entity.name]))
         self._process.start()
 
+    def execute_signal(self, sig: signal.Signals) -> None:
+        self._process.signal(sig)
+
     def execute_stop(self) -> None:
         self._process.signal()
         self._process.wait()
+        self._register_outputs(self._parent_context)
 
 
 class AsyncThreadExecutor(Executor):
@@ -0,0 +1,378 @@
+import os
+import re
+import shlex
+import shutil
+import zlib
+import hashlib
+import subprocess
+import multiprocessing
+import concurrent.futures
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from xml.sax.saxutils import escape
+
+
+class FlamegraphFolder:
+
+    # Sample header of perf script: command, pid[/tid], [cpu], timestamp, period and event
+    PATTERN_HEADER = re.compile(r"^(\S.*?)\s+\d+(?:/\d+)?\s")
+    # Frame of a call chain: address, symbol with offset, and the DSO in parentheses
+    PATTERN_FRAME = re.compile(r"^\s+[0-9a-fA-F]+\s+(.+?)\s+\((.*)\)$")
+    PATTERN_OFFSET = re.compile(r"\+0x[0-9a-fA-F]+$")
+
+    SYMBOL_UNKNOWN = "[unknown]"
+
+    def fold(self, lines: Iterable[str]) -> Dict[str, int]:
+        # Samples are counted per distinct stack, so memory is bound by the number of stacks rather than samples.
+        stacks = dict()
+        comm = None
+        frames = list()
+        for line in lines:
+            line = line.rstrip("\n")
+            if line.strip() == "":
+                if comm is not None:
+                    self._add(stacks, comm, frames)
+                comm = None
+                frames = list()
+                continue
+            if comm is None:
+                match = self.PATTERN_HEADER.match(line)
+                if match is not None:
+                    comm = match.group(1).strip()
+                continue
+            match = self.PATTERN_FRAME.match(line)
+            if match is not None:
+                frames.append(self._frame(match.group(1), match.group(2)))
+        if comm is not None:
+            self._add(stacks, comm, frames)
+        return stacks
+
+    @staticmethod
+    def write(stacks: Dict[str, int], path: str) -> None:
+        with open(path, "w") as fh:
+            for stack, count in sorted(stacks.items()):
+                fh.write("{stack} {count}\n".format(stack=stack, count=count))
+
+    @staticmethod
+    def read(path: str) -> Iterable[Tuple[str, int]]:
+        with open(path, "r") as fh:
+            for line in fh:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack == "":
+                    continue
+                yield stack, int(count)
+
+    def _frame(self, symbol: str, dso: str) -> str:
+        symbol = self.PATTERN_OFFSET.sub("", symbol)
+        if symbol == self.SYMBOL_UNKNOWN:
+            # Frames without symbols are named after their DSO, as stackcollapse-perf does.
+            symbol = "[{dso}]".format(dso=os.path.basename(dso)) if dso not in ["", "unknown"] else symbol
+        return symbol.replace(";", ":")
+
+    @staticmethod
+    def _add(stacks: Dict[str, int], comm: str, frames: List[str]) -> None:
+        # perf script prints the leaf frame first, folded stacks start from the root.
+        stack = ";".join([comm.replace(";", ":")] + list(reversed(frames)))
+        stacks[stack] = stacks.get(stack, 0) + 1
+
+
+class FlamegraphRenderer:
+
+    WIDTH = 1200
+    FRAME_HEIGHT = 16
+    FONT_SIZE = 12
+    FONT_WIDTH = 0.59
+    PAD_TOP = 40
+    PAD_BOTTOM = 10
+    PAD_SIDE = 10
+    # Frames narrower than this are left out, they could not be seen anyway.
+    MIN_WIDTH = 0.1
+
+    def render(self, stacks: Iterable[Tuple[str, int]], path: str, title: str = "Flame Graph", baseline: Iterable[Tuple[str, int]] = None) -> None:
+        root = self._tree(stacks)
+        total = root[0]
+        depth = self._depth(root)
+        height = self.PAD_TOP + self.PAD_BOTTOM + depth * self.FRAME_HEIGHT
+        scale = (self.WIDTH - 2 * self.PAD_SIDE) / total if total > 0 else 0
+        # Differential graphs are drawn with the frames of the profile, colored by the change of their share of
+        # samples against the baseline: red for growth, blue for reduction.
+        base_root = self._tree(baseline) if baseline is not None else None
+        max_delta = self._max_delta(root, base_root) if base_root is not None else 0
+        with open(path, "w") as fh:
+            fh.write('<?xml version="1.0" standalone="no"?>\n')
+            fh.write('<svg version="1.1" width="{w}" height="{h}" viewBox="0 0 {w} {h}" xmlns="http://www.w3.org/2000/svg">\n'.format(w=self.WIDTH, h=height))
+            fh.write('<rect x="0" y="0" width="{w}" height="{h}" fill="#f8f8f8"/>\n'.format(w=self.WIDTH, h=height))
+            fh.write('<text x="{x}" y="24" font-size="17" font-family="Verdana" text-anchor="middle">{title}</text>\n'.format(x=self.WIDTH / 2, title=escape(title)))
+            # Frames are drawn from the root at the bottom, children in alphabetical order like the folded stacks.
+            queue = [("all", root, base_root, 0, self.PAD_SIDE)]
+            while len(queue) > 0:
+                name, node, base_node, level, x = queue.pop()
+                width = node[0] * scale
+                if width < self.MIN_WIDTH:
+                    continue
+                y = height - self.PAD_BOTTOM - (level + 1) * self.FRAME_HEIGHT
+                info = "{name} ({samples} samples, {pct:.2f}%)".format(name=name, samples=node[0], pct=100.0 * node[0] / total)
+                if base_root is None:
+                    fill = self._color(name)
+                else:
+                    delta = self._delta(node, total, base_node, base_root[0])
+                    fill = self._color_delta(delta, max_delta)
+                    info = "{info} {delta:+.2f}%".format(info=info, delta=100.0 * delta)
+                self._frame(fh, name, info, x, y, width, fill)
+                for child_name in sorted(node[1]):
+                    child = node[1][child_name]
+                    base_child = base_node[1].get(child_name) if base_node is not None else None
+                    queue.append((child_name, child, base_child, level + 1, x))
+                    x += child[0] * scale
+            fh.write("</svg>\n")
+
+    def _frame(self, fh: Any, name: str, info: str, x: float, y: float, width: float, fill: str) -> None:
+        fh.write("<g><title>{info}</title>".format(info=escape(info)))
+        fh.write('<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{h}" fill="{fill}" rx="2" ry="2"/>'.format(
+            x=x, y=y, w=width, h=self.FRAME_HEIGHT - 1, fill=fill))
+        chars = int(width / (self.FONT_SIZE * self.FONT_WIDTH))
+        if chars >= 3:
+            text = name if len(name) <= chars else name[:chars - 2] + ".."
+            fh.write('<text x="{x:.1f}" y="{y}" font-size="{s}" font-family="Verdana">{text}</text>'.format(
+                x=x + 3, y=y + self.FRAME_HEIGHT - 4, s=self.FONT_SIZE, text=escape(text)))
+        fh.write("</g>\n")
+
+    @staticmethod
+    def _color(name: str) -> str:
+        # Warm colors derived from the name, so that a function has the same color in every graph.
+        h = zlib.crc32(name.encode())
+        return "rgb({r},{g},{b})".format(r=205 + h % 50, g=(h >> 8) % 230, b=(h >> 16) % 55)
+
+    @staticmethod
+    def _color_delta(delta: float, max_delta: float) -> str:
+        if max_delta == 0 or delta == 0:
+            return "rgb(255,255,255)"
+        v = 255 - int(200 * min(abs(delta) / max_delta, 1.0))
+        if delta > 0:
+            return "rgb(255,{v},{v})".format(v=v)
+        return "rgb({v},{v},255)".format(v=v)
+
+    @staticmethod
+    def _delta(node: List, total: int, base_node: List, base_total: int) -> float:
+        share = node[0] / total if total > 0 else 0.0
+        base_share = base_node[0] / base_total if base_node is not None and base_total > 0 else 0.0
+        return share - base_share
+
+    @staticmethod
+    def _max_delta(root: List, base_root: List) -> float:
+        max_delta = 0.0
+        queue = [(root, base_root)]
+        while len(queue) > 0:
+            node, base_node = queue.pop()
+            max_delta = max(max_delta, abs(FlamegraphRenderer._delta(node, root[0], base_node, base_root[0])))
+            for name, child in node[1].items():
+                queue.append((child, base_node[1].get(name) if base_node is not None else None))
+        return max_delta
+
+    @staticmethod
+    def _tree(stacks: Iterable[Tuple[str, int]]) -> List:
+        # Nodes are [samples, children by name]
+        root = [0, dict()]
+        for stack, count in stacks:
+            root[0] += count
+            node = root
+            for frame in stack.split(";"):
+                node = node[1].setdefault(frame, [0, dict()])
+                node[0] += count
+        return root
+
+    @staticmethod
+    def _depth(root: List) -> int:
+        depth = 0
+        queue = [(root, 1)]
+        while len(queue) > 0:
+            node, level = queue.pop()
+            depth = max(depth, level)
+            queue.extend((child, level + 1) for child in node[1].values())
+        return depth
+
+
+class FlamegraphDiff:
+
+    HEADERS = ["symbol", "baseline_self_pct", "self_pct", "delta_self_pct", "baseline_total_pct", "total_pct", "delta_total_pct"]
+
+    # Node directories of replications, profiles of the same iteration are merged across them.
+    PATTERN_REPLICATION = re.compile(r"^r[0-9]{3}$")
+    PATTERN_ITERATION = re.compile(r"^i[0-9]{3}$")
+
+    def __init__(self, baseline: Dict[str, int], stacks: Dict[str, int]):
+        self._baseline = baseline
+        self._stacks = stacks
+
+    @property
+    def baseline(self) -> Dict[str, int]:
+        return self._baseline
+
+    @property
+    def stacks(self) -> Dict[str, int]:
+        return self._stacks
+
+    @staticmethod
+    def find(path: str) -> Dict[str, List[str]]:
+        # Folded stacks by node path relative to the given directory, without replication directories
+        profiles = dict()
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names.sort()
+            if Flamegraph.FILE_FOLDED not in file_names:
+                continue
+            parts = os.path.relpath(dir_path, path).split(os.sep)
+            key = "/".join(part for part in parts if part != "." and not FlamegraphDiff.PATTERN_REPLICATION.match(part))
+            profiles.setdefault(key, list()).append(os.path.join(dir_path, Flamegraph.FILE_FOLDED))
+        return profiles
+
+    @staticmethod
+    def iterations(key: str) -> Tuple[str, str]:
+        # Node path without its iteration, and the iteration
+        parts = key.split("/")
+        for i, part in enumerate(parts):
+            if FlamegraphDiff.PATTERN_ITERATION.match(part):
+                return "/".join(parts[:i] + parts[i + 1:]), part
+        return key, None
+
+    @staticmethod
+    def merge(paths: List[str]) -> Dict[str, int]:
+        # Files are read one line at a time, only the merged counts of distinct stacks are kept in memory.
+        stacks = dict()
+        for path in paths:
+            for stack, count in FlamegraphFolder.read(path):
+                stacks[stack] = stacks.get(stack, 0) + count
+        return stacks
+
+    @staticmethod
+    def symbols(stacks: Dict[str, int]) -> Tuple[int, Dict[str, List[int]]]:
+        # Samples per symbol: [self, total], where a symbol is counted once per stack for its total.
+        samples = 0
+        symbols = dict()
+        for stack, count in stacks.items():
+            samples += count
+            frames = stack.split(";")
+            for frame in set(frames):
+                symbols.setdefault(frame, [0, 0])[1] += count
+            symbols[frames[-1]][0] += count
+        return samples, symbols
+
+    def table(self) -> List[List]:
+        # Shares of samples are compared rather than counts, so that profiles of different lengths are comparable.
+        # Rows are ranked by the growth of the self time of symbols, regressions first.
+        base_samples, base_symbols = self.symbols(self._baseline)
+        samples, symbols = self.symbols(self._stacks)
+        rows = list()
+        for symbol in set(base_symbols) | set(symbols):
+            base_self, base_total = [100.0 * v / base_samples if base_samples > 0 else 0.0 for v in base_symbols.get(symbol, [0, 0])]
+            self_pct, total_pct = [100.0 * v / samples if samples > 0 else 0.0 for v in symbols.get(symbol, [0, 0])]
+            rows.append([symbol, base_self, self_pct, self_pct - base_self, base_total, total_pct, total_pct - base_total])
+        rows.sort(key=lambda row: (-row[3], -row[6], row[0]))
+        return rows
+
+    def write_table(self, path: str) -> None:
+        with open(path, "w") as fh:
+            fh.write("\t".join(self.HEADERS) + "\n")
+            for row in self.table():
+                fh.write("\t".join([row[0]] + ["{v:.4f}".format(v=v) for v in row[1:]]) + "\n")
+
+    def render(self, path: str, title: str = "Differential Flame Graph") -> None:
+        FlamegraphRenderer().render(self._stacks.items(), path, title, baseline=self._baseline.items())
+
+
+class Flamegraph:
+
+    FILE_FOLDED = "collector.perf_profile.folded"
+    FILE_SVG = "collector.perf_profile.svg"
+
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    @staticmethod
+    def digest(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(Flamegraph.HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def generate(data_path: str, cache_path: str, become_cmd: str = None) -> List[str]:
+        # Runs in a worker process. Results are cached by the content of the data file, so that identical profiles
+        # (and runs processed again) are converted only once.
+        os.makedirs(cache_path, exist_ok=True)
+        digest = Flamegraph.digest(data_path)
+        folded_cache_path = os.path.join(cache_path, "{digest}.folded".format(digest=digest))
+        svg_cache_path = os.path.join(cache_path, "{digest}.svg".format(digest=digest))
+        if not os.path.exists(folded_cache_path):
+            stacks = Flamegraph._script(data_path, become_cmd)
+            # Files are renamed into place, concurrent workers never see a partial cache entry.
+            FlamegraphFolder.write(stacks, folded_cache_path + ".tmp")
+            os.replace(folded_cache_path + ".tmp", folded_cache_path)
+        if not os.path.exists(svg_cache_path):
+            FlamegraphRenderer().render(FlamegraphFolder.read(folded_cache_path), svg_cache_path + ".tmp")
+            os.replace(svg_cache_path + ".tmp", svg_cache_path)
+        paths = list()
+        for cached_path, file_name in [(folded_cache_path, Flamegraph.FILE_FOLDED), (svg_cache_path, Flamegraph.FILE_SVG)]:
+            path = os.path.join(os.path.dirname(data_path), file_name)
+            shutil.copyfile(cached_path, path)
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _script(data_path: str, become_cmd: str = None) -> Dict[str, int]:
+        cmd = ["perf", "script", "-f", "-i", data_path]
+        if become_cmd is not None:
+            cmd = shlex.split(become_cmd) + cmd
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace")
+        try:
+            stacks = FlamegraphFolder().fold(process.stdout)
+        finally:
+            process.stdout.close()
+            return_code = process.wait()
+        if return_code != 0:
+            raise Exception("Unable to read {path} with perf script: return code {code}".format(path=data_path, code=return_code))
+        return stacks
+
+
+class FlamegraphPool:
+
+    DEFAULT_WORKERS = 2
+
+    def __init__(self, cache_path: str = None, workers: int = DEFAULT_WORKERS, become_cmd: str = None):
+        self._cache_path = cache_path
+        self._workers = workers
+        self._become_cmd = become_cmd
+        self._executor = None
+        self._futures = list()
+
+    @property
+    def cache_path(self) -> str:
+        return self._cache_path
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def submit(self, data_path: str, callback: Callable[[List[str]], None] = None) -> concurrent.futures.Future:
+        return self.call(Flamegraph.generate, (data_path, self._cache_path, self._become_cmd), callback)
+
+    def call(self, fn: Callable, args: Tuple, callback: Callable[[Any], None] = None) -> concurrent.futures.Future:
+        # Other post-processing of perf data shares the pool, fn and its arguments are pickled into the workers.
+        if self._executor is None:
+            # Workers are spawned rather than forked, as the runner has collector threads of its own.
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers, mp_context=multiprocessing.get_context("spawn"))
+        future = self._executor.submit(fn, *args)
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.result()) if f.exception() is None else None)
+        self._futures.append(future)
+        return future
+
+    def close(self) -> List[Exception]:
+        errors = list()
+        if self._executor is None:
+            return errors
+        for future in self._futures:
+            if future.exception() is not None:
+                errors.append(future.exception())
+        self._executor.shutdown()
+        self._executor = None
+        self._futures = list()
+        return errors
@@ -1,9 +1,24 @@
 import os
 import logging
+from pymergen.core.writer import Writer
+
+
+class LoggerStreamHandler(logging.StreamHandler):
+
+    def close(self) -> None:
+        # Unlike FileHandler, StreamHandler leaves its stream open. The compressing writer must be closed to
+        # finalize its stream.
+        try:
+            self.flush()
+            self.stream.close()
+        finally:
+            super().close()
 
 
 class Logger:
 
+    FILE_NAME = "run.runner.log"
+
     _logger = None
 
     @classmethod
@@ -18,7 +33,11 @@ class Logger:
         stream_handler.setLevel(context.log_level)
         stream_handler.setFormatter(formatter)
 
-        file_handler = logging.FileHandler(os.path.join(context.run_path, "run.runner.log"))
+        log_file_path = os.path.join(context.run_path, cls.FILE_NAME)
+        if context.compress is not None:
+            file_handler = LoggerStreamHandler(Writer.open(log_file_path, context.compress))
+        else:
+            file_handler = logging.FileHandler(log_file_path)
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
 
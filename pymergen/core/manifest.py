@@ -0,0 +1,66 @@
+import os
+import json
+import threading
+from typing import List
+
+
+class Manifest:
+
+    FILE_NAME = "run.manifest.jsonl"
+
+    def __init__(self, run_path: str):
+        self._run_path = os.path.abspath(run_path)
+        self._path = os.path.join(self._run_path, self.FILE_NAME)
+        self._files = set()
+        self._fh = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def run_path(self) -> str:
+        return self._run_path
+
+    def register(self, path: str) -> None:
+        # Paths are recorded relative to the run directory so that moved or copied runs remain readable.
+        path = os.path.relpath(os.path.abspath(path), self._run_path)
+        with self._lock:
+            if path in self._files:
+                return
+            self._files.add(path)
+            if self._fh is None:
+                self._fh = open(self._path, "a")
+            self._fh.write("{data}\n".format(data=json.dumps({"path": path})))
+            self._fh.flush()
+
+    def register_dir(self, path: str) -> None:
+        # Files created by commands themselves are unknown, a single directory listing is still much cheaper than a
+        # recursive glob of the run directory.
+        for entry in os.scandir(path):
+            if entry.is_file():
+                self.register(entry.path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    @staticmethod
+    def read(run_path: str) -> List[str]:
+        run_path = os.path.abspath(run_path)
+        files = dict()
+        try:
+            with open(os.path.join(run_path, Manifest.FILE_NAME), "r") as fh:
+                for line in fh:
+                    try:
+                        path = json.loads(line)["path"]
+                    except (ValueError, KeyError):
+                        # The last record may be incomplete if the run was interrupted.
+                        continue
+                    files[os.path.join(run_path, path)] = True
+        except FileNotFoundError:
+            return list()
+        return list(files)
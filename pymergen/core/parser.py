@@ -14,6 +14,7 @@ from pymergen.core.context import Context
 from pymergen.controller.factory import ControllerFactory
 from pymergen.controller.group import ControllerGroup
 from pymergen.collector.collector import Collector
+from pymergen.parser.parser import OutputParser
 
 
 class Parser:
@@ -59,6 +60,8 @@ class Parser:
         plan.config.replication = config.get("replication", 1)
         plan.config.params = config.get("params", dict())
         plan.config.iters = config.get("iters", dict())
+        plan.config.stats = config.get("stats", None)
+        plan.config.counters = config.get("counters", None)
         plan.pre = self._parse_commands(data.get("pre", []))
         plan.post = self._parse_commands(data.get("post", []))
         plan.cgroups = self._parse_cgroups(data.get("cgroups", []))
@@ -81,6 +84,8 @@ class Parser:
         suite.config.concurrency = config.get("concurrency", False)
         suite.config.params = config.get("params", dict())
         suite.config.iters = config.get("iters", dict())
+        suite.config.stats = config.get("stats", None)
+        suite.config.counters = config.get("counters", None)
         suite.pre = self._parse_commands(data.get("pre", []))
         suite.post = self._parse_commands(data.get("post", []))
         for c in data["cases"]:
@@ -101,6 +106,8 @@ class Parser:
         case.config.parallelism = config.get("parallelism", 1)
         case.config.params = config.get("params", dict())
         case.config.iters = config.get("iters", dict())
+        case.config.stats = config.get("stats", None)
+        case.config.counters = config.get("counters", None)
         case.pre = self._parse_commands(data.get("pre", []))
         case.post = self._parse_commands(data.get("post", []))
         case.commands = self._parse_commands(data.get("commands", []))
@@ -120,9 +127,12 @@ class Parser:
             command.timeout = item.get("timeout", None)
             command.pipe_stdout = item.get("pipe_stdout", None)
             command.pipe_stderr = item.get("pipe_stderr", None)
+            command.compress = item.get("compress", None)
             command.debug_stdout = item.get("debug_stdout", False)
             command.debug_stderr = item.get("debug_stderr", False)
+            command.meter_pipes = item.get("meter_pipes", False)
             command.cgroups = item.get("cgroups", list())
+            command.parsers = self._parse_parsers(item.get("parsers", list()))
             commands.append(command)
         return commands
 
@@ -131,6 +141,8 @@ class Parser:
         for item in data:
             cgroup = ControllerGroup(item.get("name"))
             cgroup.become_cmd = item.get("become_cmd", None)
+            cgroup.backend = item.get("backend", ControllerGroup.BACKEND_AUTO)
+            cgroup.nested = item.get("nested", False)
             for c in item.get("controllers"):
                 controller = ControllerFactory.instance(c.get("name"))
                 for limit in c.get("limits", {}):
@@ -148,6 +160,15 @@ class Parser:
             collectors.append(collector)
         return collectors
 
+    def _parse_parsers(self, data: List) -> List[OutputParser]:
+        parsers = list()
+        for item in data:
+            parser_plugin = self.context.plugin_manager.get_parser_plugin(item.get("engine"))
+            parser = parser_plugin.implementation(item)
+            parser.context = self.context
+            parsers.append(parser)
+        return parsers
+
     def _init_validator(self) -> None:
         try:
             importlib.import_module("cerberus")
@@ -172,6 +193,9 @@ class Parser:
         for plugin in self.context.plugin_manager.get_collector_plugins().values():
             plugin_schema = plugin.schema(version)
             collector_schemas.append(plugin_schema)
+        # Add parser schemas
+        parser_schemas = [plugin.schema(version) for plugin in self.context.plugin_manager.get_parser_plugins().values()]
+        self._set_parser_schemas(schema, parser_schemas)
         # Validate document with schema
         self._validator.validate(document, schema)
         if self._validator.errors:
@@ -182,6 +206,18 @@ class Parser:
                 error=pprint.pformat(self._validator.errors)
             ))
 
+    def _set_parser_schemas(self, schema: Any, parser_schemas: List[Dict]) -> None:
+        # Command schemas are included at every entity level, so each copy needs its own parser schemas.
+        if isinstance(schema, dict):
+            for key, value in schema.items():
+                if key == "parsers" and isinstance(value, dict) and "anyof" in value.get("schema", dict()):
+                    value["schema"]["anyof"] = list(parser_schemas)
+                else:
+                    self._set_parser_schemas(value, parser_schemas)
+        if isinstance(schema, list):
+            for item in schema:
+                self._set_parser_schemas(item, parser_schemas)
+
     def _load_yaml(self, path: str) -> Dict:
         with open(path, "r") as f:
             data = yaml.safe_load(f)
@@ -1,11 +1,242 @@
+import io
+import os
+import json
 import itertools
 import subprocess
 import shlex
+import select
 import signal
 import threading
 import time
+from typing import Any, List, Dict, Union
 from pymergen.core.context import Context
+from pymergen.core.writer import Writer
 from pymergen.entity.command import EntityCommand
+from pymergen.parser.parser import OutputParser, OutputParserMetricWriter
+
+
+class ProcessStage:
+
+    RUSAGE_FIELDS = ["ru_utime", "ru_stime", "ru_maxrss", "ru_minflt", "ru_majflt", "ru_inblock", "ru_oublock", "ru_nvcsw", "ru_nivcsw"]
+
+    def __init__(self, index: int, cmd: Union[str, List[str]], popen: subprocess.Popen):
+        self._index = index
+        self._cmd = cmd
+        self._popen = popen
+        self._started_at = time.time()
+        self._started_ns = time.monotonic_ns()
+        self._exited_at = None
+        self._exited_ns = None
+        self._return_code = None
+        self._rusage = None
+        self._reaper = None
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def popen(self) -> subprocess.Popen:
+        return self._popen
+
+    @property
+    def return_code(self) -> int:
+        if self._return_code is None:
+            return self._popen.returncode
+        return self._return_code
+
+    @property
+    def rusage(self) -> Any:
+        return self._rusage
+
+    @property
+    def duration(self) -> float:
+        if self._exited_ns is None:
+            return None
+        return (self._exited_ns - self._started_ns) / 1e9
+
+    def start(self) -> None:
+        self._reaper = threading.Thread(name="reaper_{pid}".format(pid=self._popen.pid), target=self.reap, daemon=True)
+        self._reaper.start()
+
+    def reap(self) -> None:
+        # Popen keeps the exit status to itself, so the stage reaps its child with wait4() to also get the resource
+        # usage. The reaper holds the Popen wait lock (present in every supported CPython release) while it blocks, so
+        # Popen.wait() blocks until the exit status is published and Popen.poll() reports a running child, instead of
+        # racing this thread for the exit status and misreading ECHILD as a zero return code.
+        lock = getattr(self._popen, "_waitpid_lock", None)
+        if lock is None:
+            # Leave reaping to Popen, the stage is then reported without resource usage.
+            return
+        with lock:
+            if self._popen.returncode is not None:
+                return
+            try:
+                pid, status, rusage = os.wait4(self._popen.pid, 0)
+            except ChildProcessError:
+                return
+            self._exited_ns = time.monotonic_ns()
+            self._exited_at = time.time()
+            self._rusage = rusage
+            self._return_code = os.waitstatus_to_exitcode(status)
+            self._popen.returncode = self._return_code
+
+    def kill(self) -> None:
+        if self._popen.returncode is not None:
+            return
+        try:
+            self._popen.kill()
+        except ProcessLookupError:
+            pass
+
+    def join(self, timeout: float = None) -> None:
+        if self._reaper is not None:
+            self._reaper.join(timeout)
+
+    def data(self) -> Dict:
+        rusage = None
+        if self._rusage is not None:
+            rusage = {field: getattr(self._rusage, field) for field in self.RUSAGE_FIELDS}
+        return {
+            "index": self._index,
+            "cmd": self._cmd,
+            "pid": self._popen.pid,
+            "started_at": self._started_at,
+            "exited_at": self._exited_at,
+            "duration": self.duration,
+            "return_code": self.return_code,
+            "rusage": rusage,
+        }
+
+
+class ProcessPipe:
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, source: ProcessStage, target: ProcessStage):
+        self._source = source
+        self._target = target
+        # Take ownership of both pipe ends, so that Popen.communicate() on the target does not close its stdin.
+        self._src = source.popen.stdout
+        self._dst = target.popen.stdin
+        source.popen.stdout = None
+        target.popen.stdin = None
+        self._bytes = 0
+        self._started_ns = None
+        self._finished_ns = None
+        self._thread = None
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def duration(self) -> float:
+        if self._started_ns is None or self._finished_ns is None:
+            return None
+        return (self._finished_ns - self._started_ns) / 1e9
+
+    def start(self) -> None:
+        self._thread = threading.Thread(name="pipe_{s}_{t}".format(s=self._source.index, t=self._target.index), target=self.pump, daemon=True)
+        self._thread.start()
+
+    def pump(self) -> None:
+        self._started_ns = time.monotonic_ns()
+        src = self._src
+        dst = self._dst
+        try:
+            while True:
+                if hasattr(os, "splice"):
+                    n = os.splice(src.fileno(), dst.fileno(), self.CHUNK_SIZE)
+                else:
+                    chunk = os.read(src.fileno(), self.CHUNK_SIZE)
+                    n = len(chunk)
+                    if n > 0:
+                        os.write(dst.fileno(), chunk)
+                if n == 0:
+                    break
+                self._bytes += n
+        except BrokenPipeError:
+            # Consumer exited early. Closing the source below lets the producer receive SIGPIPE as it would without
+            # the harness interposing.
+            pass
+        finally:
+            self._finished_ns = time.monotonic_ns()
+            src.close()
+            try:
+                dst.close()
+            except BrokenPipeError:
+                pass
+
+    def join(self, timeout: float = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def data(self) -> Dict:
+        duration = self.duration
+        throughput = None
+        if duration:
+            throughput = self._bytes / duration
+        return {
+            "source": self._source.index,
+            "target": self._target.index,
+            "bytes": self._bytes,
+            "duration": duration,
+            "throughput": throughput,
+        }
+
+
+class ProcessOutput:
+
+    CHUNK_SIZE = 65536
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, name: str, stream: Any, sinks: List[Any]):
+        self._name = name
+        self._stream = stream
+        self._sinks = sinks
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def sinks(self) -> List[Any]:
+        return self._sinks
+
+    def start(self) -> None:
+        self._thread = threading.Thread(name="output_{name}".format(name=self._name), target=self.pump, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def pump(self) -> None:
+        fd = self._stream.fileno()
+        try:
+            while True:
+                # A stopped pump only drains what is already buffered (at most one pipe buffer). Descendants of a
+                # killed command may keep the pipe open and written indefinitely.
+                stopped = self._stopped.is_set()
+                readable, _, _ = select.select([fd], [], [], 0 if stopped else self.POLL_INTERVAL)
+                if len(readable) == 0:
+                    if stopped:
+                        break
+                    continue
+                chunk = os.read(fd, self.CHUNK_SIZE)
+                if len(chunk) == 0:
+                    break
+                for sink in self._sinks:
+                    sink.write(chunk)
+                if stopped:
+                    break
+        finally:
+            self._stream.close()
+
+    def join(self, timeout: float = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
 
 
 class Process:
@@ -16,11 +247,54 @@ class Process:
         self._process = None
         self._stdout = None
         self._stderr = None
+        self._stages = list()
+        self._pipes = list()
+        self._outputs = list()
+        self._run_path = None
+        self._node = None
+        self._parsers = list()
+        self._metric_writer = None
+        self._captures = dict()
+        self._cgroup = None
+        self._cgroup_fd = None
+        self._pids = None
 
     @property
     def context(self) -> Context:
         return self._context
 
+    @property
+    def run_path(self) -> str:
+        return self._run_path
+
+    @run_path.setter
+    def run_path(self, value: str) -> None:
+        self._run_path = value
+
+    @property
+    def node(self) -> str:
+        return self._node
+
+    @node.setter
+    def node(self, value: str) -> None:
+        self._node = value
+
+    @property
+    def cgroup(self) -> str:
+        return self._cgroup
+
+    @cgroup.setter
+    def cgroup(self, value: str) -> None:
+        self._cgroup = value
+
+    @property
+    def pids(self) -> Dict[int, str]:
+        return self._pids
+
+    @pids.setter
+    def pids(self, values: Dict[int, str]) -> None:
+        self._pids = values
+
     @property
     def command(self) -> EntityCommand:
         return self._command
@@ -29,6 +303,26 @@ class Process:
     def command(self, command: EntityCommand):
         self._command = command
 
+    @property
+    def return_code(self) -> int:
+        if self._process is None:
+            return None
+        return self._process.returncode
+
+    @property
+    def metrics(self) -> Dict[str, float]:
+        if self._metric_writer is None:
+            return dict()
+        return self._metric_writer.totals
+
+    @property
+    def stages(self) -> List[ProcessStage]:
+        return self._stages
+
+    @property
+    def pipes(self) -> List[ProcessPipe]:
+        return self._pipes
+
     def run(self) -> None:
         self.start()
         self.wait()
@@ -36,11 +330,21 @@ class Process:
     def start(self) -> None:
         try:
             self.context.logger.debug("{n} Execute[{cmd}]".format(n=self._command, cmd=self._command.cmd))
+            self._init_parsers()
             if self._command.pipe_stdout:
-                self._stdout = open(self._command.pipe_stdout, "w")
+                self._stdout = Writer.open(self._command.pipe_stdout, self._command.compress, self._mode(OutputParser.STREAM_STDOUT))
+                self.context.manifest.register(Writer.path_for(self._command.pipe_stdout, self._command.compress))
             if self._command.pipe_stderr:
-                self._stderr = open(self._command.pipe_stderr, "w")
-            self._process = self._popen()
+                self._stderr = Writer.open(self._command.pipe_stderr, self._command.compress, self._mode(OutputParser.STREAM_STDERR))
+                self.context.manifest.register(Writer.path_for(self._command.pipe_stderr, self._command.compress))
+            if self._cgroup is not None:
+                self._cgroup_fd = os.open(os.path.join(self._cgroup, "cgroup.procs"), os.O_WRONLY)
+            try:
+                self._process = self._popen()
+            finally:
+                if self._cgroup_fd is not None:
+                    os.close(self._cgroup_fd)
+                    self._cgroup_fd = None
             if self._command.run_time > 0:
                 self._timer()
         except Exception as e:
@@ -66,8 +370,14 @@ class Process:
         if self._process is None:
             self.context.logger.error("No process to wait for {n}".format(n=self._command))
             return
+        killed = False
         try:
             stdout, stderr = self._process.communicate(timeout=self._command.timeout)
+            if len(self._captures) > 0:
+                # Streams consumed by parsers are captured by the output pumps instead of communicate.
+                self._join_outputs(self._command.timeout)
+                stdout = self._capture(OutputParser.STREAM_STDOUT, stdout)
+                stderr = self._capture(OutputParser.STREAM_STDERR, stderr)
             if self._command.debug_stdout:
                 if self._command.pipe_stdout:
                     self.context.logger.warning("No debugging output will be captured when stdout is piped")
@@ -79,17 +389,21 @@ class Process:
             self.context.logger.debug("{n} Return[return_code={r}]".format(n=self._command, r=self._process.returncode))
         except subprocess.TimeoutExpired as e:
             self.context.logger.error("Timeout expiration for {n}".format(n=self._command))
-            if self._process:
-                self._process.kill()
+            killed = True
+            self._kill()
             if self._command.raise_error:
                 raise e
         except Exception as e:
             self.context.logger.error("Failed to wait for {n} due to {e}".format(n=self._command, e=e))
-            if self._process:
-                self._process.kill()
+            killed = True
+            self._kill()
             if self._command.raise_error:
                 raise e
         finally:
+            # Killed stages are joined as well so that their exit status and resource usage are still recorded.
+            self._join_stages()
+            self._join_outputs(0 if killed else self._command.timeout)
+            self._close_parsers()
             if self._stdout:
                 self._stdout.close()
             if self._stderr:
@@ -99,17 +413,19 @@ class Process:
         stdout = subprocess.PIPE
         stderr = subprocess.PIPE
         if self._command.shell is True:
-            if self._stdout:
-                stdout = self._stdout
-            if self._stderr:
-                stderr = self._stderr
-            return subprocess.Popen(self._command.cmd,
-                                    shell=True,
-                                    executable=self._command.shell_executable,
-                                    stdin=None,
-                                    stdout=stdout,
-                                    stderr=stderr
-                                    )
+            stdout = self._target(self._stdout, OutputParser.STREAM_STDOUT)
+            stderr = self._target(self._stderr, OutputParser.STREAM_STDERR)
+            s_curr = subprocess.Popen(self._command.cmd,
+                                      shell=True,
+                                      executable=self._command.shell_executable,
+                                      stdin=None,
+                                      stdout=stdout,
+                                      stderr=stderr,
+                                      preexec_fn=self._preexec()
+                                      )
+            self._add_stage(self._command.cmd, s_curr)
+            self._add_outputs(s_curr)
+            return s_curr
         # shell is False
         # create a list of sub commands by splitting the full command by the pipe character
         cmd_parts = shlex.split(self._command.cmd)
@@ -121,27 +437,163 @@ class Process:
         s_curr = None
         s_prev = None
         total_cmds = len(sub_cmds)
+        # Interposing between stages lets the harness count the bytes moving through each pipe.
+        meter_pipes = self._command.meter_pipes and total_cmds > 1
         for i, sub_cmd in enumerate(sub_cmds):
             s_curr_stdin = None
             if s_prev is not None:
-                s_curr_stdin = s_prev.stdout
+                s_curr_stdin = subprocess.PIPE if meter_pipes else s_prev.stdout
             is_last_command = (i == total_cmds - 1)
-            if is_last_command and self._stdout:
-                stdout = self._stdout
-            if is_last_command and self._stderr:
-                stderr = self._stderr
+            if is_last_command:
+                stdout = self._target(self._stdout, OutputParser.STREAM_STDOUT)
+                stderr = self._target(self._stderr, OutputParser.STREAM_STDERR)
             s_curr = subprocess.Popen(sub_cmd,
                                       shell=False,
                                       executable=self._command.shell_executable,
                                       stdin=s_curr_stdin,
                                       stdout=stdout,
-                                      stderr=stderr
+                                      stderr=stderr,
+                                      preexec_fn=self._preexec()
                                       )
+            self._add_stage(sub_cmd, s_curr)
             if s_prev is not None:
-                s_prev.stdout.close()
+                if meter_pipes:
+                    pipe = ProcessPipe(self._stages[-2], self._stages[-1])
+                    pipe.start()
+                    self._pipes.append(pipe)
+                else:
+                    s_prev.stdout.close()
             s_prev = s_curr
+        self._add_outputs(s_curr)
         return s_curr
 
+    def _preexec(self) -> Any:
+        if self._cgroup_fd is None:
+            return None
+        fd = self._cgroup_fd
+
+        # Runs in the forked child before exec: writing 0 to cgroup.procs moves the writing process itself, so the
+        # command starts in its cgroup. Only a single system call is made, as the child of a threaded parent must not
+        # take any lock.
+        def preexec() -> None:
+            os.write(fd, b"0")
+        return preexec
+
+    def _init_parsers(self) -> None:
+        if len(self._command.parsers) == 0:
+            return
+        path = None
+        if self.context.files:
+            path = self._run_path if self._run_path is not None else self.context.run_path
+        self._metric_writer = OutputParserMetricWriter(path)
+        self._metric_writer.store = self.context.store
+        self._metric_writer.manifest = self.context.manifest
+        self._metric_writer.node = self._node
+        for parser in self._command.parsers:
+            parser = parser.instance()
+            parser.command = self._command.name
+            parser.writer = self._metric_writer
+            self._parsers.append(parser)
+
+    def _stream_parsers(self, stream: str) -> List[OutputParser]:
+        return [parser for parser in self._parsers if parser.stream == stream]
+
+    def _mode(self, stream: str) -> str:
+        # Output pumps feeding parsers write raw bytes to the pipe file.
+        if len(self._stream_parsers(stream)) > 0:
+            return "wb"
+        return "w"
+
+    def _target(self, fh: Any, stream: str) -> Any:
+        # Compressing writers and parsers are fed through a pipe by an output pump instead of handing a descriptor
+        # to the child.
+        if isinstance(fh, Writer) or len(self._stream_parsers(stream)) > 0:
+            return subprocess.PIPE
+        if fh:
+            return fh
+        return subprocess.PIPE
+
+    def _add_outputs(self, popen: subprocess.Popen) -> None:
+        if self._pumped(self._stdout, OutputParser.STREAM_STDOUT):
+            output = ProcessOutput(OutputParser.STREAM_STDOUT, popen.stdout, self._sinks(self._stdout, OutputParser.STREAM_STDOUT))
+            popen.stdout = None
+            output.start()
+            self._outputs.append(output)
+        if self._pumped(self._stderr, OutputParser.STREAM_STDERR):
+            output = ProcessOutput(OutputParser.STREAM_STDERR, popen.stderr, self._sinks(self._stderr, OutputParser.STREAM_STDERR))
+            popen.stderr = None
+            output.start()
+            self._outputs.append(output)
+
+    def _pumped(self, fh: Any, stream: str) -> bool:
+        return isinstance(fh, Writer) or len(self._stream_parsers(stream)) > 0
+
+    def _sinks(self, fh: Any, stream: str) -> List[Any]:
+        sinks = list(self._stream_parsers(stream))
+        if fh:
+            sinks.append(fh)
+        else:
+            capture = io.BytesIO()
+            self._captures[stream] = capture
+            sinks.append(capture)
+        return sinks
+
+    def _capture(self, stream: str, data: Any) -> Any:
+        if stream in self._captures:
+            return self._captures[stream].getvalue()
+        return data
+
+    def _join_outputs(self, timeout: float = None) -> None:
+        # The command timeout also bounds the output pumps, a pump left behind by a lingering descendant is stopped.
+        for output in self._outputs:
+            output.join(timeout)
+            if output.is_alive():
+                output.stop()
+                output.join()
+
+    def _close_parsers(self) -> None:
+        for parser in self._parsers:
+            parser.close()
+        if self._metric_writer is not None:
+            self._metric_writer.close()
+
+    def _add_stage(self, cmd: Union[str, List[str]], popen: subprocess.Popen) -> None:
+        stage = ProcessStage(len(self._stages), cmd, popen)
+        stage.start()
+        self._stages.append(stage)
+        if self._pids is not None:
+            # Collectors follow the stages of the command and their descendants from the moment they are spawned.
+            self._pids[popen.pid] = self._command.name
+
+    def _kill(self) -> None:
+        # Killing only the last stage would leave the upstream stages of a pipeline running.
+        for stage in self._stages:
+            if stage.popen is not self._process:
+                stage.kill()
+        if self._process:
+            self._process.kill()
+
+    def _join_stages(self) -> None:
+        for pipe in self._pipes:
+            pipe.join(self._command.timeout)
+        for stage in self._stages:
+            stage.join(self._command.timeout)
+
+    def data(self) -> Dict:
+        return {
+            "command": self._command.name,
+            "stages": [stage.data() for stage in self._stages],
+            "pipes": [pipe.data() for pipe in self._pipes],
+        }
+
+    def log(self, path: str) -> str:
+        data = self.data()
+        log_file_path = os.path.join(path, "stat.process_{name}.json".format(name=self._command.name))
+        with open(log_file_path, "w") as fh:
+            fh.write("{data}\n".format(data=json.dumps(data)))
+            fh.flush()
+        return log_file_path
+
     def _timer(self) -> None:
         self.context.logger.debug(
             "{n} Timer[run_time={run_time}]".format(n=self._command, run_time=self._command.run_time))
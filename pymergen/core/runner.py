@@ -1,11 +1,10 @@
-import os
-import glob
 import json
 from pathlib import Path
 from typing import List, Dict
 from collections import defaultdict
 from pymergen.entity.plan import EntityPlan
 from pymergen.core.context import Context
+from pymergen.core.manifest import Manifest
 from pymergen.core.executor import ControllingExecutor
 from pymergen.core.executor import CollectingExecutor
 from pymergen.core.executor import ReplicatingExecutor
@@ -63,7 +62,11 @@ class Runner:
                     case_re = ReplicatingExecutor(self.context, case)
                     case_re.add_child(case_ie)
                     suite_cce.add_child(case_re)
-            plan_cne.execute(None)
+            try:
+                plan_cne.execute(None)
+            finally:
+                for collector in plan.collectors:
+                    collector.close()
 
     def report(self, options: Dict) -> None:
         report = dict()
@@ -74,12 +77,10 @@ class Runner:
 
     def _report_files(self) -> Dict:
         report = defaultdict(lambda: defaultdict(list))
-        run_path = os.path.abspath(self.context.run_path)
-        files = glob.glob("{run_path}/**/*".format(run_path=run_path), recursive=True)
-        for file in files:
-            if os.path.isfile(file):
-                file_name = Path(file).stem
-                file_name_parts = file_name.split(".")
-                file_name_category = file_name_parts[0]
-                report[file_name_category][file_name].append(file)
+        # Files are registered in the manifest as they are created, the run directory is never scanned.
+        for file in Manifest.read(self.context.run_path):
+            file_name = Path(file).stem
+            file_name_parts = file_name.split(".")
+            file_name_category = file_name_parts[0]
+            report[file_name_category][file_name].append(file)
         return report
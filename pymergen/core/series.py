@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import array
+import gzip
+import lzma
+import struct
+import importlib
+from typing import Any, Dict, List, TextIO, Union
+from pymergen.core.writer import Writer
+
+
+class SeriesWriter:
+
+    MAGIC = b"PMSERIES1\n"
+
+    BLOCK_SCHEMA = b"S"
+    BLOCK_CHUNK = b"C"
+    BLOCK_HEADER = struct.Struct("<cII")
+
+    TYPE_INT = "q"
+    TYPE_FLOAT = "d"
+
+    HEADER_TIMESTAMP = "timestamp_ns"
+
+    # Pending rows are written as one chunk once they reach either threshold.
+    CHUNK_SIZE = 65536
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path: str, compress: str = None, chunk_size: int = CHUNK_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self._path = Writer.path_for(path, compress)
+        self._compress = compress
+        self._chunk_size = chunk_size
+        self._flush_interval = flush_interval
+        self._fh = None
+        self._columns = None
+        self._types = None
+        self._timestamps = None
+        self._values = None
+        self._last_ns = 0
+        self._flushed_at = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def columns(self) -> List[str]:
+        return self._columns
+
+    @property
+    def types(self) -> str:
+        return self._types
+
+    @staticmethod
+    def types_for(values: List[Any]) -> str:
+        # Columns are fixed-width 64-bit. Values that are not integers, including the rare non-numeric tokens of a
+        # stat file, are stored as floats (non-numeric ones as NaN).
+        return "".join(SeriesWriter.TYPE_INT if isinstance(value, int) and not isinstance(value, bool) else SeriesWriter.TYPE_FLOAT for value in values)
+
+    def schema(self, columns: List[str], types: str) -> None:
+        if len(columns) != len(types):
+            raise Exception("Series {path} has {c} columns but {t} types".format(path=self._path, c=len(columns), t=len(types)))
+        self.flush()
+        self._columns = list(columns)
+        self._types = types
+        self._timestamps = array.array(self.TYPE_INT)
+        self._values = [array.array(t) for t in types]
+        # Timestamps are delta encoded from the start of each schema, so readers can decode schemas independently.
+        self._last_ns = 0
+        data = json.dumps({"timestamp": self.HEADER_TIMESTAMP, "columns": self._columns, "types": self._types}).encode()
+        self._write(self.BLOCK_HEADER.pack(self.BLOCK_SCHEMA, len(self._columns), len(data)) + data)
+
+    def append(self, timestamp_ns: int, values: List[Any]) -> None:
+        if self._columns is None:
+            raise Exception("Series {path} has no schema".format(path=self._path))
+        self._timestamps.append(timestamp_ns - self._last_ns)
+        self._last_ns = timestamp_ns
+        for column, t, value in zip(self._values, self._types, values):
+            column.append(self._convert(t, value))
+        if self._flushed_at is None:
+            self._flushed_at = time.monotonic()
+        if len(self._timestamps) * (len(self._types) + 1) * 8 >= self._chunk_size or time.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._timestamps is None or len(self._timestamps) == 0:
+            return
+        columns = [self._timestamps] + self._values
+        if sys.byteorder == "big":
+            for column in columns:
+                column.byteswap()
+        data = b"".join(column.tobytes() for column in columns)
+        # A chunk is a single write, rows of the chunk are stored column by column.
+        self._write(self.BLOCK_HEADER.pack(self.BLOCK_CHUNK, len(self._timestamps), len(data)) + data)
+        self._timestamps = array.array(self.TYPE_INT)
+        self._values = [array.array(t) for t in self._types]
+        self._flushed_at = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _write(self, data: bytes) -> None:
+        if self._fh is None:
+            exists = os.path.exists(self._path)
+            self._fh = Writer.open(self._path, self._compress, "ab")
+            if not exists:
+                self._fh.write(self.MAGIC)
+        self._fh.write(data)
+        self._fh.flush()
+
+    def _convert(self, t: str, value: Any) -> Union[int, float]:
+        if t == self.TYPE_INT:
+            return int(value)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float("nan")
+
+
+class SeriesReader:
+
+    def __init__(self, path: str):
+        self._path = path
+        try:
+            self._numpy = importlib.import_module("numpy")
+        except ModuleNotFoundError:
+            self._numpy = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def numpy(self) -> Any:
+        return self._numpy
+
+    @numpy.setter
+    def numpy(self, value: Any) -> None:
+        self._numpy = value
+
+    def read(self) -> List[Dict[str, Any]]:
+        # One segment per schema, mapping column names (timestamps first) to NumPy arrays, or to arrays of the array
+        # module when NumPy is not installed.
+        segments = list()
+        data = self._load()
+        if not data.startswith(SeriesWriter.MAGIC):
+            raise Exception("File {path} is not a series file".format(path=self._path))
+        offset = len(SeriesWriter.MAGIC)
+        columns = None
+        types = None
+        chunks = None
+        while offset + SeriesWriter.BLOCK_HEADER.size <= len(data):
+            kind, count, size = SeriesWriter.BLOCK_HEADER.unpack_from(data, offset)
+            offset += SeriesWriter.BLOCK_HEADER.size
+            block = data[offset:offset + size]
+            offset += size
+            if len(block) < size:
+                # The last block may be incomplete if the run was interrupted.
+                break
+            if kind == SeriesWriter.BLOCK_SCHEMA:
+                if chunks is not None:
+                    segments.append(self._segment(columns, types, chunks))
+                schema = json.loads(block)
+                columns = [schema["timestamp"]] + schema["columns"]
+                types = SeriesWriter.TYPE_INT + schema["types"]
+                chunks = list()
+            elif kind == SeriesWriter.BLOCK_CHUNK and chunks is not None:
+                chunks.append((count, block))
+        if chunks is not None:
+            segments.append(self._segment(columns, types, chunks))
+        return segments
+
+    def export(self, fh: TextIO) -> None:
+        # Same layout as the text logs of the collectors: a header line per schema followed by one line per sample
+        for segment in self.read():
+            names = list(segment.keys())
+            fh.write("{line}\n".format(line=" ".join(names)))
+            columns = [segment[name].tolist() for name in names]
+            for row in zip(*columns):
+                fh.write("{line}\n".format(line=" ".join(self._format(value) for value in row)))
+
+    def _segment(self, columns: List[str], types: str, chunks: List) -> Dict[str, Any]:
+        values = [array.array(t) for t in types]
+        for count, block in chunks:
+            offset = 0
+            for column, t in zip(values, types):
+                part = array.array(t)
+                part.frombytes(block[offset:offset + count * part.itemsize])
+                offset += count * part.itemsize
+                if sys.byteorder == "big":
+                    part.byteswap()
+                column.extend(part)
+        if self._numpy is not None:
+            np = self._numpy
+            values = [np.frombuffer(column.tobytes(), dtype=np.dtype(t)) for column, t in zip(values, types)]
+            values[0] = np.cumsum(values[0])
+        else:
+            timestamps = array.array(SeriesWriter.TYPE_INT)
+            timestamp_ns = 0
+            for delta in values[0]:
+                timestamp_ns += delta
+                timestamps.append(timestamp_ns)
+            values[0] = timestamps
+        return dict(zip(columns, values))
+
+    def _load(self) -> bytes:
+        if self._path.endswith(".gz"):
+            with gzip.open(self._path, "rb") as fh:
+                return fh.read()
+        if self._path.endswith(".xz"):
+            with lzma.open(self._path, "rb") as fh:
+                return fh.read()
+        if self._path.endswith(".zst"):
+            zstandard = importlib.import_module("zstandard")
+            with zstandard.open(self._path, "rb") as fh:
+                return fh.read()
+        with open(self._path, "rb") as fh:
+            return fh.read()
+
+    @staticmethod
+    def _format(value: Union[int, float]) -> str:
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
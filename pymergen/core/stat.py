@@ -1,15 +1,42 @@
 import os
 import time
 import json
+import threading
+from typing import Any, Dict, List
+from pymergen.controller.group import ControllerGroup
 
 
-class StatTimer:
+class StatMetric:
+
+    NAME = None
+
+    @property
+    def name(self) -> str:
+        return self.NAME
+
+    def start(self) -> None:
+        raise NotImplementedError()
+
+    def stop(self) -> None:
+        raise NotImplementedError()
+
+    def account(self, rusages: List[Any]) -> None:
+        pass
+
+    def data(self) -> Dict:
+        raise NotImplementedError()
+
+
+class StatTimer(StatMetric):
+
+    NAME = "timer"
 
     def __init__(self):
         self._active = False
         self._started_at = None
         self._stopped_at = None
-        self._duration = None
+        self._started_ns = None
+        self._stopped_ns = None
 
     @property
     def started_at(self) -> float:
@@ -19,51 +46,290 @@ class StatTimer:
     def stopped_at(self) -> float:
         return self._stopped_at
 
+    @property
+    def duration_ns(self) -> int:
+        if self._started_ns is None or self._stopped_ns is None:
+            return None
+        return self._stopped_ns - self._started_ns
+
     @property
     def duration(self) -> float:
-        if self._duration is None:
-            self._duration = self._stopped_at - self._started_at
-            self._duration = round(self._duration, 2)
-        return self._duration
+        if self.duration_ns is None:
+            return None
+        return self.duration_ns / 1e9
 
     def start(self) -> None:
         if self._active:
             raise Exception("Timer is already active")
         self._active = True
+        # Wall clock timestamps are kept for correlation only, durations come from the monotonic performance counter.
         self._started_at = time.time()
+        self._started_ns = time.perf_counter_ns()
 
     def stop(self) -> None:
         if not self._active:
             raise Exception("Timer is not active")
         self._active = False
+        self._stopped_ns = time.perf_counter_ns()
         self._stopped_at = time.time()
 
-    def log(self, path: str) -> None:
-        data = {
+    def data(self) -> Dict:
+        return {
             "started_at": self.started_at,
             "stopped_at": self.stopped_at,
             "duration": self.duration,
+            "duration_ns": self.duration_ns,
         }
+
+    def log(self, path: str) -> str:
         log_file_path = os.path.join(path, "stat.timer.json")
         with open(log_file_path, "w") as fh:
-            fh.write("{data}\n".format(data=json.dumps(data)))
+            fh.write("{data}\n".format(data=json.dumps(self.data())))
             fh.flush()
+        return log_file_path
 
 
-class Stat:
+class StatCpu(StatMetric):
+
+    NAME = "cpu"
 
     def __init__(self):
+        self._started_ns = None
+        self._stopped_ns = None
+        self._children_user = 0.0
+        self._children_system = 0.0
+
+    def start(self) -> None:
+        self._started_ns = time.process_time_ns()
+
+    def stop(self) -> None:
+        self._stopped_ns = time.process_time_ns()
+
+    def account(self, rusages: List[Any]) -> None:
+        # Child CPU time is summed from the commands executed under this node, which keeps it exact when sibling
+        # nodes run in parallel threads.
+        for rusage in rusages:
+            self._children_user += rusage.ru_utime
+            self._children_system += rusage.ru_stime
+
+    def data(self) -> Dict:
+        return {
+            # CPU time of the PyMergen process itself, including all of its threads
+            "process_ns": self._stopped_ns - self._started_ns,
+            "children_user": self._children_user,
+            "children_system": self._children_system,
+        }
+
+
+class StatResourceUsage(StatMetric):
+
+    NAME = "rusage"
+
+    FIELDS = ["ru_utime", "ru_stime", "ru_maxrss", "ru_minflt", "ru_majflt", "ru_inblock", "ru_oublock", "ru_nvcsw", "ru_nivcsw"]
+    # High-water marks are reported as the maximum over all commands, all other fields are summed.
+    FIELDS_MAX = ["ru_maxrss"]
+
+    def __init__(self):
+        self._values = {field: 0 for field in self.FIELDS}
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def account(self, rusages: List[Any]) -> None:
+        for rusage in rusages:
+            for field in self.FIELDS:
+                if field in self.FIELDS_MAX:
+                    self._values[field] = max(self._values[field], getattr(rusage, field))
+                else:
+                    self._values[field] += getattr(rusage, field)
+
+    def data(self) -> Dict:
+        return dict(self._values)
+
+
+class StatControllerGroup(StatMetric):
+
+    NAME = "cgroup"
+
+    FILES = ["cpu.stat", "memory.events", "pids.events"]
+    # High-water marks are reported as they are at the end of the node, not as deltas.
+    FILES_PEAK = ["memory.peak", "pids.peak"]
+    # Writing to memory.peak resets the peak seen through that file descriptor (Linux 6.12), which makes it local to
+    # the node even when sibling nodes share the cgroup.
+    FILES_RESET = ["memory.peak"]
+
+    def __init__(self, cgroups: List[ControllerGroup]):
+        self._cgroups = cgroups
+        self._started = None
+        self._stopped = None
+        self._peak_fds = dict()
+        self._peaks = None
+
+    def start(self) -> None:
+        self._open_peaks()
+        self._started = self._sample()
+
+    def stop(self) -> None:
+        self._stopped = self._sample()
+        self._peaks = self._read_peaks()
+
+    def data(self) -> Dict:
+        data = dict()
+        for name, started in self._started.items():
+            stopped = self._stopped.get(name, dict())
+            data[name] = {key: stopped[key] - value for key, value in started.items() if key in stopped}
+            data[name].update(self._peaks.get(name, dict()))
+        return data
+
+    def _sample(self) -> Dict:
+        sample = dict()
+        for cgroup in self._cgroups:
+            values = dict()
+            for file_name in self.FILES:
+                try:
+                    with open(os.path.join(cgroup.DIR_BASE, cgroup.name, file_name), "r") as fh:
+                        for line in fh:
+                            key, value = line.split()
+                            values["{f}.{k}".format(f=file_name.split(".")[0], k=key)] = int(value)
+                except (FileNotFoundError, ValueError):
+                    # Cgroups that do not exist yet and controllers that are not enabled are skipped.
+                    continue
+            sample[cgroup.name] = values
+        return sample
+
+    def _open_peaks(self) -> None:
+        for cgroup in self._cgroups:
+            for file_name in self.FILES_PEAK:
+                path = os.path.join(cgroup.DIR_BASE, cgroup.name, file_name)
+                reset = False
+                try:
+                    fd = os.open(path, os.O_RDWR if file_name in self.FILES_RESET else os.O_RDONLY)
+                except PermissionError:
+                    try:
+                        fd = os.open(path, os.O_RDONLY)
+                    except OSError:
+                        continue
+                except OSError:
+                    continue
+                if file_name in self.FILES_RESET:
+                    try:
+                        os.write(fd, b"reset")
+                        reset = True
+                    except OSError:
+                        # Older kernels and read-only descriptors report the peak since the cgroup was created.
+                        reset = False
+                self._peak_fds[(cgroup.name, file_name)] = (fd, reset)
+
+    def _read_peaks(self) -> Dict:
+        peaks = dict()
+        for (name, file_name), (fd, reset) in self._peak_fds.items():
+            try:
+                value = int(os.pread(fd, 64, 0))
+            except (OSError, ValueError):
+                continue
+            finally:
+                os.close(fd)
+            values = peaks.setdefault(name, dict())
+            values[file_name] = value
+            if file_name in self.FILES_RESET:
+                values["{f}_reset".format(f=file_name)] = reset
+        self._peak_fds = dict()
+        return peaks
+
+
+class Stat:
+
+    PHASE_TOTAL = "total"
+    PHASE_PRE = "pre"
+    PHASE_MAIN = "main"
+    PHASE_POST = "post"
+    # Per-command process statistics
+    PHASE_PROCESS = "process"
+
+    METRIC_TIMER = StatTimer.NAME
+    METRIC_CPU = StatCpu.NAME
+    METRIC_RUSAGE = StatResourceUsage.NAME
+    METRIC_CGROUP = StatControllerGroup.NAME
+
+    METRICS_DEFAULT = [METRIC_TIMER, METRIC_CPU]
+
+    COUNTER_COMMANDS = "commands"
+    COUNTER_FAILURES = "failures"
+
+    def __init__(self, metrics: List[str] = None, counters: List[str] = None, cgroups: List[ControllerGroup] = None):
+        if metrics is None:
+            metrics = self.METRICS_DEFAULT
         self._timer = StatTimer()
+        self._metrics = [self._timer]
+        for name in metrics:
+            if name == self.METRIC_TIMER:
+                continue
+            elif name == self.METRIC_CPU:
+                self._metrics.append(StatCpu())
+            elif name == self.METRIC_RUSAGE:
+                self._metrics.append(StatResourceUsage())
+            elif name == self.METRIC_CGROUP:
+                self._metrics.append(StatControllerGroup(cgroups if cgroups is not None else list()))
+            else:
+                raise Exception("Stat metric {name} is not recognized".format(name=name))
+        self._counter_names = counters if counters is not None else list()
+        self._counters = {self.COUNTER_COMMANDS: 0, self.COUNTER_FAILURES: 0}
+        for name in self._counter_names:
+            self._counters[name] = 0
+        self._lock = threading.Lock()
 
     @property
     def timer(self) -> StatTimer:
         return self._timer
 
+    @property
+    def metrics(self) -> List[StatMetric]:
+        return self._metrics
+
+    @property
+    def counters(self) -> Dict[str, float]:
+        return self._counters
+
+    def count(self, name: str, value: float = 1) -> None:
+        # Counters are updated from parallel and concurrent executor threads.
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def account(self, rusages: List[Any], parsed: Dict[str, float]) -> None:
+        with self._lock:
+            for metric in self._metrics:
+                metric.account(rusages)
+            # Configured counters sum the values of the matching metrics parsed from command output.
+            for name in self._counter_names:
+                if name in parsed:
+                    self._counters[name] += parsed[name]
+
     def start(self) -> None:
-        self._timer.start()
+        for metric in self._metrics:
+            metric.start()
 
     def stop(self) -> None:
-        self._timer.stop()
+        for metric in reversed(self._metrics):
+            metric.stop()
 
-    def log(self, path: str) -> None:
-        self._timer.log(path)
+    def data(self) -> Dict:
+        with self._lock:
+            data = {metric.name: metric.data() for metric in self._metrics}
+            data["counters"] = dict(self._counters)
+        return data
+
+    def log(self, path: str, phase: str = PHASE_TOTAL) -> List[str]:
+        data = self.data()
+        data["phase"] = phase
+        log_file_path = os.path.join(path, "stat.{phase}.json".format(phase=phase))
+        with open(log_file_path, "w") as fh:
+            fh.write("{data}\n".format(data=json.dumps(data)))
+            fh.flush()
+        log_file_paths = [log_file_path]
+        if phase == self.PHASE_TOTAL:
+            # Kept for consumers of the timer-only file
+            log_file_paths.append(self._timer.log(path))
+        return log_file_paths
@@ -0,0 +1,170 @@
+import json
+import queue
+import sqlite3
+import itertools
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+class Store:
+
+    FILE_NAME = "run.store.db"
+
+    QUEUE_SIZE = 65536
+    BATCH_SIZE = 1000
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS nodes ("
+        " path TEXT PRIMARY KEY,"
+        " parent TEXT,"
+        " entity TEXT,"
+        " kind TEXT,"
+        " contexts TEXT,"
+        " command TEXT,"
+        " iters TEXT,"
+        " params TEXT)",
+        "CREATE TABLE IF NOT EXISTS stats ("
+        " node TEXT NOT NULL,"
+        " phase TEXT NOT NULL,"
+        " metric TEXT NOT NULL,"
+        " value REAL)",
+        "CREATE TABLE IF NOT EXISTS samples ("
+        " node TEXT NOT NULL,"
+        " source TEXT NOT NULL,"
+        " metric TEXT NOT NULL,"
+        " timestamp REAL,"
+        " value REAL,"
+        " labels TEXT)",
+        "CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent)",
+        "CREATE INDEX IF NOT EXISTS nodes_entity ON nodes (entity)",
+        "CREATE INDEX IF NOT EXISTS stats_node ON stats (node, phase)",
+        "CREATE INDEX IF NOT EXISTS stats_metric ON stats (metric)",
+        "CREATE INDEX IF NOT EXISTS samples_node ON samples (node, metric)",
+        "CREATE INDEX IF NOT EXISTS samples_metric ON samples (metric, timestamp)",
+    ]
+
+    SQL_NODE = "INSERT OR IGNORE INTO nodes (path, parent, entity, kind, contexts, command, iters, params) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    SQL_STAT = "INSERT INTO stats (node, phase, metric, value) VALUES (?, ?, ?, ?)"
+    SQL_SAMPLE = "INSERT INTO samples (node, source, metric, timestamp, value, labels) VALUES (?, ?, ?, ?, ?, ?)"
+
+    def __init__(self, path: str):
+        self._path = path
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._closed = False
+        self._error = None
+        # The schema is created up front so that the database can be queried before the first batch is written.
+        connection = sqlite3.connect(self._path)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            for sql in self.SCHEMA:
+                connection.execute(sql)
+            connection.commit()
+        finally:
+            connection.close()
+        # SQLite connections are bound to their thread, so all writes go through a single writer thread. Executor,
+        # process, parser, and collector threads only pay for a queue put.
+        self._thread = threading.Thread(name="store", target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def node(self, path: str, entity: str, kind: str, contexts: List[str], command: str = None, iters: Dict = None, params: Dict = None) -> None:
+        parent = path.rsplit("/", 1)[0] if "/" in path else None
+        self._put(self.SQL_NODE, (path, parent, entity, kind, json.dumps(contexts), command, self._json(iters), self._json(params)))
+
+    def stat(self, node: str, phase: str, data: Dict) -> None:
+        for metric, value in self.flatten(data):
+            self._put(self.SQL_STAT, (node, phase, metric, value))
+
+    def sample(self, node: str, source: str, metric: str, timestamp: float, value: float, labels: Dict = None) -> None:
+        self._put(self.SQL_SAMPLE, (node, source, metric, timestamp, value, self._json(labels)))
+
+    def flush(self) -> None:
+        self._queue.join()
+        self._raise()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._raise()
+
+    @staticmethod
+    def query(path: str, sql: str, params: Tuple = ()) -> List[Dict]:
+        connection = sqlite3.connect("file:{path}?mode=ro".format(path=path), uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def flatten(data: Any, prefix: str = None) -> List[Tuple[str, float]]:
+        rows = list()
+        if isinstance(data, dict):
+            items = data.items()
+        elif isinstance(data, list):
+            items = enumerate(data)
+        else:
+            if isinstance(data, (int, float)) and not isinstance(data, bool):
+                rows.append((prefix, data))
+            return rows
+        for key, value in items:
+            rows.extend(Store.flatten(value, key if prefix is None else "{p}.{k}".format(p=prefix, k=key)))
+        return rows
+
+    def _put(self, sql: str, params: Tuple) -> None:
+        if self._closed:
+            raise ValueError("Store {path} is closed".format(path=self._path))
+        self._raise()
+        self._queue.put((sql, params))
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        connection = sqlite3.connect(self._path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        try:
+            stop = False
+            while not stop:
+                batch = [self._queue.get()]
+                # Whatever is queued is written in one transaction, up to the batch size.
+                while batch[-1] is not None and len(batch) < self.BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = batch[-1] is None
+                try:
+                    if self._error is None:
+                        self._write(connection, [item for item in batch if item is not None])
+                except Exception as e:
+                    # Keep draining so that producers never block on a full queue, the error is raised to them instead.
+                    self._error = e
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _write(connection: sqlite3.Connection, batch: List[Tuple[str, Tuple]]) -> None:
+        with connection:
+            for sql, items in itertools.groupby(batch, key=lambda item: item[0]):
+                connection.executemany(sql, [params for _, params in items])
+
+    @staticmethod
+    def _json(value: Dict) -> str:
+        if value is None:
+            return None
+        return json.dumps(value)
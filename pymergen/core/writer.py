@@ -0,0 +1,125 @@
+import os
+import zlib
+import lzma
+import queue
+import threading
+import importlib
+from typing import Any, Union
+
+
+class Writer:
+
+    CODEC_GZIP = "gzip"
+    CODEC_XZ = "xz"
+    CODEC_ZSTD = "zstd"
+
+    SUFFIXES = {
+        ".gz": CODEC_GZIP,
+        ".xz": CODEC_XZ,
+        ".zst": CODEC_ZSTD,
+    }
+
+    QUEUE_SIZE = 1024
+
+    def __init__(self, path: str, codec: str, append: bool = False):
+        self._path = path
+        self._codec = codec
+        self._compressor = self._init_compressor(codec)
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._fh = open(path, "ab" if append else "wb")
+        self._closed = False
+        self._error = None
+        # Compression runs in a dedicated thread so that the producer (a collector tick, a pipe pump or the logger)
+        # only pays for a queue put.
+        self._thread = threading.Thread(name="writer_{codec}".format(codec=codec), target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def codec(self) -> str:
+        return self._codec
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def write(self, data: Union[str, bytes]) -> int:
+        if self._closed:
+            raise ValueError("I/O operation on closed writer {path}".format(path=self._path))
+        if isinstance(data, str):
+            data = data.encode()
+        self._queue.put(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        # Data is flushed by the writer thread. Forcing a compressor flush on every call would ruin the compression
+        # ratio for line oriented loggers.
+        pass
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None:
+                    break
+                self._fh.write(self._compressor.compress(data))
+            self._fh.write(self._compressor.flush())
+        except Exception as e:
+            self._error = e
+            # Keep draining so that producers never block on a full queue.
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._fh.close()
+
+    @staticmethod
+    def _init_compressor(codec: str) -> Any:
+        if codec == Writer.CODEC_GZIP:
+            return zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        if codec == Writer.CODEC_XZ:
+            return lzma.LZMACompressor()
+        if codec == Writer.CODEC_ZSTD:
+            try:
+                zstandard = importlib.import_module("zstandard")
+            except ModuleNotFoundError:
+                raise Exception("Module zstandard is required for {codec} compression".format(codec=codec))
+            return zstandard.ZstdCompressor().compressobj()
+        raise Exception("Compression codec {codec} is not recognized".format(codec=codec))
+
+    @staticmethod
+    def codec_for(path: str, compress: str = None) -> str:
+        if compress is not None:
+            return compress
+        return Writer.SUFFIXES.get(os.path.splitext(path)[1])
+
+    @staticmethod
+    def path_for(path: str, compress: str = None) -> str:
+        if compress is None:
+            return path
+        for suffix, codec in Writer.SUFFIXES.items():
+            if codec == compress:
+                if not path.endswith(suffix):
+                    path = "{path}{suffix}".format(path=path, suffix=suffix)
+                return path
+        raise Exception("Compression codec {codec} is not recognized".format(codec=compress))
+
+    @staticmethod
+    def open(path: str, compress: str = None, mode: str = "w") -> Any:
+        path = Writer.path_for(path, compress)
+        codec = Writer.codec_for(path, compress)
+        if codec is None:
+            return open(path, mode)
+        # Concatenated gzip, xz and zstd frames form valid streams, so appending simply starts a new frame.
+        return Writer(path, codec, append=mode.startswith("a"))
@@ -1,5 +1,6 @@
 from typing import List
 from pymergen.entity.entity import Entity
+from pymergen.parser.parser import OutputParser
 
 
 class EntityCommand(Entity):
@@ -15,9 +16,12 @@ class EntityCommand(Entity):
         self._timeout = None
         self._pipe_stdout = None
         self._pipe_stderr = None
+        self._compress = None
         self._debug_stdout = False
         self._debug_stderr = False
+        self._meter_pipes = False
         self._cgroups = list()
+        self._parsers = list()
 
     @property
     def cmd(self) -> str:
@@ -91,6 +95,14 @@ class EntityCommand(Entity):
     def pipe_stderr(self, value: str) -> None:
         self._pipe_stderr = value
 
+    @property
+    def compress(self) -> str:
+        return self._compress
+
+    @compress.setter
+    def compress(self, value: str) -> None:
+        self._compress = value
+
     @property
     def debug_stdout(self) -> bool:
         return self._debug_stdout
@@ -107,6 +119,14 @@ class EntityCommand(Entity):
     def debug_stderr(self, value: bool) -> None:
         self._debug_stderr = value
 
+    @property
+    def meter_pipes(self) -> bool:
+        return self._meter_pipes
+
+    @meter_pipes.setter
+    def meter_pipes(self, value: bool) -> None:
+        self._meter_pipes = value
+
     @property
     def cgroups(self) -> List[str]:
         return self._cgroups
@@ -115,6 +135,17 @@ class EntityCommand(Entity):
     def cgroups(self, values: List[str]) -> None:
         self._cgroups = values
 
+    @property
+    def parsers(self) -> List[OutputParser]:
+        return self._parsers
+
+    @parsers.setter
+    def parsers(self, values: List[OutputParser]) -> None:
+        self._parsers = values
+
+    def add_parser(self, value: OutputParser) -> None:
+        self._parsers.append(value)
+
     def dir_name(self) -> str:
         return "command_{command}".format(command=self.name)
 
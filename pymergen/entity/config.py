@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, List
 
 
 class EntityConfig:
@@ -13,6 +13,8 @@ class EntityConfig:
         self._iteration: str = self.ITERATION_TYPE_PRODUCT
         self._params: dict = dict()
         self._iters: dict = dict()
+        self._stats: list = None
+        self._counters: list = None
 
     @property
     def replication(self) -> int:
@@ -61,3 +63,19 @@ class EntityConfig:
     @iters.setter
     def iters(self, values: Dict) -> None:
         self._iters = values
+
+    @property
+    def stats(self) -> List[str]:
+        return self._stats
+
+    @stats.setter
+    def stats(self, values: List[str]) -> None:
+        self._stats = values
+
+    @property
+    def counters(self) -> List[str]:
+        return self._counters
+
+    @counters.setter
+    def counters(self, values: List[str]) -> None:
+        self._counters = values
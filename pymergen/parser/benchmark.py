@@ -0,0 +1,115 @@
+import re
+from typing import Any, Dict
+from pymergen.parser.format import OutputParserJson
+from pymergen.parser.parser import OutputParser, OutputParserMetricWriter
+
+
+class OutputParserFio(OutputParserJson):
+
+    DIRECTIONS = ["read", "write", "trim"]
+    PERCENTILES = ["50.000000", "90.000000", "95.000000", "99.000000", "99.900000"]
+
+    def __init__(self):
+        super().__init__()
+        # fio prints a single JSON document when it finishes (--output-format=json).
+        self._mode = self.MODE_DOCUMENT
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._mode = self.MODE_DOCUMENT
+
+    def parse_document(self, document: Any) -> None:
+        for job in document.get("jobs", list()):
+            for direction in self.DIRECTIONS:
+                data = job.get(direction)
+                if data is None or data.get("io_bytes", 0) == 0:
+                    continue
+                labels = {"job": job.get("jobname"), "direction": direction}
+                # Throughput adds up over jobs and directions, latencies do not.
+                self.emit("iops", data["iops"], "ops/s", labels, OutputParserMetricWriter.REDUCE_SUM)
+                self.emit("bw", data["bw_bytes"], "B/s", labels, OutputParserMetricWriter.REDUCE_SUM)
+                if "lat_ns" in data:
+                    self.emit("lat_mean", data["lat_ns"]["mean"], "ns", labels, OutputParserMetricWriter.REDUCE_MEAN)
+                percentiles = data.get("clat_ns", dict()).get("percentile", dict())
+                for percentile in self.PERCENTILES:
+                    if percentile in percentiles:
+                        self.emit("clat_p{p:g}".format(p=float(percentile)), percentiles[percentile], "ns", labels, OutputParserMetricWriter.REDUCE_MAX)
+
+
+class OutputParserSysbench(OutputParser):
+
+    # Interval reports (--report-interval):
+    # [ 1s ] thds: 8 tps: 411.90 qps: 8239.10 (r/w/o: 5768.30/1646.00/824.80) lat (ms,95%): 12.30 err/s: 0.00 reconn/s: 0.00
+    # [ 1s ] thds: 8 eps: 1234.50 lat (ms,95%): 2.30
+    INTERVAL = re.compile(r"^\[\s*(?P<time>[0-9.]+)s\s*\]\s+thds:\s*(?P<threads>\d+)(?P<rest>.*)$")
+    INTERVAL_FIELDS = re.compile(r"(tps|qps|eps|err/s|reconn/s):\s*([0-9.]+)")
+    INTERVAL_LATENCY = re.compile(r"lat \(ms,(\d+)%\):\s*([0-9.]+)")
+    # Final summary
+    SUMMARY = [
+        ("transactions", re.compile(r"^\s*transactions:\s+\d+\s+\(([0-9.]+) per sec\.\)"), "ops/s"),
+        ("queries", re.compile(r"^\s*queries:\s+\d+\s+\(([0-9.]+) per sec\.\)"), "ops/s"),
+        ("events", re.compile(r"^\s*events/s \(eps\):\s+([0-9.]+)"), "ops/s"),
+        ("lat_min", re.compile(r"^\s*min:\s+([0-9.]+)"), "ms"),
+        ("lat_avg", re.compile(r"^\s*avg:\s+([0-9.]+)"), "ms"),
+        ("lat_max", re.compile(r"^\s*max:\s+([0-9.]+)"), "ms"),
+        ("lat_p", re.compile(r"^\s*(\d+)th percentile:\s+([0-9.]+)"), "ms"),
+    ]
+
+    def parse_line(self, line: str) -> None:
+        match = self.INTERVAL.match(line)
+        if match is not None:
+            labels = {"time": float(match.group("time")), "threads": int(match.group("threads"))}
+            rest = match.group("rest")
+            for name, value in self.INTERVAL_FIELDS.findall(rest):
+                self.emit("interval_{name}".format(name=name.replace("/", "_")), float(value), None, labels, OutputParserMetricWriter.REDUCE_MEAN)
+            for percentile, value in self.INTERVAL_LATENCY.findall(rest):
+                self.emit("interval_lat_p{p}".format(p=percentile), float(value), "ms", labels, OutputParserMetricWriter.REDUCE_MAX)
+            return
+        for metric, regex, unit in self.SUMMARY:
+            match = regex.match(line)
+            if match is None:
+                continue
+            if metric == "lat_p":
+                self.emit("lat_p{p}".format(p=match.group(1)), float(match.group(2)), unit)
+            else:
+                self.emit(metric, float(match.group(1)), unit)
+            return
+
+
+class OutputParserWrk(OutputParser):
+
+    TIME_UNITS = {"us": 0.001, "ms": 1.0, "s": 1000.0, "m": 60000.0, "h": 3600000.0}
+    SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+    REQUESTS = re.compile(r"^Requests/sec:\s+([0-9.]+)")
+    TRANSFER = re.compile(r"^Transfer/sec:\s+([0-9.]+)([KMGT]?B)")
+    LATENCY = re.compile(r"^\s+Latency\s+([0-9.]+)(us|ms|s|m|h)\s+([0-9.]+)(us|ms|s|m|h)\s+([0-9.]+)(us|ms|s|m|h)")
+    # Latency distribution (--latency)
+    PERCENTILE = re.compile(r"^\s+([0-9.]+)%\s+([0-9.]+)(us|ms|s|m|h)\s*$")
+    ERRORS = re.compile(r"^\s+Non-2xx or 3xx responses:\s+(\d+)")
+
+    def parse_line(self, line: str) -> None:
+        match = self.REQUESTS.match(line)
+        if match is not None:
+            self.emit("requests", float(match.group(1)), "req/s")
+            return
+        match = self.TRANSFER.match(line)
+        if match is not None:
+            self.emit("transfer", float(match.group(1)) * self.SIZE_UNITS[match.group(2)], "B/s")
+            return
+        match = self.LATENCY.match(line)
+        if match is not None:
+            self.emit("lat_avg", self._ms(match.group(1), match.group(2)), "ms")
+            self.emit("lat_stdev", self._ms(match.group(3), match.group(4)), "ms")
+            self.emit("lat_max", self._ms(match.group(5), match.group(6)), "ms")
+            return
+        match = self.PERCENTILE.match(line)
+        if match is not None:
+            self.emit("lat_p{p:g}".format(p=float(match.group(1))), self._ms(match.group(2), match.group(3)), "ms")
+            return
+        match = self.ERRORS.match(line)
+        if match is not None:
+            self.emit("errors", float(match.group(1)), reduce=OutputParserMetricWriter.REDUCE_SUM)
+
+    def _ms(self, value: str, unit: str) -> float:
+        return float(value) * self.TIME_UNITS[unit]
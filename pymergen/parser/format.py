@@ -0,0 +1,155 @@
+import re
+import json
+from typing import Any, Dict, List
+from pymergen.parser.parser import OutputParser, OutputParserMetricWriter
+
+
+class OutputParserRegex(OutputParser):
+
+    def __init__(self):
+        super().__init__()
+        self._patterns = list()
+
+    @property
+    def patterns(self) -> List[Dict]:
+        return self._patterns
+
+    def add_pattern(self, metric: str, regex: str, unit: str = None, reduce: str = OutputParserMetricWriter.REDUCE_LAST) -> None:
+        compiled = re.compile(regex)
+        if compiled.groups == 0:
+            raise Exception("Pattern {regex} for metric {metric} requires a value group or at least one group".format(regex=regex, metric=metric))
+        if reduce not in OutputParserMetricWriter.REDUCTIONS:
+            raise Exception("Pattern {regex} for metric {metric} has an unknown reduction {reduce}".format(regex=regex, metric=metric, reduce=reduce))
+        self._patterns.append({
+            "metric": metric,
+            "regex": compiled,
+            "unit": unit,
+            "reduce": reduce,
+        })
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        for pattern in config.get("patterns", list()):
+            self.add_pattern(pattern["metric"], pattern["regex"], pattern.get("unit", None), pattern.get("reduce", OutputParserMetricWriter.REDUCE_LAST))
+
+    def parse_line(self, line: str) -> None:
+        for pattern in self._patterns:
+            match = pattern["regex"].search(line)
+            if match is None:
+                continue
+            # The value is taken from the group named "value" (or the first group), and any other named groups
+            # become labels of the metric record.
+            groups = match.groupdict()
+            if "value" in groups:
+                value = groups.pop("value")
+            else:
+                value = match.group(1)
+            try:
+                # Optional groups that did not participate in the match are None.
+                value = float(value)
+            except (TypeError, ValueError):
+                self.skip()
+                continue
+            self.emit(pattern["metric"], value, pattern["unit"], groups, pattern["reduce"])
+
+
+class OutputParserKeyValue(OutputParser):
+
+    DEFAULT_SEPARATOR = "="
+
+    def __init__(self):
+        super().__init__()
+        self._separator = self.DEFAULT_SEPARATOR
+        self._delimiter = None
+        self._keys = list()
+        self._reduce = OutputParserMetricWriter.REDUCE_LAST
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._separator = config.get("separator", self.DEFAULT_SEPARATOR)
+        self._delimiter = config.get("delimiter", None)
+        self._keys = config.get("keys", list())
+        self._reduce = config.get("reduce", OutputParserMetricWriter.REDUCE_LAST)
+
+    def parse_line(self, line: str) -> None:
+        for field in line.split(self._delimiter):
+            if self._separator not in field:
+                continue
+            key, value = field.split(self._separator, 1)
+            key = key.strip()
+            if len(self._keys) > 0 and key not in self._keys:
+                continue
+            try:
+                value = float(value.strip())
+            except ValueError:
+                continue
+            self.emit(key, value, reduce=self._reduce)
+
+
+class OutputParserJson(OutputParser):
+
+    MODE_LINES = "lines"
+    MODE_DOCUMENT = "document"
+
+    def __init__(self):
+        super().__init__()
+        self._mode = self.MODE_LINES
+        self._keys = list()
+        self._lines = list()
+        self._reduce = OutputParserMetricWriter.REDUCE_LAST
+
+    def parse(self, config: Dict) -> None:
+        super().parse(config)
+        self._mode = config.get("mode", self.MODE_LINES)
+        self._keys = config.get("keys", list())
+        self._reduce = config.get("reduce", OutputParserMetricWriter.REDUCE_LAST)
+
+    def reset(self) -> None:
+        super().reset()
+        self._lines = list()
+
+    def parse_line(self, line: str) -> None:
+        if self._mode == self.MODE_DOCUMENT:
+            self._lines.append(line)
+            return
+        line = line.strip()
+        if not line.startswith("{"):
+            return
+        try:
+            document = json.loads(line)
+        except ValueError:
+            # Truncated or interleaved lines are skipped rather than disabling the parser.
+            self.skip()
+            return
+        self.parse_document(document)
+
+    def finish(self) -> None:
+        if self._mode != self.MODE_DOCUMENT:
+            return
+        # Tools often print warnings before the JSON document.
+        for i, line in enumerate(self._lines):
+            if line.startswith("{"):
+                self.parse_document(json.loads("\n".join(self._lines[i:])))
+                break
+        self._lines = list()
+
+    def parse_document(self, document: Any) -> None:
+        for key, value in self.flatten(document):
+            if len(self._keys) > 0 and key not in self._keys:
+                continue
+            self.emit(key, value, reduce=self._reduce)
+
+    @staticmethod
+    def flatten(data: Any, prefix: str = None) -> List:
+        items = list()
+        if isinstance(data, dict):
+            for key, value in data.items():
+                name = key if prefix is None else "{prefix}.{key}".format(prefix=prefix, key=key)
+                items.extend(OutputParserJson.flatten(value, name))
+        elif isinstance(data, list):
+            for i, value in enumerate(data):
+                name = str(i) if prefix is None else "{prefix}.{i}".format(prefix=prefix, i=i)
+                items.extend(OutputParserJson.flatten(value, name))
+        elif isinstance(data, (int, float)) and not isinstance(data, bool):
+            items.append((prefix, data))
+        return items
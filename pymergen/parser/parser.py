@@ -0,0 +1,241 @@
+import os
+import copy
+import json
+import time
+import threading
+from typing import Dict, Self
+from pymergen.core.context import Context
+from pymergen.core.store import Store
+from pymergen.core.manifest import Manifest
+
+
+class OutputParserMetricWriter:
+
+    FILE_NAME = "metrics.jsonl"
+
+    # Reductions of the values of a metric to the total of a command, as used by counters. Only per-event counts are
+    # summed, rates, gauges and latencies are reduced to their last, mean, or maximum value.
+    REDUCE_SUM = "sum"
+    REDUCE_LAST = "last"
+    REDUCE_MEAN = "mean"
+    REDUCE_MAX = "max"
+    REDUCTIONS = [REDUCE_SUM, REDUCE_LAST, REDUCE_MEAN, REDUCE_MAX]
+
+    def __init__(self, path: str):
+        # Records are only written to the store when no path is given
+        self._path = os.path.join(path, self.FILE_NAME) if path is not None else None
+        self._fh = None
+        self._lock = threading.Lock()
+        self._totals = dict()
+        self._counts = dict()
+        self._store = None
+        self._node = None
+        self._manifest = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def totals(self) -> Dict[str, float]:
+        return self._totals
+
+    @property
+    def store(self) -> Store:
+        return self._store
+
+    @store.setter
+    def store(self, value: Store) -> None:
+        self._store = value
+
+    @property
+    def node(self) -> str:
+        return self._node
+
+    @node.setter
+    def node(self, value: str) -> None:
+        self._node = value
+
+    @property
+    def manifest(self) -> Manifest:
+        return self._manifest
+
+    @manifest.setter
+    def manifest(self, value: Manifest) -> None:
+        self._manifest = value
+
+    def write(self, record: Dict, reduce: str = REDUCE_LAST) -> None:
+        line = "{data}\n".format(data=json.dumps(record))
+        numeric = isinstance(record["value"], (int, float))
+        with self._lock:
+            if numeric:
+                self._reduce(record["metric"], record["value"], reduce)
+            if self._path is not None:
+                if self._fh is None:
+                    self._fh = open(self._path, "a")
+                    if self._manifest is not None:
+                        self._manifest.register(self._path)
+                self._fh.write(line)
+                # Records are few and valuable while the run is in progress, so they are flushed immediately.
+                self._fh.flush()
+        if self._store is not None and numeric:
+            self._store.sample(
+                self._node,
+                "parser.{parser}".format(parser=record["parser"]),
+                record["metric"],
+                record["timestamp"],
+                record["value"],
+                record["labels"]
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def _reduce(self, metric: str, value: float, reduce: str) -> None:
+        count = self._counts.get(metric, 0) + 1
+        self._counts[metric] = count
+        if metric not in self._totals or reduce == self.REDUCE_LAST:
+            self._totals[metric] = value
+        elif reduce == self.REDUCE_SUM:
+            self._totals[metric] += value
+        elif reduce == self.REDUCE_MAX:
+            self._totals[metric] = max(self._totals[metric], value)
+        elif reduce == self.REDUCE_MEAN:
+            self._totals[metric] += (value - self._totals[metric]) / count
+        else:
+            raise Exception("Unknown reduction {reduce} of metric {metric}".format(reduce=reduce, metric=metric))
+
+
+class OutputParser:
+
+    STREAM_STDOUT = "stdout"
+    STREAM_STDERR = "stderr"
+
+    def __init__(self):
+        self._name = None
+        self._context = None
+        self._stream = self.STREAM_STDOUT
+        self._command = None
+        self._writer = None
+        self._buffer = b""
+        self._failed = False
+        self._skipped = 0
+
+    def parse(self, config: Dict) -> None:
+        self._name = config.get("name")
+        self._stream = config.get("stream", self.STREAM_STDOUT)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: str) -> None:
+        self._name = value
+
+    @property
+    def context(self) -> Context:
+        return self._context
+
+    @context.setter
+    def context(self, value: Context) -> None:
+        self._context = value
+
+    @property
+    def stream(self) -> str:
+        return self._stream
+
+    @stream.setter
+    def stream(self, value: str) -> None:
+        self._stream = value
+
+    @property
+    def command(self) -> str:
+        return self._command
+
+    @command.setter
+    def command(self, value: str) -> None:
+        self._command = value
+
+    @property
+    def writer(self) -> OutputParserMetricWriter:
+        return self._writer
+
+    @property
+    def skipped(self) -> int:
+        return self._skipped
+
+    @writer.setter
+    def writer(self, value: OutputParserMetricWriter) -> None:
+        self._writer = value
+
+    def instance(self) -> Self:
+        # Configured parsers are shared by all executions of a command, including parallel ones. Each execution
+        # consumes its output through an independent copy.
+        parser = copy.copy(self)
+        parser.reset()
+        return parser
+
+    def reset(self) -> None:
+        self._buffer = b""
+        self._failed = False
+        self._skipped = 0
+
+    def write(self, chunk: bytes) -> int:
+        self._buffer += chunk
+        lines = self._buffer.split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+        return len(chunk)
+
+    def close(self) -> None:
+        if len(self._buffer) > 0:
+            self._parse_line(self._buffer)
+            self._buffer = b""
+        try:
+            self.finish()
+        except Exception as e:
+            self._fail(e)
+        if self._skipped > 0 and self.context is not None:
+            self.context.logger.warning("Parser {n} skipped {s} lines of {c}".format(n=self._name, s=self._skipped, c=self._command))
+
+    def parse_line(self, line: str) -> None:
+        raise NotImplementedError()
+
+    def finish(self) -> None:
+        pass
+
+    def skip(self) -> None:
+        # Lines that look like metrics but hold no value are counted rather than disabling the parser.
+        self._skipped += 1
+
+    def emit(self, metric: str, value: float, unit: str = None, labels: Dict = None, reduce: str = OutputParserMetricWriter.REDUCE_LAST) -> None:
+        record = {
+            "timestamp": time.time(),
+            "command": self._command,
+            "parser": self._name,
+            "stream": self._stream,
+            "metric": metric,
+            "value": value,
+            "unit": unit,
+            "labels": labels if labels is not None else dict(),
+        }
+        self._writer.write(record, reduce)
+
+    def _parse_line(self, line: bytes) -> None:
+        if self._failed:
+            return
+        try:
+            self.parse_line(line.decode(errors="replace").rstrip("\r"))
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, e: Exception) -> None:
+        # A broken parser must never interrupt the output pump feeding the command output file.
+        self._failed = True
+        if self.context is not None:
+            self.context.logger.error("Parser {n} failed for {c} due to {e}".format(n=self._name, c=self._command, e=e))
@@ -10,6 +10,7 @@ from pymergen.plugin.plugin import Plugin
 class PluginManager:
 
     CATEGORY_COLLECTOR = "collector"
+    CATEGORY_PARSER = "parser"
 
     def __init__(self, context):
         self._context = context
@@ -19,6 +20,7 @@ class PluginManager:
     def _init_registry(self):
         self._registry = PluginRegistry()
         self._registry.add_category(self.CATEGORY_COLLECTOR)
+        self._registry.add_category(self.CATEGORY_PARSER)
 
     @property
     def paths(self) -> List:
@@ -49,3 +51,9 @@ class PluginManager:
 
     def get_collector_plugins(self) -> Dict[str, Plugin]:
         return self._registry.get_plugins(self.CATEGORY_COLLECTOR)
+
+    def get_parser_plugin(self, engine: str) -> Plugin:
+        return self._registry.get_plugin(self.CATEGORY_PARSER, engine)
+
+    def get_parser_plugins(self) -> Dict[str, Plugin]:
+        return self._registry.get_plugins(self.CATEGORY_PARSER)
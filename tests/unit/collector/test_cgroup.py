@@ -1,4 +1,6 @@
 import os
+import json
+import gzip
 import pytest
 import tempfile
 from unittest.mock import MagicMock, patch, mock_open, PropertyMock
@@ -6,17 +8,68 @@ from io import StringIO
 from pymergen.collector.collector import Collector
 from pymergen.collector.process import CollectorProcess
 from pymergen.collector.thread import CollectorThread
+from pymergen.collector.engine import CollectorSchedule
+from pymergen.core.series import SeriesReader
 from pymergen.collector.perf import CollectorPerfEvent
 from pymergen.collector.perf import CollectorPerfStat
 from pymergen.collector.perf import CollectorPerfProfile
 from pymergen.collector.cgroup import (
     CollectorControllerGroupFile,
-    CollectorControllerGroupStatParser,
+    CollectorControllerGroupSampler,
     CollectorControllerGroupStatLogger,
+    CollectorControllerGroupRates,
     CollectorControllerGroup
 )
 
 
+class TestCollectorControllerGroupRates:
+    def test_supports(self):
+        """Test rates are only derived for stat files with cumulative counters"""
+        assert CollectorControllerGroupRates.supports("cpu.stat")
+        assert CollectorControllerGroupRates.supports("io.stat")
+        assert not CollectorControllerGroupRates.supports("memory.current")
+
+    def test_derive_cpu(self):
+        """Test CPU utilization in cores and the throttling ratio"""
+        rates = CollectorControllerGroupRates("cpu.stat")
+        headers = ["usage_usec", "throttled_usec", "nr_periods", "nr_throttled"]
+        assert rates.derive(0, headers, [1000000, 0, 10, 0]) is None
+        derived_headers, derived_values = rates.derive(500000000, headers, [2000000, 250000, 15, 2])
+        assert derived_headers == ["usage_cores", "throttled_cores", "throttled_ratio"]
+        assert derived_values == [2.0, 0.5, 0.4]
+        # The header list is reused while the derived fields do not change
+        assert rates.derive(1000000000, headers, [2500000, 250000, 20, 2])[0] is derived_headers
+
+    def test_derive_io(self):
+        """Test IO bandwidth and IOPS per device, including devices that appear during the run"""
+        rates = CollectorControllerGroupRates("io.stat")
+        rates.derive(0, ["8:0_rbytes", "8:0_rios"], [0, 0])
+        derived_headers, derived_values = rates.derive(2000000000, ["8:0_rbytes", "8:0_rios", "8:16_rbytes"], [4096, 10, 100])
+        assert derived_headers == ["8:0_rbytes_per_sec", "8:0_riops"]
+        assert derived_values == [2048.0, 5.0]
+
+    def test_derive_reset(self):
+        """Test counters that went backwards are skipped"""
+        rates = CollectorControllerGroupRates("memory.stat")
+        rates.derive(0, ["pgfault", "pgmajfault"], [100, 10])
+        derived_headers, derived_values = rates.derive(1000000000, ["pgfault", "pgmajfault"], [50, 12])
+        assert derived_headers == ["pgmajfault_per_sec"]
+        assert derived_values == [2.0]
+
+    def test_summary(self):
+        """Test start to end deltas and rates of a node"""
+        rates = CollectorControllerGroupRates("cpu.stat")
+        assert rates.summary() is None
+        rates.derive(1000, ["usage_usec", "nr_periods", "nr_throttled"], [100, 0, 0])
+        rates.derive(1000001000, ["usage_usec", "nr_periods", "nr_throttled"], [400100, 5, 1])
+        rates.derive(2000001000, ["usage_usec", "nr_periods", "nr_throttled"], [1000100, 10, 1])
+        assert rates.summary() == {
+            "duration_ns": 2000000000,
+            "delta": {"usage_usec": 1000000, "nr_periods": 10, "nr_throttled": 1},
+            "rate": {"usage_cores": 0.5, "throttled_ratio": 0.1},
+        }
+
+
 class TestCollectorControllerGroupFile:
     def test_init(self):
         """Test file initialization"""
@@ -54,87 +107,82 @@ class TestCollectorControllerGroupFile:
         mock_file.close.assert_called_once()
 
 
-class TestCollectorControllerGroupStatParser:
-    def setup_method(self):
-        # Clear singleton instances between tests
-        CollectorControllerGroupStatParser._instances = {}
+class TestCollectorControllerGroupSampler:
+    def test_two_column_format(self, tmp_path):
+        """Test sampling the two-column stat format"""
+        path = tmp_path / "cpu.stat"
+        path.write_text("usage_usec 76128949\nuser_usec 45340836\nsystem_usec 30788112\n")
+        sampler = CollectorControllerGroupSampler(str(path))
 
-    def test_instance_singleton(self):
-        """Test instance method creates singleton instances"""
-        parser1 = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-        parser2 = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-        parser3 = CollectorControllerGroupStatParser.instance("/different/path", "r")
+        with patch('pymergen.collector.cgroup.time.monotonic_ns', return_value=42):
+            timestamp_ns, values = sampler.sample()
+        sampler.close()
 
-        assert parser1 is parser2
-        assert parser1 is not parser3
+        assert timestamp_ns == 42
+        assert sampler.headers == ["usage_usec", "user_usec", "system_usec"]
+        assert values == [76128949, 45340836, 30788112]
 
-    @patch('builtins.open')
-    def test_parse_headers_two_column_format(self, mock_open_func):
-        """Test parsing headers from two-column stat format"""
-        mock_file = StringIO("usage_usec 76128949\nuser_usec 45340836\nsystem_usec 30788112\n")
-        mock_file.close = MagicMock()
-        mock_open_func.return_value = mock_file
+    def test_equal_sign_format(self, tmp_path):
+        """Test sampling the nested key format"""
+        path = tmp_path / "cpu.pressure"
+        path.write_text("some avg10=0.00 avg60=0.11 avg300=0.22 total=219731\nfull avg10=0.33 avg60=0.44 avg300=0.55 total=146364\n")
+        sampler = CollectorControllerGroupSampler(str(path))
 
-        parser = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-        headers = parser.parse_headers()
+        _, values = sampler.sample()
+        sampler.close()
 
-        assert headers == ["timestamp", "usage_usec", "user_usec", "system_usec"]
+        assert sampler.headers == ["some_avg10", "some_avg60", "some_avg300", "some_total", "full_avg10", "full_avg60", "full_avg300", "full_total"]
+        assert values == [0.0, 0.11, 0.22, 219731, 0.33, 0.44, 0.55, 146364]
 
-    @patch('builtins.open')
-    def test_parse_headers_equal_sign_format(self, mock_open_func):
-        """Test parsing headers from key=value format"""
-        mock_file = StringIO("some avg10=0.00 avg60=0.00 avg300=0.00 total=219731\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=146364\n")
-        mock_file.close = MagicMock()
-        mock_open_func.return_value = mock_file
-
-        parser = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-        headers = parser.parse_headers()
-
-        assert headers == ["timestamp", "some_avg10", "some_avg60", "some_avg300", "some_total", "full_avg10", "full_avg60", "full_avg300", "full_total"]
-
-    @patch('builtins.open')
-    def test_parse_headers_invalid_format(self, mock_open_func):
-        """Test parsing headers with invalid format raises exception"""
-        mock_file = StringIO("invalid\n")
-        mock_file.close = MagicMock()
-        mock_open_func.return_value = mock_file
-
-        parser = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
+    def test_invalid_format(self, tmp_path):
+        """Test an unparsable line raises an exception"""
+        path = tmp_path / "invalid"
+        path.write_text("invalid\n")
+        sampler = CollectorControllerGroupSampler(str(path))
         with pytest.raises(Exception) as excinfo:
-            parser.parse_headers()
+            sampler.sample()
+        sampler.close()
         assert "Unable to parse headers" in str(excinfo.value)
 
-    @patch('builtins.open')
-    def test_parse_values_two_column_format(self, mock_open_func):
-        """Test parsing values from two-column stat format"""
-        mock_file = StringIO("usage_usec 76128949\nuser_usec 45340836\nsystem_usec 30788112\n")
-        mock_file.close = MagicMock()
-        mock_open_func.return_value = mock_file
-
-        parser = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-
-        with patch('pymergen.collector.cgroup.datetime') as mock_datetime:
-            mock_datetime.now().isoformat.return_value = "2023-01-01T00:00:00"
-            values = parser.parse_values()
-
-        assert values[0] == "2023-01-01T00:00:00" # timestamp
-        assert values[1:] == ["76128949", "45340836", "30788112"]
-
-    @patch('builtins.open')
-    def test_parse_values_equal_sign_format(self, mock_open_func):
-        """Test parsing values from key=value format"""
-        mock_file = StringIO("some avg10=0.00 avg60=0.11 avg300=0.22 total=219731\nfull avg10=0.33 avg60=0.44 avg300=0.55 total=146364\n")
-        mock_file.close = MagicMock()
-        mock_open_func.return_value = mock_file
-
-        parser = CollectorControllerGroupStatParser.instance("/path/to/file", "r")
-
-        with patch('pymergen.collector.cgroup.datetime') as mock_datetime:
-            mock_datetime.now().isoformat.return_value = "2023-01-01T00:00:00"
-            values = parser.parse_values()
-
-        assert values[0] == "2023-01-01T00:00:00" # timestamp
-        assert values[1:] == ["0.00", "0.11", "0.22", "219731", "0.33", "0.44", "0.55", "146364"]
+    def test_layout_reused(self, tmp_path):
+        """Test the file is opened once and the layout is reused while values change"""
+        path = tmp_path / "cpu.stat"
+        path.write_text("usage_usec 1\nuser_usec 2\n")
+        sampler = CollectorControllerGroupSampler(str(path))
+        sampler.sample()
+        headers = sampler.headers
+        with open(path, "w") as fh:
+            fh.write("usage_usec 1000000\nuser_usec 20\n")
+        with patch('pymergen.collector.cgroup.os.open') as mock_open_fd:
+            _, values = sampler.sample()
+        sampler.close()
+        mock_open_fd.assert_not_called()
+        assert sampler.headers is headers
+        assert values == [1000000, 20]
+
+    def test_layout_changed(self, tmp_path):
+        """Test the layout is recompiled when fields appear or change their type"""
+        path = tmp_path / "io.stat"
+        path.write_text("8:0 rbytes=1 wbytes=2\n")
+        sampler = CollectorControllerGroupSampler(str(path))
+        sampler.sample()
+        path.write_text("8:0 rbytes=1 wbytes=2\n8:16 rbytes=3 wbytes=4\n")
+        _, values = sampler.sample()
+        assert sampler.headers == ["8:0_rbytes", "8:0_wbytes", "8:16_rbytes", "8:16_wbytes"]
+        assert values == [1, 2, 3, 4]
+        path.write_text("8:0 rbytes=max wbytes=2\n8:16 rbytes=3 wbytes=4\n")
+        _, values = sampler.sample()
+        sampler.close()
+        assert values == ["max", 2, 3, 4]
+
+    def test_large_file(self, tmp_path):
+        """Test files larger than the buffer are read completely"""
+        path = tmp_path / "memory.stat"
+        path.write_text("".join("field_{i} {i}\n".format(i=i) for i in range(1000)))
+        sampler = CollectorControllerGroupSampler(str(path))
+        _, values = sampler.sample()
+        sampler.close()
+        assert values == list(range(1000))
 
 
 class TestCollectorControllerGroupStatLogger:
@@ -181,80 +229,266 @@ class TestCollectorControllerGroupStatLogger:
         mock_file.write.assert_called_once_with("test data\n")
         mock_file.flush.assert_called_once()
 
+    def test_log_line_compressed(self, tmp_path):
+        """Test log_line writes through a compressing writer and close finalizes the stream"""
+        path = str(tmp_path / "collector.cgroup_test_cpu_stat.log")
+        logger = CollectorControllerGroupStatLogger.instance(path, "a", "gzip")
+        logger.log_line("timestamp usage_usec")
+        logger.log_line("2023-01-01T00:00:00 1")
+        logger.close()
 
-class TestCollectorControllerGroup:
-    @pytest.mark.skip
-    @patch('pymergen.collector.cgroup.time.sleep')
-    @patch('pymergen.collector.cgroup.os.path.join')
-    @patch('pymergen.collector.cgroup.CollectorControllerGroupStatLogger.instance')
-    @patch('pymergen.collector.cgroup.CollectorControllerGroupStatParser.instance')
-    def test_run(self, mock_parser_instance, mock_logger_instance, mock_join, mock_sleep):
-        """Test the run method of CollectorControllerGroup"""
-        # Setup mocks
-        mock_executor = MagicMock()
-        mock_executor.run_path.return_value = "/test/run/path"
-
-        mock_join.side_effect = lambda *args: os.path.join(*args)
-
-        mock_logger = MagicMock()
-        mock_logger.is_first_call = True
-        mock_logger_instance.return_value = mock_logger
-
-        mock_parser = MagicMock()
-        mock_parser.parse_headers.return_value = ["header1", "header2"]
-        mock_parser.parse_values.return_value = ["value1", "value2"]
-        mock_parser_instance.return_value = mock_parser
+        assert path not in CollectorControllerGroupStatLogger._instances
+        with gzip.open(path + ".gz", "rt") as fh:
+            assert fh.read() == "timestamp usage_usec\n2023-01-01T00:00:00 1\n"
 
-        # Create test data
-        mock_controller = MagicMock()
-        mock_controller.stat_files = ["stat.file1", "stat.file2"]
 
-        mock_cgroup = MagicMock()
-        mock_cgroup.name = "test_cgroup"
-        mock_cgroup.DIR_BASE = "/sys/fs/cgroup"
-        mock_cgroup.controllers = [mock_controller]
-
-        mock_parent_context = MagicMock()
-        mock_parent_context.cgroups = [mock_cgroup]
+class TestCollectorControllerGroup:
+    def test_run_store(self, tmp_path):
+        """Test samples are sent to the store and no log file is written when files are disabled"""
+        os.makedirs(tmp_path / "test_cgroup")
+        (tmp_path / "test_cgroup" / "cpu.stat").write_text("usage_usec 100\nuser_usec 60\n")
+        controller = MagicMock()
+        controller.stat_files = ["cpu.stat"]
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path)
+        cgroup.controllers = [controller]
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
 
-        # Create collector and set it up for testing
         collector = CollectorControllerGroup()
-        collector.ramp = 0  # No delay for testing
-        collector.interval = 0.1  # Small interval for testing
-        collector._executor = mock_executor
-
-        # Set up the join behavior - run once then exit
-        def set_join():
-            collector._join = True
-        mock_sleep.side_effect = [None, set_join]  # First sleep does nothing, second sets join flag
-
-        # Execute
-        collector.run(mock_parent_context)
+        collector.context = MagicMock()
+        collector.context.files = False
+        collector._executor = MagicMock()
+        collector._executor.node_path.return_value = "plan/r001/suite/r001/case/r001/i001"
+        collector._clock_offset_ns = 0
+
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 0
+        schedule.skipped = 0
+        collector.sample(parent_context, schedule)
+
+        collector._executor.run_path.assert_not_called()
+        calls = [c[0] for c in collector.context.store.sample.call_args_list]
+        assert [(c[0], c[1], c[2], c[4]) for c in calls[2:]] == [
+            ("plan/r001/suite/r001/case/r001/i001", "collector.cgroup_test_cgroup_cpu_stat", "usage_usec", 100),
+            ("plan/r001/suite/r001/case/r001/i001", "collector.cgroup_test_cgroup_cpu_stat", "user_usec", 60),
+        ]
+        assert [c[2] for c in calls[:2]] == ["jitter_ns", "skipped"]
+
+    def test_run_leaves(self, tmp_path):
+        """Test leaves of nested cgroups are sampled next to their parent"""
+        controller = MagicMock()
+        controller.stat_files = ["cpu.stat"]
+        groups = list()
+        for name in ["test_cgroup", "test_cgroup/case_p001"]:
+            os.makedirs(tmp_path / name)
+            (tmp_path / name / "cpu.stat").write_text("usage_usec 100\n")
+            group = MagicMock()
+            group.name = name
+            group.DIR_BASE = str(tmp_path)
+            group.controllers = [controller]
+            group.leaves.return_value = list()
+            groups.append(group)
+        groups[0].leaves.return_value = [groups[1]]
+        parent_context = MagicMock()
+        parent_context.cgroups = [groups[0]]
 
-        # Verify
-        assert mock_sleep.call_count == 2
+        collector = CollectorControllerGroup()
+        collector.context = MagicMock()
+        collector.context.files = False
+        collector._executor = MagicMock()
+        collector._executor.node_path.return_value = "plan"
+        collector._clock_offset_ns = 0
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 0
+        schedule.skipped = 0
+        collector.sample(parent_context, schedule)
+
+        sources = [c[0][1] for c in collector.context.store.sample.call_args_list if c[0][2] == "usage_usec"]
+        assert sources == ["collector.cgroup_test_cgroup_cpu_stat", "collector.cgroup_test_cgroup_case_p001_cpu_stat"]
+
+    def test_run(self, tmp_path):
+        """Test the run method of CollectorControllerGroup"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        (tmp_path / "sys" / "test_cgroup" / "stat.file1").write_text("usage_usec 100\n")
+        (tmp_path / "sys" / "test_cgroup" / "stat.file2").write_text("some avg10=0.50 total=7\n")
+        os.makedirs(tmp_path / "run")
+        controller = MagicMock()
+        controller.stat_files = ["stat.file1", "stat.file2"]
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        cgroup.controllers = [controller]
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
 
-        # Verify each stat file is processed
-        assert mock_logger_instance.call_count == 2  # Once for each stat file
-        assert mock_parser_instance.call_count == 2
+        collector = CollectorControllerGroup()
+        collector.context = MagicMock()
+        collector.context.store = None
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+
+        collector.interval = 1e-8
+        # Interval of 10ns started at 10ns: the first tick samples late at 20ns and 30ns, the second tick overruns
+        # until 50ns and skips the deadlines at 20ns and 30ns.
+        with patch('pymergen.collector.engine.time.monotonic_ns', side_effect=[10, 40]):
+            schedule = CollectorSchedule(collector.interval)
+            schedule.start()
+        with patch('pymergen.collector.cgroup.time.monotonic_ns', side_effect=[20, 30]):
+            collector.sample(parent_context, schedule)
+        with patch('pymergen.collector.engine.time.monotonic_ns', return_value=40):
+            schedule.next()
+        with patch('pymergen.collector.cgroup.time.monotonic_ns', side_effect=[50, 60]):
+            collector.sample(parent_context, schedule)
+        collector._executor = MagicMock()
+        collector._task = MagicMock()
+        collector._task.error = None
+        with patch('pymergen.collector.thread.CollectorEngine'):
+            collector.stop()
+
+        with open(tmp_path / "run" / "collector.cgroup_test_cgroup_stat_file1.log") as fh:
+            assert fh.read() == "timestamp_ns jitter_ns skipped usage_usec\n20 10 0 100\n50 10 2 100\n"
+        with open(tmp_path / "run" / "collector.cgroup_test_cgroup_stat_file2.log") as fh:
+            assert fh.read() == "timestamp_ns jitter_ns skipped some_avg10 some_total\n30 20 0 0.5 7\n60 20 2 0.5 7\n"
+        collector.context.manifest.register.assert_any_call(str(tmp_path / "run" / "collector.cgroup_test_cgroup_stat_file1.log"))
+        assert collector._samplers == {}
+
+    def test_run_binary(self, tmp_path):
+        """Test samples are written as a binary series when configured"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        (tmp_path / "sys" / "test_cgroup" / "cpu.stat").write_text("usage_usec 100\n")
+        os.makedirs(tmp_path / "run")
+        controller = MagicMock()
+        controller.stat_files = ["cpu.stat"]
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        cgroup.controllers = [controller]
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
 
-        # Verify logger operations
-        assert mock_logger.log_line.call_count == 4  # Two calls for each stat file (headers + values)
+        collector = CollectorControllerGroup()
+        collector.parse({"name": "test", "format": "binary"})
+        collector.context = MagicMock()
+        collector.context.store = None
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 5
+        schedule.skipped = 0
+        with patch('pymergen.collector.cgroup.time.monotonic_ns', side_effect=[20, 30]):
+            collector.sample(parent_context, schedule)
+            collector.sample(parent_context, schedule)
+        collector._task = MagicMock()
+        collector._task.error = None
+        with patch('pymergen.collector.thread.CollectorEngine'):
+            collector.stop()
+
+        series_file_path = str(tmp_path / "run" / "collector.cgroup_test_cgroup_cpu_stat.series")
+        assert not os.path.exists(tmp_path / "run" / "collector.cgroup_test_cgroup_cpu_stat.log")
+        collector.context.manifest.register.assert_called_once_with(series_file_path)
+        reader = SeriesReader(series_file_path)
+        reader.numpy = None
+        segments = reader.read()
+        assert len(segments) == 1
+        assert {name: values.tolist() for name, values in segments[0].items()} == {
+            "timestamp_ns": [20, 30],
+            "jitter_ns": [5, 5],
+            "skipped": [0, 0],
+            "usage_usec": [100, 100],
+        }
+        assert collector._series_writers == {}
+
+    def test_run_pressure(self, tmp_path):
+        """Test cgroup and system-wide pressure files are sampled and unreadable files are skipped"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        os.makedirs(tmp_path / "proc")
+        pressure = "some avg10=0.50 avg60=0.25 avg300=0.00 total=1500\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=20\n"
+        (tmp_path / "sys" / "test_cgroup" / "cpu.pressure").write_text(pressure)
+        (tmp_path / "proc" / "memory").write_text(pressure)
+        os.makedirs(tmp_path / "run")
+        controller = MagicMock()
+        controller.stat_files = ["cpu.stat", "cpu.pressure"]
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        cgroup.controllers = [controller]
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
 
-        # Verify expected paths were used
-        expected_log_paths = [
-            "/test/run/path/collector.cgroup_test_cgroup_stat_file1.log",
-            "/test/run/path/collector.cgroup_test_cgroup_stat_file2.log"
-        ]
-        expected_stat_paths = [
-            "/sys/fs/cgroup/test_cgroup/stat.file1",
-            "/sys/fs/cgroup/test_cgroup/stat.file2"
+        collector = CollectorControllerGroup()
+        collector.parse({"name": "test", "system_pressure": True})
+        collector.context = MagicMock()
+        collector.context.store = None
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 0
+        schedule.skipped = 0
+        with patch.object(CollectorControllerGroup, 'DIR_PRESSURE', str(tmp_path / "proc")), \
+                patch('pymergen.collector.cgroup.time.monotonic_ns', return_value=10):
+            collector.sample(parent_context, schedule)
+        collector._task = MagicMock()
+        collector._task.error = None
+        with patch('pymergen.collector.thread.CollectorEngine'):
+            collector.stop()
+
+        assert sorted(os.listdir(tmp_path / "run")) == [
+            "collector.cgroup_system_memory_pressure.log",
+            "collector.cgroup_test_cgroup_cpu_pressure.log",
         ]
+        with open(tmp_path / "run" / "collector.cgroup_test_cgroup_cpu_pressure.log") as fh:
+            assert fh.read() == (
+                "timestamp_ns jitter_ns skipped some_avg10 some_avg60 some_avg300 some_total full_avg10 full_avg60 full_avg300 full_total\n"
+                "10 0 0 0.5 0.25 0.0 1500 0.0 0.0 0.0 20\n"
+            )
+
+    def test_run_rates(self, tmp_path):
+        """Test derived rates are logged during the run and summarized when the collector stops"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        stat_file = tmp_path / "sys" / "test_cgroup" / "cpu.stat"
+        os.makedirs(tmp_path / "run")
+        controller = MagicMock()
+        controller.stat_files = ["cpu.stat"]
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        cgroup.controllers = [controller]
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
 
-        mock_logger_instance.assert_any_call(expected_log_paths[0], 'a')
-        mock_logger_instance.assert_any_call(expected_log_paths[1], 'a')
-        mock_parser_instance.assert_any_call(expected_stat_paths[0], 'r')
-        mock_parser_instance.assert_any_call(expected_stat_paths[1], 'r')
+        collector = CollectorControllerGroup()
+        collector.parse({"name": "test", "rates": True})
+        collector.context = MagicMock()
+        collector.context.store.sample = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+        collector._executor.node_path.return_value = "plan/r001/case/r001/i001"
+        collector._clock_offset_ns = 0
+        collector._parent_context = parent_context
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 0
+        schedule.skipped = 0
+        with patch('pymergen.collector.cgroup.time.monotonic_ns', side_effect=[0, 1000000000, 2000000000]):
+            for usage_usec in [0, 500000, 2000000]:
+                stat_file.write_text("usage_usec {v}\n".format(v=usage_usec))
+                collector.sample(parent_context, schedule)
+        collector._task = MagicMock()
+        collector._task.error = None
+        with patch('pymergen.collector.thread.CollectorEngine'):
+            collector.stop()
+
+        with open(tmp_path / "run" / "collector.cgroup_test_cgroup_cpu_stat_rates.log") as fh:
+            assert fh.read() == "timestamp_ns usage_cores\n1000000000 0.5\n2000000000 1.5\n"
+        with open(tmp_path / "run" / "stat.collector.cgroup_test_cgroup_cpu_stat.json") as fh:
+            summary = json.loads(fh.read())
+        assert summary == {"duration_ns": 2000000000, "delta": {"usage_usec": 2000000}, "rate": {"usage_cores": 1.0}}
+        collector.context.manifest.register.assert_any_call(str(tmp_path / "run" / "stat.collector.cgroup_test_cgroup_cpu_stat.json"))
+        collector.context.store.stat.assert_called_once_with("plan/r001/case/r001/i001", "collector", {"collector.cgroup_test_cgroup_cpu_stat": summary})
+        sources = {c[0][1] for c in collector.context.store.sample.call_args_list}
+        assert sources == {"collector.cgroup_test_cgroup_cpu_stat", "collector.cgroup_test_cgroup_cpu_stat_rates"}
+        assert collector._rate_states == {}
 
     @patch('pymergen.collector.process.AsyncProcessExecutor')
     def test_process_collector_lifecycle(self, mock_executor_class):
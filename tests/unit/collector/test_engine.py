@@ -0,0 +1,152 @@
+import time
+import threading
+from unittest.mock import patch
+from pymergen.collector.engine import CollectorSchedule, CollectorEngineTask, CollectorEngine
+
+
+class TestCollectorSchedule:
+    @patch('pymergen.collector.engine.time.monotonic_ns')
+    def test_deadlines(self, mock_monotonic_ns):
+        """Test deadlines are multiples of the interval regardless of the sampling cost"""
+        mock_monotonic_ns.side_effect = [1000, 1300, 2100, 3050]
+        schedule = CollectorSchedule(1e-6)
+        schedule.start()
+        assert schedule.interval_ns == 1000
+        assert schedule.jitter_ns(1200) == 200
+        assert schedule.next() == 700
+        assert schedule.deadline_ns == 2000
+        assert schedule.next() == 900
+        assert schedule.next() == 950
+        assert schedule.deadline_ns == 4000
+        assert schedule.skipped == 0
+
+    @patch('pymergen.collector.engine.time.monotonic_ns')
+    def test_overrun(self, mock_monotonic_ns):
+        """Test deadlines missed by an overrun are skipped and counted"""
+        mock_monotonic_ns.side_effect = [0, 3500, 6000]
+        schedule = CollectorSchedule(1e-6)
+        schedule.start()
+        assert schedule.next() == 500
+        assert schedule.deadline_ns == 4000
+        assert schedule.skipped == 3
+        # A deadline that is due right now is not missed
+        assert schedule.next() == 0
+        assert schedule.skipped == 4
+
+    @patch('pymergen.collector.engine.time.monotonic_ns')
+    def test_start_delay(self, mock_monotonic_ns):
+        """Test the first deadline is delayed by the ramp"""
+        mock_monotonic_ns.return_value = 100
+        schedule = CollectorSchedule(1)
+        schedule.start(0.5)
+        assert schedule.deadline_ns == 500000100
+
+    @patch('pymergen.collector.engine.time.sleep')
+    @patch('pymergen.collector.engine.time.monotonic_ns')
+    def test_sleep(self, mock_monotonic_ns, mock_sleep):
+        """Test sleeping until the next deadline"""
+        mock_monotonic_ns.side_effect = [0, 250000000]
+        schedule = CollectorSchedule(0.5)
+        schedule.start()
+        schedule.sleep()
+        mock_sleep.assert_called_once_with(0.25)
+
+    @patch('pymergen.collector.engine.time.monotonic_ns')
+    def test_final(self, mock_monotonic_ns):
+        """Test the final sample has no jitter and is reset by a new start"""
+        mock_monotonic_ns.return_value = 0
+        schedule = CollectorSchedule(1)
+        assert schedule.started is False
+        schedule.start()
+        assert schedule.started is True
+        schedule.final = True
+        assert schedule.jitter_ns(300) == 0
+        schedule.start(1)
+        assert schedule.final is False
+        assert schedule.started is False
+
+
+class TestCollectorEngineTask:
+    def test_finish(self):
+        """Test the final sample is taken once the ramp elapsed and its error is kept"""
+        schedules = list()
+        task = CollectorEngineTask("test", lambda schedule: schedules.append(schedule.final), 1, 60)
+        task.schedule.start(task.ramp)
+        task.finish()
+        assert schedules == []
+        task.schedule.start()
+        task.finish()
+        assert schedules == [True]
+        failing = CollectorEngineTask("test", lambda schedule: 1 / 0, 1)
+        failing.schedule.start()
+        failing.finish()
+        assert isinstance(failing.error, ZeroDivisionError)
+
+
+class TestCollectorEngine:
+    @staticmethod
+    def wait(condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return condition()
+
+    def test_instance(self):
+        """Test engines are shared per CPU"""
+        assert CollectorEngine.instance() is CollectorEngine.instance()
+        assert CollectorEngine.instance(0) is not CollectorEngine.instance()
+        assert CollectorEngine.instance(0).cpu == 0
+
+    def test_multiplex(self):
+        """Test a single thread runs tasks with different intervals and exits when idle"""
+        engine = CollectorEngine()
+        threads = {"fast": list(), "slow": list()}
+        fast = CollectorEngineTask("fast", lambda schedule: threads["fast"].append(threading.current_thread()), 0.001)
+        slow = CollectorEngineTask("slow", lambda schedule: threads["slow"].append(threading.current_thread()), 0.005)
+        engine.register(fast)
+        engine.register(slow)
+        thread = engine.thread
+        assert thread.name == "collector_engine"
+        assert self.wait(lambda: len(threads["slow"]) > 1)
+        engine.unregister(fast)
+        engine.unregister(slow)
+        assert len(threads["fast"]) > len(threads["slow"])
+        assert set(threads["fast"] + threads["slow"]) == {thread}
+        assert self.wait(lambda: engine.thread is None)
+        assert not fast.active
+
+    def test_unregister(self):
+        """Test no callback runs after a task is unregistered"""
+        engine = CollectorEngine()
+        calls = list()
+        task = CollectorEngineTask("test", lambda schedule: calls.append(schedule.deadline_ns), 0.001)
+        engine.register(task)
+        assert self.wait(lambda: len(calls) > 2)
+        engine.unregister(task)
+        count = len(calls)
+        time.sleep(0.01)
+        assert len(calls) == count
+        assert calls == sorted(calls)
+
+    def test_error(self):
+        """Test a failing callback is stopped and its error is kept for the collector"""
+        engine = CollectorEngine()
+
+        def callback(schedule):
+            raise ValueError("failed")
+        task = CollectorEngineTask("test", callback, 0.001)
+        engine.register(task)
+        assert self.wait(lambda: task.error is not None)
+        engine.unregister(task)
+        assert str(task.error) == "failed"
+        assert self.wait(lambda: engine.thread is None)
+
+    def test_ramp(self):
+        """Test tasks are not run before their ramp"""
+        engine = CollectorEngine()
+        calls = list()
+        task = CollectorEngineTask("test", lambda schedule: calls.append(1), 0.001, 10)
+        engine.register(task)
+        time.sleep(0.01)
+        engine.unregister(task)
+        assert calls == []
@@ -0,0 +1,89 @@
+import os
+import select
+import threading
+from unittest.mock import MagicMock, patch
+from pymergen.collector.events import CollectorInotify, CollectorControllerGroupEvents
+
+
+class TestCollectorInotify:
+    def test_watch(self, tmp_path):
+        """Test modifications of watched files are reported"""
+        path = tmp_path / "memory.events"
+        path.write_text("oom 0\n")
+        inotify = CollectorInotify()
+        try:
+            assert inotify.read() == []
+            inotify.watch(str(path))
+            path.write_text("oom 1\n")
+            events = inotify.read()
+            assert (str(path), CollectorInotify.IN_MODIFY) in events
+        finally:
+            inotify.close()
+        assert inotify.fd is None
+
+
+class TestCollectorControllerGroupEvents:
+    def test_parse(self):
+        """Test parsing configuration and defaults"""
+        collector = CollectorControllerGroupEvents()
+        collector.parse({"name": "test"})
+        assert collector.files == ["memory.events"]
+        collector.parse({"name": "test", "files": ["pids.events"]})
+        assert collector.files == ["pids.events"]
+
+    def test_run(self, tmp_path):
+        """Test event counters are logged when the kernel modifies them and missing files are skipped"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        events_file = tmp_path / "sys" / "test_cgroup" / "memory.events"
+        events_file.write_text("low 0\nhigh 0\nmax 0\noom 0\noom_kill 0\n")
+        os.makedirs(tmp_path / "run")
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
+        collector = CollectorControllerGroupEvents()
+        collector.parse({"name": "test", "files": ["memory.events", "pids.events"]})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+        collector._executor.node_path.return_value = "plan/r001/case/r001/i001"
+
+        log_file_path = tmp_path / "run" / "collector.events_test_cgroup_memory_events.log"
+        thread = threading.Thread(target=collector.run, args=[parent_context])
+        thread.start()
+        try:
+            for _ in range(500):
+                if collector._wakeup is not None and log_file_path.exists():
+                    break
+                threading.Event().wait(0.01)
+            # Rewritten in place like the kernel does, a truncation would be reported as a separate modification
+            with open(events_file, "r+") as fh:
+                fh.write("low 0\nhigh 3\nmax 1\noom 1\noom_kill 1\n")
+            for _ in range(500):
+                if len(log_file_path.read_text().splitlines()) == 3:
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            collector.join()
+            thread.join()
+            collector.stop = MagicMock()
+
+        lines = log_file_path.read_text().splitlines()
+        assert lines[0] == "timestamp_ns low high max oom oom_kill"
+        assert lines[1].split()[1:] == ["0", "0", "0", "0", "0"]
+        assert lines[2].split()[1:] == ["0", "3", "1", "1", "1"]
+        assert int(lines[2].split()[0]) >= int(lines[1].split()[0])
+        collector.context.manifest.register.assert_called_once_with(str(log_file_path))
+        metrics = [c[0][2] for c in collector.context.store.sample.call_args_list]
+        assert metrics == ["low", "high", "max", "oom", "oom_kill"] * 2
+        assert not (tmp_path / "run" / "collector.events_test_cgroup_pids_events.log").exists()
+
+    def test_stop(self):
+        """Test the wakeup pipe is closed once the thread is joined"""
+        collector = CollectorControllerGroupEvents()
+        collector._executor = MagicMock()
+        collector._wakeup = os.pipe()
+        collector.stop()
+        collector._executor.execute_stop.assert_called_once()
+        assert collector._wakeup is None
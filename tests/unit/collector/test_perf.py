@@ -1,13 +1,80 @@
+import os
+import json
+import time
+import signal
+import threading
 import pytest
 from unittest.mock import MagicMock, patch
 from pymergen.collector.perf import (
     CollectorPerf,
     CollectorPerfEvent,
     CollectorPerfStat,
-    CollectorPerfProfile
+    CollectorPerfStatMetrics,
+    CollectorPerfStatParser,
+    CollectorPerfProfile,
+    CollectorPerfSched,
+    CollectorPerfSchedSummary,
+    CollectorPerfSession
 )
 
 
+@pytest.fixture
+def perf_session(tmp_path):
+    # Stands in for perf, acknowledging the commands read from the control FIFO
+    session = CollectorPerfSession(str(tmp_path / "perf.session"))
+    session.open()
+    commands = list()
+
+    def serve():
+        control = os.open(session.control_path, os.O_RDONLY)
+        ack = os.open(session.ack_path, os.O_WRONLY)
+        with os.fdopen(control, "rb", buffering=0) as fh:
+            for line in iter(fh.readline, b""):
+                commands.append(line.strip().decode())
+                os.write(ack, b"ack\n")
+                if line.strip() == b"stop":
+                    break
+        os.close(ack)
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    yield session, commands
+    os.write(session._control_fd, b"stop\n")
+    thread.join()
+    session.close()
+
+
+class TestCollectorPerfSession:
+    def test_control(self, perf_session):
+        """Test commands are written to the control FIFO and acknowledged"""
+        session, commands = perf_session
+        session.control(CollectorPerfSession.COMMAND_ENABLE)
+        session.control(CollectorPerfSession.COMMAND_DISABLE)
+        assert commands == ["enable", "disable"]
+
+    def test_control_timeout(self, tmp_path):
+        """Test a command that is never acknowledged fails"""
+        session = CollectorPerfSession(str(tmp_path / "session"))
+        session.TIMEOUT = 0.1
+        session.open()
+        try:
+            with pytest.raises(Exception, match="No acknowledgement of enable"):
+                session.control(CollectorPerfSession.COMMAND_ENABLE)
+        finally:
+            session.close()
+        assert not os.path.exists(tmp_path / "session")
+
+    def test_wait_output(self, tmp_path):
+        """Test the output file switched after the known ones is found"""
+        session = CollectorPerfSession(str(tmp_path))
+        (tmp_path / "perf.data.2024").write_text("")
+        known = session.outputs("perf.data")
+        (tmp_path / "perf.data.2025").write_text("")
+        (tmp_path / "perf.data").write_text("")
+        assert known == ["perf.data.2024"]
+        assert session.wait_output("perf.data", known) == str(tmp_path / "perf.data.2025")
+
+
 class TestCollectorPerf:
     def test_init(self):
         """Test perf collector initialization"""
@@ -197,6 +264,192 @@ class TestCollectorPerfStat:
         assert "-e '{page-faults}'" in cmd_str
 
 
+    def test_prepare_cmd_parts_interval(self):
+        """Test interval mode writes CSV counts to stderr instead of a data file"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "interval": 0.5, "events": [{"name": "cycles"}]})
+        assert collector.cmd == "perf stat -I 500 -x , -a -e '{cycles}'"
+        parsers = collector.command().parsers
+        assert len(parsers) == 1
+        assert parsers[0].stream == "stderr"
+        assert parsers[0].collector is collector
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "events": [{"name": "cycles"}]})
+        assert collector.command().parsers == []
+
+    def test_interval(self, tmp_path):
+        """Test interval counts are logged per cgroup with derived metrics and totals of the node"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "interval": 1, "events": [{"name": "cycles", "cgroup": "cg"}, {"name": "instructions", "cgroup": "cg"}]})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        collector._executor.node_path.return_value = "plan"
+        collector._started_ns = 1000
+        collector._clock_offset_ns = 0
+        collector._parent_context = MagicMock()
+        parser = collector.command().parsers[0].instance()
+        parser.write(b"# started on Mon\n\n")
+        parser.write(b"     1.000100000,1000,,cycles,cg,1000000,100.00,,\n     1.000100000,2000,,instructions,cg,1000000,100.00,2.00,insn per cycle\n")
+        parser.write(b"     2.000200000,<not counted>,,cycles,cg,0,0.00,,\n     2.000200000,3000,,cycles,cg,1000000,100.00,,\n")
+        parser.write(b"     2.000200000,3000,,instructions,cg,1000000,100.00,,\n")
+        parser.close()
+        with open(tmp_path / "collector.perf_stat_cg.log", "r") as fh:
+            assert fh.read().splitlines() == [
+                "timestamp_ns cycles instructions ipc enabled_pct",
+                "1000101000 1000.0 2000.0 2.0 100.0",
+                "2000201000 3000.0 3000.0 1.0 100.0",
+            ]
+        with open(tmp_path / "stat.collector.perf_stat.json", "r") as fh:
+            summary = json.loads(fh.read())
+        assert summary == {"cg": {"total": {"cycles": 4000.0, "instructions": 5000.0}, "derived": {"ipc": 1.25}, "enabled_pct": {"cycles": 100.0, "instructions": 100.0}, "scaled": False}}
+        collector.context.store.stat.assert_called_once_with("plan", "collector", {"collector.perf_stat": summary})
+        collector._executor.execute_stop = MagicMock()
+        collector.stop()
+        assert collector._stat_loggers == dict()
+
+    def test_parse_persistent(self):
+        """Test a persistent session requires interval mode"""
+        collector = CollectorPerfStat()
+        with pytest.raises(Exception, match="requires an interval"):
+            collector.parse({"name": "perf", "persistent": True, "events": [{"name": "cycles"}]})
+
+    def test_parse_metrics(self):
+        """Test metric groups require interval mode"""
+        collector = CollectorPerfStat()
+        with pytest.raises(Exception, match="require an interval"):
+            collector.parse({"name": "perf", "metrics": [{"name": "TopdownL1"}]})
+
+    def test_prepare_cmd_parts_persistent(self):
+        """Test a persistent session is started with its counters disabled and a control FIFO"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "persistent": True, "interval": 1, "events": [{"name": "cycles"}]})
+        collector.context = MagicMock()
+        collector.context.run_path = "/run"
+        assert collector.cmd == "perf stat -I 1000 -x , -a -e '{cycles}' --control fifo:/run/perf.session/control.fifo,/run/perf.session/ack.fifo --delay=-1"
+
+    def test_persistent(self, perf_session, tmp_path):
+        """Test a single perf process counts for each node and intervals are attributed to the running node"""
+        session, commands = perf_session
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "persistent": True, "interval": 0.01, "events": [{"name": "cycles"}]})
+        collector.context = MagicMock()
+        collector.context.files = False
+        collector.context.run_path = str(tmp_path)
+        with patch("pymergen.collector.process.AsyncProcessExecutor") as executor:
+            executor.return_value.node_path.side_effect = lambda context: context
+            parser = collector.command().parsers[0].instance()
+
+            def disabled(count, line):
+                # perf prints the interval cut short by disabling the counters once it acknowledged the command
+                def emit():
+                    while commands.count("disable") < count:
+                        time.sleep(0.001)
+                    parser.write(line)
+                thread = threading.Thread(target=emit)
+                thread.start()
+                return thread
+
+            collector.start("node1")
+            parser.write(b"1.0,100,,cycles,1000,100.00,,\n")
+            thread = disabled(1, b"1.5,20,,cycles,1000,100.00,,\n")
+            started = time.monotonic()
+            collector.stop()
+            thread.join()
+            parser.write(b"2.0,50,,cycles,1000,100.00,,\n")
+            collector.start("node2")
+            parser.write(b"3.0,200,,cycles,1000,100.00,,\n")
+            thread = disabled(2, b"3.5,10,,cycles,1000,100.00,,\n")
+            collector.stop()
+            thread.join()
+            # Stopping does not wait for a tick of perf or the timeout
+            assert time.monotonic() - started < CollectorPerfStat.FLUSH_TIMEOUT * 2
+            assert executor.call_count == 1
+            assert commands == ["enable", "disable", "enable", "disable"]
+            stats = collector.context.store.stat.call_args_list
+            assert stats[0][0] == ("node1", "collector", {"collector.perf_stat": {"system": {"total": {"cycles": 120.0}, "derived": {}, "enabled_pct": {"cycles": 100.0}, "scaled": False}}})
+            assert stats[1][0] == ("node2", "collector", {"collector.perf_stat": {"system": {"total": {"cycles": 210.0}, "derived": {}, "enabled_pct": {"cycles": 100.0}, "scaled": False}}})
+            collector.close()
+            executor.return_value.execute_stop.assert_called_once()
+        assert collector.session is None
+        assert not os.path.exists(session.path)
+
+    def test_prepare_cmd_parts_metrics(self):
+        """Test metric groups are counted per cgroup and system-wide"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "interval": 1, "metrics": [{"name": "TopdownL1", "cgroup": "cg"}, {"name": "TopdownL2", "cgroup": "cg"}, {"name": "TopdownL1"}]})
+        assert collector.has_cgroups is True
+        assert collector.has_metrics is True
+        assert collector.cmd == "perf stat -I 1000 -x , -M TopdownL1,TopdownL2 -G cg -a -M TopdownL1"
+
+    def test_interval_metrics(self, tmp_path):
+        """Test top-down metrics per cgroup and the scaling of multiplexed counters"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "interval": 1, "metrics": [{"name": "TopdownL1", "cgroup": "cg"}]})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        collector._executor.node_path.return_value = "plan"
+        collector._started_ns = 0
+        collector._clock_offset_ns = 0
+        collector._parent_context = MagicMock()
+        parser = collector.command().parsers[0].instance()
+        for interval, (frontend, backend, pct) in [("1.0", ("20.0", "40.0", "100.00")), ("2.0", ("30.0", "60.0", "50.00"))]:
+            parser.write("{i},1000,,TOPDOWN.SLOTS,cg,1000,{p},{f},%  tma_frontend_bound\n".format(i=interval, p=pct, f=frontend).encode())
+            parser.write("{i},,,,cg,,,{b},%  tma_backend_bound\n".format(i=interval, b=backend).encode())
+            parser.write("{i},<not supported>,,cycles,cg,0,0.00,,\n".format(i=interval).encode())
+        parser.close()
+        with open(tmp_path / "collector.perf_stat_cg.log", "r") as fh:
+            lines = fh.read().splitlines()
+        assert lines[0] == "timestamp_ns TOPDOWN.SLOTS tma_frontend_bound tma_backend_bound enabled_pct"
+        assert lines[2] == "2000000000 1000.0 30.0 60.0 50.0"
+        with open(tmp_path / "stat.collector.perf_stat.json", "r") as fh:
+            summary = json.loads(fh.read())["cg"]
+        assert summary["metrics"] == {"tma_frontend_bound": 25.0, "tma_backend_bound": 50.0}
+        assert summary["topdown"] == {"frontend_bound": 0.25, "backend_bound": 0.5}
+        assert summary["enabled_pct"] == {"TOPDOWN.SLOTS": 75.0}
+        assert summary["scaled"] is True
+
+
+    def test_parser_wait(self):
+        """Test waiting for an interval to be printed in full"""
+        collector = CollectorPerfStat()
+        collector.parse({"name": "perf", "interval": 1, "events": [{"name": "cycles"}, {"name": "instructions"}]})
+        collector._started_ns = 0
+        parser = collector.command().parsers[0].instance()
+        parser.write(b"1.0,100,,cycles,1000,100.00,,\n")
+        assert parser.wait(0, 0.01) is False
+        parser.write(b"1.0,100,,instructions,1000,100.00,,\n2.0,100,,cycles,1000,100.00,,\n")
+        # The first interval is complete once the second one started, which is complete with as many lines
+        assert parser.wait(0, 0.01) is True
+        assert parser.wait(1, 0.01) is False
+        parser.write(b"2.0,100,,instructions,1000,100.00,,\n")
+        assert parser.wait(1, 0.01) is True
+        assert parser.intervals == 2
+
+
+class TestCollectorPerfStatMetrics:
+    def test_derive(self):
+        """Test IPC, cache and branch miss rates, including aliases and modifiers of events"""
+        headers, values = CollectorPerfStatMetrics.derive({
+            "cpu-cycles:u": 200.0,
+            "instructions:u": 100.0,
+            "cache-references": 0.0,
+            "cache-misses": 0.0,
+            "branch-instructions": 50.0,
+            "branch-misses": 5.0,
+        })
+        assert headers == ["ipc", "cache_miss_rate", "branch_miss_rate"]
+        assert values == [0.5, 0.0, 0.1]
+        assert CollectorPerfStatMetrics.derive({"cycles": 1.0}) == ([], [])
+
+    def test_topdown(self):
+        """Test metric names from the unit column and top-down fractions with or without prefix"""
+        assert CollectorPerfStatMetrics.metric("%  tma_bad_speculation") == "tma_bad_speculation"
+        assert CollectorPerfStatMetrics.metric("insn per cycle") == "insn_per_cycle"
+        assert CollectorPerfStatMetrics.topdown({"tma_retiring": 50.0, "frontend_bound": 10.0, "insn_per_cycle": 2.0}) == {"retiring": 0.5, "frontend_bound": 0.1}
+
+
 class TestCollectorPerfProfile:
     def test_init(self):
         """Test perf profile collector initialization"""
@@ -224,3 +477,153 @@ class TestCollectorPerfProfile:
         assert "-G cgroup1" in cmd_str
         assert "-a" in cmd_str
         assert "-e '{page-faults}'" in cmd_str
+
+    def test_persistent(self, perf_session, tmp_path):
+        """Test the samples of each node are switched to a data file in the node directory"""
+        session, commands = perf_session
+        collector = CollectorPerfProfile()
+        collector.parse({"name": "perf", "persistent": True, "events": [{"name": "cycles"}]})
+        collector.context = MagicMock()
+        collector.context.run_path = str(tmp_path)
+        assert "-o {path}/perf.data --switch-output=signal".format(path=collector.session_path) in collector.cmd
+        with patch("pymergen.collector.process.AsyncProcessExecutor") as executor:
+            executor.return_value.run_path.return_value = str(tmp_path)
+            executor.return_value.execute_signal.side_effect = lambda sig: open(os.path.join(session.path, "perf.data.1"), "w").close()
+            collector.start("node1")
+            collector.stop()
+            executor.return_value.execute_signal.assert_called_once_with(signal.SIGUSR2)
+        assert commands == ["enable", "disable"]
+        assert os.path.exists(tmp_path / "collector.perf_profile.data")
+        collector.context.manifest.register.assert_called_once_with(str(tmp_path / "collector.perf_profile.data"))
+
+    def test_flamegraph(self, tmp_path):
+        """Test profiles are submitted for conversion once a node stopped and the pool is closed with the plan"""
+        collector = CollectorPerfProfile()
+        collector.parse({"name": "perf", "flamegraph": True, "flamegraph_workers": 3, "events": [{"name": "cycles"}]})
+        collector.context = MagicMock()
+        collector.context.work_path = str(tmp_path)
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        (tmp_path / "collector.perf_profile.data").write_bytes(b"data")
+        with patch("pymergen.collector.perf.FlamegraphPool") as pool:
+            pool.return_value.close.return_value = [Exception("failed")]
+            collector.stop()
+            pool.assert_called_once_with(str(tmp_path / "flamegraph.cache"), 3, None)
+            pool.return_value.submit.assert_called_once_with(str(tmp_path / "collector.perf_profile.data"), collector._register_flamegraph)
+            collector.close()
+            pool.return_value.close.assert_called_once()
+        collector.context.logger.error.assert_called_once()
+        collector._register_flamegraph(["a.svg"])
+        collector.context.manifest.register.assert_called_once_with("a.svg")
+
+
+TIMEHIST = """           time    cpu  task name                       wait time  sch delay   run time
+                        [tid/pid]                          (msec)     (msec)     (msec)
+--------------- ------  ------------------------------  ---------  ---------  ---------
+   79371.874569 [0011]  gcc[31949]                          0.014      0.004      1.148
+   79371.874591 [0010]  <idle>                              0.000      0.000      0.019
+   79371.874600 [0011]  gcc[31949]                          2.000      0.300      0.500
+   79371.874610 [0001]  perf[100]                                              migrated: gcc[31949] cpu 11 => 1
+   79371.874620 [0002]  cc1[31950]                          0.000      0.000      3.000
+"""
+
+
+class TestCollectorPerfSchedSummary:
+    def test_summary(self):
+        """Test wakeup latencies, run queue delays and migrations per task"""
+        summary = CollectorPerfSchedSummary()
+        summary.parse(TIMEHIST.splitlines(keepends=True))
+        data = summary.summary()
+        assert sorted(data["tasks"]) == ["cc1[31950]", "gcc[31949]"]
+        gcc = data["tasks"]["gcc[31949]"]
+        assert gcc["switches"] == 2
+        assert gcc["migrations"] == 1
+        assert gcc["delay_max_ms"] == 0.3
+        assert gcc["delay_avg_ms"] == pytest.approx(0.152)
+        assert gcc["wait_avg_ms"] == pytest.approx(1.007)
+        assert data["total"]["switches"] == 3
+        assert data["total"]["delay_max_ms"] == 0.3
+        # 0us, 4us and 300us
+        assert data["delay_histogram"]["le_1us"] == 1
+        assert data["delay_histogram"]["le_4us"] == 1
+        assert data["delay_histogram"]["le_512us"] == 1
+        assert sum(data["delay_histogram"].values()) == 3
+
+    def test_empty(self):
+        """Test a node without scheduler events"""
+        data = CollectorPerfSchedSummary().summary()
+        assert data["total"] == {"switches": 0, "migrations": 0, "delay_avg_ms": 0.0, "delay_max_ms": 0.0}
+
+
+class TestCollectorPerfSched:
+    def test_prepare_cmd_parts(self):
+        """Test perf sched record is scoped to a cgroup"""
+        collector = CollectorPerfSched()
+        collector.parse({"name": "sched", "cgroup": "benchmark", "custom": ["-m", "4096"]})
+        assert collector.cmd == "perf sched record -o {m:context:run_path}/collector.perf_sched.data -G benchmark -m 4096"
+
+    def test_timehist(self, tmp_path):
+        """Test the recording is summarized with perf sched timehist"""
+        data_file_path = str(tmp_path / "collector.perf_sched.data")
+        with patch("pymergen.collector.perf.subprocess.Popen") as popen:
+            popen.return_value.stdout.__iter__.return_value = iter(TIMEHIST.splitlines(keepends=True))
+            popen.return_value.wait.return_value = 0
+            summary = CollectorPerfSched.timehist(data_file_path, "sudo -n")
+            assert popen.call_args[0][0] == ["sudo", "-n", "perf", "sched", "timehist", "-M", "-f", "-i", data_file_path]
+        assert summary["total"]["migrations"] == 1
+
+    def test_timehist_failed(self, tmp_path):
+        """Test a failure to read the data file is raised"""
+        with patch("pymergen.collector.perf.subprocess.Popen") as popen:
+            popen.return_value.wait.return_value = 1
+            with pytest.raises(Exception, match="return code 1"):
+                CollectorPerfSched.timehist(str(tmp_path / "collector.perf_sched.data"))
+
+    def test_stop(self, tmp_path):
+        """Test the recording of the node is summarized in the pool, while the next nodes run"""
+        collector = CollectorPerfSched()
+        collector.parse({"name": "sched", "become_cmd": "sudo -n", "workers": 3})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        collector._executor.node_path.return_value = "plan"
+        data_file_path = str(tmp_path / "collector.perf_sched.data")
+        (tmp_path / "collector.perf_sched.data").write_bytes(b"data")
+        with patch("pymergen.collector.perf.FlamegraphPool") as pool, patch("pymergen.collector.perf.subprocess.Popen") as popen:
+            collector.stop()
+            popen.assert_not_called()
+            pool.assert_called_once_with(workers=3)
+            fn, args, callback = pool.return_value.call.call_args[0]
+            assert fn == CollectorPerfSched.timehist
+            assert args == (data_file_path, "sudo -n")
+            assert collector._parent_context is None
+            popen.return_value.stdout.__iter__.return_value = iter(TIMEHIST.splitlines(keepends=True))
+            popen.return_value.wait.return_value = 0
+            callback(fn(*args))
+        with open(tmp_path / "stat.collector.perf_sched.json", "r") as fh:
+            summary = json.loads(fh.read())
+        assert summary["total"]["migrations"] == 1
+        collector.context.store.stat.assert_called_once_with("plan", "collector", {"collector.perf_sched": summary["total"]})
+        assert collector._summarized == [str(tmp_path)]
+
+    def test_close(self, tmp_path):
+        """Test failures are logged and the entities of summarized nodes are rolled up again once the plan finished"""
+        collector = CollectorPerfSched()
+        collector.parse({"name": "sched"})
+        collector.context = MagicMock()
+        collector.context.run_path = str(tmp_path)
+        collector._pool = MagicMock()
+        collector._pool.close.return_value = [Exception("return code 1")]
+        collector._summarized = [str(tmp_path / "plan" / "r001" / "suite" / "r002")]
+        with patch("pymergen.collector.perf.Aggregator") as aggregator:
+            aggregator.return_value.aggregate.return_value = ["stat.summary.json"]
+            collector.close()
+            assert [c[0][0] for c in aggregator.return_value.aggregate.call_args_list] == [
+                str(tmp_path / "plan" / "r001" / "suite"),
+                str(tmp_path / "plan" / "r001"),
+                str(tmp_path / "plan"),
+            ]
+        collector.context.logger.error.assert_called_once()
+        collector.context.manifest.register.assert_called_with("stat.summary.json")
+        assert collector._pool is None
+        assert collector._summarized == []
@@ -0,0 +1,116 @@
+import os
+import select
+from unittest.mock import MagicMock, patch
+from pymergen.collector.pressure import CollectorPressureTrigger, CollectorPressureSource, CollectorPressure
+
+
+class TestCollectorPressureTrigger:
+    def test_parse(self):
+        """Test trigger configuration and defaults"""
+        trigger = CollectorPressureTrigger.parse({"resource": "memory", "type": "full", "threshold_us": 100000, "window_us": 2000000})
+        assert trigger.line == "full 100000 2000000"
+        trigger = CollectorPressureTrigger.parse({"resource": "cpu"})
+        assert trigger.resource == "cpu"
+        assert trigger.line == "some 150000 1000000"
+
+
+class TestCollectorPressureSource:
+    def test_open(self, tmp_path):
+        """Test the trigger is written to the pressure file, null terminated"""
+        path = tmp_path / "cpu.pressure"
+        path.write_text("")
+        source = CollectorPressureSource("test", str(path), CollectorPressureTrigger("cpu"))
+        assert source.open() == source.fd
+        source.close()
+        assert source.fd is None
+        assert path.read_bytes() == b"some 150000 1000000\0"
+
+    def test_log(self, tmp_path):
+        """Test events are logged with a header line"""
+        source = CollectorPressureSource("test", "cpu.pressure", CollectorPressureTrigger("cpu"))
+        source.event()
+        assert source.log(str(tmp_path / "events.log"), 10) is True
+        source.event()
+        assert source.log(str(tmp_path / "events.log"), 20) is False
+        source.close()
+        assert (tmp_path / "events.log").read_text() == "timestamp_ns events\n10 1\n20 2\n"
+
+
+class TestCollectorPressure:
+    def test_parse(self):
+        """Test parsing configuration"""
+        collector = CollectorPressure()
+        collector.parse({"name": "test", "system": True, "triggers": [{"resource": "io"}, {"resource": "cpu", "type": "full"}]})
+        assert collector.system is True
+        assert [trigger.line for trigger in collector.triggers] == ["some 150000 1000000", "full 150000 1000000"]
+
+    def test_sources(self):
+        """Test a source per trigger for every cgroup and the system"""
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = "/sys/fs/cgroup"
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
+        collector = CollectorPressure()
+        collector.parse({"name": "test", "system": True, "triggers": [{"resource": "memory"}]})
+        assert [(source.name, source.path) for source in collector.sources(parent_context)] == [
+            ("system", "/proc/pressure/memory"),
+            ("test_cgroup", "/sys/fs/cgroup/test_cgroup/memory.pressure"),
+        ]
+
+    def test_run(self, tmp_path):
+        """Test stall events are recorded as they are reported and removed cgroups are dropped"""
+        os.makedirs(tmp_path / "sys" / "test_cgroup")
+        (tmp_path / "sys" / "test_cgroup" / "cpu.pressure").write_text("")
+        os.makedirs(tmp_path / "run")
+        cgroup = MagicMock()
+        cgroup.name = "test_cgroup"
+        cgroup.DIR_BASE = str(tmp_path / "sys")
+        parent_context = MagicMock()
+        parent_context.cgroups = [cgroup]
+        collector = CollectorPressure()
+        collector.parse({"name": "test", "triggers": [{"resource": "cpu"}]})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path / "run")
+        collector._executor.node_path.return_value = "plan/r001/case/r001/i001"
+
+        poller = MagicMock()
+        registered = list()
+        poller.register.side_effect = lambda fd, mask: registered.append((fd, mask))
+
+        def poll():
+            fd = registered[1][0]
+            if len(poller.poll.call_args_list) == 3:
+                collector.join()
+                return [(registered[0][0], select.POLLIN)]
+            if len(poller.poll.call_args_list) == 2:
+                return [(fd, select.POLLERR)]
+            return [(fd, select.POLLPRI), (fd, select.POLLPRI)]
+        poller.poll.side_effect = poll
+        with patch('pymergen.collector.pressure.select.poll', return_value=poller), \
+                patch('pymergen.collector.pressure.time.monotonic_ns', return_value=10):
+            collector.run(parent_context)
+        collector.stop()
+
+        assert registered[1][1] == select.POLLPRI
+        poller.unregister.assert_called_once_with(registered[1][0])
+        log_file_path = tmp_path / "run" / "collector.pressure_test_cgroup_cpu_some.log"
+        assert log_file_path.read_text() == "timestamp_ns events\n10 1\n10 2\n"
+        collector.context.manifest.register.assert_called_once_with(str(log_file_path))
+        calls = collector.context.store.sample.call_args_list
+        assert [(c[0][0], c[0][1], c[0][2], c[0][4]) for c in calls] == [
+            ("plan/r001/case/r001/i001", "collector.pressure_test_cgroup_cpu_some", "events", 1),
+            ("plan/r001/case/r001/i001", "collector.pressure_test_cgroup_cpu_some", "events", 2),
+        ]
+        assert collector._wakeup is None
+
+    def test_run_stopped_during_ramp(self):
+        """Test a collector that is stopped during its ramp returns without waiting for the ramp to elapse"""
+        collector = CollectorPressure()
+        collector.parse({"name": "test", "ramp": 60, "triggers": [{"resource": "cpu"}]})
+        collector.join()
+        with patch('pymergen.collector.pressure.select.poll') as mock_poll:
+            collector.run(MagicMock())
+        mock_poll.assert_not_called()
+        assert collector._wakeup is None
@@ -0,0 +1,98 @@
+import os
+import time
+import subprocess
+import pytest
+from unittest.mock import MagicMock, patch
+from pymergen.collector.proc import CollectorProcFile, CollectorProcTask, CollectorProcProcess, CollectorProc
+
+
+@pytest.fixture
+def sleeper():
+    # A shell with a child process of its own, so that descendants are followed as well
+    process = subprocess.Popen(["sh", "-c", "sleep 30 & wait"])
+    for _ in range(500):
+        if os.path.exists("/proc/{pid}/task/{pid}/children".format(pid=process.pid)):
+            with open("/proc/{pid}/task/{pid}/children".format(pid=process.pid), "r") as fh:
+                if fh.read().strip():
+                    break
+        time.sleep(0.01)
+    yield process
+    process.kill()
+    process.wait()
+    subprocess.run(["pkill", "-P", str(process.pid)], check=False)
+
+
+class TestCollectorProcFile:
+    def test_read(self, tmp_path):
+        """Test the file is re-read from the start and the buffer grows for large files"""
+        path = tmp_path / "stat"
+        path.write_text("a" * 10)
+        fh = CollectorProcFile(str(path))
+        fh._size = 4
+        try:
+            assert fh.read() == b"a" * 10
+            path.write_text("b" * 3)
+            assert fh.read() == b"b" * 3
+            path.write_text("")
+            with pytest.raises(ProcessLookupError):
+                fh.read()
+        finally:
+            fh.close()
+
+
+class TestCollectorProcTask:
+    def test_sample(self, tmp_path):
+        """Test CPU times are converted to nanoseconds and the command name may contain spaces"""
+        (tmp_path / "stat").write_text("42 (my (cmd) x) S 1 42 42 0 -1 4194560 100 0 0 0 150 25 0 0 20 0 1 0 100 0\n")
+        (tmp_path / "schedstat").write_text("1000 2000 3\n")
+        task = CollectorProcTask(str(tmp_path), 100)
+        try:
+            assert task.sample() == ("my_(cmd)_x", [1500000000, 250000000, 1000, 2000, 3])
+            assert task.children() == []
+        finally:
+            task.close()
+
+
+class TestCollectorProcProcess:
+    def test_sample(self, sleeper):
+        """Test rows per thread with the memory and IO of the process"""
+        process = CollectorProcProcess(sleeper.pid, "sleeper", os.sysconf("SC_CLK_TCK"))
+        try:
+            rows = process.sample()
+            assert [row[0] for row in rows] == [sleeper.pid]
+            assert rows[0][1] == "sh"
+            assert len(rows[0][2]) == len(CollectorProcTask.HEADERS + CollectorProcProcess.HEADERS)
+            assert rows[0][2][5] > 0
+            assert len(process.children()) == 1
+        finally:
+            process.close()
+
+
+class TestCollectorProc:
+    def test_sample(self, sleeper, tmp_path):
+        """Test the commands of the node and their descendants are logged per thread"""
+        parent_context = MagicMock()
+        parent_context.pids = {sleeper.pid: "sleeper", 999999999: "exited"}
+        collector = CollectorProc()
+        collector.parse({"name": "proc", "interval": 1})
+        collector.context = MagicMock()
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        collector._executor.node_path.return_value = "plan"
+        collector._clock_offset_ns = 0
+        collector._task = MagicMock()
+        collector._task.error = None
+        with patch("pymergen.collector.thread.CollectorEngine"):
+            collector.sample(parent_context, MagicMock())
+            collector.sample(parent_context, MagicMock())
+            assert 999999999 in collector._exited
+            assert len(collector._processes) == 2
+            collector.stop()
+        assert collector._processes == dict()
+        with open(tmp_path / "collector.proc_sleeper.log", "r") as fh:
+            lines = fh.read().splitlines()
+        assert lines[0] == "timestamp_ns pid tid comm utime_ns stime_ns run_ns wait_ns timeslices rss_bytes read_bytes write_bytes"
+        assert len(lines) == 5
+        assert set(line.split()[3] for line in lines[1:]) == {"sh", "sleep"}
+        sources = set(c[0][1] for c in collector.context.store.sample.call_args_list)
+        assert "collector.proc_sleeper_{pid}_{pid}".format(pid=sleeper.pid) in sources
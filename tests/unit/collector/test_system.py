@@ -0,0 +1,119 @@
+import os
+from unittest.mock import MagicMock
+from pymergen.collector.system import CollectorSystemSampler, CollectorSystemRates, CollectorSystem
+
+
+def sampler(tmp_path, source, content):
+    path = tmp_path / source.replace("/", "_")
+    path.write_text(content)
+    return CollectorSystemSampler(str(path), source)
+
+
+class TestCollectorSystemSampler:
+    def test_stat(self, tmp_path):
+        """Test CPU modes per CPU and totals of interrupts"""
+        s = sampler(tmp_path, "stat", "cpu  10 0 20 70 0 0 0 0 0 0\ncpu0 10 0 20 70 0 0 0 0 0 0\nintr 500 1 2 3\nctxt 42\n")
+        timestamp_ns, values = s.sample()
+        assert s.headers[:4] == ["cpu_user", "cpu_nice", "cpu_system", "cpu_idle"]
+        assert s.headers[-2:] == ["intr", "ctxt"]
+        assert values[-2:] == [500, 42]
+        assert len(values) == 22
+
+    def test_meminfo(self, tmp_path):
+        """Test kilobytes are converted to bytes and counts are kept"""
+        s = sampler(tmp_path, "meminfo", "MemTotal:       1000 kB\nHugePages_Total:       2\n")
+        assert s.sample()[1] == [1024000, 2]
+        assert s.headers == ["MemTotal_bytes", "HugePages_Total"]
+
+    def test_diskstats(self, tmp_path):
+        """Test fields per device without loop devices"""
+        s = sampler(tmp_path, "diskstats", "   7       0 loop0 1 0 0 0 0 0 0 0 0 0 0\n 253       0 vda 4 0 8 2 1 0 2 3 0 5 5\n")
+        assert s.sample()[1] == [4, 0, 8, 2, 1, 0, 2, 3, 0, 5, 5]
+        assert s.headers[0] == "vda_reads"
+        assert s.headers[-1] == "vda_weighted_io_ms"
+
+    def test_net_dev(self, tmp_path):
+        """Test the column headers are skipped"""
+        s = sampler(tmp_path, "net/dev", "Inter-|   Receive\n face |bytes\n    lo: 100 2 0 0 0 0 0 0 300 4 0 0 0 0 0 0\n")
+        values = s.sample()[1]
+        assert s.headers[0] == "lo_rx_bytes"
+        assert s.headers[8] == "lo_tx_bytes"
+        assert values[0] == 100 and values[8] == 300
+
+    def test_loadavg(self, tmp_path):
+        """Test load averages and the running and total thread counts"""
+        s = sampler(tmp_path, "loadavg", "0.11 0.18 0.35 2/72 31691\n")
+        assert s.sample()[1] == [0.11, 0.18, 0.35, 2, 72]
+        assert s.headers == ["load1", "load5", "load15", "running", "threads"]
+
+    def test_interrupts(self, tmp_path):
+        """Test interrupt counts are summed over all CPUs"""
+        s = sampler(tmp_path, "interrupts", "     CPU0 CPU1\n 24:  1  2  IO-APIC 5-edge ACPI:Ged\nERR:  3\n")
+        assert s.sample()[1] == [3, 3]
+        assert s.headers == ["irq_24", "irq_ERR"]
+        # The layout is recompiled when an interrupt is added
+        (tmp_path / "interrupts").write_text("     CPU0 CPU1\n 24:  1  2  IO-APIC 5-edge ACPI:Ged\n 25:  4  4  IO-APIC 6-edge ACPI:Ged\nERR:  3\n")
+        assert s.sample()[1] == [3, 8, 3]
+        s.close()
+
+
+class TestCollectorSystemRates:
+    def test_cpu(self):
+        """Test CPU utilization by mode"""
+        rates = CollectorSystemRates("stat")
+        headers = ["cpu_user", "cpu_nice", "cpu_system", "cpu_idle", "cpu_iowait", "cpu_irq", "cpu_softirq", "cpu_steal", "ctxt"]
+        rates.derive(0, headers, [0, 0, 0, 0, 0, 0, 0, 0, 0])
+        derived = dict(zip(*rates.derive(1000000000, headers, [30, 0, 10, 60, 0, 0, 0, 0, 500])))
+        assert derived["cpu_user_pct"] == 30.0
+        assert derived["cpu_idle_pct"] == 60.0
+        assert derived["ctxt_per_sec"] == 500.0
+
+    def test_disk(self):
+        """Test disk bandwidth, IOPS, await and utilization"""
+        rates = CollectorSystemRates("diskstats")
+        headers = ["vda_reads", "vda_sectors_read", "vda_read_ms", "vda_writes", "vda_write_ms", "vda_in_flight", "vda_io_ms"]
+        rates.derive(0, headers, [0, 0, 0, 0, 0, 0, 0])
+        derived = dict(zip(*rates.derive(2000000000, headers, [10, 8, 30, 10, 10, 1, 500])))
+        assert derived["vda_riops"] == 5.0
+        assert derived["vda_read_bytes_per_sec"] == 2048.0
+        assert derived["vda_await_ms"] == 2.0
+        assert derived["vda_util_pct"] == 25.0
+
+
+class TestCollectorSystem:
+    def test_parse(self):
+        """Test rates are derived by default and sources can be selected"""
+        collector = CollectorSystem()
+        collector.parse({"name": "system", "sources": ["loadavg"]})
+        assert collector.rates is True
+        assert collector.sources == ["loadavg"]
+
+    def test_sample(self, tmp_path):
+        """Test all sources are sampled on the same tick and rates are logged"""
+        collector = CollectorSystem()
+        collector.parse({"name": "system", "sources": ["stat", "loadavg", "net/dev"]})
+        collector.context = MagicMock()
+        collector.context.store = None
+        collector._executor = MagicMock()
+        collector._executor.run_path.return_value = str(tmp_path)
+        collector._clock_offset_ns = 0
+        schedule = MagicMock()
+        schedule.jitter_ns.return_value = 0
+        schedule.skipped = 0
+        collector.sample(MagicMock(), schedule)
+        collector.sample(MagicMock(), schedule)
+        files = sorted(os.listdir(tmp_path))
+        assert files == [
+            "collector.system_loadavg.log",
+            "collector.system_net_dev.log",
+            "collector.system_net_dev_rates.log",
+            "collector.system_stat.log",
+            "collector.system_stat_rates.log",
+        ]
+        with open(tmp_path / "collector.system_stat_rates.log", "r") as fh:
+            assert "cpu_user_pct" in fh.readline().split()
+        collector._task = MagicMock()
+        collector._task.error = None
+        collector._parent_context = MagicMock()
+        collector.stop()
+        assert "stat.collector.system_stat.json" in os.listdir(tmp_path)
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from pymergen.collector.thread import CollectorThread
+from pymergen.collector.thread import CollectorThread, CollectorPeriodic
 from pymergen.core.executor import AsyncThreadExecutor
 
 
@@ -11,7 +11,7 @@ class TestCollectorThread:
         assert collector._name is None
         assert collector._context is None
         assert collector._executor is None
-        assert collector._join is False
+        assert collector.joined is False
         assert collector._ramp == CollectorThread.DEFAULT_RAMP
         assert collector._interval == CollectorThread.DEFAULT_INTERVAL
 
@@ -80,12 +80,12 @@ class TestCollectorThread:
         """Test stop method"""
         collector = CollectorThread()
         collector._executor = MagicMock()
-        collector._join = True
+        collector.join()
 
         collector.stop()
 
         collector._executor.execute_stop.assert_called_once()
-        assert collector._join is False
+        assert collector.joined is False
 
     def test_run_not_implemented(self):
         """Test that run method raises NotImplementedError"""
@@ -96,8 +96,71 @@ class TestCollectorThread:
     def test_join(self):
         """Test join method"""
         collector = CollectorThread()
-        assert collector._join is False
+        assert collector.joined is False
+
+        collector.join()
 
+        assert collector.joined is True
+
+    def test_wait(self):
+        """Test waiting is interrupted by join"""
+        collector = CollectorThread()
+        assert collector.wait(0) is False
         collector.join()
+        assert collector.wait(60) is True
+
+
+class TestCollectorPeriodic:
+    def test_parse(self):
+        """Test parsing the engine CPU"""
+        collector = CollectorPeriodic()
+        collector.parse({"name": "test_collector", "cpu": 3})
+        assert collector.cpu == 3
+
+    @patch('pymergen.collector.thread.CollectorEngine')
+    def test_start_stop(self, mock_engine_class):
+        """Test periodic collectors register a task with the shared engine instead of starting a thread"""
+        engine = mock_engine_class.instance.return_value
+        collector = CollectorPeriodic()
+        collector.context = MagicMock()
+        collector.parse({"name": "test_collector", "ramp": 2, "interval": 0.5, "cpu": 1})
+        collector.sample = MagicMock()
+        parent_context = MagicMock()
 
-        assert collector._join is True
+        collector.start(parent_context)
+        mock_engine_class.instance.assert_called_with(1)
+        task = engine.register.call_args[0][0]
+        assert task.name == "test_collector"
+        assert task.ramp == 2
+        assert task.schedule.interval_ns == 500000000
+        task.callback(task.schedule)
+        collector.sample.assert_called_once_with(parent_context, task.schedule)
+
+        task.error = ValueError("failed")
+        collector.stop()
+        engine.unregister.assert_called_once_with(task)
+        collector.context.logger.error.assert_called_once()
+
+    @patch('pymergen.collector.thread.CollectorEngine')
+    def test_stop_final_sample(self, mock_engine_class):
+        """Test a final sample is taken at the stop boundary after the task is unregistered"""
+        engine = mock_engine_class.instance.return_value
+        collector = CollectorPeriodic()
+        collector.context = MagicMock()
+        collector.parse({"name": "test_collector", "interval": 60})
+        collector.sample = MagicMock(side_effect=lambda parent_context, schedule: engine.unregister.assert_called_once())
+        parent_context = MagicMock()
+
+        collector.start(parent_context)
+        task = engine.register.call_args[0][0]
+        task.schedule.start(task.ramp)
+        collector.stop()
+        collector.sample.assert_called_once_with(parent_context, task.schedule)
+        assert task.schedule.final is True
+        collector.context.logger.error.assert_not_called()
+
+    def test_sample_not_implemented(self):
+        """Test that sample method raises NotImplementedError"""
+        collector = CollectorPeriodic()
+        with pytest.raises(NotImplementedError):
+            collector.sample(MagicMock(), MagicMock())
@@ -47,17 +47,20 @@ class TestControllerSubclasses:
         cpu = ControllerCpu()
         assert cpu.name == Controller.TYPE_CPU
         assert "cpu.stat" in cpu.stat_files
+        assert "cpu.pressure" in cpu.stat_files
 
     def test_controller_io(self):
         io = ControllerIo()
         assert io.name == Controller.TYPE_IO
         assert "io.stat" in io.stat_files
+        assert "io.pressure" in io.stat_files
 
     def test_controller_memory(self):
         memory = ControllerMemory()
         assert memory.name == Controller.TYPE_MEMORY
         assert "memory.stat" in memory.stat_files
         assert "memory.numa_stat" in memory.stat_files
+        assert "memory.pressure" in memory.stat_files
 
     def test_controller_hugetlb(self):
         hugetlb = ControllerHugeTlb()
@@ -1,9 +1,20 @@
+import os
+import sys
+import errno
 import pytest
+from unittest.mock import patch, call
 from pymergen.controller.controller import Controller, ControllerCpu, ControllerMemory
 from pymergen.controller.group import ControllerGroup
 from pymergen.entity.command import EntityCommand
 
 
+@pytest.fixture(autouse=True)
+def dir_base(tmp_path):
+    # Without a cgroup.controllers file, the automatic backend falls back to libcgroup regardless of the host.
+    with patch.object(ControllerGroup, 'DIR_BASE', str(tmp_path)):
+        yield tmp_path
+
+
 class TestControllerGroup:
     def test_init(self):
         group = ControllerGroup("test_group")
@@ -117,3 +128,152 @@ class TestControllerGroup:
         destroyers = group.destroyers()
         assert len(destroyers) == 1
         assert "cgdelete -g :empty_group" in destroyers[0].cmd
+
+
+class TestControllerGroupNative:
+    @staticmethod
+    def group(name="test_group"):
+        group = ControllerGroup(name)
+        cpu = ControllerCpu()
+        cpu.add_limit("max", "max 100000")
+        group.add_controller(cpu)
+        group.add_controller(ControllerMemory())
+        return group
+
+    def test_backend(self, dir_base):
+        """Test the automatic backend is native on the unified cgroup v2 hierarchy"""
+        group = self.group()
+        assert group.backend == ControllerGroup.BACKEND_AUTO
+        assert group.native is False
+        (dir_base / "cgroup.controllers").write_text("cpu memory\n")
+        assert group.native is True
+        assert group.direct is True
+        assert group.managed is True
+        group.become_cmd = "sudo"
+        # Privileged cgroups are delegated, so commands are still placed into them at spawn time.
+        assert group.direct is True
+        assert group.managed is False
+        group.backend = ControllerGroup.BACKEND_LIBCGROUP
+        assert group.native is False
+        assert group.path == os.path.join(str(dir_base), "test_group")
+
+    def test_create_destroy(self, dir_base):
+        """Test directories, enabled controllers, and limits are written directly"""
+        group = self.group("parent/child")
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        assert group.builders() == []
+        group.create()
+        assert (dir_base / "cgroup.subtree_control").read_text() == "+cpu +memory"
+        assert (dir_base / "parent" / "cgroup.subtree_control").read_text() == "+cpu +memory"
+        assert (dir_base / "parent" / "child" / "cpu.max").read_text() == "max 100000"
+        assert group.destroyers() == []
+        # Interface files of a real cgroup disappear with its directory
+        os.remove(dir_base / "parent" / "child" / "cpu.max")
+        group.destroy()
+        assert not (dir_base / "parent" / "child").exists()
+        assert (dir_base / "parent").exists()
+
+    def test_create_libcgroup(self, dir_base):
+        """Test nothing is created directly with the libcgroup backend"""
+        group = self.group()
+        group.create()
+        group.destroy()
+        assert os.listdir(dir_base) == []
+
+    def test_helpers(self):
+        """Test privileged cgroups are managed by a single helper command run with become_cmd"""
+        group = self.group()
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        group.become_cmd = "sudo"
+        builders = group.builders()
+        assert len(builders) == 1
+        assert builders[0].name == "cgroup_create_test_group"
+        assert builders[0].become_cmd == "sudo"
+        assert builders[0].cmd == "{python} -m pymergen.bin.cgroup create --name test_group --owner {uid}:{gid} --controllers cpu,memory --limit 'cpu.max=max 100000'".format(python=sys.executable, uid=os.getuid(), gid=os.getgid())
+        destroyers = group.destroyers()
+        assert destroyers[0].cmd == "{python} -m pymergen.bin.cgroup destroy --name test_group".format(python=sys.executable)
+        group.nested = True
+        assert group.destroyers()[0].cmd == "{python} -m pymergen.bin.cgroup destroy --name test_group --nested".format(python=sys.executable)
+        group.create()
+        assert not os.path.exists(group.path)
+
+    @patch("os.chown")
+    def test_delegate(self, mock_chown, dir_base):
+        """Test the helper delegates the cgroup to the user running PyMergen"""
+        group = self.group()
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        group.owner = "1000:100"
+        group.create()
+        path = os.path.join(str(dir_base), "test_group")
+        assert mock_chown.call_args_list == [
+            call(path, 1000, 100),
+            call(os.path.join(path, "cgroup.procs"), 1000, 100),
+            call(os.path.join(path, "cgroup.threads"), 1000, 100),
+            call(os.path.join(path, "cgroup.subtree_control"), 1000, 100),
+        ]
+
+    def test_nested(self, dir_base):
+        """Test leaves are created under a nested cgroup and removed with it"""
+        group = self.group("parent")
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        group.nested = True
+        group.create()
+        assert (dir_base / "parent" / "cgroup.subtree_control").read_text() == "+cpu +memory"
+        assert group.leaves() == []
+        assert group.leaf("case_p001") == os.path.join(str(dir_base), "parent", "case_p001")
+        assert group.leaf("case/x") == os.path.join(str(dir_base), "parent", "case_x")
+        leaves = group.leaves()
+        assert [leaf.name for leaf in leaves] == ["parent/case_p001", "parent/case_x"]
+        assert leaves[0].controllers == group.controllers
+        assert leaves[0].path == os.path.join(str(dir_base), "parent", "case_p001")
+        os.remove(dir_base / "parent" / "cpu.max")
+        os.remove(dir_base / "parent" / "cgroup.subtree_control")
+        group.destroy()
+        assert not (dir_base / "parent").exists()
+
+    def test_destroy_busy(self, dir_base):
+        """Test leaves with exiting processes are killed and removed once they are no longer populated"""
+        group = self.group("parent")
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        group.nested = True
+        group.create()
+        leaf = group.leaf("case")
+        (dir_base / "parent" / "case" / "cgroup.events").write_text("populated 1\nfrozen 0\n")
+        (dir_base / "parent" / "case" / "cgroup.kill").write_text("")
+        removed = list()
+
+        def rmdir(path):
+            removed.append(path)
+            if len(removed) == 1:
+                raise OSError(errno.EBUSY, "Device or resource busy")
+
+        def sleep(seconds):
+            (dir_base / "parent" / "case" / "cgroup.events").write_text("populated 0\nfrozen 0\n")
+
+        with patch("pymergen.controller.group.os.rmdir", side_effect=rmdir), patch("pymergen.controller.group.time.sleep", side_effect=sleep) as mock_sleep:
+            group.destroy()
+        assert (dir_base / "parent" / "case" / "cgroup.kill").read_text() == "1"
+        assert mock_sleep.call_count == 1
+        assert removed == [leaf, leaf, group.path]
+
+    def test_destroy_populated(self, dir_base):
+        """Test a leaf that remains populated fails the removal after a timeout"""
+        group = self.group("parent")
+        group.backend = ControllerGroup.BACKEND_NATIVE
+        group.nested = True
+        group.create()
+        group.leaf("case")
+        (dir_base / "parent" / "case" / "cgroup.events").write_text("populated 1\n")
+        with patch("pymergen.controller.group.os.rmdir", side_effect=OSError(errno.EBUSY, "Device or resource busy")), patch.object(ControllerGroup, "REMOVE_TIMEOUT", 0):
+            with pytest.raises(Exception, match="still populated"):
+                group.destroy()
+        with patch("pymergen.controller.group.os.rmdir", side_effect=OSError(errno.EACCES, "Permission denied")):
+            with pytest.raises(PermissionError):
+                group.destroy()
+
+    def test_nested_libcgroup(self, dir_base):
+        """Test cgroups that are not managed directly have no leaves"""
+        group = self.group("parent")
+        group.nested = True
+        os.makedirs(dir_base / "parent" / "leaf")
+        assert group.leaves() == []
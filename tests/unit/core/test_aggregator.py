@@ -0,0 +1,260 @@
+import os
+import gzip
+import json
+import pytest
+from unittest.mock import MagicMock
+from pymergen.core.series import SeriesWriter
+from pymergen.core.aggregator import AggregatorSample, AggregatorStatistics, AggregatorNode, Aggregator
+
+
+def values(node):
+    return {key: sample.values for key, sample in node.samples.items()}
+
+
+class TestAggregatorSample:
+    def test_merge(self):
+        """Test merged samples have the statistics of the pooled values"""
+        a = AggregatorSample.of([1, 2, 3])
+        b = AggregatorSample.of([10, 20])
+        a.merge(b)
+        pooled = AggregatorSample.of([1, 2, 3, 10, 20])
+        assert a.count == 5
+        assert a.mean == pytest.approx(pooled.mean)
+        assert a.stddev == pytest.approx(pooled.stddev)
+        assert (a.min, a.max) == (1.0, 20.0)
+        assert a.values == [1, 2, 3, 10, 20]
+
+    def test_reservoir(self):
+        """Test the values kept are bounded while the moments stay exact"""
+        sample = AggregatorSample()
+        sample.RESERVOIR_SIZE = 10
+        for value in range(100):
+            sample.add(value)
+        assert sample.count == 100
+        assert sample.mean == 49.5
+        assert len(sample.values) == 10
+        assert sample.complete is False
+
+    def test_state(self):
+        """Test a sample is restored from its state"""
+        sample = AggregatorSample.of([4, 1, 3])
+        restored = AggregatorSample.load(json.loads(json.dumps(sample.state())))
+        assert (restored.count, restored.mean, restored.stddev) == (sample.count, sample.mean, sample.stddev)
+        restored.merge(AggregatorSample.of([2]))
+        assert restored.values == [1, 2, 3, 4]
+
+
+class TestAggregatorStatistics:
+    @pytest.fixture
+    def stats(self):
+        stats = AggregatorStatistics()
+        # The pure Python implementation is the reference for the optional numpy implementation.
+        stats.numpy = None
+        return stats
+
+    def test_empty(self, stats):
+        """Test an empty sample only has a count"""
+        assert stats.summarize([]) == {"count": 0}
+
+    def test_single(self, stats):
+        """Test a single value has no spread"""
+        data = stats.summarize([5])
+        assert data["count"] == 1
+        assert data["mean"] == 5.0
+        assert data["median"] == 5.0
+        assert data["p99"] == 5.0
+        assert data["stddev"] is None
+        assert data["ci"] is None
+
+    def test_summarize(self, stats):
+        """Test descriptive statistics and percentiles"""
+        data = stats.summarize([4, 1, 3, 2, 5])
+        assert data["count"] == 5
+        assert data["mean"] == 3.0
+        assert data["stddev"] == pytest.approx(1.5811388)
+        assert data["min"] == 1.0
+        assert data["max"] == 5.0
+        assert data["median"] == 3.0
+        assert data["p90"] == pytest.approx(4.6)
+        assert data["p95"] == pytest.approx(4.8)
+        assert data["p99"] == pytest.approx(4.96)
+
+    def test_bootstrap(self, stats):
+        """Test the bootstrap confidence interval brackets the mean and is reproducible"""
+        values = [float(v) for v in range(100)]
+        data = stats.summarize(values)
+        assert data["ci"][0] < data["mean"] < data["ci"][1]
+        assert data["ci"][1] - data["ci"][0] < 20
+        assert stats.summarize(values)["ci"] == data["ci"]
+
+    def test_normal_approximation(self, stats):
+        """Test large samples use the normal approximation"""
+        stats.BOOTSTRAP_LIMIT = 10
+        data = stats.summarize([1, 2] * 50)
+        assert data["ci"] == pytest.approx([1.5 - 1.959964 * data["stddev"] / 10, 1.5 + 1.959964 * data["stddev"] / 10])
+
+    def test_reservoir(self, stats):
+        """Test samples larger than the reservoir use the normal approximation and estimated percentiles"""
+        sample = AggregatorSample()
+        sample.RESERVOIR_SIZE = 50
+        for value in range(1000):
+            sample.add(value)
+        data = stats.summarize(sample)
+        assert data["count"] == 1000
+        assert data["mean"] == 499.5
+        assert (data["min"], data["max"]) == (0.0, 999.0)
+        assert 300 < data["median"] < 700
+        assert data["ci"] == pytest.approx([499.5 - 1.959964 * data["stddev"] / 1000 ** 0.5, 499.5 + 1.959964 * data["stddev"] / 1000 ** 0.5])
+
+    def test_numpy(self):
+        """Test the numpy implementation matches the reference implementation"""
+        np = pytest.importorskip("numpy")
+        stats = AggregatorStatistics()
+        stats.numpy = np
+        # Resamples are drawn in several chunks
+        stats.BOOTSTRAP_CHUNK = 100
+        reference = AggregatorStatistics()
+        reference.numpy = None
+        values = [3, 1, 4, 1, 5, 9, 2, 6]
+        data = stats.summarize(values)
+        expected = reference.summarize(values)
+        for key in ["count", "mean", "stddev", "min", "max", "median", "p90", "p95", "p99"]:
+            assert data[key] == pytest.approx(expected[key])
+        assert data["ci"][0] < data["mean"] < data["ci"][1]
+
+
+class TestAggregatorNode:
+    def test_merge(self):
+        """Test samples and children are merged recursively"""
+        a = AggregatorNode()
+        a.add("x", 1)
+        a.children["c"] = AggregatorNode()
+        a.children["c"].add("y", 2)
+        b = AggregatorNode()
+        b.add("x", 3)
+        b.children["c"] = AggregatorNode()
+        b.children["c"].add("y", 4)
+        a.merge(b)
+        assert values(a) == {"x": [1, 3]}
+        assert values(a.children["c"]) == {"y": [2, 4]}
+
+
+class TestAggregator:
+    @staticmethod
+    def write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fh:
+            fh.write(data)
+
+    @pytest.fixture
+    def run_path(self, tmp_path):
+        for r in [1, 2]:
+            plan = tmp_path / "plan" / "r{r:03d}".format(r=r)
+            self.write(str(plan / "stat.total.json"), json.dumps({"phase": "total", "timer": {"started_at": 1.0, "duration_ns": 100 * r}, "counters": {"commands": 2}}))
+            self.write(str(plan / "stat.timer.json"), json.dumps({"duration_ns": 1}))
+            case = plan / "case" / "r001"
+            self.write(str(case / "stat.total.json"), json.dumps({"timer": {"duration_ns": 10 * r}}))
+            self.write(str(case / "i001" / "p001" / "stat.process_cmd.json"), json.dumps({"command": "cmd", "stages": [{"rusage": {"ru_utime": 0.5}}]}))
+            self.write(str(case / "i001" / "p001" / "metrics.jsonl"), "\n".join([
+                json.dumps({"metric": "latency", "value": r}),
+                json.dumps({"metric": "latency", "value": r + 1}),
+                json.dumps({"metric": "name", "value": "text"}),
+                "{\"metric\": \"late",
+            ]))
+            self.write(str(case / "i001" / "collector.cgroup_cg_cpu_stat.log"), "timestamp usage_usec\n2025-01-01T00:00:00 {v}\n".format(v=r * 7))
+        return tmp_path
+
+    def test_is_entity(self, run_path):
+        """Test entity directories are recognized by their replication directories"""
+        aggregator = Aggregator()
+        assert aggregator.is_entity(str(run_path / "plan")) is True
+        assert aggregator.is_entity(str(run_path / "plan" / "r001")) is False
+        assert aggregator.is_entity(str(run_path / "missing")) is False
+
+    def test_collect(self, run_path):
+        """Test numeric values are collected from stats, parsed metrics, and collector logs"""
+        node = Aggregator().collect(str(run_path / "plan"))
+        assert values(node) == {
+            "stat.total.timer.duration_ns": [100, 200],
+            "stat.total.counters.commands": [2, 2],
+        }
+        case = node.children["case"]
+        assert values(case) == {
+            "stat.total.timer.duration_ns": [10, 20],
+            "i001/p001/stat.process_cmd.stages.0.rusage.ru_utime": [0.5, 0.5],
+            "i001/p001/metrics.latency": [1, 2, 2, 3],
+            "i001/collector.cgroup_cg_cpu_stat.usage_usec": [7.0, 14.0],
+        }
+
+    def test_collect_compressed(self, tmp_path):
+        """Test compressed collector logs are read"""
+        os.makedirs(tmp_path / "case" / "r001")
+        with gzip.open(tmp_path / "case" / "r001" / "collector.cgroup_cg_pids_current.log.gz", "wt") as fh:
+            fh.write("timestamp current\nt 3\n")
+        node = Aggregator().collect(str(tmp_path / "case"))
+        assert values(node) == {"collector.cgroup_cg_pids_current.current": [3.0]}
+
+    def test_collect_layout_change(self, tmp_path):
+        """Test repeated header lines of collector logs replace the column layout"""
+        os.makedirs(tmp_path / "case" / "r001")
+        (tmp_path / "case" / "r001" / "collector.cgroup_cg_io_stat.log").write_text(
+            "timestamp_ns 8:0_rbytes\n10 1\ntimestamp_ns 8:0_rbytes 8:16_rbytes\n20 2 3\n"
+        )
+        node = Aggregator().collect(str(tmp_path / "case"))
+        assert values(node) == {
+            "collector.cgroup_cg_io_stat.8:0_rbytes": [1.0, 2.0],
+            "collector.cgroup_cg_io_stat.8:16_rbytes": [3.0],
+        }
+
+    def test_collect_series(self, tmp_path):
+        """Test binary collector series are read like their text logs"""
+        os.makedirs(tmp_path / "case" / "r001")
+        writer = SeriesWriter(str(tmp_path / "case" / "r001" / "collector.cgroup_cg_memory_stat.series"))
+        writer.schema(["jitter_ns", "anon", "max"], "qqd")
+        writer.append(10, [0, 4096, "max"])
+        writer.append(20, [5, 8192, "max"])
+        writer.close()
+        node = Aggregator().collect(str(tmp_path / "case"))
+        assert values(node) == {
+            "collector.cgroup_cg_memory_stat.jitter_ns": [0, 5],
+            "collector.cgroup_cg_memory_stat.anon": [4096, 8192],
+        }
+
+    def test_aggregate(self, run_path):
+        """Test only the given entity is summarized unless recursive"""
+        aggregator = Aggregator()
+        aggregator.aggregate(str(run_path / "plan"))
+        assert not (run_path / "plan" / "r001" / "case" / "stat.summary.json").exists()
+        with open(run_path / "plan" / "stat.summary.json") as fh:
+            data = json.loads(fh.read())
+        assert data["metrics"]["stat.total.timer.duration_ns"]["mean"] == 150.0
+        assert data["children"]["case"]["metrics"]["i001/p001/metrics.latency"]["count"] == 4
+
+    def test_aggregate_recursive(self, run_path):
+        """Test every entity directory of a run is summarized"""
+        Aggregator().aggregate(str(run_path), recursive=True)
+        assert not (run_path / "stat.summary.json").exists()
+        assert (run_path / "plan" / "stat.summary.json").exists()
+        for r in [1, 2]:
+            with open(run_path / "plan" / "r{r:03d}".format(r=r) / "case" / "stat.summary.json") as fh:
+                data = json.loads(fh.read())
+            assert data["metrics"]["stat.total.timer.duration_ns"]["count"] == 1
+
+    def test_aggregate_state(self, run_path):
+        """Test nested entities are rolled up from their state rather than their files"""
+        aggregator = Aggregator()
+        paths = aggregator.aggregate(str(run_path), recursive=True)
+        assert str(run_path / "plan" / "r001" / "case" / "stat.summary.state.json") in paths
+        for r in [1, 2]:
+            os.remove(run_path / "plan" / "r{r:03d}".format(r=r) / "case" / "r001" / "i001" / "p001" / "metrics.jsonl")
+        node = aggregator.collect(str(run_path / "plan"))
+        assert values(node.children["case"])["i001/p001/metrics.latency"] == [1, 2, 2, 3]
+        assert values(node) == {
+            "stat.total.timer.duration_ns": [100, 200],
+            "stat.total.counters.commands": [2, 2],
+        }
+
+    def test_aggregate_missing(self, tmp_path):
+        """Test missing directories are ignored"""
+        Aggregator().aggregate(str(tmp_path / "missing"))
+        assert os.listdir(tmp_path) == []
@@ -5,6 +5,7 @@ import logging
 from unittest.mock import MagicMock, patch
 from datetime import datetime
 from pymergen.core.context import Context
+from pymergen.core.manifest import Manifest
 
 
 class TestContext:
@@ -18,6 +19,9 @@ class TestContext:
         args.filter_plan = None
         args.filter_suite = None
         args.filter_case = None
+        args.compress = None
+        args.store = False
+        args.no_files = False
         return args
 
     @patch('os.path.exists')
@@ -102,6 +106,26 @@ class TestContext:
             context = Context(args)
             with pytest.raises(Exception) as excinfo:
                 context.validate()
+            assert "Command perf not found" in str(excinfo.value)
+
+    @patch('shutil.which')
+    def test_validate_plans(self, mock_which, args):
+        """libcgroup is only required when a cgroup is not native"""
+        mock_which.return_value = None
+        native = MagicMock()
+        native.native = True
+        plan = MagicMock()
+        plan.cgroups = [native]
+
+        with patch('pymergen.core.context.Context._prepare'), \
+             patch('pymergen.core.context.Context._init_logger'):
+            context = Context(args)
+            context.validate_plans([plan])
+            libcgroup = MagicMock()
+            libcgroup.native = False
+            plan.cgroups.append(libcgroup)
+            with pytest.raises(Exception) as excinfo:
+                context.validate_plans([plan])
             assert "Command cgcreate not found" in str(excinfo.value)
 
     @patch('sys.platform', 'linux')
@@ -118,3 +142,33 @@ class TestContext:
             with pytest.raises(Exception) as excinfo:
                 context.validate()
             assert "Plan path /test/plan.yaml does not exist" in str(excinfo.value)
+
+    @patch('sys.platform', 'linux')
+    @patch('shutil.which')
+    @patch('os.path.exists')
+    def test_validate_no_results(self, mock_exists, mock_which, args):
+        """Files can only be disabled when results are written to the store"""
+        mock_which.return_value = "/usr/bin/command"
+        mock_exists.return_value = True
+        args.no_files = True
+
+        with patch('pymergen.core.context.Context._prepare'), \
+             patch('pymergen.core.context.Context._init_logger'):
+            context = Context(args)
+            assert context.files is False
+            assert context.store is None
+            with pytest.raises(Exception) as excinfo:
+                context.validate()
+            assert "Results must be written" in str(excinfo.value)
+
+    def test_store(self, args, tmp_path):
+        """The store is created in the run directory and closed with the context"""
+        args.store = True
+        with patch('pymergen.core.context.Context._prepare'), \
+             patch('pymergen.core.context.Context._init_logger'), \
+             patch('pymergen.core.context.Context._generate_run_path', return_value=str(tmp_path)):
+            context = Context(args)
+        assert context.store.path == os.path.join(str(tmp_path), "run.store.db")
+        context.close()
+        assert context.store.closed is True
+        assert Manifest.read(str(tmp_path)) == [str(tmp_path / "run.store.db"), str(tmp_path / "run.runner.log")]
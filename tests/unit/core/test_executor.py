@@ -1,4 +1,5 @@
 import os
+import json
 import pytest
 import threading
 from unittest.mock import MagicMock, patch, call
@@ -14,6 +15,8 @@ from pymergen.entity.command import EntityCommand
 from pymergen.entity.case import EntityCase
 from pymergen.entity.suite import EntitySuite
 from pymergen.entity.plan import EntityPlan
+from pymergen.core.stat import Stat
+from pymergen.core.store import Store
 
 
 class TestExecutorContext:
@@ -40,6 +43,19 @@ class TestExecutorContext:
         assert context.current == 42
         assert context.exclude_from_path is False
 
+    def test_stats(self):
+        parent_context = ExecutorContext(None)
+        stat = MagicMock()
+        parent_context.add_stat(stat)
+        context = ExecutorContext(parent_context)
+        child_stat = MagicMock()
+        context.add_stat(child_stat)
+
+        assert parent_context.stats == [stat]
+        assert context.stats == [stat, child_stat]
+        context.remove_stat(child_stat)
+        assert context.stats == [stat]
+
     def test_id(self):
         context = ExecutorContext(None)
         context._prefix = "test"
@@ -107,7 +123,9 @@ class TestDerivedContextClasses:
 class TestExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity(self):
@@ -205,7 +223,9 @@ class TestExecutor:
 class TestControllingExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity(self):
@@ -246,6 +266,9 @@ class TestControllingExecutor:
 
         # Assert builder commands were executed
         assert mock_process_execute.call_count == 4  # 2 cgroups with 1 builder + 1 destroyer each
+        for cgroup in cgroups:
+            cgroup.create.assert_called_once()
+            cgroup.destroy.assert_called_once()
 
         # Assert child was executed
         child.execute.assert_called_once()
@@ -259,7 +282,9 @@ class TestControllingExecutor:
 class TestCollectingExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity(self):
@@ -311,20 +336,52 @@ class TestCollectingExecutor:
             assert isinstance(context_arg, CollectingExecutorContext)
             assert context_arg.entity == entity
             assert context_arg.cgroups == cgroups
+            # Commands of the node are shared with its collectors
+            assert context_arg.pids is child.execute.call_args[0][0].pids
+            assert context_arg.pids == dict()
+
+    def test_stop_collectors_parallel(self, context, entity, cgroups):
+        """Test collectors are stopped in parallel and a failure does not prevent the others from stopping"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        # Each stop only returns once all collectors are stopping at the same time
+        def stop(error=None):
+            barrier.wait()
+            if error is not None:
+                raise error
+
+        collectors = [MagicMock() for _ in range(3)]
+        collectors[0].stop.side_effect = lambda: stop()
+        collectors[1].stop.side_effect = lambda: stop(ValueError("failed"))
+        collectors[2].stop.side_effect = lambda: stop()
+        executor = CollectingExecutor(context, entity, collectors, cgroups)
+
+        with pytest.raises(ValueError):
+            executor._stop_collectors()
+
+        for collector in collectors:
+            collector.stop.assert_called_once()
 
 
 class TestReplicatingExecutor:
     @pytest.fixture
-    def context(self):
-        return MagicMock()
+    def context(self, tmp_path):
+        context = MagicMock()
+        context.run_path = str(tmp_path)
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity(self):
         entity = MagicMock()
+        entity.name = "test_entity"
+        entity.parent = None
         entity.config = MagicMock()
         entity.config.replication = 2
-        entity.pre = []
-        entity.post = []
+        entity.config.stats = None
+        entity.config.counters = None
+        entity.pre = [MagicMock()]
+        entity.post = [MagicMock()]
         entity.log_name.return_value = "test_entity"
         return entity
 
@@ -362,6 +419,7 @@ class TestReplicatingExecutor:
         child = MagicMock()
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Mock run_path to return a predictable path
         test_path = "/test/run/path"
@@ -382,20 +440,103 @@ class TestReplicatingExecutor:
         # Execute
         executor.execute_main(parent_context)
 
-        # Verify Stat methods were called properly
-        assert mock_stat.start.call_count == 2
-        assert mock_stat.stop.call_count == 2
-        assert mock_stat.log.call_count == 2
+        # Verify Stat methods were called properly, once per replication and per pre, main and post phase
+        assert mock_stat.start.call_count == 8
+        assert mock_stat.stop.call_count == 8
+        assert mock_stat.log.call_count == 8
 
         # Verify log method was called with correct path
         for call_args in mock_stat.log.call_args_list:
             assert call_args[0][0] == test_path
+        phases = [call_args[0][1] if len(call_args[0]) > 1 else Stat.PHASE_TOTAL for call_args in mock_stat.log.call_args_list]
+        assert phases == [Stat.PHASE_PRE, Stat.PHASE_MAIN, Stat.PHASE_POST, Stat.PHASE_TOTAL] * 2
+
+    def test_stat_files(self, context, entity, tmp_path):
+        """Stats are written per replication and per phase, commands are counted at every level"""
+        entity.config.replication = 1
+        executor = ReplicatingExecutor(context, entity)
+        executor.run_path = MagicMock(return_value=str(tmp_path))
+        child = MagicMock()
+        child.execute.side_effect = lambda c: [stat.count(Stat.COUNTER_COMMANDS) for stat in c.stats]
+        executor.add_child(child)
+        executor.execute_pre = MagicMock()
+        executor.execute_post = MagicMock()
+        parent_context = MagicMock()
+        parent_context.parent = None
+        parent_context.stats = []
+
+        executor.execute_main(parent_context)
+
+        for phase in [Stat.PHASE_PRE, Stat.PHASE_MAIN, Stat.PHASE_POST, Stat.PHASE_TOTAL]:
+            with open(tmp_path / "stat.{phase}.json".format(phase=phase)) as fh:
+                data = json.loads(fh.read())
+            assert data["phase"] == phase
+            assert data["timer"]["duration_ns"] >= 0
+            assert "cpu" in data
+        with open(tmp_path / "stat.main.json") as fh:
+            assert json.loads(fh.read())["counters"]["commands"] == 1
+        with open(tmp_path / "stat.total.json") as fh:
+            assert json.loads(fh.read())["counters"]["commands"] == 1
+        with open(tmp_path / "stat.pre.json") as fh:
+            assert json.loads(fh.read())["counters"]["commands"] == 0
+        assert (tmp_path / "stat.timer.json").exists()
+        registered = [c[0][0] for c in context.manifest.register.call_args_list]
+        assert str(tmp_path / "stat.total.json") in registered
+        assert str(tmp_path / "stat.timer.json") in registered
+
+    def test_store(self, context, entity, tmp_path):
+        """Phase statistics are recorded in the store, and no files are written when files are disabled"""
+        context.files = False
+        context.store = Store(str(tmp_path / Store.FILE_NAME))
+        entity.config.params = {}
+        executor = ReplicatingExecutor(context, entity)
+        executor.add_child(MagicMock())
+        executor.execute_pre = MagicMock()
+        executor.execute_post = MagicMock()
+        parent_context = MagicMock()
+        parent_context.parent = None
+        parent_context.stats = []
+        parent_context.exclude_from_path = True
+
+        executor.execute_main(parent_context)
+        context.store.close()
+
+        assert os.listdir(tmp_path) == [Store.FILE_NAME]
+        rows = Store.query(context.store.path, "SELECT node, phase FROM stats WHERE metric = ? ORDER BY node, phase", ("timer.duration_ns",))
+        assert [(row["node"], row["phase"]) for row in rows] == [
+            ("test_entity/r001", phase) for phase in ["main", "post", "pre", "total"]
+        ] + [
+            ("test_entity/r002", phase) for phase in ["main", "post", "pre", "total"]
+        ]
+        assert [row["path"] for row in Store.query(context.store.path, "SELECT path FROM nodes ORDER BY path")] == ["test_entity/r001", "test_entity/r002"]
+
+    def test_summary(self, context, entity, tmp_path):
+        """The entity directory is summarized once all replications are finished"""
+        executor = ReplicatingExecutor(context, entity)
+        executor.add_child(MagicMock())
+        executor.execute_pre = MagicMock()
+        executor.execute_post = MagicMock()
+        parent_context = MagicMock()
+        parent_context.parent = None
+        parent_context.stats = []
+        parent_context.exclude_from_path = True
+
+        executor.execute_main(parent_context)
+
+        context.manifest.register.assert_any_call(str(tmp_path / "test_entity" / "stat.summary.json"))
+        with open(tmp_path / "test_entity" / "stat.summary.json") as fh:
+            data = json.loads(fh.read())
+        assert data["metrics"]["stat.total.timer.duration_ns"]["count"] == 2
+        assert data["metrics"]["stat.main.counters.commands"]["mean"] == 0
+        assert data["children"] == {}
 
 
 class TestConcurrentExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity_concurrent(self):
@@ -482,14 +623,19 @@ class TestConcurrentExecutor:
 
 class TestIteratingExecutor:
     @pytest.fixture
-    def context(self):
-        return MagicMock()
+    def context(self, tmp_path):
+        context = MagicMock()
+        context.run_path = str(tmp_path)
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity_with_iters(self):
         entity = MagicMock()
         entity.parent = None
         entity.config = MagicMock()
+        entity.config.stats = None
+        entity.config.counters = None
         entity.config.iters = {"var1": ["A", "B"], "var2": ["C", "D"]}
         entity.config.iteration = EntityConfig.ITERATION_TYPE_PRODUCT
         entity.log_name.return_value = "test_entity"
@@ -500,6 +646,8 @@ class TestIteratingExecutor:
         entity = MagicMock()
         entity.parent = None
         entity.config = MagicMock()
+        entity.config.stats = None
+        entity.config.counters = None
         entity.config.iters = {}
         entity.log_name.return_value = "test_entity"
         return entity
@@ -510,6 +658,7 @@ class TestIteratingExecutor:
         child = MagicMock()
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Execute
         executor.execute_main(parent_context)
@@ -541,6 +690,8 @@ class TestIteratingExecutor:
         entity = MagicMock()
         entity.parent = None
         entity.config = MagicMock()
+        entity.config.stats = None
+        entity.config.counters = None
         entity.config.iters = {"var1": ["A", "B"], "var2": ["C", "D"]}
         entity.config.iteration = EntityConfig.ITERATION_TYPE_ZIP
         entity.log_name.return_value = "test_entity"
@@ -549,6 +700,7 @@ class TestIteratingExecutor:
         child = MagicMock()
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Execute
         executor.execute_main(parent_context)
@@ -579,6 +731,7 @@ class TestIteratingExecutor:
         child = MagicMock()
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Execute
         executor.execute_main(parent_context)
@@ -596,13 +749,18 @@ class TestIteratingExecutor:
 
 class TestParallelExecutor:
     @pytest.fixture
-    def context(self):
-        return MagicMock()
+    def context(self, tmp_path):
+        context = MagicMock()
+        context.run_path = str(tmp_path)
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity_parallel(self):
         entity = MagicMock()
         entity.config = MagicMock()
+        entity.config.stats = None
+        entity.config.counters = None
         entity.config.parallelism = 3
         entity.log_name.return_value = "test_entity"
         return entity
@@ -611,6 +769,8 @@ class TestParallelExecutor:
     def entity_not_parallel(self):
         entity = MagicMock()
         entity.config = MagicMock()
+        entity.config.stats = None
+        entity.config.counters = None
         entity.config.parallelism = 1
         entity.log_name.return_value = "test_entity"
         return entity
@@ -633,6 +793,7 @@ class TestParallelExecutor:
         executor = ParallelExecutor(context, entity_parallel)
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Execute
         executor.execute_main(parent_context)
@@ -649,18 +810,21 @@ class TestParallelExecutor:
         mock_thread2.join.assert_called_once()
         mock_thread3.join.assert_called_once()
 
-        # Check thread targets point to child_copy.execute
+        # Check thread targets execute child copies with their own stat
         thread1_args = mock_thread_class.call_args_list[0][1]
         thread2_args = mock_thread_class.call_args_list[1][1]
         thread3_args = mock_thread_class.call_args_list[2][1]
-        assert thread1_args['target'] == child_copy1.execute
-        assert thread2_args['target'] == child_copy2.execute
-        assert thread3_args['target'] == child_copy3.execute
+        assert thread1_args['target'] == executor.execute_child
+        assert thread2_args['target'] == executor.execute_child
+        assert thread3_args['target'] == executor.execute_child
+        assert thread1_args['args'][0] == child_copy1
+        assert thread2_args['args'][0] == child_copy2
+        assert thread3_args['args'][0] == child_copy3
 
         # Verify contexts passed to threads
-        context1 = thread1_args['args'][0]
-        context2 = thread2_args['args'][0]
-        context3 = thread3_args['args'][0]
+        context1 = thread1_args['args'][1]
+        context2 = thread2_args['args'][1]
+        context3 = thread3_args['args'][1]
         assert isinstance(context1, ParallelExecutorContext)
         assert isinstance(context2, ParallelExecutorContext)
         assert isinstance(context3, ParallelExecutorContext)
@@ -677,6 +841,7 @@ class TestParallelExecutor:
         child = MagicMock()
         executor.add_child(child)
         parent_context = MagicMock()
+        parent_context.parent = None
 
         # Execute
         executor.execute_main(parent_context)
@@ -693,8 +858,11 @@ class TestParallelExecutor:
 
 class TestProcessExecutor:
     @pytest.fixture
-    def context(self):
-        return MagicMock()
+    def context(self, tmp_path):
+        context = MagicMock()
+        context.run_path = str(tmp_path)
+        context.store = None
+        return context
 
     @pytest.fixture
     def parent_context(self):
@@ -748,12 +916,53 @@ class TestProcessExecutor:
         # Assert
         mock_process_class.assert_called_once_with(context)
         mock_process.run.assert_called_once()
+        mock_process.log.assert_called_once_with("/test/run/path")
 
         # Verify command was prepared and set on process
         prepared_command = mock_process.command
         assert prepared_command is not command  # Should be a copy
         assert prepared_command.cmd == "echo 'test'"  # Original command without placeholders
 
+    def test_store(self, context, command, tmp_path):
+        """Nodes and process statistics are recorded in the store instead of files"""
+        context.files = False
+        context.store = Store(str(tmp_path / Store.FILE_NAME))
+        case = EntityCase()
+        case.name = "testcase"
+        case.config.params = {"size": "1k"}
+        suite = EntitySuite()
+        suite.name = "testsuite"
+        suite.add_case(case)
+        plan = EntityPlan()
+        plan.name = "testplan"
+        plan.add_suite(suite)
+        command.parent = case
+        command.run_time = 0
+        command.timeout = 10
+        command.parsers = []
+        command.meter_pipes = False
+        parent_context = IteratingExecutorContext(None)
+        parent_context.entity = case
+        parent_context.current = 2
+        parent_context.iters = {"depth": "4"}
+
+        executor = ProcessExecutor(context, command)
+        executor.execute_main(parent_context)
+        context.store.close()
+
+        assert not (tmp_path / "testcase").exists()
+        nodes = Store.query(context.store.path, "SELECT * FROM nodes")
+        assert len(nodes) == 1
+        assert nodes[0]["path"] == "testcase/i002/testcommand"
+        assert nodes[0]["parent"] == "testcase/i002"
+        assert nodes[0]["kind"] == "command"
+        assert nodes[0]["command"] == "echo 'test'"
+        assert json.loads(nodes[0]["contexts"]) == ["i002"]
+        assert json.loads(nodes[0]["iters"]) == {"depth": "4"}
+        assert json.loads(nodes[0]["params"]) == {"size": "1k"}
+        rows = Store.query(context.store.path, "SELECT value FROM stats WHERE phase = ? AND metric = ?", (Stat.PHASE_PROCESS, "stages.0.return_code"))
+        assert rows == [{"value": 0}]
+
     @patch('pymergen.core.executor.copy.copy')
     def test_command_preparation(self, mock_copy, context, parent_context):
 
@@ -936,6 +1145,72 @@ class TestProcessExecutor:
         # Verify iteration variables from all parent contexts were correctly substituted
         assert processed_cmd == "Test case_val1 and suite_val1 and plan_val1"
 
+    @staticmethod
+    def cgroup_command(cgroups, names):
+        plan = EntityPlan()
+        plan.cgroups = cgroups
+        suite = EntitySuite()
+        plan.add_suite(suite)
+        case = EntityCase()
+        suite.add_case(case)
+        command = EntityCommand()
+        command.name = "testcommand"
+        command.cgroups = names
+        case.add_command(command)
+        return command
+
+    @staticmethod
+    def cgroup(name, direct):
+        cgroup = MagicMock()
+        cgroup.name = name
+        cgroup.direct = direct
+        cgroup.nested = False
+        cgroup.path = "/sys/fs/cgroup/{name}".format(name=name)
+        controller = MagicMock()
+        controller.name = "cpu"
+        cgroup.controllers = [controller]
+        return cgroup
+
+    def test_sub_cgroup(self, context):
+        """Test cgexec is only used for cgroups that are not placed natively"""
+        cgroups = [self.cgroup("native", True), self.cgroup("libcgroup", False)]
+        executor = ProcessExecutor(context, self.cgroup_command(cgroups, ["native", "libcgroup"]))
+        assert executor._sub_cgroup("echo") == "cgexec -g cpu:libcgroup echo"
+        assert executor._native_cgroup(None) == "/sys/fs/cgroup/native"
+        executor = ProcessExecutor(context, self.cgroup_command(cgroups, ["native"]))
+        assert executor._sub_cgroup("echo") == "echo"
+        executor = ProcessExecutor(context, self.cgroup_command(cgroups, []))
+        assert executor._sub_cgroup("echo") == "echo"
+        assert executor._native_cgroup(None) is None
+
+    def test_native_cgroup_leaf(self, context):
+        """Test commands of nested cgroups are placed in a leaf per case and parallel instance"""
+        cgroup = self.cgroup("native", True)
+        cgroup.nested = True
+        cgroup.leaf.side_effect = lambda name: "/sys/fs/cgroup/native/{name}".format(name=name)
+        command = self.cgroup_command([cgroup], ["native"])
+        command.parent.name = "testcase"
+        executor = ProcessExecutor(context, command)
+        parallel_context = ParallelExecutorContext(None)
+        parallel_context.current = 2
+        iterating_context = IteratingExecutorContext(parallel_context)
+        iterating_context.current = 1
+        assert executor._native_cgroup(iterating_context) == "/sys/fs/cgroup/native/testcase_p002"
+        # Pre and post commands of the case are not run by a parallel executor
+        assert executor._native_cgroup(ReplicatingExecutorContext(None)) == "/sys/fs/cgroup/native/testcase"
+
+    def test_sub_cgroup_errors(self, context):
+        """Test unknown cgroups and several native cgroups are rejected"""
+        cgroups = [self.cgroup("a", True), self.cgroup("b", True)]
+        executor = ProcessExecutor(context, self.cgroup_command(cgroups, ["unknown"]))
+        with pytest.raises(Exception) as excinfo:
+            executor._sub_cgroup("echo")
+        assert "No matching controller group found" in str(excinfo.value)
+        executor = ProcessExecutor(context, self.cgroup_command(cgroups, ["a", "b"]))
+        with pytest.raises(Exception) as excinfo:
+            executor._native_cgroup(None)
+        assert "can only be placed in one native cgroup" in str(excinfo.value)
+
     def test_sub_become(self, context):
         # Setup
         command = EntityCommand()
@@ -975,10 +1250,33 @@ class TestProcessExecutor:
         assert result == "Path: /test/run/path, PID: 1000, PPID: 999, PGID: 1001"
 
 
+    def test_account(self, context):
+        """Commands are counted and their resource usage and parsed metrics accounted at every enclosing level"""
+        executor = ProcessExecutor(context, EntityCommand())
+        stage = MagicMock()
+        executor._process = MagicMock()
+        executor._process.stages = [stage, MagicMock(rusage=None)]
+        executor._process.metrics = {"requests": 3.0}
+        executor._process.return_code = 1
+        parent_context = ExecutorContext(None)
+        stats = [MagicMock(), MagicMock()]
+        for stat in stats:
+            parent_context.add_stat(stat)
+
+        executor._account(parent_context)
+
+        for stat in stats:
+            stat.count.assert_any_call(Stat.COUNTER_COMMANDS)
+            stat.count.assert_any_call(Stat.COUNTER_FAILURES)
+            stat.account.assert_called_once_with([stage.rusage], {"requests": 3.0})
+
+
 class TestAsyncProcessExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def command(self):
@@ -1012,7 +1310,9 @@ class TestAsyncProcessExecutor:
 class TestAsyncThreadExecutor:
     @pytest.fixture
     def context(self):
-        return MagicMock()
+        context = MagicMock()
+        context.store = None
+        return context
 
     @pytest.fixture
     def entity(self):
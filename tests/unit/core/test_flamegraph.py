@@ -0,0 +1,144 @@
+import os
+import pytest
+from unittest.mock import patch
+from pymergen.core.flamegraph import FlamegraphFolder, FlamegraphRenderer, FlamegraphDiff, Flamegraph, FlamegraphPool
+
+SCRIPT = """python3 1234/1235 [001] 100.000001:     250000 cpu-clock:pppH:
+\tffffffff81000001 do_work+0x10 (/usr/bin/python3)
+\tffffffff81000002 main+0x2 (/usr/bin/python3)
+\t7f0000000003 [unknown] (/usr/lib/libc.so.6)
+
+python3 1234/1235 [001] 100.000002:     250000 cpu-clock:pppH:
+\tffffffff81000001 do_work+0x10 (/usr/bin/python3)
+\tffffffff81000002 main+0x2 (/usr/bin/python3)
+\t7f0000000003 [unknown] (/usr/lib/libc.so.6)
+
+my worker 42 [000] 100.000003:     250000 cpu-clock:pppH:
+\tffffffff81000004 idle;loop+0x1 ([kernel.kallsyms])
+"""
+
+
+class TestFlamegraphFolder:
+    def test_fold(self):
+        """Test samples are counted per stack from the root frame, with the command name as root"""
+        stacks = FlamegraphFolder().fold(SCRIPT.splitlines(keepends=True))
+        assert stacks == {
+            "python3;[libc.so.6];main;do_work": 2,
+            "my worker;idle:loop": 1,
+        }
+
+    def test_write_read(self, tmp_path):
+        """Test folded stacks are written sorted and read back"""
+        path = str(tmp_path / "folded")
+        FlamegraphFolder.write({"b;c d": 2, "a": 1}, path)
+        with open(path, "r") as fh:
+            assert fh.read() == "a 1\nb;c d 2\n"
+        assert list(FlamegraphFolder.read(path)) == [("a", 1), ("b;c d", 2)]
+
+
+class TestFlamegraphRenderer:
+    def test_render(self, tmp_path):
+        """Test a frame is drawn per function of each stack level"""
+        path = str(tmp_path / "graph.svg")
+        FlamegraphRenderer().render([("main;do_work", 3), ("main;<idle>", 1)], path)
+        with open(path, "r") as fh:
+            svg = fh.read()
+        assert svg.count("<rect") == 5
+        assert "<title>do_work (3 samples, 75.00%)</title>" in svg
+        assert "&lt;idle&gt;" in svg
+        assert svg.rstrip().endswith("</svg>")
+
+    def test_render_baseline(self, tmp_path):
+        """Test frames are colored by the change of their share of samples against the baseline"""
+        path = str(tmp_path / "graph.svg")
+        FlamegraphRenderer().render([("main;slow", 3), ("main;fast", 1)], path, baseline=[("main;slow", 1), ("main;fast", 3)])
+        with open(path, "r") as fh:
+            svg = fh.read()
+        assert "<title>slow (3 samples, 75.00%) +50.00%</title>" in svg
+        assert "<title>fast (1 samples, 25.00%) -50.00%</title>" in svg
+        assert 'fill="rgb(255,55,55)"' in svg
+        assert 'fill="rgb(55,55,255)"' in svg
+
+
+class TestFlamegraphDiff:
+    def test_find(self, tmp_path):
+        """Test profiles are grouped by node across replications"""
+        for replication in ["r001", "r002"]:
+            for iteration in ["i001", "i002"]:
+                path = tmp_path / "plan" / "r001" / "case" / replication / iteration
+                path.mkdir(parents=True)
+                (path / Flamegraph.FILE_FOLDED).write_text("main 1\n")
+        profiles = FlamegraphDiff.find(str(tmp_path))
+        assert sorted(profiles) == ["plan/case/i001", "plan/case/i002"]
+        assert len(profiles["plan/case/i001"]) == 2
+        assert FlamegraphDiff.iterations("plan/case/i002") == ("plan/case", "i002")
+        assert FlamegraphDiff.iterations("plan/case") == ("plan/case", None)
+        assert FlamegraphDiff.merge(profiles["plan/case/i001"]) == {"main": 2}
+
+    def test_table(self):
+        """Test symbols are ranked by the growth of their share of self samples"""
+        diff = FlamegraphDiff({"main;a": 3, "main;b": 1}, {"main;a": 10, "main;b": 10, "main;c": 20})
+        rows = diff.table()
+        assert [row[0] for row in rows] == ["c", "b", "main", "a"]
+        assert rows[0][1:4] == [0.0, 50.0, 50.0]
+        assert rows[-1][1:4] == [75.0, 25.0, -50.0]
+        # Every stack starts from main, which has no samples of its own.
+        assert rows[2][4:] == [100.0, 100.0, 0.0]
+
+    def test_write(self, tmp_path):
+        """Test the table and the differential flame graph are written"""
+        diff = FlamegraphDiff({"main;a": 1}, {"main;a": 1, "main;b": 1})
+        diff.write_table(str(tmp_path / "diff.tsv"))
+        diff.render(str(tmp_path / "diff.svg"))
+        with open(tmp_path / "diff.tsv", "r") as fh:
+            lines = fh.read().splitlines()
+        assert lines[0].split("\t") == FlamegraphDiff.HEADERS
+        assert lines[1] == "b\t0.0000\t50.0000\t50.0000\t0.0000\t50.0000\t50.0000"
+        assert os.path.exists(tmp_path / "diff.svg")
+
+
+class TestFlamegraph:
+    def test_generate(self, tmp_path):
+        """Test results are cached by the hash of the data file and copied next to it"""
+        data_path = tmp_path / "collector.perf_profile.data"
+        data_path.write_bytes(b"data")
+        cache_path = str(tmp_path / "cache")
+        with patch.object(Flamegraph, "_script", return_value={"main;do_work": 1}) as script:
+            paths = Flamegraph.generate(str(data_path), cache_path)
+            assert paths == [str(tmp_path / Flamegraph.FILE_FOLDED), str(tmp_path / Flamegraph.FILE_SVG)]
+            assert Flamegraph.generate(str(data_path), cache_path) == paths
+            script.assert_called_once()
+        assert sorted(os.listdir(cache_path)) == sorted("{d}.{e}".format(d=Flamegraph.digest(str(data_path)), e=e) for e in ["folded", "svg"])
+        with open(paths[0], "r") as fh:
+            assert fh.read() == "main;do_work 1\n"
+
+    def test_script(self, tmp_path):
+        """Test perf script output is folded while it is read"""
+        with patch("pymergen.core.flamegraph.subprocess.Popen") as popen:
+            popen.return_value.stdout.__iter__.return_value = iter(SCRIPT.splitlines(keepends=True))
+            popen.return_value.wait.return_value = 0
+            assert Flamegraph._script("perf.data", "sudo -n")["my worker;idle:loop"] == 1
+            assert popen.call_args[0][0] == ["sudo", "-n", "perf", "script", "-f", "-i", "perf.data"]
+            popen.return_value.wait.return_value = 1
+            with pytest.raises(Exception, match="Unable to read perf.data"):
+                Flamegraph._script("perf.data")
+
+
+class TestFlamegraphPool:
+    def test_close_errors(self, tmp_path):
+        """Test failures of workers are returned once the pool is closed"""
+        pool = FlamegraphPool(str(tmp_path / "cache"), 1)
+        assert pool.close() == []
+        pool.submit(str(tmp_path / "missing.data"))
+        errors = pool.close()
+        assert len(errors) == 1
+        assert isinstance(errors[0], FileNotFoundError)
+
+    def test_call(self):
+        """Test other jobs share the pool and their results are passed to the callback"""
+        pool = FlamegraphPool(workers=1)
+        results = list()
+        future = pool.call(max, ([1, 3, 2],), results.append)
+        assert future.result() == 3
+        assert pool.close() == []
+        assert results == [3]
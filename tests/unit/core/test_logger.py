@@ -1,8 +1,9 @@
 import os
+import gzip
 import pytest
 import logging
 from unittest.mock import MagicMock, patch
-from pymergen.core.logger import Logger
+from pymergen.core.logger import Logger, LoggerStreamHandler
 
 
 class TestLogger:
@@ -15,6 +16,7 @@ class TestLogger:
         context = MagicMock()
         context.run_path = "/test/run"
         context.log_level = "INFO"
+        context.compress = None
         return context
 
     @patch('logging.getLogger')
@@ -106,3 +108,20 @@ class TestLogger:
         assert logger1 == logger2  # Same logger instance
         # Handlers shouldn't be added again
         mock_logger1.addHandler.assert_not_called()
+
+    def test_compressed_runner_log(self, context, tmp_path):
+        """Test runner log is written through a compressing writer"""
+        context.run_path = str(tmp_path)
+        context.compress = "gzip"
+
+        logger = Logger.logger(context)
+        logger.debug("compressed message")
+        for handler in list(logger.handlers):
+            if isinstance(handler, LoggerStreamHandler):
+                logger.removeHandler(handler)
+                handler.close()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+        with gzip.open(str(tmp_path / "run.runner.log.gz"), "rt") as fh:
+            assert "compressed message" in fh.read()
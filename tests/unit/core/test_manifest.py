@@ -0,0 +1,40 @@
+import os
+import json
+from pymergen.core.manifest import Manifest
+
+
+class TestManifest:
+    def test_register(self, tmp_path):
+        """Test files are appended once, relative to the run directory"""
+        manifest = Manifest(str(tmp_path))
+        manifest.register(str(tmp_path / "plan" / "r001" / "stat.total.json"))
+        manifest.register(str(tmp_path / "plan" / "r001" / "stat.total.json"))
+        manifest.register(str(tmp_path / "run.runner.log"))
+        manifest.close()
+        with open(tmp_path / Manifest.FILE_NAME) as fh:
+            records = [json.loads(line) for line in fh]
+        assert records == [{"path": "plan/r001/stat.total.json"}, {"path": "run.runner.log"}]
+
+    def test_register_dir(self, tmp_path):
+        """Test files of a single directory are registered without recursion"""
+        os.makedirs(tmp_path / "p001" / "nested")
+        (tmp_path / "p001" / "perf.data").write_text("")
+        (tmp_path / "p001" / "nested" / "ignored").write_text("")
+        manifest = Manifest(str(tmp_path))
+        manifest.register_dir(str(tmp_path / "p001"))
+        manifest.close()
+        assert Manifest.read(str(tmp_path)) == [str(tmp_path / "p001" / "perf.data")]
+
+    def test_read(self, tmp_path):
+        """Test records are read as absolute paths, skipping duplicates and incomplete lines"""
+        (tmp_path / Manifest.FILE_NAME).write_text("{\"path\": \"a/b.log\"}\n{\"path\": \"c.json\"}\n{\"path\": \"a/b.log\"}\n{\"pa")
+        assert Manifest.read(str(tmp_path)) == [str(tmp_path / "a" / "b.log"), str(tmp_path / "c.json")]
+
+    def test_read_missing(self, tmp_path):
+        """Test a run without manifest has no files"""
+        assert Manifest.read(str(tmp_path)) == []
+
+    def test_close_without_records(self, tmp_path):
+        """Test no manifest is created without records"""
+        Manifest(str(tmp_path)).close()
+        assert not (tmp_path / Manifest.FILE_NAME).exists()
@@ -231,7 +231,9 @@ class TestParser:
             "config": {
                 "replication": 3,
                 "params": {"key1": "value1"},
-                "iters": {"iter1": ["a", "b"]}
+                "iters": {"iter1": ["a", "b"]},
+                "stats": ["cpu", "rusage"],
+                "counters": ["requests"]
             },
             "pre": [{"cmd": "echo pre"}],
             "post": [{"cmd": "echo post"}],
@@ -273,6 +275,8 @@ class TestParser:
             assert plan.config.replication == 3
             assert plan.config.params == {"key1": "value1"}
             assert plan.config.iters == {"iter1": ["a", "b"]}
+            assert plan.config.stats == ["cpu", "rusage"]
+            assert plan.config.counters == ["requests"]
             assert plan.pre == mock_pre_commands
             assert plan.post == mock_post_commands
             assert plan.cgroups == mock_cgroups
@@ -473,6 +477,26 @@ class TestParser:
         assert mock_process_collector.context == context
         assert mock_thread_collector.context == context
 
+    def test_parse_parsers(self, context):
+        # Setup
+        parser = Parser(context)
+        parser_data = [
+            {"engine": "regex", "name": "latency", "patterns": [{"metric": "lat", "regex": "lat=([0-9.]+)"}]},
+        ]
+        mock_regex_plugin = MagicMock()
+        mock_output_parser = MagicMock()
+        mock_regex_plugin.implementation.return_value = mock_output_parser
+        context.plugin_manager.get_parser_plugin.return_value = mock_regex_plugin
+
+        # Execute
+        parsers = parser._parse_parsers(parser_data)
+
+        # Assert
+        assert parsers == [mock_output_parser]
+        context.plugin_manager.get_parser_plugin.assert_called_once_with("regex")
+        mock_regex_plugin.implementation.assert_called_once_with(parser_data[0])
+        assert mock_output_parser.context == context
+
     @patch('importlib.import_module')
     def test_init_validator_success(self, mock_import_module, context):
         # Setup
@@ -3,8 +3,11 @@ from unittest.mock import MagicMock, patch
 import subprocess
 import signal
 import time
+import json
+import gzip
 from pymergen.core.process import Process
 from pymergen.entity.command import EntityCommand
+from pymergen.parser.format import OutputParserRegex, OutputParserKeyValue
 
 
 class TestProcess:
@@ -60,10 +63,39 @@ class TestProcess:
             executable=None,
             stdin=None,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            preexec_fn=None
         )
         mock_process.communicate.assert_called_once_with(timeout=None)
 
+    def test_run_cgroup(self, context, tmp_path):
+        """Test commands are placed into a native cgroup by their child before exec"""
+        (tmp_path / "cgroup.procs").write_text("")
+        cmd = EntityCommand()
+        cmd.cmd = "true | true"
+        cmd.shell = False
+        process = Process(context)
+        process.command = cmd
+        process.cgroup = str(tmp_path)
+        process.run()
+        assert process.return_code == 0
+        # Every stage writes 0, which moves the writing process itself
+        assert (tmp_path / "cgroup.procs").read_text() == "00"
+        assert process._cgroup_fd is None
+
+    def test_run_pids(self, context):
+        """Test every stage is registered for collectors as it is spawned"""
+        cmd = EntityCommand()
+        cmd.name = "pipeline"
+        cmd.cmd = "true | true"
+        cmd.shell = False
+        process = Process(context)
+        process.command = cmd
+        process.pids = dict()
+        process.run()
+        assert process.pids == {stage.popen.pid: "pipeline" for stage in process.stages}
+        assert len(process.pids) == 2
+
     @patch('pymergen.core.process.subprocess.Popen')
     def test_run_shell_false(self, mock_popen, context):
         # Setup
@@ -91,7 +123,8 @@ class TestProcess:
             executable=None,
             stdin=None,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            preexec_fn=None
         )
 
     @patch('pymergen.core.process.subprocess.Popen')
@@ -235,7 +268,8 @@ class TestProcess:
             executable=None,
             stdin=None,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            preexec_fn=None
         )
         # Second process
         mock_popen.assert_any_call(
@@ -244,7 +278,8 @@ class TestProcess:
             executable=None,
             stdin=mock_process1.stdout,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            preexec_fn=None
         )
         # Third process
         mock_popen.assert_any_call(
@@ -253,7 +288,8 @@ class TestProcess:
             executable=None,
             stdin=mock_process2.stdout,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            preexec_fn=None
         )
         # Verify stdout closing
         mock_process1.stdout.close.assert_called_once()
@@ -461,3 +497,190 @@ class TestProcess:
 
             # Assert signal was called after timer expired
             mock_signal.assert_called_once_with()
+
+    def test_pipeline_stages_tracked(self, context, tmp_path):
+        """Test each stage of a shell-free pipeline is tracked with its own exit status and resource usage"""
+        command = EntityCommand()
+        command.name = "pipeline"
+        command.cmd = "head -c 100000 /dev/zero | cat | wc -c"
+        command.shell = False
+
+        process = Process(context)
+        process.command = command
+        process.run()
+
+        assert len(process.stages) == 3
+        assert len(process.pipes) == 0
+        for i, stage in enumerate(process.stages):
+            data = stage.data()
+            assert data["index"] == i
+            assert data["return_code"] == 0
+            assert data["duration"] >= 0
+            assert data["rusage"] is not None
+            assert data["exited_at"] >= data["started_at"]
+
+        process.log(str(tmp_path))
+        with open(tmp_path / "stat.process_pipeline.json") as fh:
+            data = json.loads(fh.read())
+        assert data["command"] == "pipeline"
+        assert [s["cmd"] for s in data["stages"]] == [["head", "-c", "100000", "/dev/zero"], ["cat"], ["wc", "-c"]]
+
+    def test_stage_reaper_wait_lock(self, context):
+        """Test the stage reaper defers Popen.poll() and Popen.wait() through the Popen wait lock"""
+        command = EntityCommand()
+        command.name = "reaper"
+        command.cmd = "sleep 0.2"
+        command.shell = False
+
+        process = Process(context)
+        process.command = command
+        process.start()
+        # The reaper relies on this CPython attribute, every supported release provides it.
+        assert hasattr(process.stages[0].popen, "_waitpid_lock")
+        assert process.stages[0].popen.poll() is None
+        process.wait()
+
+        assert process.stages[0].popen.poll() == 0
+        assert process.stages[0].data()["rusage"] is not None
+
+    def test_pipeline_timeout_records_killed_stages(self, context):
+        """Test every stage of a timed out pipeline is killed and still recorded"""
+        command = EntityCommand()
+        command.name = "pipeline"
+        command.cmd = "sleep 5 | sleep 5"
+        command.shell = False
+        command.timeout = 0.5
+        command.raise_error = False
+
+        process = Process(context)
+        process.command = command
+        started = time.monotonic()
+        process.run()
+
+        assert time.monotonic() - started < 3
+        for stage in process.stages:
+            data = stage.data()
+            assert data["return_code"] == -signal.SIGKILL
+            assert data["rusage"] is not None
+
+    def test_pipeline_meter_pipes(self, context):
+        """Test interposed pipes count the bytes moved between stages"""
+        command = EntityCommand()
+        command.name = "pipeline"
+        command.cmd = "head -c 100000 /dev/zero | cat | wc -c"
+        command.shell = False
+        command.meter_pipes = True
+
+        process = Process(context)
+        process.command = command
+        process.run()
+
+        assert [stage.return_code for stage in process.stages] == [0, 0, 0]
+        assert len(process.pipes) == 2
+        assert [pipe.bytes for pipe in process.pipes] == [100000, 100000]
+        data = process.pipes[0].data()
+        assert data["source"] == 0
+        assert data["target"] == 1
+
+    def test_pipeline_meter_pipes_early_consumer_exit(self, context):
+        """Test interposed pipes let the producer terminate when the consumer exits early"""
+        command = EntityCommand()
+        command.name = "pipeline"
+        command.cmd = "yes | head -n 1"
+        command.shell = False
+        command.meter_pipes = True
+        command.timeout = 10
+
+        process = Process(context)
+        process.command = command
+        process.run()
+
+        assert process.stages[1].return_code == 0
+        assert process.stages[0].return_code == -signal.SIGPIPE
+
+    def test_pipe_stdout_compressed(self, context, tmp_path):
+        """Test piped output is streamed through a compressing writer"""
+        command = EntityCommand()
+        command.name = "compressed"
+        command.cmd = "head -c 1000 /dev/zero | tr '\\0' a"
+        command.shell = False
+        command.pipe_stdout = str(tmp_path / "stdout.txt")
+        command.compress = "gzip"
+
+        process = Process(context)
+        process.command = command
+        process.run()
+
+        with gzip.open(str(tmp_path / "stdout.txt.gz"), "rt") as fh:
+            assert fh.read() == "a" * 1000
+
+    def test_pipe_stdout_compressed_timeout(self, context, tmp_path):
+        """Test the command timeout bounds the output pump when a descendant keeps the pipe open"""
+        command = EntityCommand()
+        command.name = "compressed"
+        command.cmd = "echo start; sleep 5; echo stop"
+        command.shell = True
+        command.timeout = 0.5
+        command.raise_error = False
+        command.pipe_stdout = str(tmp_path / "stdout.txt")
+        command.compress = "gzip"
+
+        process = Process(context)
+        process.command = command
+        started = time.monotonic()
+        process.run()
+
+        assert time.monotonic() - started < 3
+        with gzip.open(str(tmp_path / "stdout.txt.gz"), "rt") as fh:
+            assert fh.read() == "start\n"
+
+    def test_parsers(self, context, tmp_path):
+        """Test command output is parsed into metrics while still piped to a file"""
+        stdout_parser = OutputParserRegex()
+        stdout_parser.parse({"name": "ops", "patterns": [{"metric": "ops", "regex": r"ops=(\d+)"}]})
+        stderr_parser = OutputParserKeyValue()
+        stderr_parser.parse({"name": "kv", "stream": "stderr"})
+        command = EntityCommand()
+        command.name = "parsed"
+        command.cmd = "printf 'ops=1\\nops=2\\n'; printf 'lat=3\\n' >&2"
+        command.shell = True
+        command.debug_stderr = True
+        command.pipe_stdout = str(tmp_path / "stdout.txt")
+        command.add_parser(stdout_parser)
+        command.add_parser(stderr_parser)
+
+        process = Process(context)
+        process.command = command
+        process.run_path = str(tmp_path)
+        process.run()
+
+        with open(tmp_path / "stdout.txt") as fh:
+            assert fh.read() == "ops=1\nops=2\n"
+        with open(tmp_path / "metrics.jsonl") as fh:
+            records = [json.loads(line) for line in fh]
+        assert sorted((r["parser"], r["metric"], r["value"]) for r in records) == [("kv", "lat", 3.0), ("ops", "ops", 1.0), ("ops", "ops", 2.0)]
+        assert all(r["command"] == "parsed" for r in records)
+        context.logger.debug.assert_any_call(b"lat=3\n")
+
+    def test_parsers_timeout(self, context, tmp_path):
+        """Test the command timeout bounds the output pump feeding parsers"""
+        parser = OutputParserRegex()
+        parser.parse({"name": "ops", "patterns": [{"metric": "ops", "regex": r"ops=(\d+)"}]})
+        command = EntityCommand()
+        command.name = "parsed"
+        command.cmd = "echo ops=1; sleep 5; echo ops=2"
+        command.shell = True
+        command.timeout = 0.5
+        command.raise_error = False
+        command.add_parser(parser)
+
+        process = Process(context)
+        process.command = command
+        process.run_path = str(tmp_path)
+        started = time.monotonic()
+        process.run()
+
+        assert time.monotonic() - started < 3
+        with open(tmp_path / "metrics.jsonl") as fh:
+            records = [json.loads(line) for line in fh]
+        assert [r["value"] for r in records] == [1.0]
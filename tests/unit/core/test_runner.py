@@ -61,6 +61,16 @@ class TestRunner:
         # Assert that execute was called
         mock_execute.assert_called_once()
 
+    @patch.object(ControllingExecutor, 'execute')
+    def test_run_close_collectors(self, mock_execute, context, plan):
+        """Test collectors are closed once the plan finished, also when it failed"""
+        collector = MagicMock()
+        plan.collectors = [collector]
+        mock_execute.side_effect = Exception("failed")
+        with pytest.raises(Exception):
+            Runner(context).run([plan])
+        collector.close.assert_called_once()
+
     def test_run_executor_hierarchy(self, context, plan):
         # This test verifies the executor hierarchy is correctly constructed
         runner = Runner(context)
@@ -160,25 +170,23 @@ class TestRunner:
             # With suite concurrency=True, we should NOT have a CollectingExecutor at the case level
             assert isinstance(case_ie.children[0], ParallelExecutor)
 
-    @patch('os.path.isfile')
-    @patch('pymergen.core.runner.glob.glob')
+    @patch('pymergen.core.runner.Manifest.read')
     @patch('pymergen.core.runner.json.dumps')
     @patch('builtins.print')
-    def test_report_files(self, mock_print, mock_dumps, mock_glob, mock_isfile, context):
+    def test_report_files(self, mock_print, mock_dumps, mock_read, context):
         # Setup
-        mock_glob.return_value = [
+        mock_read.return_value = [
             "/test/run/plan/r001/suite/r001/case/r001/collector.perf_stat.data",
             "/test/run/plan/r001/suite/r001/case/r001/collector.cgroup_cpu.log"
         ]
         mock_dumps.return_value = '{"files": {"collector": {"collector.perf_stat": ["/test/run/plan/r001/suite/r001/case/r001/collector.perf_stat.data"], "collector.cgroup_cpu": ["/test/run/plan/r001/suite/r001/case/r001/collector.cgroup_cpu.log"]}}'
-        mock_isfile.return_value = True
 
         # Execute
         runner = Runner(context)
         runner.report({"files": True})
 
         # Assert
-        mock_glob.assert_called_once_with("/test/run/**/*", recursive=True)
+        mock_read.assert_called_once_with("/test/run")
         mock_dumps.assert_called_once()
         mock_print.assert_called_once()
 
@@ -0,0 +1,142 @@
+import io
+import gzip
+import math
+import array
+import pytest
+from unittest.mock import patch
+from pymergen.core.series import SeriesWriter, SeriesReader
+
+
+class TestSeriesWriter:
+    def test_types_for(self):
+        """Test column types are inferred from a sample"""
+        assert SeriesWriter.types_for([1, 0.5, "max", True]) == "qddd"
+
+    def test_schema_mismatch(self, tmp_path):
+        """Test the schema needs a type per column"""
+        writer = SeriesWriter(str(tmp_path / "test.series"))
+        with pytest.raises(Exception) as excinfo:
+            writer.schema(["a", "b"], "q")
+        assert "2 columns but 1 types" in str(excinfo.value)
+
+    def test_append_without_schema(self, tmp_path):
+        """Test samples need a schema"""
+        writer = SeriesWriter(str(tmp_path / "test.series"))
+        with pytest.raises(Exception) as excinfo:
+            writer.append(0, [1])
+        assert "has no schema" in str(excinfo.value)
+
+    def test_chunks(self, tmp_path):
+        """Test rows are buffered and written in chunks of the configured size"""
+        path = tmp_path / "test.series"
+        writer = SeriesWriter(str(path), chunk_size=48, flush_interval=60)
+        writer.schema(["a", "b"], "qd")
+        size = path.stat().st_size
+        writer.append(1000, [1, 0.5])
+        assert path.stat().st_size == size
+        writer.append(1010, [2, 1.5])
+        # Two rows of a timestamp and two columns reach the chunk size of 48 bytes
+        assert path.stat().st_size == size + SeriesWriter.BLOCK_HEADER.size + 48
+        writer.close()
+
+    def test_flush_interval(self, tmp_path):
+        """Test pending rows are written once the flush interval elapsed"""
+        path = tmp_path / "test.series"
+        writer = SeriesWriter(str(path), flush_interval=1)
+        writer.schema(["a"], "q")
+        size = path.stat().st_size
+        with patch('pymergen.core.series.time.monotonic', side_effect=[10, 10, 10.5, 11, 11]):
+            writer.append(0, [1])
+            writer.append(1, [2])
+            assert path.stat().st_size == size
+            writer.append(2, [3])
+        assert path.stat().st_size == size + SeriesWriter.BLOCK_HEADER.size + 3 * 2 * 8
+
+
+class TestSeriesReader:
+    @staticmethod
+    def write(path, compress=None):
+        writer = SeriesWriter(path, compress, chunk_size=32)
+        writer.schema(["jitter_ns", "usage_usec"], "qq")
+        writer.append(1000000000000, [10, 100])
+        writer.append(1000000000010, [0, 250])
+        writer.append(1000000000025, [5, 400])
+        writer.schema(["some_avg10"], "d")
+        writer.append(1000000000030, [0.5])
+        writer.append(1000000000040, ["max"])
+        writer.close()
+        return writer.path
+
+    def test_read(self, tmp_path):
+        """Test segments are decoded per schema with absolute timestamps"""
+        path = self.write(str(tmp_path / "test.series"))
+        reader = SeriesReader(path)
+        reader.numpy = None
+        segments = reader.read()
+        assert len(segments) == 2
+        assert list(segments[0].keys()) == ["timestamp_ns", "jitter_ns", "usage_usec"]
+        assert segments[0]["timestamp_ns"] == array.array("q", [1000000000000, 1000000000010, 1000000000025])
+        assert segments[0]["usage_usec"].tolist() == [100, 250, 400]
+        assert segments[1]["some_avg10"][0] == 0.5
+        assert math.isnan(segments[1]["some_avg10"][1])
+
+    def test_read_numpy(self, tmp_path):
+        """Test segments are returned as NumPy arrays"""
+        np = pytest.importorskip("numpy")
+        path = self.write(str(tmp_path / "test.series"))
+        segments = SeriesReader(path).read()
+        assert isinstance(segments[0]["usage_usec"], np.ndarray)
+        assert segments[0]["timestamp_ns"].tolist() == [1000000000000, 1000000000010, 1000000000025]
+
+    def test_read_compressed(self, tmp_path):
+        """Test compressed series, appended across writers"""
+        path = self.write(str(tmp_path / "test.series"), "gzip")
+        assert path.endswith(".series.gz")
+        writer = SeriesWriter(str(tmp_path / "test.series"), "gzip")
+        writer.schema(["usage_usec"], "q")
+        writer.append(5, [1])
+        writer.close()
+        reader = SeriesReader(path)
+        reader.numpy = None
+        segments = reader.read()
+        assert len(segments) == 3
+        assert segments[2]["usage_usec"].tolist() == [1]
+        with gzip.open(path, "rb") as fh:
+            assert fh.read().startswith(SeriesWriter.MAGIC)
+
+    def test_read_truncated(self, tmp_path):
+        """Test an incomplete last chunk is ignored"""
+        path = self.write(str(tmp_path / "test.series"))
+        with open(path, "rb") as fh:
+            data = fh.read()
+        with open(path, "wb") as fh:
+            fh.write(data[:-4])
+        reader = SeriesReader(path)
+        reader.numpy = None
+        segments = reader.read()
+        assert len(segments[1]["timestamp_ns"]) == 0
+        assert segments[0]["usage_usec"].tolist() == [100, 250, 400]
+
+    def test_read_invalid(self, tmp_path):
+        """Test files without the series magic are rejected"""
+        (tmp_path / "test.series").write_text("timestamp_ns usage_usec\n")
+        with pytest.raises(Exception) as excinfo:
+            SeriesReader(str(tmp_path / "test.series")).read()
+        assert "is not a series file" in str(excinfo.value)
+
+    def test_export(self, tmp_path):
+        """Test text export in the layout of the collector logs"""
+        path = self.write(str(tmp_path / "test.series"))
+        reader = SeriesReader(path)
+        reader.numpy = None
+        fh = io.StringIO()
+        reader.export(fh)
+        assert fh.getvalue() == (
+            "timestamp_ns jitter_ns usage_usec\n"
+            "1000000000000 10 100\n"
+            "1000000000010 0 250\n"
+            "1000000000025 5 400\n"
+            "timestamp_ns some_avg10\n"
+            "1000000000030 0.5\n"
+            "1000000000040 nan\n"
+        )
@@ -3,7 +3,7 @@ import json
 import pytest
 import tempfile
 from unittest.mock import patch, MagicMock
-from pymergen.core.stat import StatTimer, Stat
+from pymergen.core.stat import StatTimer, StatCpu, StatResourceUsage, StatControllerGroup, Stat
 
 
 class TestStatTimer:
@@ -13,7 +13,8 @@ class TestStatTimer:
         assert timer._active is False
         assert timer._started_at is None
         assert timer._stopped_at is None
-        assert timer._duration is None
+        assert timer.duration is None
+        assert timer.duration_ns is None
 
     def test_properties(self):
         """Test property getters"""
@@ -25,27 +26,26 @@ class TestStatTimer:
         assert timer.stopped_at == 105.0
 
     def test_duration_calculation(self):
-        """Test duration property calculates and rounds correctly"""
+        """Test duration is taken from the performance counter without rounding"""
         timer = StatTimer()
         timer._started_at = 100.0
-        timer._stopped_at = 105.123456
+        timer._stopped_at = 200.0
+        timer._started_ns = 1000
+        timer._stopped_ns = 5124567
 
-        # First call calculates duration
-        assert timer.duration == 5.12
-        # Second call uses cached value
-        assert timer.duration == 5.12
-        # Verify duration was cached
-        assert timer._duration == 5.12
+        assert timer.duration_ns == 5123567
+        assert timer.duration == 0.005123567
 
     def test_start(self):
         """Test start method sets timer state"""
         timer = StatTimer()
 
-        with patch('time.time', return_value=100.5):
+        with patch('time.time', return_value=100.5), patch('time.perf_counter_ns', return_value=42):
             timer.start()
 
         assert timer._active is True
         assert timer._started_at == 100.5
+        assert timer._started_ns == 42
 
     def test_start_raises_exception_when_active(self):
         """Test start raises exception when timer is already active"""
@@ -62,11 +62,12 @@ class TestStatTimer:
         timer = StatTimer()
         timer._active = True
 
-        with patch('time.time', return_value=105.5):
+        with patch('time.time', return_value=105.5), patch('time.perf_counter_ns', return_value=84):
             timer.stop()
 
         assert timer._active is False
         assert timer._stopped_at == 105.5
+        assert timer._stopped_ns == 84
 
     def test_stop_raises_exception_when_inactive(self):
         """Test stop raises exception when timer is not active"""
@@ -79,53 +80,161 @@ class TestStatTimer:
         assert "Timer is not active" in str(excinfo.value)
 
     def test_log(self):
-        """Test log method writes timer data to file"""
+        """Test log method writes timer data to the legacy timer file"""
         timer = StatTimer()
         timer._started_at = 100.0
         timer._stopped_at = 105.0
+        timer._started_ns = 0
+        timer._stopped_ns = 5000000000
 
         with tempfile.TemporaryDirectory() as temp_dir:
-            with patch('json.dumps', return_value='{\'mocked_json\': true}'):
-                timer.log(temp_dir)
+            timer.log(temp_dir)
 
-            # Verify file was created with expected content
             log_file_path = os.path.join(temp_dir, "stat.timer.json")
-            assert os.path.exists(log_file_path)
-
             with open(log_file_path, 'r') as f:
-                content = f.read()
-                assert content == "{data}\n".format(data='{\'mocked_json\': true}')
+                data = json.loads(f.read())
+            assert data == {"started_at": 100.0, "stopped_at": 105.0, "duration": 5.0, "duration_ns": 5000000000}
+
+
+class TestStatMetrics:
+    @staticmethod
+    def rusage(**values):
+        rusage = MagicMock()
+        for field in StatResourceUsage.FIELDS:
+            setattr(rusage, field, values.get(field, 0))
+        return rusage
+
+    def test_cpu(self):
+        """Test child CPU time is summed from accounted commands"""
+        cpu = StatCpu()
+        with patch('time.process_time_ns', side_effect=[100, 350]):
+            cpu.start()
+            cpu.account([self.rusage(ru_utime=1.5, ru_stime=0.5), self.rusage(ru_utime=0.25)])
+            cpu.stop()
+        assert cpu.data() == {"process_ns": 250, "children_user": 1.75, "children_system": 0.5}
+
+    def test_rusage(self):
+        """Test resource usage is summed, except high-water marks"""
+        rusage = StatResourceUsage()
+        rusage.start()
+        rusage.account([self.rusage(ru_maxrss=100, ru_minflt=10), self.rusage(ru_maxrss=300, ru_minflt=5)])
+        rusage.stop()
+        data = rusage.data()
+        assert data["ru_maxrss"] == 300
+        assert data["ru_minflt"] == 15
+
+    def test_cgroup(self, tmp_path):
+        """Test cgroup counters are reported as deltas and missing files are skipped"""
+        cgroup = MagicMock()
+        cgroup.name = "test"
+        cgroup.DIR_BASE = str(tmp_path)
+        os.makedirs(tmp_path / "test")
+        stat_file = tmp_path / "test" / "cpu.stat"
+        stat = StatControllerGroup([cgroup])
+        stat_file.write_text("usage_usec 100\nuser_usec 60\n")
+        stat.start()
+        stat_file.write_text("usage_usec 250\nuser_usec 100\n")
+        stat.stop()
+        assert stat.data() == {"test": {"cpu.usage_usec": 150, "cpu.user_usec": 40}}
+
+    def test_cgroup_peaks(self, tmp_path):
+        """Test peaks are read at the end of the node, with memory.peak reset at its start"""
+        cgroup = MagicMock()
+        cgroup.name = "test"
+        cgroup.DIR_BASE = str(tmp_path)
+        os.makedirs(tmp_path / "test")
+        (tmp_path / "test" / "memory.events").write_text("max 0\noom_kill 0\n")
+        (tmp_path / "test" / "memory.peak").write_text("4096\n")
+        (tmp_path / "test" / "pids.peak").write_text("12\n")
+        stat = StatControllerGroup([cgroup])
+        with patch('pymergen.core.stat.os.write') as mock_write:
+            stat.start()
+        mock_write.assert_called_once()
+        assert mock_write.call_args[0][1] == b"reset"
+        (tmp_path / "test" / "memory.events").write_text("max 2\noom_kill 1\n")
+        (tmp_path / "test" / "memory.peak").write_text("8192\n")
+        stat.stop()
+        assert stat.data() == {"test": {
+            "memory.max": 2,
+            "memory.oom_kill": 1,
+            "memory.peak": 8192,
+            "memory.peak_reset": True,
+            "pids.peak": 12,
+        }}
+        assert stat._peak_fds == {}
+
+    def test_cgroup_peaks_without_reset(self, tmp_path):
+        """Test the peak since the creation of the cgroup is reported on kernels without reset support"""
+        cgroup = MagicMock()
+        cgroup.name = "test"
+        cgroup.DIR_BASE = str(tmp_path)
+        os.makedirs(tmp_path / "test")
+        (tmp_path / "test" / "memory.peak").write_text("4096\n")
+        stat = StatControllerGroup([cgroup])
+        with patch('pymergen.core.stat.os.write', side_effect=OSError(22, "Invalid argument")):
+            stat.start()
+        stat.stop()
+        assert stat.data() == {"test": {"memory.peak": 4096, "memory.peak_reset": False}}
 
 
 class TestStat:
     def test_init(self):
-        """Test Stat initialization creates StatTimer"""
+        """Test default metrics"""
         stat = Stat()
-        assert isinstance(stat._timer, StatTimer)
+        assert isinstance(stat.timer, StatTimer)
+        assert [metric.name for metric in stat.metrics] == ["timer", "cpu"]
+        assert stat.counters == {"commands": 0, "failures": 0}
+
+    def test_init_metrics(self):
+        """Test configured metrics and counters"""
+        stat = Stat(["rusage", "cgroup"], ["requests"], [])
+        assert [metric.name for metric in stat.metrics] == ["timer", "rusage", "cgroup"]
+        assert stat.counters == {"commands": 0, "failures": 0, "requests": 0}
+
+    def test_init_unknown_metric(self):
+        """Test unknown metrics are rejected"""
+        with pytest.raises(Exception) as excinfo:
+            Stat(["unknown"])
+        assert "not recognized" in str(excinfo.value)
 
-    def test_timer_property(self):
-        """Test timer property returns the StatTimer instance"""
+    def test_count(self):
+        """Test counters"""
         stat = Stat()
-        timer = stat.timer
-        assert timer is stat._timer
+        stat.count("commands")
+        stat.count("custom", 2.5)
+        assert stat.counters["commands"] == 1
+        assert stat.counters["custom"] == 2.5
+
+    def test_account(self):
+        """Test configured counters sum parsed metrics"""
+        stat = Stat(["rusage"], ["requests"])
+        stat.account([TestStatMetrics.rusage(ru_minflt=3)], {"requests": 10.0, "errors": 1.0})
+        stat.account([], {"requests": 5.0})
+        assert stat.counters["requests"] == 15.0
+        assert "errors" not in stat.counters
+        assert stat.metrics[1].data()["ru_minflt"] == 3
 
     @patch.object(StatTimer, 'start')
-    def test_start(self, mock_start):
-        """Test start delegates to timer.start"""
+    @patch.object(StatCpu, 'start')
+    def test_start(self, mock_cpu_start, mock_timer_start):
+        """Test start delegates to all metrics"""
         stat = Stat()
         stat.start()
-        mock_start.assert_called_once()
+        mock_timer_start.assert_called_once()
+        mock_cpu_start.assert_called_once()
 
-    @patch.object(StatTimer, 'stop')
-    def test_stop(self, mock_stop):
-        """Test stop delegates to timer.stop"""
+    def test_log(self, tmp_path):
+        """Test phase files and the legacy timer file"""
         stat = Stat()
+        stat.start()
         stat.stop()
-        mock_stop.assert_called_once()
-
-    @patch.object(StatTimer, 'log')
-    def test_log(self, mock_log):
-        """Test log delegates to timer.log"""
-        stat = Stat()
-        stat.log("/test/path")
-        mock_log.assert_called_once_with("/test/path")
+        stat.log(str(tmp_path), Stat.PHASE_MAIN)
+        assert not (tmp_path / "stat.timer.json").exists()
+        stat.log(str(tmp_path))
+        with open(tmp_path / "stat.main.json") as fh:
+            data = json.loads(fh.read())
+        assert data["phase"] == "main"
+        assert set(data.keys()) == {"phase", "timer", "cpu", "counters"}
+        with open(tmp_path / "stat.total.json") as fh:
+            assert json.loads(fh.read())["phase"] == "total"
+        assert (tmp_path / "stat.timer.json").exists()
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+import pytest
+from pymergen.core.store import Store
+
+
+class TestStore:
+    @pytest.fixture
+    def store(self, tmp_path):
+        store = Store(str(tmp_path / Store.FILE_NAME))
+        yield store
+        store.close()
+
+    def test_schema(self, store):
+        """Test tables and indexes are created before anything is written"""
+        rows = Store.query(store.path, "SELECT name FROM sqlite_master WHERE type = ?", ("index",))
+        names = [row["name"] for row in rows]
+        assert "stats_metric" in names
+        assert "samples_node" in names
+
+    def test_node(self, store):
+        """Test nodes are recorded once with their parent path"""
+        store.node("plan/r001/suite", "suite", "suite", ["r001"], iters={"size": "1"}, params={"a": "b"})
+        store.node("plan/r001/suite", "suite", "suite", ["r002"])
+        store.flush()
+        rows = Store.query(store.path, "SELECT * FROM nodes")
+        assert rows == [{
+            "path": "plan/r001/suite",
+            "parent": "plan/r001",
+            "entity": "suite",
+            "kind": "suite",
+            "contexts": "[\"r001\"]",
+            "command": None,
+            "iters": "{\"size\": \"1\"}",
+            "params": "{\"a\": \"b\"}",
+        }]
+
+    def test_stat(self, store):
+        """Test stats are flattened into numeric rows"""
+        store.stat("plan/r001", "total", {"phase": "total", "timer": {"duration_ns": 10}, "stages": [{"return_code": 0}]})
+        store.flush()
+        rows = Store.query(store.path, "SELECT node, phase, metric, value FROM stats ORDER BY metric")
+        assert rows == [
+            {"node": "plan/r001", "phase": "total", "metric": "stages.0.return_code", "value": 0},
+            {"node": "plan/r001", "phase": "total", "metric": "timer.duration_ns", "value": 10},
+        ]
+
+    def test_sample(self, store):
+        """Test samples are written in batches"""
+        store.BATCH_SIZE = 7
+        for i in range(100):
+            store.sample("plan/r001", "parser.wrk", "latency", float(i), i, {"p": "50"})
+        store.flush()
+        rows = Store.query(store.path, "SELECT COUNT(*) AS n, SUM(value) AS s FROM samples WHERE metric = ?", ("latency",))
+        assert rows == [{"n": 100, "s": 4950}]
+        assert json.loads(Store.query(store.path, "SELECT labels FROM samples LIMIT 1")[0]["labels"]) == {"p": "50"}
+
+    def test_close(self, store):
+        """Test pending rows are written on close and writes are rejected afterwards"""
+        store.sample("n", "s", "m", 0.0, 1)
+        store.close()
+        assert Store.query(store.path, "SELECT COUNT(*) AS n FROM samples") == [{"n": 1}]
+        with pytest.raises(ValueError):
+            store.sample("n", "s", "m", 0.0, 1)
+
+    def test_error(self, store):
+        """Test write errors are raised to producers"""
+        store._put("INSERT INTO missing VALUES (?)", (1,))
+        with pytest.raises(sqlite3.OperationalError):
+            store.flush()
+        with pytest.raises(sqlite3.OperationalError):
+            store.sample("n", "s", "m", 0.0, 1)
+        store._error = None
+
+    def test_query_read_only(self, store):
+        """Test queries cannot modify the store"""
+        with pytest.raises(sqlite3.OperationalError):
+            Store.query(store.path, "DELETE FROM samples")
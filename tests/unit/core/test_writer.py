@@ -0,0 +1,74 @@
+import gzip
+import lzma
+import pytest
+from unittest.mock import patch
+from pymergen.core.writer import Writer
+
+
+class TestWriter:
+    def test_codec_for_suffix(self):
+        """Test codec detection by file suffix"""
+        assert Writer.codec_for("/tmp/out.log.gz") == Writer.CODEC_GZIP
+        assert Writer.codec_for("/tmp/out.log.xz") == Writer.CODEC_XZ
+        assert Writer.codec_for("/tmp/out.log.zst") == Writer.CODEC_ZSTD
+        assert Writer.codec_for("/tmp/out.log") is None
+
+    def test_codec_for_option(self):
+        """Test compress option takes precedence over the file suffix"""
+        assert Writer.codec_for("/tmp/out.log", Writer.CODEC_XZ) == Writer.CODEC_XZ
+
+    def test_path_for(self):
+        """Test suffix is appended for the compress option"""
+        assert Writer.path_for("/tmp/out.log") == "/tmp/out.log"
+        assert Writer.path_for("/tmp/out.log", Writer.CODEC_GZIP) == "/tmp/out.log.gz"
+        assert Writer.path_for("/tmp/out.log.gz", Writer.CODEC_GZIP) == "/tmp/out.log.gz"
+
+    def test_path_for_unknown_codec(self):
+        """Test unknown codecs are rejected"""
+        with pytest.raises(Exception) as excinfo:
+            Writer.path_for("/tmp/out.log", "bzip")
+        assert "not recognized" in str(excinfo.value)
+
+    @patch('builtins.open')
+    def test_open_uncompressed(self, mock_open_func):
+        """Test plain files are opened directly"""
+        Writer.open("/tmp/out.log", None, "a")
+        mock_open_func.assert_called_once_with("/tmp/out.log", "a")
+
+    def test_gzip(self, tmp_path):
+        """Test gzip stream written from text and bytes"""
+        path = str(tmp_path / "out.log.gz")
+        writer = Writer.open(path)
+        assert isinstance(writer, Writer)
+        writer.write("line 1\n")
+        writer.write(b"line 2\n")
+        writer.flush()
+        writer.close()
+        assert writer.closed is True
+        with gzip.open(path, "rt") as fh:
+            assert fh.read() == "line 1\nline 2\n"
+
+    def test_xz_option(self, tmp_path):
+        """Test xz stream selected by the compress option"""
+        writer = Writer.open(str(tmp_path / "out.log"), Writer.CODEC_XZ)
+        writer.write("data\n")
+        writer.close()
+        with lzma.open(str(tmp_path / "out.log.xz"), "rt") as fh:
+            assert fh.read() == "data\n"
+
+    def test_append_starts_new_frame(self, tmp_path):
+        """Test appending produces a valid concatenated stream"""
+        path = str(tmp_path / "out.log.gz")
+        for line in ["first\n", "second\n"]:
+            writer = Writer.open(path, None, "a")
+            writer.write(line)
+            writer.close()
+        with gzip.open(path, "rt") as fh:
+            assert fh.read() == "first\nsecond\n"
+
+    def test_write_after_close(self, tmp_path):
+        """Test writes are rejected after close"""
+        writer = Writer.open(str(tmp_path / "out.log.gz"))
+        writer.close()
+        with pytest.raises(ValueError):
+            writer.write("data")
@@ -89,6 +89,14 @@ class TestCommand:
         assert command.debug_stdout is True
 
 
+    def test_command_meter_pipes(self, command):
+        """Test meter_pipes property"""
+        assert command.meter_pipes is False
+
+        command.meter_pipes = True
+        assert command.meter_pipes is True
+
+
     def test_command_debug_stderr(self, command):
         """Test debug_stderr property"""
         assert command.debug_stderr is False
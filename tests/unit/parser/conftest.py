@@ -0,0 +1,23 @@
+import pytest
+from unittest.mock import MagicMock
+from pymergen.core.context import Context
+
+
+@pytest.fixture
+def mock_context():
+    context = MagicMock(spec=Context)
+    context.logger = MagicMock()
+    return context
+
+
+@pytest.fixture
+def mock_writer():
+    writer = MagicMock()
+    writer.records = list()
+    writer.reductions = dict()
+
+    def write(record, reduce):
+        writer.records.append(record)
+        writer.reductions[record["metric"]] = reduce
+    writer.write.side_effect = write
+    return writer
@@ -0,0 +1,83 @@
+import json
+from pymergen.parser.benchmark import OutputParserFio, OutputParserSysbench, OutputParserWrk
+
+
+class TestOutputParserFio:
+    def test_parse_document(self, mock_writer):
+        """Test fio job metrics are emitted per direction"""
+        parser = OutputParserFio()
+        parser.parse({"name": "fio"})
+        parser.writer = mock_writer
+        document = {
+            "jobs": [{
+                "jobname": "randread",
+                "read": {
+                    "io_bytes": 4096,
+                    "iops": 1000.0,
+                    "bw_bytes": 4096000,
+                    "lat_ns": {"mean": 250.0},
+                    "clat_ns": {"percentile": {"50.000000": 300, "99.000000": 900, "99.900000": 1200}},
+                },
+                "write": {"io_bytes": 0, "iops": 0, "bw_bytes": 0},
+            }]
+        }
+        parser.write(json.dumps(document, indent=2).encode())
+        parser.close()
+        metrics = {r["metric"]: r["value"] for r in mock_writer.records}
+        assert metrics == {"iops": 1000.0, "bw": 4096000, "lat_mean": 250.0, "clat_p50": 300, "clat_p99": 900, "clat_p99.9": 1200}
+        assert all(r["labels"] == {"job": "randread", "direction": "read"} for r in mock_writer.records)
+        # Throughput is totalled over jobs, latencies are not
+        assert mock_writer.reductions["iops"] == "sum"
+        assert mock_writer.reductions["lat_mean"] == "mean"
+        assert mock_writer.reductions["clat_p99"] == "max"
+
+
+class TestOutputParserSysbench:
+    def test_interval(self, mock_writer):
+        """Test interval report lines"""
+        parser = OutputParserSysbench()
+        parser.parse({"name": "sysbench"})
+        parser.writer = mock_writer
+        parser.write(b"[ 1s ] thds: 8 tps: 411.90 qps: 8239.10 (r/w/o: 5768.30/1646.00/824.80) lat (ms,95%): 12.30 err/s: 0.00 reconn/s: 0.00\n")
+        metrics = {r["metric"]: r["value"] for r in mock_writer.records}
+        assert metrics["interval_tps"] == 411.9
+        assert metrics["interval_qps"] == 8239.1
+        assert metrics["interval_err_s"] == 0.0
+        assert metrics["interval_lat_p95"] == 12.3
+        assert mock_writer.records[0]["labels"] == {"time": 1.0, "threads": 8}
+
+    def test_summary(self, mock_writer):
+        """Test final summary lines"""
+        parser = OutputParserSysbench()
+        parser.parse({"name": "sysbench"})
+        parser.writer = mock_writer
+        parser.write(b"    transactions:                        12345  (411.50 per sec.)\n"
+                     b"         min:                                    1.02\n"
+                     b"         95th percentile:                       12.30\n")
+        metrics = {r["metric"]: r["value"] for r in mock_writer.records}
+        assert metrics == {"transactions": 411.5, "lat_min": 1.02, "lat_p95": 12.3}
+
+
+class TestOutputParserWrk:
+    def test_parse(self, mock_writer):
+        """Test wrk summary with latency distribution"""
+        parser = OutputParserWrk()
+        parser.parse({"name": "wrk"})
+        parser.writer = mock_writer
+        parser.write(b"  Thread Stats   Avg      Stdev     Max   +/- Stdev\n"
+                     b"    Latency   635.91us    0.89ms  12.92ms   93.69%\n"
+                     b"  Latency Distribution\n"
+                     b"     50%  491.00us\n"
+                     b"     99%    1.50s\n"
+                     b"  Non-2xx or 3xx responses: 3\n"
+                     b"Requests/sec:  56136.43\n"
+                     b"Transfer/sec:      1.50MB\n")
+        metrics = {r["metric"]: r["value"] for r in mock_writer.records}
+        assert abs(metrics["lat_avg"] - 0.63591) < 1e-9
+        assert metrics["lat_stdev"] == 0.89
+        assert metrics["lat_max"] == 12.92
+        assert metrics["lat_p50"] == 0.491
+        assert metrics["lat_p99"] == 1500.0
+        assert metrics["errors"] == 3.0
+        assert metrics["requests"] == 56136.43
+        assert metrics["transfer"] == 1.5 * 1024 ** 2
@@ -0,0 +1,107 @@
+import json
+import pytest
+from pymergen.parser.format import OutputParserRegex, OutputParserKeyValue, OutputParserJson
+
+
+class TestOutputParserRegex:
+    def test_first_group(self, mock_writer):
+        """Test value is taken from the first group"""
+        parser = OutputParserRegex()
+        parser.parse({"name": "regex", "patterns": [{"metric": "lat", "regex": r"latency: ([0-9.]+)", "unit": "ms"}]})
+        parser.writer = mock_writer
+        parser.write(b"latency: 1.5\nnoise\n")
+        assert len(mock_writer.records) == 1
+        assert mock_writer.records[0]["metric"] == "lat"
+        assert mock_writer.records[0]["value"] == 1.5
+        assert mock_writer.records[0]["unit"] == "ms"
+
+    def test_named_groups(self, mock_writer):
+        """Test named groups other than value become labels"""
+        parser = OutputParserRegex()
+        parser.parse({"name": "regex", "patterns": [{"metric": "ops", "regex": r"(?P<op>\w+) (?P<value>\d+) ops"}]})
+        parser.writer = mock_writer
+        parser.write(b"read 100 ops\n")
+        assert mock_writer.records[0]["value"] == 100.0
+        assert mock_writer.records[0]["labels"] == {"op": "read"}
+
+    def test_reduce(self, mock_writer):
+        """Test the reduction of a metric is declared per pattern"""
+        parser = OutputParserRegex()
+        parser.parse({"name": "regex", "patterns": [
+            {"metric": "retries", "regex": r"retries: (\d+)", "reduce": "sum"},
+            {"metric": "lat", "regex": r"latency: ([0-9.]+)"},
+        ]})
+        parser.writer = mock_writer
+        parser.write(b"retries: 2\nlatency: 1.5\n")
+        assert mock_writer.reductions == {"retries": "sum", "lat": "last"}
+        with pytest.raises(Exception) as excinfo:
+            parser.add_pattern("lat", r"latency: ([0-9.]+)", reduce="median")
+        assert "unknown reduction median" in str(excinfo.value)
+
+    def test_non_numeric(self, mock_writer, mock_context):
+        """Test matches without a numeric value are skipped and counted without disabling the parser"""
+        parser = OutputParserRegex()
+        parser.parse({"name": "regex", "patterns": [{"metric": "lat", "regex": r"latency: ([0-9.]+)?(n/a)?"}]})
+        parser.context = mock_context
+        parser.writer = mock_writer
+        parser.write(b"latency: n/a\nlatency: .\nlatency: 2.5\n")
+        parser.close()
+        assert [r["value"] for r in mock_writer.records] == [2.5]
+        assert parser.skipped == 2
+        mock_context.logger.warning.assert_called_once()
+        mock_context.logger.error.assert_not_called()
+
+    def test_pattern_without_group(self):
+        """Test patterns without a group are rejected when the configuration is parsed"""
+        parser = OutputParserRegex()
+        with pytest.raises(Exception) as excinfo:
+            parser.parse({"name": "regex", "patterns": [{"metric": "lat", "regex": r"latency: [0-9.]+"}]})
+        assert "requires a value group" in str(excinfo.value)
+
+
+class TestOutputParserKeyValue:
+    def test_parse_line(self, mock_writer):
+        """Test numeric key value pairs are emitted"""
+        parser = OutputParserKeyValue()
+        parser.parse({"name": "kv"})
+        parser.writer = mock_writer
+        parser.write(b"ops=10 lat=2.5 mode=fast\n")
+        assert [(r["metric"], r["value"]) for r in mock_writer.records] == [("ops", 10.0), ("lat", 2.5)]
+
+    def test_keys_and_separator(self, mock_writer):
+        """Test key filter, separator and delimiter options"""
+        parser = OutputParserKeyValue()
+        parser.parse({"name": "kv", "separator": ":", "delimiter": ",", "keys": ["lat"]})
+        parser.writer = mock_writer
+        parser.write(b"ops: 10, lat: 2.5\n")
+        assert [(r["metric"], r["value"]) for r in mock_writer.records] == [("lat", 2.5)]
+
+
+class TestOutputParserJson:
+    def test_lines(self, mock_writer):
+        """Test JSON lines are flattened"""
+        parser = OutputParserJson()
+        parser.parse({"name": "json"})
+        parser.writer = mock_writer
+        parser.write(b'warning\n{"a": {"b": 1, "c": [2, 3]}, "d": "x", "e": true}\n')
+        assert [(r["metric"], r["value"]) for r in mock_writer.records] == [("a.b", 1), ("a.c.0", 2), ("a.c.1", 3)]
+
+    def test_lines_invalid(self, mock_writer):
+        """Test undecodable lines are skipped without disabling the parser"""
+        parser = OutputParserJson()
+        parser.parse({"name": "json"})
+        parser.writer = mock_writer
+        parser.write(b'{"a": 1\n{"a": 2}\n')
+        assert [(r["metric"], r["value"]) for r in mock_writer.records] == [("a", 2)]
+        assert parser.skipped == 1
+
+    def test_document(self, mock_writer):
+        """Test a multi-line document is parsed on close"""
+        parser = OutputParserJson()
+        parser.parse({"name": "json", "mode": "document", "keys": ["total.ops"]})
+        parser.writer = mock_writer
+        document = json.dumps({"total": {"ops": 5, "lat": 1}}, indent=2)
+        parser.write("note: starting\n{d}\n".format(d=document).encode())
+        assert len(mock_writer.records) == 0
+        parser.close()
+        assert [(r["metric"], r["value"]) for r in mock_writer.records] == [("total.ops", 5)]
@@ -0,0 +1,109 @@
+import json
+from unittest.mock import MagicMock
+from pymergen.parser.parser import OutputParser, OutputParserMetricWriter
+
+
+class OutputParserLines(OutputParser):
+
+    def parse_line(self, line: str) -> None:
+        if line == "fail":
+            raise ValueError("bad line")
+        self.emit("length", len(line), "chars", {"line": line})
+
+
+class TestOutputParser:
+    def test_parse(self):
+        """Test common parser configuration"""
+        parser = OutputParserLines()
+        parser.parse({"name": "lines", "engine": "lines", "stream": "stderr"})
+        assert parser.name == "lines"
+        assert parser.stream == OutputParser.STREAM_STDERR
+
+    def test_parse_default_stream(self):
+        """Test parsers read stdout by default"""
+        parser = OutputParserLines()
+        parser.parse({"name": "lines"})
+        assert parser.stream == OutputParser.STREAM_STDOUT
+
+    def test_write_splits_lines(self, mock_writer):
+        """Test lines split across chunks are reassembled"""
+        parser = OutputParserLines()
+        parser.parse({"name": "lines"})
+        parser.command = "bench"
+        parser.writer = mock_writer
+        parser.write(b"ab")
+        parser.write(b"c\r\nde\nf")
+        assert [r["labels"]["line"] for r in mock_writer.records] == ["abc", "de"]
+        parser.close()
+        assert [r["labels"]["line"] for r in mock_writer.records] == ["abc", "de", "f"]
+        record = mock_writer.records[0]
+        assert record["command"] == "bench"
+        assert record["parser"] == "lines"
+        assert record["stream"] == "stdout"
+        assert record["metric"] == "length"
+        assert record["value"] == 3
+        assert record["unit"] == "chars"
+
+    def test_failure_disables_parser(self, mock_context, mock_writer):
+        """Test a failing parser logs once and stops parsing"""
+        parser = OutputParserLines()
+        parser.parse({"name": "lines"})
+        parser.context = mock_context
+        parser.writer = mock_writer
+        parser.write(b"ok\nfail\nok\n")
+        assert len(mock_writer.records) == 1
+        mock_context.logger.error.assert_called_once()
+
+    def test_instance(self, mock_writer):
+        """Test instances are independent copies"""
+        parser = OutputParserLines()
+        parser.parse({"name": "lines"})
+        parser.writer = mock_writer
+        parser.write(b"partial")
+        instance = parser.instance()
+        assert instance is not parser
+        assert instance.name == "lines"
+        assert instance._buffer == b""
+        assert parser._buffer == b"partial"
+
+
+class TestOutputParserMetricWriter:
+    def test_write(self, tmp_path):
+        """Test records are appended as JSON lines"""
+        writer = OutputParserMetricWriter(str(tmp_path))
+        writer.write({"metric": "a", "value": 1})
+        writer.write({"metric": "b", "value": 2})
+        writer.close()
+        with open(tmp_path / OutputParserMetricWriter.FILE_NAME) as fh:
+            records = [json.loads(line) for line in fh]
+        assert records == [{"metric": "a", "value": 1}, {"metric": "b", "value": 2}]
+
+    def test_totals(self, tmp_path):
+        """Test numeric values are reduced per metric as declared, and to the last value by default"""
+        writer = OutputParserMetricWriter(str(tmp_path))
+        for value in [1, 4, 2.5]:
+            writer.write({"metric": "last", "value": value})
+            writer.write({"metric": "sum", "value": value}, OutputParserMetricWriter.REDUCE_SUM)
+            writer.write({"metric": "mean", "value": value}, OutputParserMetricWriter.REDUCE_MEAN)
+            writer.write({"metric": "max", "value": value}, OutputParserMetricWriter.REDUCE_MAX)
+        writer.write({"metric": "b", "value": "text"})
+        writer.close()
+        assert writer.totals == {"last": 2.5, "sum": 7.5, "mean": 2.5, "max": 4}
+
+    def test_close_without_records(self, tmp_path):
+        """Test no file is created without records"""
+        writer = OutputParserMetricWriter(str(tmp_path))
+        writer.close()
+        assert not (tmp_path / OutputParserMetricWriter.FILE_NAME).exists()
+
+    def test_store(self):
+        """Test numeric records are sent to the store only when no path is given"""
+        writer = OutputParserMetricWriter(None)
+        writer.store = MagicMock()
+        writer.node = "case/r001/i001/p001/bench"
+        writer.write({"timestamp": 1.0, "parser": "wrk", "metric": "rps", "value": 10.5, "labels": {"t": "1"}})
+        writer.write({"timestamp": 2.0, "parser": "wrk", "metric": "name", "value": "text", "labels": {}})
+        writer.close()
+        assert writer.path is None
+        assert writer.totals == {"rps": 10.5}
+        writer.store.sample.assert_called_once_with("case/r001/i001/p001/bench", "parser.wrk", "rps", 1.0, 10.5, {"t": "1"})
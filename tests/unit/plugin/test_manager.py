@@ -23,6 +23,7 @@ class TestPluginManager:
         assert manager._paths is None
         assert isinstance(manager._registry, PluginRegistry)
         assert PluginManager.CATEGORY_COLLECTOR in manager._registry.categories
+        assert PluginManager.CATEGORY_PARSER in manager._registry.categories
 
     def test_paths_property(self, mock_context):
         """Test paths property"""
@@ -61,7 +62,7 @@ class TestPluginManager:
                   mock_loader, mock_glob, mock_context):
         """Test plugin loading"""
         # Setup mocks
-        mock_glob.return_value = ["/test/path/collector/test_plugin/plugin.py"]
+        mock_glob.side_effect = lambda path: ["/test/path/collector/test_plugin/plugin.py"] if "collector" in path else []
 
         mock_loader_instance = MagicMock()
         mock_loader.return_value = mock_loader_instance
@@ -81,7 +82,8 @@ class TestPluginManager:
             manager.load()
 
         # Verify
-        mock_glob.assert_called_with(os.path.join('/test/path', 'collector', '*', 'plugin.py'))
+        mock_glob.assert_any_call(os.path.join('/test/path', 'collector', '*', 'plugin.py'))
+        mock_glob.assert_any_call(os.path.join('/test/path', 'parser', '*', 'plugin.py'))
         mock_loader.assert_called_with('collector', '/test/path/collector/test_plugin/plugin.py')
         mock_spec_from_loader.assert_called_with(mock_loader_instance.name, mock_loader_instance)
         mock_module_from_spec.assert_called_with(mock_spec)
@@ -118,3 +120,35 @@ class TestPluginManager:
         # Verify
         manager._registry.get_plugins.assert_called_with(PluginManager.CATEGORY_COLLECTOR)
         assert result == mock_plugins
+
+    def test_get_parser_plugin(self, mock_context):
+        """Test get_parser_plugin method"""
+        manager = PluginManager(mock_context)
+
+        mock_plugin = MagicMock(spec=Plugin)
+        manager._registry.get_plugin = MagicMock(return_value=mock_plugin)
+
+        result = manager.get_parser_plugin("regex")
+
+        manager._registry.get_plugin.assert_called_with(PluginManager.CATEGORY_PARSER, "regex")
+        assert result == mock_plugin
+
+    def test_get_parser_plugins(self, mock_context):
+        """Test get_parser_plugins method"""
+        manager = PluginManager(mock_context)
+
+        mock_plugins = {"regex": MagicMock(), "fio": MagicMock()}
+        manager._registry.get_plugins = MagicMock(return_value=mock_plugins)
+
+        result = manager.get_parser_plugins()
+
+        manager._registry.get_plugins.assert_called_with(PluginManager.CATEGORY_PARSER)
+        assert result == mock_plugins
+
+    def test_load_builtin_parser_plugins(self, mock_context):
+        """Test built-in parser plugins are discovered"""
+        mock_context.plugin_path = None
+        manager = PluginManager(mock_context)
+        manager.load()
+
+        assert sorted(manager.get_parser_plugins().keys()) == ["fio", "json", "keyvalue", "regex", "sysbench", "wrk"]